@@ -8,19 +8,33 @@ import os
 import asyncio
 import threading
 import time
-import json
-from server import PromptServer
+try:
+    from server import PromptServer
+except ImportError:
+    # 在ComfyUI之外导入（如维护脚本）时不注册服务器端点
+    PromptServer = None
 
 # 必须首先声明 WEB_DIRECTORY
 WEB_DIRECTORY = "web"
 
 # 导入核心模块
 from .core import setup_logger, get_logger, NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
-from .handlers import register_file_operations_endpoints, register_static_endpoints
+from .handlers import (
+    register_file_operations_endpoints, register_static_endpoints, register_admin_endpoints,
+    register_handshake_endpoint, enable_websocket_actions, prepare_web_directory, save_workflow_file
+)
+from .utils.path_resolver import resolve_path
+from .utils.workflow_format import get_storage_path, locate_workflow_file, publish_workflow_save
+from .utils.json_codec import loads, dumps
+from .utils.lock_manager import path_lock_sync
+from .utils.operation_journal import get_operation_journal, plan_move, plan_copy
 
 # 设置日志
 logger = setup_logger()
 
+# WebSocket消息处理器支持的操作（注册成功后在能力握手中公布）
+WEBSOCKET_ACTIONS = ("list_directory", "load_workflow", "save_workflow", "move_file", "copy_file")
+
 # WebSocket消息处理器（直接在__init__.py中定义以避免导入问题）
 def handle_websocket_message(message_data, client_id=None):
     """处理来自前端的WebSocket消息"""
@@ -36,13 +50,13 @@ def handle_websocket_message(message_data, client_id=None):
                 # 创建临时节点实例来执行操作
                 from .core.nodes import NZWorkflowManagerNode
                 node = NZWorkflowManagerNode()
-                result = node.list_directory(path)
+                result = node.list_directory(resolve_path(path or os.getcwd()))
                 
                 # 返回WebSocket响应格式
                 response = {
                     "type": "nz_workflow_manager_response",
                     "action": action,
-                    "result": json.loads(result[0]) if result and result[0] else None
+                    "result": loads(result[0]) if result and result[0] else None
                 }
                 
                 return response
@@ -50,13 +64,17 @@ def handle_websocket_message(message_data, client_id=None):
                 # 创建临时节点实例来执行文件读取操作
                 from .core.nodes import NZWorkflowManagerNode
                 node = NZWorkflowManagerNode()
+                if path:
+                    # 按压缩存储模式保存后文件可能已改为 .json.gz 等扩展名
+                    path = resolve_path(path)
+                    path = locate_workflow_file(path) or path
                 result = node.load_workflow(path)
                 
                 # 返回WebSocket响应格式
                 response = {
                     "type": "nz_workflow_manager_response", 
                     "action": action,
-                    "result": json.loads(result[0]) if result and result[0] else None
+                    "result": loads(result[0]) if result and result[0] else None
                 }
                 
                 return response
@@ -72,29 +90,30 @@ def handle_websocket_message(message_data, client_id=None):
                     if not workflow_data:
                         raise ValueError("工作流数据不能为空")
                     
-                    # 确保目录存在
-                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    file_path = resolve_path(file_path)
                     
                     # 如果workflow_data是字符串，直接写入；如果是对象，序列化为JSON
                     if isinstance(workflow_data, str):
                         content = workflow_data
                     else:
-                        import json
-                        content = json.dumps(workflow_data, indent=2, ensure_ascii=False)
+                        content = dumps(workflow_data, indent=True)
                     
-                    # 写入文件
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
+                    # 与HTTP保存相同：按根目录的存储模式写入，并记录版本供增量保存使用
+                    with path_lock_sync(exclusive=[file_path, get_storage_path(file_path)]):
+                        storage_path, size, revision, mtime_ns, previous_path = save_workflow_file(file_path, content)
+                        publish_workflow_save(previous_path, file_path, storage_path)
                     
-                    logger.info(f"工作流保存成功: {file_path} ({len(content)} 字符)")
+                    logger.info(f"工作流保存成功: {storage_path} ({size} 字节)")
                     
                     return {
                         "type": "nz_workflow_manager_response",
                         "action": action,
                         "result": {
                             "success": True, 
-                            "file_path": file_path,
-                            "size": len(content)
+                            "file_path": storage_path,
+                            "size": size,
+                            "revision": revision,
+                            "mtime_ns": mtime_ns
                         }
                     }
                     
@@ -112,12 +131,15 @@ def handle_websocket_message(message_data, client_id=None):
                 new_filename = message_data.get("new_filename", "")
                 
                 try:
-                    import shutil
                     from .utils.validation import validate_path
                     
                     if not validate_path(source_path) or not validate_path(target_path):
                         raise ValueError("源路径或目标路径无效")
                     
+                    source_path = resolve_path(source_path)
+                    source_path = locate_workflow_file(source_path) or source_path
+                    target_path = resolve_path(target_path)
+                    
                     if not os.path.exists(source_path):
                         raise ValueError("源文件不存在")
                     
@@ -140,8 +162,9 @@ def handle_websocket_message(message_data, client_id=None):
                     # 构建完整的目标文件路径
                     full_target_path = os.path.join(target_path, file_name)
                     
-                    # 移动文件（覆盖已存在的文件）
-                    shutil.move(source_path, full_target_path)
+                    with path_lock_sync(exclusive=[source_path, full_target_path]):
+                        # 通过操作日志移动（可撤销；覆盖已存在的文件，被覆盖的文件移入回收站）
+                        get_operation_journal().execute('move_file', plan_move(source_path, full_target_path))
                     logger.info(f"WebSocket: 成功移动文件: {source_path} -> {full_target_path}")
                     
                     return {
@@ -168,12 +191,15 @@ def handle_websocket_message(message_data, client_id=None):
                 new_name = message_data.get("new_name", "")
                 
                 try:
-                    import shutil
                     from .utils.validation import validate_path, validate_filename
                     
                     if not validate_path(source_path) or not validate_path(target_path):
                         raise ValueError("源路径或目标路径无效")
                     
+                    source_path = resolve_path(source_path)
+                    source_path = locate_workflow_file(source_path) or source_path
+                    target_path = resolve_path(target_path)
+                    
                     if not os.path.exists(source_path):
                         raise ValueError("源文件不存在")
                     
@@ -197,8 +223,9 @@ def handle_websocket_message(message_data, client_id=None):
                     # 构建完整的目标文件路径
                     full_target_path = os.path.join(target_path, target_file_name)
                     
-                    # 复制文件（覆盖已存在的文件）
-                    shutil.copy2(source_path, full_target_path)
+                    # 通过操作日志复制（可撤销；覆盖已存在的文件，被覆盖的文件移入回收站）
+                    with path_lock_sync(exclusive=[full_target_path], shared=[source_path]):
+                        get_operation_journal().execute('copy_file', plan_copy(source_path, full_target_path))
                     logger.info(f"WebSocket: 成功复制文件: {source_path} -> {full_target_path}")
                     
                     return {
@@ -245,6 +272,7 @@ def register_websocket_handler():
             # 注册消息处理器
             if hasattr(prompt_server, 'add_message_handler'):
                 prompt_server.add_message_handler("nz_workflow_manager", handle_websocket_message)
+                enable_websocket_actions(WEBSOCKET_ACTIONS)
                 logger.info("WebSocket消息处理器注册成功")
             else:
                 logger.warning("PromptServer不支持add_message_handler")
@@ -262,6 +290,7 @@ def register_websocket_handler():
                         prompt_server = PromptServer.instance
                         if hasattr(prompt_server, 'add_message_handler'):
                             prompt_server.add_message_handler("nz_workflow_manager", handle_websocket_message)
+                            enable_websocket_actions(WEBSOCKET_ACTIONS)
                             logger.info("延迟注册 - WebSocket消息处理器注册成功")
                         else:
                             logger.warning("延迟注册 - PromptServer不支持add_message_handler")
@@ -305,6 +334,20 @@ def register_http_endpoints():
             except Exception as e:
                 logger.error(f"静态文件端点注册失败: {str(e)}")
             
+            # 注册管理端点
+            try:
+                register_admin_endpoints(app)
+                logger.info("管理端点注册完成")
+            except Exception as e:
+                logger.error(f"管理端点注册失败: {str(e)}")
+            
+            # 注册能力握手端点
+            try:
+                register_handshake_endpoint(app)
+                logger.info("能力握手端点注册完成")
+            except Exception as e:
+                logger.error(f"能力握手端点注册失败: {str(e)}")
+            
             logger.info("所有HTTP端点注册流程完成")
         else:
             logger.warning("无法获取PromptServer应用实例，启动延迟注册")
@@ -330,6 +373,20 @@ def register_http_endpoints():
                         except Exception as e:
                             logger.error(f"延迟注册 - 静态文件端点注册失败: {str(e)}")
                         
+                        # 延迟注册管理端点
+                        try:
+                            register_admin_endpoints(app)
+                            logger.info("延迟注册 - 管理端点注册完成")
+                        except Exception as e:
+                            logger.error(f"延迟注册 - 管理端点注册失败: {str(e)}")
+                        
+                        # 延迟注册能力握手端点
+                        try:
+                            register_handshake_endpoint(app)
+                            logger.info("延迟注册 - 能力握手端点注册完成")
+                        except Exception as e:
+                            logger.error(f"延迟注册 - 能力握手端点注册失败: {str(e)}")
+                        
                         logger.info("延迟注册所有HTTP端点流程完成")
                     else:
                         logger.error("延迟注册失败 - 仍无法获取PromptServer实例")
@@ -344,11 +401,20 @@ def register_http_endpoints():
 
 
 # 执行注册
+if PromptServer is None:
+    logger.info("未在ComfyUI中运行，跳过WebSocket和HTTP端点注册")
+else:
+    try:
+        register_websocket_handler()
+        register_http_endpoints()
+    except Exception as e:
+        logger.error(f"插件初始化失败: {str(e)}")
+
+# 端点注册后再选择前端目录：打包产物可用时ComfyUI只加载 dist/web 中的引导文件
 try:
-    register_websocket_handler()
-    register_http_endpoints()
+    WEB_DIRECTORY = prepare_web_directory()
 except Exception as e:
-    logger.error(f"插件初始化失败: {str(e)}")
+    logger.error(f"选择前端目录失败，使用 web/ 源码: {str(e)}")
 
 # 导出所需的变量
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS', 'WEB_DIRECTORY']
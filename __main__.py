@@ -0,0 +1,30 @@
+"""
+NZ工作流助手 - 命令行入口
+插件目录名不是合法的包名，这里把插件目录注册为包（不执行__init__.py，因此不需要ComfyUI和aiohttp），
+再运行维护工具：python <插件目录> <命令> [参数]，命令见 cli.py
+"""
+
+import os
+import sys
+import types
+
+PACKAGE_NAME = "nz_workflow_manager"
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 插件目录本身不作为导入路径，避免其中的 core/utils 与其他同名模块冲突
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != PLUGIN_DIR]
+
+# 进程池的工作进程（spawn/forkserver方式启动）需要重新执行本文件注册包：
+# 清除__spec__后multiprocessing按文件路径而不是模块名（__main__，会被跳过）准备主模块
+__spec__ = None
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules[PACKAGE_NAME] = package
+
+from nz_workflow_manager.cli import main  # noqa: E402
+
+
+if __name__ == '__main__':
+    sys.exit(main())
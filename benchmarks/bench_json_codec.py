@@ -0,0 +1,117 @@
+"""
+NZ工作流助手 - JSON编解码性能对比
+对比标准库json / ujson / orjson 在大目录列表和大工作流上的解析与序列化耗时
+
+用法: python benchmarks/bench_json_codec.py [--files 20000] [--nodes 4000] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import importlib.util
+
+
+def _load_codec_module():
+    # json_codec不依赖插件的其他模块，直接按文件路径加载，无需启动ComfyUI
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils', 'json_codec.py')
+    spec = importlib.util.spec_from_file_location('nz_json_codec', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_listing(file_count):
+    """模拟list_directory返回的大目录"""
+    return {
+        "path": "/data/workflows/大目录",
+        "directories": [{"name": f"子目录_{i}", "path": f"/data/workflows/大目录/子目录_{i}"} for i in range(file_count // 50)],
+        "files": [
+            {
+                "name": f"工作流_{i:05d}.json",
+                "path": f"/data/workflows/大目录/工作流_{i:05d}.json",
+                "size": random.randint(1000, 5000000),
+                "modified": 1700000000.0 + i
+            }
+            for i in range(file_count)
+        ]
+    }
+
+
+def make_workflow(node_count):
+    """模拟ComfyUI导出的大工作流（数MB）"""
+    nodes = []
+    links = []
+    for i in range(node_count):
+        nodes.append({
+            "id": i,
+            "type": random.choice(["KSampler", "CLIPTextEncode", "VAEDecode", "CheckpointLoaderSimple"]),
+            "pos": [random.random() * 5000, random.random() * 5000],
+            "size": [315, 262],
+            "flags": {},
+            "order": i,
+            "mode": 0,
+            "inputs": [{"name": "model", "type": "MODEL", "link": i * 2}],
+            "outputs": [{"name": "LATENT", "type": "LATENT", "links": [i * 2 + 1], "slot_index": 0}],
+            "properties": {"Node name for S&R": "KSampler"},
+            "widgets_values": [random.randint(0, 2 ** 32), "randomize", 20, 7.5, "euler", "normal", 1.0,
+                               "一张高质量的风景照片, masterpiece, best quality"]
+        })
+        links.append([i * 2, i, 0, i + 1, 0, "MODEL"])
+    return {"last_node_id": node_count, "last_link_id": node_count * 2, "nodes": nodes, "links": links,
+            "groups": [], "config": {}, "extra": {"ds": {"scale": 1.0, "offset": [0, 0]}}, "version": 0.4}
+
+
+def _best(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_payload(codec_module, label, payload, repeat):
+    # 基准：标准库json的原有写法（dumps成str后再编码 / 直接loads）
+    stdlib = codec_module.get_codec('json')
+    text = stdlib.dumps(payload, indent=True)
+    raw = text.encode('utf-8')
+    print(f"\n{label}: {len(raw) / 1024 / 1024:.2f} MiB")
+    print(f"{'backend':<8} {'loads':>10} {'dumps':>10} {'dumps_bytes':>12} {'indent':>10}")
+
+    baseline = None
+    for name in ("json", "ujson", "orjson"):
+        codec = codec_module.get_codec(name)
+        if codec is None:
+            print(f"{name:<8} {'(未安装)':>10}")
+            continue
+        row = (
+            _best(lambda: codec.loads(raw), repeat),
+            _best(lambda: codec.dumps(payload), repeat),
+            _best(lambda: codec.dumps_bytes(payload), repeat),
+            _best(lambda: codec.dumps_bytes(payload, indent=True), repeat),
+        )
+        if baseline is None:
+            baseline = row
+        speedup = baseline[0] / row[0], baseline[2] / row[2]
+        print(f"{name:<8} {row[0]:>8.1f}ms {row[1]:>8.1f}ms {row[2]:>10.1f}ms {row[3]:>8.1f}ms"
+              f"  (loads x{speedup[0]:.1f}, dumps_bytes x{speedup[1]:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000, help="目录列表中的文件数")
+    parser.add_argument('--nodes', type=int, default=4000, help="工作流中的节点数")
+    parser.add_argument('--repeat', type=int, default=5, help="每项重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    random.seed(0)
+    codec_module = _load_codec_module()
+    print(f"Python {sys.version.split()[0]}, 当前选用: {codec_module.JSON_BACKEND}")
+    bench_payload(codec_module, f"目录列表 ({args.files}个文件)", make_listing(args.files), args.repeat)
+    bench_payload(codec_module, f"工作流 ({args.nodes}个节点)", make_workflow(args.nodes), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""
+NZ工作流助手 - 命令行维护工具
+不启动ComfyUI也能重建索引、查找重复、统计磁盘占用、转换存储格式和打包前端，适合在存储节点上定时执行。
+与服务器共用同一套路径解析、遍历、索引和文件写入代码；逐个文件的任务分布到进程池，
+进度输出到stderr，结果（JSON）输出到stdout；格式转换把处理过的文件记录在检查点中，
+中断后重新运行（或下一次定时执行）只处理新增和修改过的文件
+
+用法: python <插件目录> <命令> [路径...] [参数]，不指定路径时处理配置的所有本地根目录
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .core.logger import get_logger
+from .core.config import get_setting, get_data_dir
+from .core.constants import REMOTE_PATH_SCHEMES
+from .utils.path_resolver import resolve_path, invalidate_path, notify_path_moved
+from .utils.json_codec import loads, dumps, dumps_bytes
+from .utils.lock_manager import path_lock_sync, LockTimeoutError
+from .utils.workflow_iterator import walk_workflow_files
+from .utils.workflow_format import (
+    STORAGE_MODES, zstandard, get_storage_mode, is_stored_as, get_converted_path, convert_workflow_file
+)
+from .utils.duplicate_finder import get_duplicate_finder
+from .utils.disk_usage import get_disk_usage_index
+from .utils.note_index import get_note_index
+from .utils import asset_pipeline
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 检查点保存在数据目录的子目录中
+CHECKPOINT_DIR_NAME = "maintenance"
+CHECKPOINT_VERSION = 1
+
+# 处理过程中每隔多少秒保存一次检查点
+CHECKPOINT_SAVE_INTERVAL = 5
+
+# 输出重定向到文件时每隔多少秒输出一行进度
+PROGRESS_LOG_INTERVAL = 10
+
+
+class Progress:
+    """进度输出到stderr：终端中原地刷新，重定向到文件（定时任务日志）时每隔一段时间输出一行"""
+
+    def __init__(self, label, total=0, stream=None):
+        self.label = label
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+        self.started = time.time()
+        self.printed_at = 0
+
+    def update(self, done, total=None, detail=''):
+        if total is not None:
+            self.total = total
+        now = time.time()
+        interval = 0.2 if self.interactive else PROGRESS_LOG_INTERVAL
+        if now - self.printed_at < interval and done < self.total:
+            return
+        self.printed_at = now
+        self._write(done, detail)
+
+    def _write(self, done, detail, final=False):
+        counter = f" {done}/{self.total} ({done * 100 // self.total}%)" if self.total else ''
+        line = f"[{self.label}]{counter} {detail}".rstrip()
+        if self.interactive:
+            self.stream.write(f"\r\033[K{line}" + ('\n' if final else ''))
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def finish(self, detail=''):
+        elapsed = time.time() - self.started
+        self._write(self.total, f"{detail} 耗时{elapsed:.1f}秒".strip(), final=True)
+
+
+class Checkpoint:
+    """
+    任务检查点 {路径: 记录}：记录中保存处理时的文件签名（mtime_ns, size），
+    签名未变化的文件在之后的运行中直接跳过；定期写盘，中断（Ctrl+C、进程被杀）后最多重做几秒的工作
+    """
+
+    def __init__(self, task):
+        self.path = os.path.join(get_data_dir(CHECKPOINT_DIR_NAME), f"{task}.json")
+        self.entries = {}
+        self.saved_at = time.time()
+        try:
+            with open(self.path, 'rb') as f:
+                data = loads(f.read())
+            if data.get('version') == CHECKPOINT_VERSION:
+                self.entries = data['entries']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def reset(self, roots):
+        """丢弃根目录下的记录（重新处理所有文件）"""
+        prefixes = tuple(os.path.join(root, '') for root in roots)
+        self.entries = {path: entry for path, entry in self.entries.items() if not path.startswith(prefixes)}
+
+    def get(self, path, signature):
+        entry = self.entries.get(path)
+        return entry if entry is not None and entry['signature'] == list(signature) else None
+
+    def put(self, path, signature, **values):
+        self.entries[path] = {"signature": list(signature), **values}
+
+    def discard(self, path):
+        self.entries.pop(path, None)
+
+    def prune(self, root, seen):
+        """删除根目录下已不存在的文件的记录"""
+        prefix = os.path.join(root, '')
+        for path in [p for p in self.entries if p.startswith(prefix) and p not in seen]:
+            del self.entries[path]
+
+    def save(self, force=True):
+        if not force and time.time() - self.saved_at < CHECKPOINT_SAVE_INTERVAL:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(dumps_bytes({"version": CHECKPOINT_VERSION, "entries": self.entries}))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"保存检查点失败: {str(e)}")
+        self.saved_at = time.time()
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _create_executor(workers):
+    """进程池（不可用时改用线程池）"""
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError, ValueError):
+        logger.warning("进程池不可用，改用线程池")
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+def _run_parallel(function, jobs, workers, on_result):
+    """
+    把jobs [(参数...)] 分布到进程池执行，每完成一个调用on_result(结果)；
+    同时提交的任务数有上限，文件很多时不会一次创建全部任务
+    """
+    executor = _create_executor(workers)
+    jobs = iter(jobs)
+    pending = set()
+    try:
+        while True:
+            for args in jobs:
+                pending.add(executor.submit(function, *args))
+                if len(pending) >= workers * 4:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                on_result(future.result())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _get_roots(paths):
+    """命令行中的路径（支持 @根目录/相对路径）；没有指定时使用配置的本地根目录"""
+    if paths:
+        roots = [resolve_path(path) for path in paths]
+    else:
+        roots = [
+            root['path'] for root in get_setting('roots', [])
+            if not root['path'].lower().startswith(REMOTE_PATH_SCHEMES)
+        ]
+        if not roots:
+            raise ValueError("没有配置工作流根目录，请在命令行中指定要处理的目录")
+    for root in roots:
+        if not os.path.isdir(root):
+            raise ValueError(f"路径不是目录: {root}")
+    return [os.path.normpath(root) for root in roots]
+
+
+# ====== 任务 ======
+
+def _compact_job(path, mode):
+    """在工作进程中转换一个文件，返回 (源路径, 存储模式, 转换后的路径, 签名, 节省的字节数, 错误, 是否稍后重试)"""
+    try:
+        # 与服务器的保存/移动操作互斥（启用advisory_locks时跨进程生效）
+        with path_lock_sync(exclusive=[path, get_converted_path(path, mode)]):
+            target, saved = convert_workflow_file(path, mode)
+            return path, mode, target, _signature(target), saved, None, False
+    except LockTimeoutError as e:
+        return path, mode, None, None, 0, str(e), True
+    except Exception as e:
+        return path, mode, None, None, 0, str(e), False
+
+
+def run_compact(roots, mode=None, workers=None, restart=False):
+    """把根目录下的工作流转换为指定存储模式（不指定时使用各根目录配置的模式）"""
+    if mode == 'zstd' and zstandard is None:
+        raise ValueError("转换为zstd格式需要安装 zstandard")
+    workers = workers or get_setting('dedupe_workers', 0) or os.cpu_count() or 4
+
+    checkpoint = Checkpoint('compact')
+    if restart:
+        checkpoint.reset(roots)
+
+    # 先遍历找出需要处理的文件（检查点中签名未变化的文件直接跳过）
+    jobs, skipped = [], 0
+    for root in roots:
+        seen = set()
+        root_mode = mode or get_storage_mode(root)
+        for path, _ in walk_workflow_files(root):
+            seen.add(path)
+            try:
+                signature = _signature(path)
+            except OSError:
+                continue
+            # 已转换为该模式，或无法转换且之后没有修改过
+            entry = checkpoint.get(path, signature)
+            if is_stored_as(path, root_mode) or (entry is not None and (entry.get('error') or entry.get('mode') == root_mode)):
+                skipped += 1
+                continue
+            jobs.append((path, root_mode))
+        checkpoint.prune(root, seen)
+
+    progress = Progress('compact', len(jobs))
+    summary = {"converted": 0, "skipped": skipped, "failed": 0, "retry": 0, "saved_bytes": 0, "errors": []}
+
+    def on_result(result):
+        path, mode, target, signature, saved, error, retry = result
+        if error is not None:
+            summary['retry' if retry else 'failed'] += 1
+            summary['errors'].append({"path": path, "error": error})
+            logger.warning(f"转换失败: {path} - {error}")
+            if not retry:
+                # 无法转换的文件（如JSON格式错误）在被修改之前不再重试
+                try:
+                    checkpoint.put(path, _signature(path), error=error)
+                except OSError:
+                    pass
+        else:
+            summary['converted'] += 1
+            summary['saved_bytes'] += saved
+            checkpoint.discard(path)
+            checkpoint.put(target, signature, mode=mode)
+            if target != path:
+                notify_path_moved(path, target)
+            invalidate_path(path, target)
+        done = summary['converted'] + summary['failed'] + summary['retry']
+        progress.update(done, detail=f"节省 {summary['saved_bytes'] // 1024} KB")
+        checkpoint.save(force=False)
+
+    try:
+        _run_parallel(_compact_job, jobs, workers, on_result)
+    finally:
+        checkpoint.save()
+    progress.finish(f"转换{summary['converted']}个，跳过{skipped}个，失败{summary['failed']}个")
+    return summary
+
+
+def run_dedupe(roots, semantic=False):
+    """查找重复工作流（命令行工具是独立进程，哈希在进程池中计算；结果缓存定期保存，中断后重新运行时不必从头计算）"""
+    reports = []
+    for root in roots:
+        progress = Progress(f"dedupe {os.path.basename(root) or root}")
+        report = get_duplicate_finder().find_duplicates(
+            root, semantic,
+            progress=lambda kind, done, total: progress.update(done, total, kind),
+            processes=True
+        )
+        progress.total = 0
+        progress.finish(f"{report['scanned_files']}个文件，计算{report['hashed_files']}个哈希，{len(report['groups'])}组重复")
+        reports.append(report)
+    return reports
+
+
+def run_disk_usage(roots, depth=None):
+    """统计磁盘占用（目录索引保存在数据目录，未变化的目录不再重复扫描）"""
+    results = []
+    for root in roots:
+        progress = Progress(f"disk-usage {os.path.basename(root) or root}")
+        usage = get_disk_usage_index().get_usage(root, depth=depth)
+        progress.finish(f"{usage['files']}个文件，{usage['size'] // (1024 * 1024)} MB")
+        results.append(usage)
+    return results
+
+
+def run_reindex(roots):
+    """重建按路径保存的索引：刷新磁盘占用索引，删除已不存在的文件的备注"""
+    usage = run_disk_usage(roots, depth=0)
+    before = get_note_index().get_stats()['notes']
+    get_note_index().invalidate(roots)
+    removed = before - get_note_index().get_stats()['notes']
+    return {
+        "roots": [{"path": item['path'], "size": item['size'], "files": item['files'], "dirs": item['dirs']} for item in usage],
+        "removed_notes": removed
+    }
+
+
+def run_build_assets():
+    """打包前端到 dist/（服务器启动时不打包，源码修改后需要运行此命令，否则使用 web/ 源码）"""
+    manifest = asset_pipeline.build()
+    if manifest['verified_with'] is None:
+        logger.warning("未安装Node.js，跳过产物语法校验")
+    return manifest
+
+
+# ====== 命令行 ======
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='nz-workflow-manager',
+        description="NZ工作流助手维护工具（不需要启动ComfyUI）"
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出详细日志")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compact = commands.add_parser('compact', help="转换工作流存储格式")
+    compact.add_argument('paths', nargs='*', help="要处理的目录（默认所有根目录）")
+    compact.add_argument('--mode', choices=STORAGE_MODES, help="目标存储模式（默认使用各根目录配置的模式）")
+    compact.add_argument('--workers', type=int, help="工作进程数（默认使用dedupe_workers设置）")
+    compact.add_argument('--restart', action='store_true', help="忽略检查点，重新处理所有文件")
+
+    dedupe = commands.add_parser('dedupe', help="查找重复工作流")
+    dedupe.add_argument('paths', nargs='*', help="要处理的目录（默认所有根目录）")
+    dedupe.add_argument('--semantic', action='store_true', help="忽略节点位置和ID，比较图结构")
+
+    disk_usage = commands.add_parser('disk-usage', help="统计磁盘占用")
+    disk_usage.add_argument('paths', nargs='*', help="要处理的目录（默认所有根目录）")
+    disk_usage.add_argument('--depth', type=int, help="展开的层数（默认使用disk_usage_depth设置）")
+
+    reindex = commands.add_parser('reindex', help="重建磁盘占用和备注索引")
+    reindex.add_argument('paths', nargs='*', help="要处理的目录（默认所有根目录）")
+
+    commands.add_parser('build-assets', help="打包前端到 dist/")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 默认只输出警告和错误，进度和结果单独输出
+    logger.setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    try:
+        if args.command == 'build-assets':
+            result = run_build_assets()
+            sys.stdout.write(dumps(result, indent=True) + '\n')
+            return 0
+        roots = _get_roots(args.paths)
+        if args.command == 'compact':
+            result = run_compact(roots, args.mode, args.workers, args.restart)
+        elif args.command == 'dedupe':
+            result = run_dedupe(roots, args.semantic)
+        elif args.command == 'disk-usage':
+            result = run_disk_usage(roots, args.depth)
+        else:
+            result = run_reindex(roots)
+    except KeyboardInterrupt:
+        sys.stderr.write("\n已中断，重新运行同一命令可继续\n")
+        return 130
+    except Exception as e:
+        logger.error(f"{args.command} 执行失败: {str(e)}")
+        return 1
+
+    sys.stdout.write(dumps(result, indent=True) + '\n')
+    return 1 if isinstance(result, dict) and result.get('failed') else 0
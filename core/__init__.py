@@ -5,10 +5,10 @@ NZ工作流助手 - 核心模块
 
 from .logger import setup_logger, get_logger
 from .constants import *
-from .nodes import NZWorkflowManagerNode, NZBaseNode, NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
+from .nodes import NZWorkflowManagerNode, NZWorkflowIteratorNode, NZBaseNode, NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
 
 __all__ = [
     'setup_logger', 'get_logger',
-    'NZWorkflowManagerNode', 'NZBaseNode', 
+    'NZWorkflowManagerNode', 'NZWorkflowIteratorNode', 'NZBaseNode', 
     'NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS'
 ]
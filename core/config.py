@@ -0,0 +1,118 @@
+"""
+NZ工作流助手 - 运行配置模块
+从配置文件和环境变量加载运行参数（工作流根目录等）
+"""
+
+import os
+import json
+import threading
+from .logger import get_logger
+from .constants import DEFAULT_SETTINGS, SETTINGS_FILE_NAME, SETTINGS_FILE_ENV, WORKFLOW_ROOTS_ENV, REMOTE_PATH_SCHEMES
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 已加载的配置（延迟加载）
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_plugin_dir():
+    """获取插件根目录"""
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_settings_file():
+    """获取配置文件路径"""
+    return os.environ.get(SETTINGS_FILE_ENV) or os.path.join(get_plugin_dir(), SETTINGS_FILE_NAME)
+
+
+def _normalize_roots(roots):
+    """把根目录配置统一为 [{"name": ..., "path": ...}] 格式"""
+    normalized = []
+    used_names = set()
+    
+    for entry in roots or []:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        if not isinstance(entry, dict) or not entry.get('path'):
+            logger.warning(f"忽略无效的根目录配置: {entry}")
+            continue
+        
+        root = dict(entry)
+        if root['path'].lower().startswith(REMOTE_PATH_SCHEMES):
+            # 对象存储根目录（如 s3://bucket/prefix）保持地址形式
+            root['path'] = root['path'].rstrip('/')
+        else:
+            root['path'] = os.path.abspath(os.path.expanduser(root['path']))
+        
+        # 根目录名称用于生成路径ID，必须唯一
+        name = root.get('name') or os.path.basename(root['path'].rstrip(os.sep)) or 'root'
+        base_name, index = name, 2
+        while name in used_names:
+            name = f"{base_name}{index}"
+            index += 1
+        used_names.add(name)
+        root['name'] = name
+        
+        normalized.append(root)
+    
+    return normalized
+
+
+def load_settings():
+    """从配置文件和环境变量加载配置"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings_file = get_settings_file()
+    
+    if os.path.isfile(settings_file):
+        try:
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                file_settings = json.load(f)
+            if isinstance(file_settings, dict):
+                settings.update(file_settings)
+                logger.info(f"已加载配置文件: {settings_file}")
+            else:
+                logger.warning(f"配置文件格式无效（应为JSON对象）: {settings_file}")
+        except Exception as e:
+            logger.error(f"读取配置文件失败: {str(e)}")
+    
+    # 环境变量中的根目录优先于配置文件
+    env_roots = os.environ.get(WORKFLOW_ROOTS_ENV, '')
+    if env_roots.strip():
+        settings['roots'] = [p for p in env_roots.split(os.pathsep) if p.strip()]
+    
+    settings['roots'] = _normalize_roots(settings.get('roots'))
+    return settings
+
+
+def get_settings():
+    """获取当前配置（首次调用时加载）"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+    return _settings
+
+
+def reload_settings():
+    """重新加载配置"""
+    global _settings
+    with _settings_lock:
+        _settings = load_settings()
+    return _settings
+
+
+def get_setting(key, default=None):
+    """读取单个配置项"""
+    return get_settings().get(key, default)
+
+
+def get_data_dir(*parts):
+    """获取插件数据目录（索引、缓存等持久化文件），不存在时自动创建"""
+    base = get_setting('data_dir') or os.path.join(get_plugin_dir(), 'data')
+    path = os.path.join(os.path.abspath(os.path.expanduser(base)), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
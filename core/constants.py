@@ -10,7 +10,7 @@ WEB_DIRECTORY = "web"
 NODE_CATEGORY = "NZ Workflow"
 
 # 支持的文件扩展名
-SUPPORTED_WORKFLOW_EXTENSIONS = ['.json']
+SUPPORTED_WORKFLOW_EXTENSIONS = ['.json', '.json.gz', '.json.zst']
 
 # 文件操作相关常量
 INVALID_FILENAME_CHARS = ['<', '>', ':', '"', '|', '?', '*', '\\', '/']
@@ -23,10 +23,114 @@ WEBSOCKET_RESPONSE_TYPE = "nz_workflow_manager_response"
 HTTP_ENDPOINTS = {
     'local_files': '/local_files',
     'file_operations': '/file_operations', 
-    'static_files': '/nz_static'
+    'static_files': '/nz_static',
+    'hashed_assets': '/nz_assets',
+    'admin': '/nz_admin',
+    'handshake': '/nz_handshake'
 }
 
+# 能力握手协议版本（握手响应的结构变化时递增，前端据此丢弃旧的缓存）
+HANDSHAKE_PROTOCOL_VERSION = 1
+
 # 默认路径配置
 DEFAULT_PATHS = {
     'current_directory': '',  # 空字符串表示使用当前工作目录
 }
+
+# 运行配置文件（位于插件根目录，可通过环境变量 NZ_SETTINGS_FILE 指定其他位置）
+SETTINGS_FILE_NAME = "nz_settings.json"
+SETTINGS_FILE_ENV = "NZ_SETTINGS_FILE"
+
+# 工作流根目录环境变量（多个根目录使用 os.pathsep 分隔，优先于配置文件）
+WORKFLOW_ROOTS_ENV = "NZ_WORKFLOW_ROOTS"
+
+# 根目录相对路径ID前缀，例如 "@team/projects/a.json"
+PATH_ID_PREFIX = "@"
+
+# 对象存储根目录的地址前缀
+REMOTE_PATH_SCHEMES = ("s3://",)
+
+# 默认运行配置
+DEFAULT_SETTINGS = {
+    # 允许访问的工作流根目录；为空时不限制访问范围（兼容旧版本行为）
+    'roots': [],
+    # 路径解析缓存
+    'path_cache_size': 4096,
+    'path_cache_ttl': 5.0,
+    # 并行复制的工作线程数
+    'copy_workers': 8,
+    # 插件数据目录（为空时使用插件目录下的 data/）
+    'data_dir': '',
+    # 回收站：保留天数、容量上限（字节）、后台清理间隔（秒）
+    'trash_max_age_days': 30,
+    'trash_max_bytes': 10 * 1024 ** 3,
+    'trash_purge_interval': 600,
+    # 工作流存储模式：original / minified / gzip / zstd（可在roots中按根目录单独配置storage_mode）
+    'storage_mode': 'original',
+    'storage_compression_level': 6,
+    'storage_zstd_level': 3,
+    # 增量保存：缓存最近保存版本的总大小上限（字节）
+    'revision_cache_bytes': 64 * 1024 * 1024,
+    # 依赖分析：模型目录索引的最短刷新间隔（秒）、并行分析的线程数
+    'model_index_refresh_interval': 30,
+    'analysis_workers': 4,
+    # 重复查找的工作线程/进程数（0表示使用CPU核心数）
+    'dedupe_workers': 0,
+    # 重复查找改用进程池（默认线程池：读文件和哈希计算会释放GIL；
+    # ComfyUI中的进程池在spawn平台上需要重新导入主模块，通常无法使用）
+    'dedupe_processes': False,
+    # 磁盘占用统计的并行扫描线程数
+    'disk_usage_workers': 8,
+    # 磁盘占用层级默认展开的深度
+    'disk_usage_depth': 3,
+    # 共享工作流缓存的最大字节数
+    'workflow_cache_bytes': 128 * 1024 * 1024,
+    # 打开工作流后预读的同目录工作流数量
+    'prefetch_siblings': 8,
+    # 打开工作流后预读的该用户最常用工作流数量
+    'prefetch_top_n': 5,
+    # 对象存储客户端的最大连接数（连接池大小）
+    's3_max_pool_connections': 32,
+    # 超过该大小的保存使用分段上传
+    's3_multipart_threshold': 8 * 1024 * 1024,
+    # 分段上传每段大小（S3要求至少5MiB）
+    's3_multipart_chunk_size': 8 * 1024 * 1024,
+    # 分段上传的并发段数
+    's3_upload_concurrency': 4,
+    # 复制目录时的并发对象数
+    's3_copy_concurrency': 16,
+    # 对象元数据和目录列表缓存的有效期（秒）
+    's3_metadata_cache_ttl': 10,
+    # 导出压缩包的deflate压缩级别
+    'zip_compression_level': 6,
+    # 导入压缩包的最大大小（上传大小和解压后总大小）
+    'zip_import_max_bytes': 4 * 1024 * 1024 * 1024,
+    # 导入压缩包的最大文件数
+    'zip_import_max_files': 20000,
+    # 等待路径锁（其他操作正在修改同一文件或目录）的最长时间（秒）
+    'lock_timeout': 30,
+    # 修改文件时在数据目录的锁文件上加跨进程建议锁（多个实例共享工作流目录时使用，需配置同一个data_dir）
+    'advisory_locks': True,
+    # 合并同时到达的相同读取请求（目录列表、加载工作流）
+    'coalesce_reads': True,
+    # 使用 dist/ 中打包压缩的前端；产物缺失或比源码旧时使用 web/ 源码（打包命令: build-assets）
+    'bundle_assets': True,
+    # 工作流管理器节点缓存的读取结果数量（目录列表/工作流，文件未变化时直接返回）
+    'node_result_cache_entries': 64,
+    # 操作日志写入后调用fsync（关闭后断电时可能丢失最近的日志记录）
+    'journal_fsync': True,
+    # 可撤销的操作数量
+    'undo_history': 50,
+    # 请求耗时超过该值（毫秒）时写入慢操作日志，0表示关闭请求追踪
+    'slow_operation_ms': 1000,
+    # 允许非本机地址访问管理端点（慢操作日志、运行时分析）
+    'admin_allow_remote': False,
+    # 管理端点的访问令牌，非空时请求必须带上该令牌（不再按来源地址判断，适用于反向代理后的部署）
+    'admin_token': '',
+}
+
+# 工作流中被识别为模型文件引用的扩展名
+MODEL_FILE_EXTENSIONS = ('.safetensors', '.ckpt', '.pt', '.pth', '.bin', '.gguf', '.sft', '.onnx', '.pkl')
+
+# 回收站目录名（以点开头，目录列表中默认隐藏）
+TRASH_DIR_NAME = ".nz_trash"
@@ -4,10 +4,19 @@ NZ工作流助手 - ComfyUI节点定义模块
 """
 
 import os
-import json
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from .logger import get_logger
+from .config import get_setting
 from .constants import NODE_CATEGORY, SUPPORTED_WORKFLOW_EXTENSIONS
+from ..utils.path_resolver import resolve_path, PathAccessError
+from ..utils.workflow_format import write_workflow, get_storage_path
+from ..utils.lock_manager import path_lock_sync
+from ..utils.workflow_cache import load_workflow_text
+from ..utils.workflow_iterator import get_workflow_iterator, SORT_MODES, SORT_ORDERS
+from ..utils.json_codec import loads, dumps
 
 
 # 获取logger实例
@@ -32,13 +41,105 @@ class NZWorkflowManagerNode:
     
     FUNCTION = "run"
     
+    # 读取结果缓存：(操作, 路径, 变化指纹) -> 结果，所有节点实例共享
+    _result_cache = OrderedDict()
+    _result_lock = threading.Lock()
+    
+    @staticmethod
+    def _fingerprint(action, path):
+        """
+        读取结果的变化指纹：目录为目录本身和每个条目的修改时间（目录的修改时间只在增删改名时变化，
+        原地编辑文件时不变，而列表中显示条目的修改日期），工作流文件为修改时间和大小；
+        路径不存在时为None，保存操作没有指纹
+        """
+        if action == "list_directory":
+            try:
+                directory = path or os.getcwd()
+                digest = hashlib.sha1(str(os.stat(directory).st_mtime_ns).encode('ascii'))
+                with os.scandir(directory) as entries:
+                    for entry in sorted(entries, key=lambda entry: entry.name):
+                        try:
+                            mtime = entry.stat().st_mtime_ns
+                        except OSError:
+                            mtime = 0
+                        digest.update(f"\0{entry.name}\0{mtime}".encode('utf-8', 'surrogateescape'))
+                return f"dir:{digest.hexdigest()}"
+            except OSError:
+                return None
+        if action == "load_workflow":
+            try:
+                stat = os.stat(path)
+                return f"file:{stat.st_mtime_ns}-{stat.st_size}"
+            except (OSError, ValueError):
+                return None
+        return None
+    
+    @staticmethod
+    def _resolve(action, path):
+        """
+        把节点输入的路径限制在配置的根目录内（与HTTP和WebSocket处理器相同）；
+        列目录时空路径表示当前目录，保存时先补全扩展名再校验，其他操作的空路径原样返回
+        """
+        if action == "save_workflow" and path and not any(path.lower().endswith(ext) for ext in SUPPORTED_WORKFLOW_EXTENSIONS):
+            path += '.json'
+        if not path and action != "list_directory":
+            return path
+        return resolve_path(path or os.getcwd())
+    
+    @classmethod
+    def IS_CHANGED(cls, action, path, workflow_data):
+        """ComfyUI据此判断是否需要重新执行：读取操作的文件未变化时复用上次的输出，保存操作每次都执行"""
+        if action == "save_workflow":
+            return float("nan")
+        try:
+            path = cls._resolve(action, path)
+        except PathAccessError:
+            return float("nan")
+        fingerprint = cls._fingerprint(action, path)
+        # 路径不存在时也每次执行，文件出现后能立即读到
+        return fingerprint if fingerprint is not None else float("nan")
+    
+    @classmethod
+    def _cached_result(cls, action, path, read):
+        """按 (操作, 路径, 指纹) 缓存读取结果，文件未变化时不重新读取和序列化"""
+        fingerprint = cls._fingerprint(action, path)
+        if fingerprint is None:
+            return read(path)
+        
+        key = (action, os.path.abspath(path or os.getcwd()), fingerprint)
+        with cls._result_lock:
+            result = cls._result_cache.get(key)
+            if result is not None:
+                cls._result_cache.move_to_end(key)
+                return result
+        
+        result = read(path)
+        # 读取成功时结果为JSON对象，错误信息不缓存
+        if not result[0].startswith('{'):
+            return result
+        max_entries = get_setting('node_result_cache_entries', 64)
+        with cls._result_lock:
+            # 同一路径的旧结果已失效
+            for stale in [k for k in cls._result_cache if k[:2] == key[:2]]:
+                del cls._result_cache[stale]
+            if max_entries > 0:
+                cls._result_cache[key] = result
+                while len(cls._result_cache) > max_entries:
+                    cls._result_cache.popitem(last=False)
+        return result
+    
     def run(self, action, path, workflow_data):
         """执行节点操作"""
         try:
+            try:
+                path = self._resolve(action, path)
+            except PathAccessError as e:
+                return (f"路径无效: {str(e)}",)
+            
             if action == "list_directory":
-                return self.list_directory(path)
+                return self._cached_result(action, path, self.list_directory)
             elif action == "load_workflow":
-                return self.load_workflow(path)
+                return self._cached_result(action, path, self.load_workflow)
             elif action == "save_workflow":
                 return self.save_workflow(path, workflow_data)
             else:
@@ -95,7 +196,7 @@ class NZWorkflowManagerNode:
                 "type": "directory_listing"
             }
             
-            return (json.dumps(result, ensure_ascii=False),)
+            return (dumps(result),)
             
         except Exception as e:
             logger.error(f"列出目录失败: {str(e)}")
@@ -113,8 +214,7 @@ class NZWorkflowManagerNode:
             if not any(path.lower().endswith(ext) for ext in SUPPORTED_WORKFLOW_EXTENSIONS):
                 return ("只支持JSON格式的工作流文件",)
             
-            with open(path, 'r', encoding='utf-8') as f:
-                workflow_data = f.read()
+            workflow_data = load_workflow_text(path)
             
             result = {
                 "path": path,
@@ -122,7 +222,7 @@ class NZWorkflowManagerNode:
                 "type": "workflow_loaded"
             }
             
-            return (json.dumps(result, ensure_ascii=False),)
+            return (dumps(result),)
             
         except Exception as e:
             logger.error(f"加载工作流失败: {str(e)}")
@@ -134,7 +234,7 @@ class NZWorkflowManagerNode:
             if not path:
                 return ("请提供保存路径",)
             
-            if not path.lower().endswith('.json'):
+            if not any(path.lower().endswith(ext) for ext in SUPPORTED_WORKFLOW_EXTENSIONS):
                 path += '.json'
             
             # 确保目录存在
@@ -142,12 +242,12 @@ class NZWorkflowManagerNode:
             
             # 验证JSON格式
             try:
-                json.loads(workflow_data)
-            except json.JSONDecodeError:
+                loads(workflow_data)
+            except ValueError:
                 return ("工作流数据不是有效的JSON格式",)
             
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(workflow_data)
+            with path_lock_sync(exclusive=[path, get_storage_path(path)]):
+                path, _ = write_workflow(path, workflow_data)
             
             result = {
                 "path": path,
@@ -155,13 +255,91 @@ class NZWorkflowManagerNode:
                 "type": "workflow_saved"
             }
             
-            return (json.dumps(result, ensure_ascii=False),)
+            return (dumps(result),)
             
         except Exception as e:
             logger.error(f"保存工作流失败: {str(e)}")
             return (f"保存工作流失败: {str(e)}",)
 
 
+class NZWorkflowIteratorNode:
+    """
+    工作流遍历节点 - 每次执行按游标输出文件夹（或标签查询结果）中的一个工作流，
+    配合游标的"执行后递增"批量处理大量工作流，不需要把整个目录列表放进一个字符串
+    """
+    
+    CATEGORY = NODE_CATEGORY
+    RETURN_TYPES = ("STRING", "STRING", "INT", "INT", "BOOLEAN")
+    RETURN_NAMES = ("path", "workflow", "next_cursor", "total", "done")
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "folder": ("STRING", {"default": "", "multiline": False}),
+                "cursor": ("INT", {"default": 0, "min": 0, "max": 0x7fffffff, "control_after_generate": True}),
+                "sort": (list(SORT_MODES), {"default": "name"}),
+                "order": (list(SORT_ORDERS), {"default": "asc"}),
+                "emit": (["path", "workflow"], {"default": "workflow"})
+            },
+            "optional": {
+                "pattern": ("STRING", {"default": "", "multiline": False}),
+                "regex": ("STRING", {"default": "", "multiline": False}),
+                "recursive": ("BOOLEAN", {"default": False}),
+                "tags": ("STRING", {"default": "", "multiline": False})
+            }
+        }
+    
+    FUNCTION = "run"
+    
+    @staticmethod
+    def _parse_tags(tags):
+        return [tag.strip() for tag in (tags or '').split(',') if tag.strip()]
+    
+    @classmethod
+    def IS_CHANGED(cls, folder, cursor, sort, order, emit, pattern='', regex='', recursive=False, tags=''):
+        """
+        列表缓存的版本和当前工作流文件的修改时间：目录没有变化时ComfyUI复用上次的输出；
+        不排序的遍历和标签查询无法廉价判断，每次执行
+        """
+        # 不能在这里取不排序遍历的下一项，否则run时生成器的位置已经前进
+        if sort == "none" or cls._parse_tags(tags):
+            return float("nan")
+        try:
+            item = get_workflow_iterator().get(
+                resolve_path(folder or os.getcwd()), cursor, pattern, regex, recursive, sort, order
+            )
+            if item['path'] is None:
+                return f"{item['generation']}:done"
+            stat = os.stat(item['path'])
+            return f"{item['generation']}:{item['path']}:{stat.st_mtime_ns}-{stat.st_size}"
+        except (OSError, ValueError):
+            return float("nan")
+    
+    def run(self, folder, cursor, sort, order, emit, pattern='', regex='', recursive=False, tags=''):
+        """输出第cursor个工作流的路径（emit=workflow时同时输出工作流内容），遍历完时done为True"""
+        try:
+            # 与HTTP处理器相同，只能遍历配置的根目录内的文件夹（超出时抛出PathAccessError）
+            folder = resolve_path(folder or os.getcwd())
+            item = get_workflow_iterator().get(
+                folder, cursor, pattern, regex, recursive, sort, order, self._parse_tags(tags)
+            )
+            if item['done']:
+                logger.info(f"工作流遍历完成: {folder} (游标 {cursor})")
+                return ("", "", cursor, item['total'], True)
+            
+            workflow = ""
+            if emit == "workflow":
+                workflow = load_workflow_text(item['path'])
+                # 输出前确认是有效的JSON，避免下游节点收到损坏的文件
+                loads(workflow)
+            
+            return (item['path'], workflow, cursor + 1, item['total'], False)
+        except Exception as e:
+            logger.error(f"工作流遍历失败: {str(e)}")
+            raise
+
+
 class NZBaseNode:
     """基础节点 - 确保插件注册成功"""
     
@@ -181,10 +359,12 @@ class NZBaseNode:
 # 节点映射配置
 NODE_CLASS_MAPPINGS = {
     "NZ_Base": NZBaseNode,
-    "NZ_Workflow_Manager": NZWorkflowManagerNode
+    "NZ_Workflow_Manager": NZWorkflowManagerNode,
+    "NZ_Workflow_Iterator": NZWorkflowIteratorNode
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "NZ_Base": "⭐ NZ工作流助手（内测版）",
-    "NZ_Workflow_Manager": "📁 NZ工作流助手（内测版）"
+    "NZ_Workflow_Manager": "📁 NZ工作流助手（内测版）",
+    "NZ_Workflow_Iterator": "🔁 NZ工作流遍历（内测版）"
 }
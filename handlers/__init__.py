@@ -3,10 +3,17 @@ NZ工作流助手 - 处理器模块
 包含WebSocket消息处理、文件操作和静态文件服务
 """
 
-from .file_operations import register_file_operations_endpoints
-from .static_handler import register_static_endpoints
+from .file_operations import register_file_operations_endpoints, save_workflow_file
+from .static_handler import register_static_endpoints, prepare_web_directory
+from .admin_handler import register_admin_endpoints
+from .handshake import register_handshake_endpoint, enable_websocket_actions
 
 __all__ = [
     'register_file_operations_endpoints', 
-    'register_static_endpoints'
+    'save_workflow_file',
+    'register_static_endpoints',
+    'register_admin_endpoints',
+    'register_handshake_endpoint',
+    'enable_websocket_actions',
+    'prepare_web_directory'
 ]
@@ -0,0 +1,125 @@
+"""
+NZ工作流助手 - 管理端点处理器模块
+查看慢操作日志，以及在运行中的服务里做限时的调用栈采样或内存分析；
+配置了 admin_token 时只接受带正确令牌的请求，否则只接受本机请求（admin_allow_remote 可放开）
+"""
+
+import hmac
+import asyncio
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from ..core.constants import HTTP_ENDPOINTS
+from ..utils.json_codec import json_response
+from ..utils.tracer import get_tracer
+from ..utils.profiler import run_profile, DEFAULT_INTERVAL, DEFAULT_TOP
+
+
+# 获取logger实例
+logger = get_logger()
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', 'localhost')
+
+# 传递管理令牌的请求头（也可以用查询参数token）
+ADMIN_TOKEN_HEADER = 'X-NZ-Admin-Token'
+
+
+def _is_allowed(request):
+    """
+    配置了管理令牌时按令牌校验；否则只接受本机请求，除非配置允许远程访问
+    （经反向代理转发时request.remote是代理的地址，所有请求都像本机请求，这种部署应配置令牌）
+    """
+    token = get_setting('admin_token', '')
+    if token:
+        provided = request.headers.get(ADMIN_TOKEN_HEADER) or request.query.get('token', '')
+        return hmac.compare_digest(provided.encode('utf-8'), str(token).encode('utf-8'))
+    if get_setting('admin_allow_remote', False):
+        return True
+    remote = request.remote or ''
+    return remote in LOCAL_ADDRESSES or remote.startswith('127.') or remote.startswith('::ffff:127.')
+
+
+async def handle_admin(request):
+    """处理管理端点请求"""
+    try:
+        if not _is_allowed(request):
+            return json_response({
+                "success": False,
+                "error": "管理令牌无效" if get_setting('admin_token', '') else "管理端点只允许本机访问"
+            }, status=403)
+
+        action = request.query.get('action', '')
+        logger.info(f"收到管理请求: {action}")
+        # 有人查看时才测量事件循环延迟（最后一次管理请求后持续一段时间）
+        get_tracer().ensure_monitor()
+
+        if action == 'slow_operations':
+            return await _handle_slow_operations_http(request.query)
+        elif action == 'profile':
+            return await _handle_profile_http(request.query)
+        else:
+            return json_response({
+                "error": f"不支持的操作: {action}",
+                "action": action
+            })
+
+    except Exception as e:
+        logger.error(f"管理请求处理失败: {str(e)}")
+        return json_response({
+            "error": f"处理失败: {str(e)}"
+        })
+
+
+async def _handle_slow_operations_http(data):
+    """处理查看慢操作日志的HTTP请求"""
+    try:
+        limit = int(data.get('limit', 0) or 0)
+        tracer = get_tracer()
+
+        return json_response({
+            "success": True,
+            "operations": tracer.slow_operations(limit or None),
+            "stats": tracer.get_stats()
+        })
+
+    except Exception as e:
+        logger.error(f"HTTP: 获取慢操作日志失败: {str(e)}")
+        return json_response({
+            "success": False,
+            "error": str(e)
+        })
+
+
+async def _handle_profile_http(data):
+    """处理运行时分析的HTTP请求：mode=sample|memory，seconds为分析时长，完成后返回报告"""
+    try:
+        mode = data.get('mode', 'sample')
+        seconds = float(data.get('seconds', 5) or 5)
+        interval = float(data.get('interval', DEFAULT_INTERVAL) or DEFAULT_INTERVAL)
+        top = int(data.get('top', DEFAULT_TOP) or DEFAULT_TOP)
+
+        # 分析在线程池中进行，事件循环照常处理其他请求（也就是被分析的负载）
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None, run_profile, mode, seconds, interval, top)
+        logger.info(f"HTTP: 运行时分析完成: {mode}")
+
+        return json_response({
+            "success": True,
+            "report": report
+        })
+
+    except Exception as e:
+        logger.error(f"HTTP: 运行时分析失败: {str(e)}")
+        return json_response({
+            "success": False,
+            "error": str(e)
+        })
+
+
+def register_admin_endpoints(app):
+    """注册管理端点"""
+    try:
+        app.router.add_get(HTTP_ENDPOINTS['admin'], handle_admin)
+        logger.info(f"✅ 已注册管理端点: {HTTP_ENDPOINTS['admin']}")
+
+    except Exception as e:
+        logger.error(f"❌ 注册管理端点失败: {str(e)}")
@@ -4,122 +4,255 @@ NZ工作流助手 - 文件操作处理器模块
 """
 
 import os
-import json
-import shutil
+import asyncio
+import functools
+import hashlib
 import mimetypes
+import tempfile
 from datetime import datetime
+from urllib.parse import quote
 from aiohttp import web
 from ..core.logger import get_logger
 from ..core.constants import SUPPORTED_WORKFLOW_EXTENSIONS, HTTP_ENDPOINTS
-from ..utils.validation import validate_path, validate_filename
+from ..core.config import get_setting, get_data_dir
+from ..utils.validation import validate_path, validate_filename, parse_entity_tags
+from ..utils.json_codec import json_response, json_response_bytes, read_request_json, loads, dumps, dumps_bytes
+from ..utils.path_resolver import resolve_path, invalidate_path
+from ..utils.trash import get_trash_manager
+from ..utils.operation_journal import get_operation_journal, plan_paths
+from ..utils.workflow_format import (
+    write_workflow, read_workflow_text, pretty_workflow_text, get_storage_path,
+    get_workflow_extension, strip_workflow_extension, locate_workflow_file, publish_workflow_save
+)
+from ..utils.revision_cache import get_revision_cache, compute_revision, serialize_for_revision
+from ..utils.json_patch import apply_json_patch, JsonPatchError
+from ..utils.dependency_analyzer import get_dependency_analyzer
+from ..utils.duplicate_finder import get_duplicate_finder
+from ..utils.disk_usage import get_disk_usage_index
+from ..utils.workflow_cache import record_workflow_access, get_workflow_cache, get_access_stats
+from ..utils.storage_backend import get_local_backend, close_storage_backends
+from ..utils.note_index import get_note_index
+from ..utils.lock_manager import path_lock
+from ..utils.tracer import span, trace_request, annotate_trace
+from ..utils.single_flight import get_single_flight
+from ..utils.zip_transfer import ZipStreamWriter, write_directory_zip, import_zip, CONFLICT_POLICIES
+from .storage_operations import is_storage_request, handle_storage_operation
 from ..utils.file_utils import get_file_info, get_directory_listing
 
 
 # 获取logger实例
 logger = get_logger()
 
+# /local_files 和 /file_operations 支持的操作（在能力握手中公布，新增操作时同步更新）
+LOCAL_FILE_ACTIONS = ('list_directory', 'load_workflow')
+FILE_OPERATION_ACTIONS = (
+    'list_directory', 'create_directory', 'delete_file', 'delete_directory', 'path_exists',
+    'copy_file', 'copy_directory', 'move_file', 'move_directory', 'rename',
+    'check_file_exists', 'check_directory_exists', 'save_workflow', 'save_workflow_patch',
+    'analyze_dependencies', 'find_duplicates', 'duplicate_report', 'disk_usage',
+    'workflow_access_stats', 'read_coalescing_stats', 'sync_notes', 'query_notes',
+    'export_zip', 'import_zip', 'list_trash', 'restore_trash', 'empty_trash',
+    'operation_history', 'undo_operation', 'redo_operation'
+)
 
+
+@trace_request
 async def handle_local_files(request):
     """处理本地文件系统访问请求"""
     try:
         path = request.query.get('path', '')
         action = request.query.get('action', 'list_directory')
+        annotate_trace(action, path)
         
         if not path:
-            return web.json_response({
+            return json_response({
                 "error": "路径参数缺失",
                 "type": "error"
             })
         
         logger.info(f"本地文件访问请求: {action} - {path}")
         
-        if not os.path.exists(path):
-            return web.json_response({
+        # 对象存储路径交给存储后端处理
+        if is_storage_request(request.query):
+            return await handle_storage_operation(
+                'load_workflow' if action == 'load_workflow' else 'list_directory', request.query
+            )
+        
+        path = resolve_path(path)
+        
+        with span('filesystem'):
+            exists = os.path.exists(path)
+        if not exists:
+            return json_response({
                 "error": f"路径不存在: {path}",
                 "type": "error"
             })
         
         # 根据操作类型处理
         if action == 'load_workflow':
-            return await _handle_load_workflow_http(path)
+            return await _handle_load_workflow_http(
+                path, _is_true(request.query.get('pretty', '')), _get_request_user(request),
+                request.headers.get('If-None-Match')
+            )
         else:
-            return await _handle_list_directory_http(path)
+            return await _handle_list_directory_http(path, request.headers.get('If-None-Match'))
             
     except Exception as e:
         logger.error(f"本地文件访问失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "error": f"访问失败: {str(e)}",
             "type": "error"
         })
 
 
-async def _handle_load_workflow_http(path):
-    """处理加载工作流文件的HTTP请求"""
+def _trace_detail(data):
+    """慢操作日志中显示的请求路径"""
+    for key in ('path', 'file_path', 'directory_path', 'source_path', 'parent_path'):
+        if data.get(key):
+            return data.get(key)
+    return ''
+
+
+def _get_request_user(request):
+    """获取请求对应的用户（ComfyUI多用户模式的comfy-user头，否则使用客户端地址）"""
+    return request.headers.get('comfy-user') or request.remote or None
+
+
+def _cache_headers(etag):
+    """带ETag的响应头（no-cache：客户端每次使用前都需要条件请求确认）"""
+    return {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+
+def _not_modified(etag):
+    """内容未变化（If-None-Match命中）时的304响应，客户端继续使用本地缓存"""
+    return web.Response(status=304, headers=_cache_headers(etag))
+
+
+def _workflow_etag(path, pretty):
+    """工作流的ETag：修改时间（纳秒）和文件大小，不需要读取文件内容"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}" + ("-pretty" if pretty else "")
+
+
+def _read_workflow_response(path, pretty):
+    """读取工作流并编码为响应内容（在线程池中执行）"""
+    with span('filesystem'):
+        mtime_ns = os.stat(path).st_mtime_ns
+        workflow_data = get_workflow_cache().get_text(path)
+    
+    with span('serialize'):
+        # 版本哈希和修改时间可作为保存时的If-Match前置条件
+        revision = _get_file_revision(path, workflow_data)
+        if pretty:
+            workflow_data = pretty_workflow_text(workflow_data)
+        
+        logger.info(f"工作流文件读取成功: {path}")
+        return dumps_bytes({
+            "path": path,
+            "data": workflow_data,
+            "revision": revision,
+            "mtime_ns": mtime_ns,
+            "type": "workflow_loaded"
+        })
+
+
+async def _handle_load_workflow_http(path, pretty=False, user=None, if_none_match=None):
+    """
+    处理加载工作流文件的HTTP请求（压缩格式自动解压，pretty=True时返回缩进格式）
+    if_none_match与文件当前的ETag一致时返回304，不读取文件内容
+    """
     try:
-        if not os.path.isfile(path):
-            return web.json_response({
+        path = resolve_path(path)
+        
+        with span('filesystem'):
+            # 按压缩存储模式保存后文件可能已改为 .json.gz 等扩展名
+            path = locate_workflow_file(path) or path
+            is_file = os.path.isfile(path)
+        if not is_file:
+            return json_response({
                 "error": f"路径不是文件: {path}",
                 "type": "error"
             })
         
         if not any(path.lower().endswith(ext) for ext in SUPPORTED_WORKFLOW_EXTENSIONS):
-            return web.json_response({
-                "error": "只支持JSON格式的工作流文件",
+            return json_response({
+                "error": "只支持JSON格式的工作流文件（.json / .json.gz / .json.zst）",
                 "type": "error"
             })
         
-        with open(path, 'r', encoding='utf-8') as f:
-            workflow_data = f.read()
-        
-        result = {
-            "path": path,
-            "data": workflow_data,
-            "type": "workflow_loaded"
-        }
+        with span('filesystem'):
+            etag = _workflow_etag(path, pretty)
+        if etag in parse_entity_tags(if_none_match):
+            record_workflow_access(path, user)
+            return _not_modified(etag)
         
-        logger.info(f"工作流文件读取成功: {path}")
-        return web.json_response(result)
+        # 同一文件同时被多个客户端打开时只读取和编码一次
+        body = await get_single_flight().run('load_workflow', path, pretty, _read_workflow_response, path, pretty)
+        record_workflow_access(path, user)
+        return json_response_bytes(body, headers=_cache_headers(etag))
         
     except Exception as read_error:
         logger.error(f"读取工作流文件失败: {str(read_error)}")
-        return web.json_response({
+        return json_response({
             "error": f"读取文件失败: {str(read_error)}",
             "type": "error"
         })
 
 
-async def _handle_list_directory_http(path):
-    """处理列出目录内容的HTTP请求"""
-    try:
-        if not os.path.isdir(path):
-            return web.json_response({
-                "error": f"路径不是目录: {path}",
-                "type": "error"
-            })
-        
-        # 使用工具函数获取目录列表
+def _read_directory_response(path):
+    """扫描目录并编码为响应内容（在线程池中执行）"""
+    # 使用工具函数获取目录列表
+    with span('filesystem'):
         result = get_directory_listing(path)
+    
+    if result is None:
+        return dumps_bytes({
+            "error": f"无法读取目录: {path}",
+            "type": "error"
+        })
+    
+    logger.info(f"目录内容: {len(result['directories'])}个目录, {len(result['files'])}个JSON文件")
+    with span('serialize'):
+        return dumps_bytes(result)
+
+
+async def _handle_list_directory_http(path, if_none_match=None):
+    """处理列出目录内容的HTTP请求（ETag为响应内容的哈希，if_none_match一致时返回304）"""
+    try:
+        path = resolve_path(path)
         
-        if result is None:
-            return web.json_response({
-                "error": f"无法读取目录: {path}",
+        with span('filesystem'):
+            is_directory = os.path.isdir(path)
+        if not is_directory:
+            return json_response({
+                "error": f"路径不是目录: {path}",
                 "type": "error"
             })
         
-        logger.info(f"目录内容: {len(result['directories'])}个目录, {len(result['files'])}个JSON文件")
-        return web.json_response(result)
+        # 同一目录同时被多个客户端打开时只扫描和编码一次
+        body = await get_single_flight().run('list_directory', path, None, _read_directory_response, path)
+        with span('serialize'):
+            etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if etag in parse_entity_tags(if_none_match):
+            return _not_modified(etag)
+        return json_response_bytes(body, headers=_cache_headers(etag))
         
     except Exception as e:
         logger.error(f"列出目录失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "error": f"列出目录失败: {str(e)}",
             "type": "error"
         })
 
 
+@trace_request
 async def handle_file_operations(request):
     """处理文件操作HTTP请求"""
     try:
+        # 导入压缩包需要流式读取上传内容，不能先整体解析表单
+        if request.method == 'POST' and request.query.get('action') == 'import_zip':
+            return await _handle_import_zip_http(request)
+        
         # 支持GET和POST请求
         if request.method == 'POST':
             # 处理POST请求（支持表单数据）
@@ -128,7 +261,8 @@ async def handle_file_operations(request):
                 action = data.get('action', '')
             else:
                 # 处理JSON数据
-                data = await request.json()
+                with span('validate'):
+                    data = await read_request_json(request)
                 action = data.get('action', '')
         else:
             # 处理GET请求
@@ -136,12 +270,17 @@ async def handle_file_operations(request):
             action = request.query.get('action', '')
         
         logger.info(f"收到文件操作请求: {action} (方法: {request.method})")
+        annotate_trace(action, _trace_detail(data))
+        
+        # 涉及对象存储根目录的请求交给存储后端处理
+        if is_storage_request(data):
+            return await handle_storage_operation(action, data)
         
         # 根据操作类型分发处理
         if action == 'list_directory':
             path = data.get('path', '') if hasattr(data, 'get') else data.get('path', '')
             logger.info(f"处理目录列表请求: {path}")
-            return await _handle_list_directory_http(path)
+            return await _handle_list_directory_http(path, request.headers.get('If-None-Match'))
         elif action == 'create_directory':
             return await _handle_create_directory_http(data)
         elif action == 'delete_file':
@@ -165,16 +304,48 @@ async def handle_file_operations(request):
         elif action == 'check_directory_exists':
             return await _handle_check_directory_exists_http(data)
         elif action == 'save_workflow':
-            return await _handle_save_workflow_http(data)
+            return await _handle_save_workflow_http(data, _get_request_preconditions(request, data))
+        elif action == 'save_workflow_patch':
+            return await _handle_save_workflow_patch_http(data)
+        elif action == 'analyze_dependencies':
+            return await _handle_analyze_dependencies_http(data)
+        elif action == 'find_duplicates':
+            return await _handle_find_duplicates_http(data)
+        elif action == 'duplicate_report':
+            return await _handle_duplicate_report_http(data)
+        elif action == 'disk_usage':
+            return await _handle_disk_usage_http(data)
+        elif action == 'workflow_access_stats':
+            return await _handle_workflow_access_stats_http(data, _get_request_user(request))
+        elif action == 'read_coalescing_stats':
+            return await _handle_read_coalescing_stats_http(data)
+        elif action == 'sync_notes':
+            return await _handle_sync_notes_http(data)
+        elif action == 'query_notes':
+            return await _handle_query_notes_http(data)
+        elif action == 'export_zip':
+            return await _handle_export_zip_http(request, data)
+        elif action == 'list_trash':
+            return await _handle_list_trash_http(data)
+        elif action == 'restore_trash':
+            return await _handle_restore_trash_http(data)
+        elif action == 'empty_trash':
+            return await _handle_empty_trash_http(data)
+        elif action == 'operation_history':
+            return await _handle_operation_history_http(data)
+        elif action == 'undo_operation':
+            return await _handle_undo_operation_http(data, 'undo')
+        elif action == 'redo_operation':
+            return await _handle_undo_operation_http(data, 'redo')
         else:
-            return web.json_response({
+            return json_response({
                 "error": f"不支持的操作: {action}",
                 "action": action
             })
             
     except Exception as e:
         logger.error(f"文件操作请求处理失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "error": f"处理失败: {str(e)}"
         })
 
@@ -188,27 +359,30 @@ async def _handle_create_directory_http(data):
         if not validate_path(parent_path):
             raise ValueError("父目录路径无效")
         
+        parent_path = resolve_path(parent_path)
+        
         if not validate_filename(directory_name):
             raise ValueError("目录名包含非法字符或为空")
         
         new_directory_path = os.path.join(parent_path, directory_name)
         
-        # 检查目录是否已存在
-        if os.path.exists(new_directory_path):
-            raise ValueError("目录已存在")
+        async with path_lock(exclusive=[new_directory_path]):
+            # 检查目录是否已存在
+            if os.path.exists(new_directory_path):
+                raise ValueError("目录已存在")
         
-        # 创建目录
-        os.makedirs(new_directory_path)
-        logger.info(f"HTTP: 成功创建目录: {new_directory_path}")
+            # 创建目录
+            await get_local_backend().make_directory(new_directory_path)
+            logger.info(f"HTTP: 成功创建目录: {new_directory_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "path": new_directory_path
         })
         
     except Exception as e:
         logger.error(f"HTTP: 创建目录失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -222,23 +396,29 @@ async def _handle_delete_file_http(data):
         if not validate_path(file_path):
             raise ValueError("文件路径无效")
         
-        if not os.path.exists(file_path):
-            raise ValueError("文件不存在")
+        file_path = resolve_path(file_path)
+        file_path = locate_workflow_file(file_path) or file_path
+        
+        async with path_lock(exclusive=[file_path]):
+            if not os.path.exists(file_path):
+                raise ValueError("文件不存在")
         
-        if not os.path.isfile(file_path):
-            raise ValueError("指定路径不是文件")
+            if not os.path.isfile(file_path):
+                raise ValueError("指定路径不是文件")
         
-        os.remove(file_path)
-        logger.info(f"HTTP: 成功删除文件: {file_path}")
+            # 默认移入回收站，permanent=true时永久删除
+            trash_id = await get_local_backend().delete(file_path, _is_true(data.get('permanent')))
+            logger.info(f"HTTP: 成功删除文件: {file_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
-            "path": file_path
+            "path": file_path,
+            "trash_id": trash_id
         })
         
     except Exception as e:
         logger.error(f"HTTP: 删除文件失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -252,23 +432,28 @@ async def _handle_delete_directory_http(data):
         if not validate_path(directory_path):
             raise ValueError("目录路径无效")
         
-        if not os.path.exists(directory_path):
-            raise ValueError("目录不存在")
+        directory_path = resolve_path(directory_path)
         
-        if not os.path.isdir(directory_path):
-            raise ValueError("指定路径不是目录")
+        async with path_lock(exclusive=[directory_path]):
+            if not os.path.exists(directory_path):
+                raise ValueError("目录不存在")
+        
+            if not os.path.isdir(directory_path):
+                raise ValueError("指定路径不是目录")
         
-        shutil.rmtree(directory_path)
-        logger.info(f"HTTP: 成功删除目录: {directory_path}")
+            # 默认移入回收站（一次重命名），permanent=true时永久删除
+            trash_id = await get_local_backend().delete(directory_path, _is_true(data.get('permanent')))
+            logger.info(f"HTTP: 成功删除目录: {directory_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
-            "path": directory_path
+            "path": directory_path,
+            "trash_id": trash_id
         })
         
     except Exception as e:
         logger.error(f"HTTP: 删除目录失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -282,6 +467,8 @@ async def _handle_path_exists_http(data):
         if not path_to_check:
             raise ValueError("路径不能为空")
         
+        path_to_check = resolve_path(path_to_check)
+        
         exists = os.path.exists(path_to_check)
         is_directory = False
         is_file = False
@@ -290,7 +477,7 @@ async def _handle_path_exists_http(data):
             is_directory = os.path.isdir(path_to_check)
             is_file = os.path.isfile(path_to_check)
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "exists": exists,
             "is_directory": is_directory,
@@ -300,7 +487,7 @@ async def _handle_path_exists_http(data):
         
     except Exception as e:
         logger.error(f"HTTP: 检查路径存在失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -316,6 +503,10 @@ async def _handle_copy_file_http(data):
         if not validate_path(source_path) or not validate_path(target_path):
             raise ValueError("源路径或目标路径无效")
         
+        source_path = resolve_path(source_path)
+        source_path = locate_workflow_file(source_path) or source_path
+        target_path = resolve_path(target_path)
+        
         if not os.path.exists(source_path):
             raise ValueError("源文件不存在")
         
@@ -339,11 +530,12 @@ async def _handle_copy_file_http(data):
         # 构建完整的目标文件路径
         full_target_path = os.path.join(target_path, target_file_name)
         
-        # 复制文件（覆盖已存在的文件）
-        shutil.copy2(source_path, full_target_path)
-        logger.info(f"HTTP: 成功复制文件: {source_path} -> {full_target_path}")
+        async with path_lock(exclusive=[full_target_path], shared=[source_path]):
+            # 复制文件（覆盖已存在的文件，被覆盖的文件移入回收站；先写临时文件再原子替换）
+            await get_local_backend().copy(source_path, full_target_path)
+            logger.info(f"HTTP: 成功复制文件: {source_path} -> {full_target_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "source": source_path,
             "target": full_target_path
@@ -351,7 +543,7 @@ async def _handle_copy_file_http(data):
         
     except Exception as e:
         logger.error(f"HTTP: 复制文件失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -367,6 +559,9 @@ async def _handle_copy_directory_http(data):
         if not validate_path(source_path) or not validate_path(target_path):
             raise ValueError("源路径或目标路径无效")
         
+        source_path = resolve_path(source_path)
+        target_path = resolve_path(target_path)
+        
         if not os.path.exists(source_path):
             raise ValueError("源目录不存在")
         
@@ -390,21 +585,22 @@ async def _handle_copy_directory_http(data):
         # 构建完整的目标目录路径
         full_target_path = os.path.join(target_path, target_dir_name)
         
-        # 复制目录（覆盖已存在的目录）
-        if os.path.exists(full_target_path):
-            shutil.rmtree(full_target_path)
-        shutil.copytree(source_path, full_target_path)
-        logger.info(f"HTTP: 成功复制目录: {source_path} -> {full_target_path}")
+        async with path_lock(exclusive=[full_target_path], shared=[source_path]):
+            # 复制目录（覆盖已存在的目录，被覆盖的目录移入回收站；先并行复制到暂存目录，完成后再放到目标位置）
+            stats = await get_local_backend().copy(source_path, full_target_path)
+            logger.info(f"HTTP: 成功复制目录: {source_path} -> {full_target_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "source": source_path,
-            "target": full_target_path
+            "target": full_target_path,
+            "files": stats["files"],
+            "bytes": stats["bytes"]
         })
         
     except Exception as e:
         logger.error(f"HTTP: 复制目录失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -420,6 +616,10 @@ async def _handle_move_file_http(data):
         if not validate_path(source_path) or not validate_path(target_path):
             raise ValueError("源路径或目标路径无效")
         
+        source_path = resolve_path(source_path)
+        source_path = locate_workflow_file(source_path) or source_path
+        target_path = resolve_path(target_path)
+        
         if not os.path.exists(source_path):
             raise ValueError("源文件不存在")
         
@@ -442,11 +642,12 @@ async def _handle_move_file_http(data):
         # 构建完整的目标文件路径
         full_target_path = os.path.join(target_path, file_name)
         
-        # 移动文件（覆盖已存在的文件）
-        shutil.move(source_path, full_target_path)
-        logger.info(f"HTTP: 成功移动文件: {source_path} -> {full_target_path}")
+        async with path_lock(exclusive=[source_path, full_target_path]):
+            # 移动文件（覆盖已存在的文件，被覆盖的文件移入回收站）
+            await get_local_backend().move(source_path, full_target_path)
+            logger.info(f"HTTP: 成功移动文件: {source_path} -> {full_target_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "source": source_path,
             "target": full_target_path
@@ -454,7 +655,7 @@ async def _handle_move_file_http(data):
         
     except Exception as e:
         logger.error(f"HTTP: 移动文件失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -471,6 +672,8 @@ async def _handle_move_directory_http(data):
         if not validate_path(source_path):
             raise ValueError("源路径无效")
         
+        source_path = resolve_path(source_path)
+        
         if not os.path.exists(source_path):
             raise ValueError("源目录不存在")
         
@@ -483,6 +686,8 @@ async def _handle_move_directory_http(data):
             if not validate_path(target_path):
                 raise ValueError("目标父目录路径无效")
             
+            target_path = resolve_path(target_path)
+            
             if not os.path.exists(target_path):
                 raise ValueError("目标父目录不存在")
             
@@ -495,15 +700,16 @@ async def _handle_move_directory_http(data):
             # 构建完整的目标路径
             full_target_path = os.path.join(target_path, new_name)
             
-            # 检查新名称是否已存在
-            if os.path.exists(full_target_path):
-                raise ValueError("目标名称已存在")
+            async with path_lock(exclusive=[source_path, full_target_path]):
+                # 检查新名称是否已存在
+                if os.path.exists(full_target_path):
+                    raise ValueError("目标名称已存在")
                 
-            # 执行重命名
-            os.rename(source_path, full_target_path)
-            logger.info(f"HTTP: 成功重命名目录: {source_path} -> {full_target_path}")
+                # 执行重命名
+                await get_local_backend().rename(source_path, full_target_path)
+                logger.info(f"HTTP: 成功重命名目录: {source_path} -> {full_target_path}")
             
-            return web.json_response({
+            return json_response({
                 "success": True, 
                 "source": source_path,
                 "target": full_target_path,
@@ -514,6 +720,8 @@ async def _handle_move_directory_http(data):
             if not validate_path(target_path):
                 raise ValueError("目标目录路径无效")
             
+            target_path = resolve_path(target_path)
+            
             if not os.path.exists(target_path):
                 raise ValueError("目标目录不存在")
             
@@ -526,13 +734,12 @@ async def _handle_move_directory_http(data):
             # 构建完整的目标目录路径
             full_target_path = os.path.join(target_path, dir_name)
             
-            # 移动目录（覆盖已存在的目录）
-            if os.path.exists(full_target_path):
-                shutil.rmtree(full_target_path)
-            shutil.move(source_path, full_target_path)
-            logger.info(f"HTTP: 成功移动目录: {source_path} -> {full_target_path}")
+            async with path_lock(exclusive=[source_path, full_target_path]):
+                # 移动目录（覆盖已存在的目录，被覆盖的目录移入回收站）
+                await get_local_backend().move(source_path, full_target_path)
+                logger.info(f"HTTP: 成功移动目录: {source_path} -> {full_target_path}")
             
-            return web.json_response({
+            return json_response({
                 "success": True, 
                 "source": source_path,
                 "target": full_target_path,
@@ -541,7 +748,7 @@ async def _handle_move_directory_http(data):
         
     except Exception as e:
         logger.error(f"HTTP: 移动目录失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -561,30 +768,44 @@ async def _handle_rename_http(data):
         if not validate_path(source_path):
             raise ValueError("原路径无效")
         
+        source_path = resolve_path(source_path)
+        if not os.path.exists(source_path):
+            # 工作流可能已按存储模式改为 .json.gz 等扩展名，新名称沿用实际的扩展名
+            located_path = locate_workflow_file(source_path)
+            if located_path is not None:
+                if new_name and not target_path and get_workflow_extension(new_name):
+                    new_name = strip_workflow_extension(new_name) + get_workflow_extension(located_path)
+                source_path = located_path
+        
         if not os.path.exists(source_path):
             raise ValueError("原路径不存在")
         
         # 确定最终目标路径
         if target_path:
-            final_target_path = target_path
-            new_name = os.path.basename(target_path)
+            final_target_path = resolve_path(target_path)
+            new_name = os.path.basename(final_target_path)
         elif new_name:
             parent_dir = os.path.dirname(source_path)
-            final_target_path = os.path.join(parent_dir, new_name)
+            final_target_path = resolve_path(os.path.join(parent_dir, new_name))
         else:
             raise ValueError("目标路径或新名称参数缺失")
         
         if not validate_filename(new_name):
             raise ValueError("新名称包含非法字符或为空")
         
-        if os.path.exists(final_target_path):
-            raise ValueError("目标名称已存在")
-        
-        # 执行重命名
-        os.rename(source_path, final_target_path)
-        logger.info(f"HTTP: 成功重命名: {source_path} -> {final_target_path}")
+        async with path_lock(exclusive=[source_path, final_target_path]):
+            # 在锁内重新检查，避免检查和重命名之间被其他操作修改
+            if not os.path.exists(source_path):
+                raise ValueError("原路径不存在")
+            
+            if os.path.exists(final_target_path):
+                raise ValueError("目标名称已存在")
+            
+            # 执行重命名
+            await get_local_backend().rename(source_path, final_target_path)
+            logger.info(f"HTTP: 成功重命名: {source_path} -> {final_target_path}")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
             "source_path": source_path,
             "target_path": final_target_path
@@ -592,7 +813,7 @@ async def _handle_rename_http(data):
         
     except Exception as e:
         logger.error(f"HTTP: 重命名失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -606,16 +827,17 @@ async def _handle_check_file_exists_http(data):
         if not file_path:
             raise ValueError("文件路径不能为空")
         
+        file_path = resolve_path(file_path)
         exists = os.path.exists(file_path) and os.path.isfile(file_path)
         logger.info(f"HTTP: 检查文件存在性: {file_path} -> {exists}")
         
-        return web.json_response({
+        return json_response({
             "exists": exists
         })
         
     except Exception as e:
         logger.error(f"HTTP: 检查文件存在性失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "exists": False,
             "error": str(e)
         })
@@ -629,23 +851,106 @@ async def _handle_check_directory_exists_http(data):
         if not directory_path:
             raise ValueError("目录路径不能为空")
         
+        directory_path = resolve_path(directory_path)
         exists = os.path.exists(directory_path) and os.path.isdir(directory_path)
         logger.info(f"HTTP: 检查目录存在性: {directory_path} -> {exists}")
         
-        return web.json_response({
+        return json_response({
             "exists": exists
         })
         
     except Exception as e:
         logger.error(f"HTTP: 检查目录存在性失败: {str(e)}")
-        return web.json_response({
+        return json_response({
             "exists": False,
             "error": str(e)
         })
 
 
-async def _handle_save_workflow_http(data):
-    """处理保存工作流的HTTP请求"""
+def _get_request_preconditions(request, data):
+    """保存的前置条件：If-Match/If-None-Match请求头，或请求体中的if_match/if_none_match"""
+    return (
+        request.headers.get('If-Match') or data.get('if_match'),
+        request.headers.get('If-None-Match') or data.get('if_none_match')
+    )
+
+
+def _get_file_revision(path, content=None):
+    """文件当前内容的版本哈希：刚保存且未被其他途径修改的文件直接使用保存时的版本"""
+    revision = get_revision_cache().get_revision(path)
+    if revision is None:
+        revision = compute_revision(read_workflow_text(path) if content is None else content)
+    return revision
+
+
+def _matches_entity_tags(path, tags):
+    """标签为纯数字时按修改时间（纳秒）比较，否则按版本哈希比较"""
+    if str(os.stat(path).st_mtime_ns) in tags:
+        return True
+    if get_revision_cache().get_revision(path) in tags:
+        return True
+    content = read_workflow_text(path)
+    if compute_revision(content) in tags:
+        return True
+    # 精简/压缩存储的文件与客户端提交的文本格式不同，再按客户端的序列化格式比较
+    return compute_revision(serialize_for_revision(loads(content))) in tags
+
+
+def _check_save_precondition(file_path, if_match=None, if_none_match=None):
+    """
+    检查保存的前置条件（乐观并发控制，需在持有路径锁时调用）
+    If-Match: 版本哈希、修改时间（纳秒）或 *；If-None-Match: * 表示只允许新建
+    满足时返回None，否则返回失败响应内容（包含文件当前的版本，便于客户端合并或覆盖）
+    """
+    match_tags = parse_entity_tags(if_match)
+    none_match_tags = parse_entity_tags(if_none_match)
+    if not match_tags and not none_match_tags:
+        return None
+    
+    current_path = locate_workflow_file(file_path) or file_path
+    exists = os.path.isfile(current_path)
+    
+    error = None
+    if '*' in none_match_tags and exists:
+        error = "文件已存在"
+    elif match_tags and not exists:
+        error = "文件不存在或已被删除"
+    elif match_tags and '*' not in match_tags and not _matches_entity_tags(current_path, match_tags):
+        error = "文件已被其他人修改（版本不一致）"
+    if error is None:
+        return None
+    
+    failure = {
+        "success": False,
+        "precondition_failed": True,
+        "error": error
+    }
+    if exists:
+        failure["revision"] = _get_file_revision(current_path)
+        failure["mtime_ns"] = os.stat(current_path).st_mtime_ns
+    return failure
+
+
+def save_workflow_file(file_path, content):
+    """
+    按根目录的存储模式写入工作流（可能压缩或改为 .json.gz 等扩展名；HTTP处理器在线程池中执行，
+    WebSocket处理器直接调用），调用方持有路径锁，返回 (storage_path, size, revision, mtime_ns, previous_path)；
+    previous_path是保存前已存在的文件，与storage_path不同时调用方应通过publish_workflow_save通知路径变化
+    """
+    # 确保目录存在
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    
+    previous_path = locate_workflow_file(file_path)
+    storage_path, size = write_workflow(file_path, content)
+    
+    # 记录本次保存的版本，后续保存可以只上传补丁
+    revision = get_revision_cache().remember(storage_path, content)
+    return storage_path, size, revision, os.stat(storage_path).st_mtime_ns, previous_path
+
+
+async def _handle_save_workflow_http(data, preconditions=(None, None)):
+    """处理保存工作流的HTTP请求（可带If-Match/If-None-Match前置条件）"""
+    if_match, if_none_match = preconditions
     file_path = data.get('file_path', '')
     workflow_data = data.get('workflow_data', '')
     
@@ -656,30 +961,641 @@ async def _handle_save_workflow_http(data):
         if not workflow_data:
             raise ValueError("工作流数据不能为空")
         
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file_path = resolve_path(file_path)
         
         # 如果workflow_data是字符串，直接写入；如果是对象，序列化为JSON
         if isinstance(workflow_data, str):
             content = workflow_data
         else:
-            content = json.dumps(workflow_data, indent=2, ensure_ascii=False)
+            content = dumps(workflow_data, indent=True)
         
-        # 写入文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        async with path_lock(exclusive=[file_path, get_storage_path(file_path)]):
+            failure = _check_save_precondition(file_path, if_match, if_none_match)
+            if failure is not None:
+                logger.info(f"HTTP: 保存前置条件不满足: {file_path} ({failure['error']})")
+                return json_response(failure)
+            
+            # 压缩和写入在线程池中进行，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            with span('filesystem'):
+                storage_path, size, revision, mtime_ns, previous_path = await loop.run_in_executor(
+                    None, save_workflow_file, file_path, content
+                )
+            publish_workflow_save(previous_path, file_path, storage_path)
         
-        logger.info(f"HTTP: 工作流保存成功: {file_path} ({len(content)} 字符)")
+        logger.info(f"HTTP: 工作流保存成功: {storage_path} ({size} 字节)")
         
-        return web.json_response({
+        return json_response({
             "success": True, 
-            "file_path": file_path,
-            "size": len(content)
+            "file_path": storage_path,
+            "size": size,
+            "revision": revision,
+            "mtime_ns": mtime_ns
         })
         
     except Exception as e:
         logger.error(f"HTTP: 保存工作流失败: {str(e)}")
-        return web.json_response({
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+def _apply_workflow_patch(file_path, base_revision, patch, expected_revision):
+    """
+    把补丁应用到缓存的上一版本并写入文件（在线程池中执行）
+    返回 (storage_path, size, revision, previous_path)；需要客户端完整上传时返回None和原因
+    """
+    cache = get_revision_cache()
+    storage_path = get_storage_path(file_path)
+    
+    document = cache.get_document(storage_path, base_revision)
+    if document is None:
+        return None, "服务器没有该基准版本或文件已被修改"
+    
+    try:
+        new_document = apply_json_patch(document, patch)
+    except JsonPatchError as e:
+        return None, f"补丁无法应用: {str(e)}"
+    
+    content = serialize_for_revision(new_document)
+    if compute_revision(content) != expected_revision:
+        return None, "应用补丁后的版本哈希不一致"
+    
+    previous_path = locate_workflow_file(file_path)
+    storage_path, size = write_workflow(file_path, content)
+    revision = cache.remember(storage_path, content, new_document)
+    return (storage_path, size, revision, previous_path), None
+
+
+async def _handle_save_workflow_patch_http(data):
+    """处理增量保存工作流的HTTP请求（RFC 6902 JSON Patch + 基准版本哈希）"""
+    file_path = data.get('file_path', '')
+    base_revision = data.get('base_revision', '')
+    expected_revision = data.get('revision', '')
+    patch = data.get('patch', [])
+    
+    try:
+        if not file_path:
+            raise ValueError("文件路径不能为空")
+        
+        if not base_revision or not expected_revision:
+            raise ValueError("缺少版本哈希参数")
+        
+        if isinstance(patch, str):
+            patch = loads(patch)
+        
+        file_path = resolve_path(file_path)
+        
+        async with path_lock(exclusive=[file_path, get_storage_path(file_path)]):
+            loop = asyncio.get_running_loop()
+            saved, reason = await loop.run_in_executor(
+                None, _apply_workflow_patch, file_path, base_revision, patch, expected_revision
+            )
+        
+        if saved is None:
+            logger.info(f"HTTP: 增量保存需要完整上传: {file_path} ({reason})")
+            return json_response({
+                "success": False,
+                "need_full_upload": True,
+                "error": reason
+            })
+        
+        storage_path, size, revision, previous_path = saved
+        publish_workflow_save(previous_path, file_path, storage_path)
+        logger.info(f"HTTP: 工作流增量保存成功: {storage_path} ({len(patch)} 个补丁操作, {size} 字节)")
+        
+        return json_response({
+            "success": True, 
+            "file_path": storage_path,
+            "size": size,
+            "revision": revision,
+            "delta": True
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 增量保存工作流失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_analyze_dependencies_http(data):
+    """处理依赖分析的HTTP请求：path为目录时分析其中所有工作流，为文件时只分析该文件"""
+    path = data.get('path', '')
+    
+    try:
+        if not path:
+            raise ValueError("路径不能为空")
+        
+        path = resolve_path(path)
+        analyzer = get_dependency_analyzer()
+        loop = asyncio.get_running_loop()
+        
+        if os.path.isdir(path):
+            report = await loop.run_in_executor(None, analyzer.analyze_directory, path)
+        elif os.path.isfile(path):
+            report = await loop.run_in_executor(None, analyzer.analyze_file, path)
+        else:
+            raise ValueError(f"路径不存在: {path}")
+        
+        missing = sum(1 for r in report['files'].values() if not r.get('ok', False))
+        logger.info(f"HTTP: 依赖分析完成: {path} ({len(report['files'])}个工作流, {missing}个存在缺失)")
+        
+        return json_response({
+            "success": True,
+            "path": path,
+            "type": "dependency_report",
+            **report
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 依赖分析失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_find_duplicates_http(data):
+    """处理查找重复工作流的HTTP请求（mode=exact逐字节比较，mode=semantic忽略节点位置和ID）"""
+    path = data.get('path', '')
+    mode = data.get('mode', 'exact')
+    
+    try:
+        if not path:
+            raise ValueError("路径不能为空")
+        
+        if mode not in ('exact', 'semantic'):
+            raise ValueError(f"不支持的比较模式: {mode}")
+        
+        path = resolve_path(path)
+        if not os.path.isdir(path):
+            raise ValueError("指定路径不是目录")
+        
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(
+            None, get_duplicate_finder().find_duplicates, path, mode == 'semantic'
+        )
+        
+        return json_response({
+            "success": True,
+            "type": "duplicate_report",
+            **report
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 查找重复工作流失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_duplicate_report_http(data):
+    """处理读取最近一次重复查找报告的HTTP请求"""
+    try:
+        report = get_duplicate_finder().load_report()
+        if report is None:
+            raise ValueError("还没有重复查找报告")
+        
+        return json_response({
+            "success": True,
+            "type": "duplicate_report",
+            **report
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 读取重复查找报告失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_disk_usage_http(data):
+    """处理磁盘占用统计的HTTP请求，返回展开到depth层的目录占用层级"""
+    path = data.get('path', '')
+    depth = data.get('depth')
+    
+    try:
+        if not path:
+            raise ValueError("路径不能为空")
+        
+        path = resolve_path(path)
+        if not os.path.isdir(path):
+            raise ValueError("指定路径不是目录")
+        
+        depth = int(depth) if depth not in (None, '') else None
+        refresh = data.get('refresh') is None or _is_true(data.get('refresh'))
+        
+        loop = asyncio.get_running_loop()
+        tree = await loop.run_in_executor(None, get_disk_usage_index().get_usage, path, depth, refresh)
+        
+        return json_response({
+            "success": True,
+            "type": "disk_usage",
+            "tree": tree
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 统计磁盘占用失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_workflow_access_stats_http(data, user=None):
+    """处理访问统计的HTTP请求（sort=recent最近打开 / frequent最常打开，scope=user只看当前用户）"""
+    sort = data.get('sort', 'recent')
+    scope = data.get('scope', 'all')
+    
+    try:
+        if sort not in ('recent', 'frequent'):
+            raise ValueError(f"不支持的排序方式: {sort}")
+        
+        limit = max(1, min(int(data.get('limit') or 20), 200))
+        cache = get_workflow_cache()
+        items = get_access_stats().get_ranked(sort, (user or 'default') if scope == 'user' else None, limit)
+        for item in items:
+            item['cached'] = cache.contains(item['path'])
+        
+        return json_response({
+            "success": True,
+            "type": "workflow_access_stats",
+            "sort": sort,
+            "items": items,
+            "cache": cache.get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 获取访问统计失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+def _as_list(value):
+    """请求参数转换为列表（JSON数组，或GET参数中逗号分隔的字符串）"""
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return list(value)
+
+
+async def _handle_sync_notes_http(data):
+    """处理同步备注的HTTP请求：notes为 {路径: 备注}，备注为null表示删除，只更新有变化的条目"""
+    notes = data.get('notes') or {}
+    
+    try:
+        if not isinstance(notes, dict):
+            raise ValueError("notes必须是 {路径: 备注} 对象")
+        
+        changes = {}
+        for path, note in notes.items():
+            # 客户端的备注可能属于已不在允许范围内的路径，跳过即可
+            try:
+                changes[resolve_path(path)] = note
+            except Exception:
+                continue
+        
+        loop = asyncio.get_running_loop()
+        changed = await loop.run_in_executor(None, get_note_index().update, changes)
+        
+        return json_response({
+            "success": True,
+            "changed": changed
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 同步备注失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_query_notes_http(data):
+    """
+    处理备注查询的HTTP请求：tags_all / tags_any / tags_none 标签集合运算，category，
+    priority_min / priority_max 优先级范围，path 目录前缀，name 文件名，sort，offset / limit 分页
+    """
+    try:
+        path_prefix = data.get('path', '')
+        if path_prefix:
+            if not validate_path(path_prefix):
+                raise ValueError("路径无效")
+            path_prefix = resolve_path(path_prefix)
+        
+        offset = max(0, int(data.get('offset') or 0))
+        limit = max(1, min(int(data.get('limit') or 50), 500))
+        query = functools.partial(
+            get_note_index().query,
+            tags_all=_as_list(data.get('tags_all')),
+            tags_any=_as_list(data.get('tags_any')),
+            tags_none=_as_list(data.get('tags_none')),
+            category=data.get('category') or None,
+            priority_min=data.get('priority_min') if data.get('priority_min') not in (None, '') else None,
+            priority_max=data.get('priority_max') if data.get('priority_max') not in (None, '') else None,
+            path_prefix=path_prefix or None,
+            name=data.get('name') or None,
+            sort=data.get('sort') or 'priority',
+            offset=offset,
+            limit=limit
+        )
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, query)
+        
+        return json_response({
+            "success": True,
+            "type": "note_query",
+            **result
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 查询备注失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_read_coalescing_stats_http(data):
+    """处理请求合并统计的HTTP请求（合并了多少个相同的目录列表/工作流读取请求）"""
+    try:
+        return json_response({
+            "success": True,
+            "type": "read_coalescing_stats",
+            "stats": get_single_flight().get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 获取请求合并统计失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_export_zip_http(request, data):
+    """处理导出目录为zip的HTTP请求：边遍历边把压缩数据流式写入响应"""
+    path = data.get('path', '')
+    
+    try:
+        if not path:
+            raise ValueError("路径不能为空")
+        
+        path = resolve_path(path)
+        if not os.path.isdir(path):
+            raise ValueError("指定路径不是目录")
+    except Exception as e:
+        logger.error(f"HTTP: 导出压缩包失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+    
+    file_name = f"{os.path.basename(path.rstrip(os.sep)) or 'workflows'}.zip"
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/zip",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}"
+    })
+    await response.prepare(request)
+    
+    # 响应头已经发出，之后的错误只能记录日志（客户端收到的压缩包不完整，解压时会报错）
+    loop = asyncio.get_running_loop()
+    writer = ZipStreamWriter(response, loop)
+    try:
+        count = await loop.run_in_executor(None, write_directory_zip, path, writer)
+        await response.write_eof()
+        logger.info(f"HTTP: 导出压缩包完成: {path} ({count}个文件, {writer.bytes_written} 字节)")
+    except Exception as e:
+        logger.error(f"HTTP: 导出压缩包中断: {path} - {str(e)}")
+    return response
+
+
+async def _handle_import_zip_http(request):
+    """
+    处理导入zip的HTTP请求（multipart：target_path、new_name、conflict字段在前，file字段在后）
+    上传内容按块写入数据目录中的临时文件，再并行解压为 target_path/new_name
+    """
+    fields = {}
+    upload_path = None
+    
+    try:
+        max_bytes = get_setting('zip_import_max_bytes', 4 * 1024 * 1024 * 1024)
+        reader = await request.multipart()
+        
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            
+            if part.name != 'file':
+                fields[part.name] = await part.text()
+                continue
+            
+            fields.setdefault('file_name', part.filename or '')
+            fd, upload_path = tempfile.mkstemp(suffix='.zip', dir=get_data_dir('imports'))
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = await part.read_chunk(1024 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"上传的压缩包超过大小限制 ({max_bytes} 字节)")
+                    f.write(chunk)
+        
+        if upload_path is None:
+            raise ValueError("没有上传压缩包")
+        
+        target_path = fields.get('target_path', '')
+        if not validate_path(target_path):
+            raise ValueError("目标路径无效")
+        
+        target_path = resolve_path(target_path)
+        if not os.path.isdir(target_path):
+            raise ValueError("目标路径不是目录")
+        
+        # 目标目录名：new_name，否则使用压缩包文件名
+        new_name = fields.get('new_name') or os.path.splitext(os.path.basename(fields.get('file_name', '')))[0]
+        if not validate_filename(new_name):
+            raise ValueError("目标目录名包含非法字符或为空")
+        
+        conflict = fields.get('conflict') or 'replace'
+        if conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突策略: {conflict}")
+        
+        full_target_path = os.path.join(target_path, new_name)
+        
+        async with path_lock(exclusive=[full_target_path]):
+            loop = asyncio.get_running_loop()
+            stats = await loop.run_in_executor(None, import_zip, upload_path, full_target_path, conflict)
+            invalidate_path(full_target_path)
+        logger.info(f"HTTP: 成功导入压缩包: {full_target_path}")
+        
+        return json_response({
+            "success": True, 
+            "target": full_target_path,
+            **stats
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 导入压缩包失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+    finally:
+        if upload_path is not None and os.path.exists(upload_path):
+            os.remove(upload_path)
+
+
+def _is_true(value):
+    """解析请求参数中的布尔值（GET参数为字符串）"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+async def _handle_list_trash_http(data):
+    """处理列出回收站内容的HTTP请求"""
+    try:
+        # 回收站元数据的读取在线程池中进行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(None, get_trash_manager().list_items)
+        
+        return json_response({
+            "success": True,
+            "items": items,
+            "type": "trash_listing"
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 列出回收站失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_restore_trash_http(data):
+    """处理从回收站还原的HTTP请求"""
+    item_id = data.get('trash_id', '')
+    target_path = data.get('target_path', '')
+    
+    try:
+        if not item_id:
+            raise ValueError("回收站项目ID不能为空")
+        
+        if target_path:
+            if not validate_path(target_path):
+                raise ValueError("还原目标路径无效")
+            target_path = resolve_path(target_path)
+        
+        item = get_trash_manager().get_item(item_id)
+        if item is None:
+            raise ValueError(f"回收站中没有该项目: {item_id}")
+        restored_path = os.path.abspath(target_path or item['original_path'])
+        
+        async with path_lock(exclusive=[restored_path]):
+            # 通过操作日志还原（可撤销，中断后可恢复）
+            await get_local_backend().restore(item_id, restored_path)
+        logger.info(f"HTTP: 成功还原回收站项目: {item_id} -> {restored_path}")
+        
+        return json_response({
+            "success": True, 
+            "trash_id": item_id,
+            "path": restored_path
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 还原回收站项目失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_empty_trash_http(data):
+    """处理清空回收站的HTTP请求（可指定逗号分隔的trash_ids）"""
+    trash_ids = data.get('trash_ids', '')
+    
+    try:
+        if isinstance(trash_ids, str):
+            trash_ids = [i for i in trash_ids.split(',') if i.strip()]
+        
+        loop = asyncio.get_running_loop()
+        removed = await loop.run_in_executor(None, get_trash_manager().empty, trash_ids or None)
+        
+        return json_response({
+            "success": True, 
+            "removed": removed
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 清空回收站失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_operation_history_http(data):
+    """处理获取撤销/重做历史的HTTP请求"""
+    try:
+        limit = int(data.get('limit', 20) or 0)
+        journal = get_operation_journal()
+        # 第一次读取历史时要加载日志文件，统计还要等待组提交的写盘锁，都在线程池中进行
+        loop = asyncio.get_running_loop()
+        history = await loop.run_in_executor(None, journal.history, limit)
+        stats = await loop.run_in_executor(None, journal.get_stats)
+        
+        return json_response({
+            "success": True,
+            "undo": history['undo'],
+            "redo": history['redo'],
+            "stats": stats
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: 获取操作历史失败: {str(e)}")
+        return json_response({
+            "success": False, 
+            "error": str(e)
+        })
+
+
+async def _handle_undo_operation_http(data, direction):
+    """处理撤销/重做最近一次操作的HTTP请求（可传operation_id，确认撤销的是客户端看到的操作）"""
+    operation_id = data.get('operation_id', '')
+    
+    try:
+        journal = get_operation_journal()
+        entry = journal.peek(direction)
+        if operation_id and entry['id'] != operation_id:
+            raise ValueError("操作历史已变化，请刷新后重试")
+        
+        async with path_lock(exclusive=plan_paths(entry['plan'])):
+            loop = asyncio.get_running_loop()
+            method = journal.undo if direction == 'undo' else journal.redo
+            result = await loop.run_in_executor(None, method, entry['id'])
+            logger.info(f"HTTP: 成功{'撤销' if direction == 'undo' else '重做'}操作: {result['label']} {result['paths']}")
+        
+        return json_response({
+            "success": True,
+            "operation": result
+        })
+        
+    except Exception as e:
+        logger.error(f"HTTP: {'撤销' if direction == 'undo' else '重做'}操作失败: {str(e)}")
+        return json_response({
             "success": False, 
             "error": str(e)
         })
@@ -699,6 +1615,23 @@ def register_file_operations_endpoints(app):
         app.router.add_post(HTTP_ENDPOINTS['file_operations'], handle_file_operations)
         logger.info(f"✅ 已注册文件操作端点: {HTTP_ENDPOINTS['file_operations']}")
         
+        # 恢复上次运行中断的文件操作
+        try:
+            recovered = get_operation_journal().recover()
+            if recovered:
+                logger.info(f"操作日志: 已处理{recovered}个中断的操作")
+        except Exception as e:
+            logger.error(f"操作日志恢复失败: {str(e)}")
+        
+        # 启动回收站后台清理
+        get_trash_manager().start_purger()
+        
+        # 监听工作流根目录，增量更新磁盘占用统计
+        get_disk_usage_index().start_watcher([root['path'] for root in get_setting('roots', [])])
+        
+        # 服务关闭时释放对象存储的连接池
+        app.on_cleanup.append(lambda app: close_storage_backends())
+        
         # 输出所有注册的端点信息
         logger.info(f"文件操作端点注册完成。当前router有 {len(app.router._resources)} 个资源")
         
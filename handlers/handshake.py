@@ -0,0 +1,113 @@
+"""
+NZ工作流助手 - 能力握手处理器模块
+前端启动时请求一次，得到协议版本、支持的操作和传输方式、批量/流式能力、限制和服务器时间，
+据此直接选择可用的最快方式，不再靠试探请求和超时回退判断；
+响应带ETag（不含服务器时间），能力没有变化时返回304
+"""
+
+import time
+import hashlib
+from aiohttp import web
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from ..core.constants import HANDSHAKE_PROTOCOL_VERSION, HTTP_ENDPOINTS
+from ..utils.json_codec import json_response, dumps_bytes, JSON_BACKEND
+from ..utils.workflow_format import STORAGE_MODES, zstandard
+from ..utils.storage_backend import is_object_storage_available
+from ..utils.profiler import MAX_PROFILE_SECONDS
+from ..utils.validation import parse_entity_tags
+from .file_operations import FILE_OPERATION_ACTIONS, LOCAL_FILE_ACTIONS
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 一次请求可以处理多个项目的操作
+BATCH_ACTIONS = ('sync_notes', 'empty_trash')
+
+# WebSocket消息处理器注册成功后支持的操作（未注册时为空）
+_websocket_actions = ()
+
+# aiohttp应用允许的最大请求体（字节）
+_request_max_bytes = None
+
+
+def enable_websocket_actions(actions):
+    """WebSocket消息处理器注册成功后调用，在握手中公布这些操作"""
+    global _websocket_actions
+    _websocket_actions = tuple(actions)
+
+
+def set_request_max_bytes(app):
+    """记录aiohttp应用的请求体大小限制（应用未公开该属性时不公布）"""
+    global _request_max_bytes
+    _request_max_bytes = getattr(app, '_client_max_size', None)
+
+
+def get_capabilities():
+    """插件当前的能力描述（不含服务器时间，用于计算ETag）"""
+    storage_modes = [mode for mode in STORAGE_MODES if mode != 'zstd' or zstandard is not None]
+    return {
+        "protocol": HANDSHAKE_PROTOCOL_VERSION,
+        "transports": {
+            "http": True,
+            "websocket": bool(_websocket_actions)
+        },
+        "actions": {
+            "file_operations": list(FILE_OPERATION_ACTIONS),
+            "local_files": list(LOCAL_FILE_ACTIONS),
+            "websocket": list(_websocket_actions)
+        },
+        "batch": list(BATCH_ACTIONS),
+        "stream": {
+            "zip_export": True,
+            "zip_import": True
+        },
+        "features": {
+            "conditional_get": True,
+            "delta_save": True,
+            "save_preconditions": True,
+            "undo": get_setting('undo_history', 50) > 0,
+            "coalesced_reads": bool(get_setting('coalesce_reads', True)),
+            "object_storage": is_object_storage_available(),
+            "storage_modes": storage_modes,
+            "json_backend": JSON_BACKEND
+        },
+        "limits": {
+            "request_max_bytes": _request_max_bytes,
+            "zip_import_max_bytes": get_setting('zip_import_max_bytes', 4 * 1024 * 1024 * 1024),
+            "zip_import_max_files": get_setting('zip_import_max_files', 20000),
+            "lock_timeout": get_setting('lock_timeout', 30),
+            "undo_history": get_setting('undo_history', 50),
+            "profile_max_seconds": MAX_PROFILE_SECONDS
+        }
+    }
+
+
+async def handle_handshake(request):
+    """处理能力握手请求"""
+    try:
+        capabilities = get_capabilities()
+        etag = hashlib.blake2b(dumps_bytes(capabilities, sort_keys=True), digest_size=16).hexdigest()
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+        # 能力没有变化：客户端继续使用缓存，服务器时间从Date头获得
+        if etag in parse_entity_tags(request.headers.get('If-None-Match')):
+            return web.Response(status=304, headers=headers)
+
+        capabilities['server_time'] = time.time()
+        return json_response(capabilities, headers=headers)
+
+    except Exception as e:
+        logger.error(f"HTTP: 能力握手失败: {str(e)}")
+        return json_response({
+            "success": False,
+            "error": str(e)
+        })
+
+
+def register_handshake_endpoint(app):
+    """注册能力握手端点"""
+    set_request_max_bytes(app)
+    app.router.add_get(HTTP_ENDPOINTS['handshake'], handle_handshake)
+    logger.info(f"✅ 已注册能力握手端点: {HTTP_ENDPOINTS['handshake']}")
@@ -1,19 +1,34 @@
 """
 NZ工作流助手 - 静态文件服务处理器模块
-处理静态文件服务请求
+处理静态文件服务请求，以及打包后带内容哈希的前端文件（不可变缓存）
 """
 
 import os
+import re
 import mimetypes
 from aiohttp import web
 from ..core.logger import get_logger
+from ..core.config import get_setting
 from ..core.constants import HTTP_ENDPOINTS
 from ..utils.validation import is_safe_path
+from ..utils import asset_pipeline
 
 
 # 获取logger实例
 logger = get_logger()
 
+# 设置后始终加载 web/ 源码（修改前端时使用，无需重新打包）
+WEB_DEV_ENV = "NZ_WEB_DEV"
+
+# 打包文件名：<名称>.<内容哈希>.js
+HASHED_ASSET_RE = re.compile(r'^[\w-]+\.[0-9a-f]{%d}\.js$' % asset_pipeline.HASH_LENGTH)
+
+# 哈希文件内容不会变化，读取后常驻内存：文件名 -> (原始内容, gzip内容或None)
+_hashed_asset_cache = {}
+
+# 哈希文件端点是否已注册（未注册时不能让ComfyUI加载打包产物）
+_hashed_assets_registered = False
+
 
 async def handle_static_files(request):
     """处理静态文件服务请求 - 专门用于提供web目录下的静态文件"""
@@ -60,8 +75,75 @@ async def handle_static_files(request):
         return web.Response(status=500, text=f"Internal server error: {str(e)}")
 
 
+def _read_hashed_asset(filename):
+    cached = _hashed_asset_cache.get(filename)
+    if cached is None:
+        path = os.path.join(asset_pipeline.ASSETS_DIR, filename)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        compressed = None
+        if os.path.isfile(path + '.gz'):
+            with open(path + '.gz', 'rb') as f:
+                compressed = f.read()
+        cached = _hashed_asset_cache[filename] = (raw, compressed)
+    return cached
+
+
+async def handle_hashed_assets(request):
+    """提供打包后的前端文件 - 文件名包含内容哈希，浏览器永久缓存，内容变化时文件名随之变化"""
+    try:
+        filename = request.match_info.get('filename', '')
+        if not HASHED_ASSET_RE.match(filename):
+            return web.Response(status=404, text="File not found")
+
+        try:
+            raw, compressed = _read_hashed_asset(filename)
+        except FileNotFoundError:
+            logger.warning(f"打包文件不存在: {filename}")
+            return web.Response(status=404, text="File not found")
+
+        headers = {
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept-Encoding',
+            'Access-Control-Allow-Origin': '*'
+        }
+        body = raw
+        if compressed is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            # 打包时已预先压缩，不在请求时压缩
+            body = compressed
+            headers['Content-Encoding'] = 'gzip'
+
+        return web.Response(body=body, content_type='application/javascript', charset='utf-8', headers=headers)
+
+    except Exception as e:
+        logger.error(f"打包文件服务失败: {str(e)}")
+        return web.Response(status=500, text=f"Internal server error: {str(e)}")
+
+
+def prepare_web_directory():
+    """
+    选择ComfyUI加载前端的目录（相对插件目录）：打包产物齐全且比源码新时使用 dist/web；
+    产物缺失或过期、未启用或设置了NZ_WEB_DEV时使用 web/ 源码（启动时不打包，打包是单独的构建步骤）
+    """
+    if os.environ.get(WEB_DEV_ENV) or not get_setting('bundle_assets', True):
+        logger.info("前端使用 web/ 源码（未启用打包）")
+        return "web"
+    if not _hashed_assets_registered:
+        logger.warning("打包文件端点未注册，前端使用 web/ 源码")
+        return "web"
+
+    ok, reason = asset_pipeline.check_build()
+    if not ok:
+        logger.info(f"前端打包产物不可用（{reason}），使用 web/ 源码；运行 python <插件目录> build-assets 重新打包")
+        return "web"
+
+    logger.info(f"前端使用打包产物: {reason}")
+    return os.path.relpath(asset_pipeline.LOADER_DIR, asset_pipeline.PLUGIN_DIR)
+
+
 def register_static_endpoints(app):
     """注册静态文件服务端点"""
+    global _hashed_assets_registered
     try:
         logger.info(f"开始注册静态文件端点，app实例: {app}")
         
@@ -70,6 +152,12 @@ def register_static_endpoints(app):
         app.router.add_get(static_route, handle_static_files)
         logger.info(f"✅ 已注册静态文件服务端点: {static_route}")
         
+        # 注册打包文件端点
+        assets_route = HTTP_ENDPOINTS['hashed_assets'] + '/{filename}'
+        app.router.add_get(assets_route, handle_hashed_assets)
+        _hashed_assets_registered = True
+        logger.info(f"✅ 已注册打包文件端点: {assets_route}")
+        
         # 验证web目录是否存在
         plugin_web_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'web')
         if os.path.exists(plugin_web_dir):
@@ -0,0 +1,326 @@
+"""
+NZ工作流助手 - 存储后端文件操作处理器模块
+处理涉及对象存储根目录的HTTP文件操作请求（纯本地路径的请求仍由file_operations处理），
+源和目标位于不同后端时（如本地 -> S3）逐个文件传输
+"""
+
+import os
+import shutil
+import asyncio
+from ..core.logger import get_logger
+from ..utils.validation import validate_filename
+from ..utils.json_codec import json_response, dumps
+from ..utils.storage_backend import resolve_storage_path, is_remote_request, get_local_backend
+from ..utils.workflow_format import pretty_workflow_text
+from ..utils.operation_journal import plan_copy
+from ..utils.copy_engine import get_staging_path
+from ..utils.lock_manager import path_lock
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 可能包含路径的请求参数
+PATH_PARAMETERS = ('path', 'file_path', 'directory_path', 'parent_path', 'source_path', 'target_path', 'old_path')
+
+
+def is_storage_request(data):
+    """请求是否涉及对象存储路径"""
+    return is_remote_request(data, PATH_PARAMETERS)
+
+
+async def _require(backend, path, is_dir, message):
+    info = await backend.stat(path)
+    if info is None:
+        raise ValueError(f"{message}不存在")
+    if info['is_dir'] != is_dir:
+        raise ValueError(f"{message}不是{'目录' if is_dir else '文件'}")
+    return info
+
+
+def _write_staging_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _remove_staging(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+async def _download_to_local(source_backend, source_path, target_path, is_dir):
+    """
+    把对象存储中的文件或目录下载到本地目标旁的暂存路径，再通过操作日志复制到目标
+    （已存在的目标移入回收站，与本地复制/移动的覆盖语义一致，可撤销）；调用方持有目标路径的锁
+    """
+    loop = asyncio.get_running_loop()
+    staging_path = get_staging_path(source_path, target_path)
+    # 上次中断留下的暂存内容无法确认是否完整，重新下载
+    await loop.run_in_executor(None, _remove_staging, staging_path)
+    try:
+        if is_dir:
+            files = await source_backend.list_files(source_path)
+            await loop.run_in_executor(None, lambda: os.makedirs(staging_path, exist_ok=True))
+            for relative in files:
+                parts = relative.split('/')
+                data = await source_backend.read_bytes(source_backend.join(source_path, *parts))
+                await loop.run_in_executor(None, _write_staging_file, os.path.join(staging_path, *parts), data)
+        else:
+            data = await source_backend.read_bytes(source_path)
+            await loop.run_in_executor(None, _write_staging_file, staging_path, data)
+
+        plan = await loop.run_in_executor(None, plan_copy, staging_path, target_path)
+        await get_local_backend().run_operation('copy_directory' if is_dir else 'copy_file', plan)
+    finally:
+        await loop.run_in_executor(None, _remove_staging, staging_path)
+
+
+async def _transfer(source_backend, source_path, target_backend, target_path, move=False):
+    """
+    在两个路径之间复制或移动，同一后端时使用后端自身的实现；
+    已存在的目标（包括目录）被整体替换，不与源合并
+    """
+    if source_backend is target_backend:
+        if move:
+            await source_backend.move(source_path, target_path)
+        else:
+            await source_backend.copy(source_path, target_path)
+        return
+
+    info = await source_backend.stat(source_path)
+    if target_backend is get_local_backend():
+        await _download_to_local(source_backend, source_path, target_path, info['is_dir'])
+    else:
+        if await target_backend.exists(target_path):
+            await target_backend.delete(target_path)
+        if info['is_dir']:
+            files = await source_backend.list_files(source_path)
+            if not files:
+                await target_backend.make_directory(target_path)
+            for relative in files:
+                parts = relative.split('/')
+                data = await source_backend.read_bytes(source_backend.join(source_path, *parts))
+                await target_backend.write_bytes(target_backend.join(target_path, *parts), data)
+        else:
+            await target_backend.write_bytes(target_path, await source_backend.read_bytes(source_path))
+
+    if move:
+        await source_backend.delete(source_path)
+
+
+async def handle_storage_operation(action, data):
+    """按操作类型分发对象存储相关的请求"""
+    handlers = {
+        'list_directory': _handle_list_directory,
+        'load_workflow': _handle_load_workflow,
+        'save_workflow': _handle_save_workflow,
+        'create_directory': _handle_create_directory,
+        'delete_file': _handle_delete,
+        'delete_directory': _handle_delete,
+        'path_exists': _handle_path_exists,
+        'check_file_exists': _handle_check_exists,
+        'check_directory_exists': _handle_check_exists,
+        'copy_file': _handle_copy_or_move,
+        'copy_directory': _handle_copy_or_move,
+        'move_file': _handle_copy_or_move,
+        'move_directory': _handle_copy_or_move,
+        'rename': _handle_rename,
+    }
+    handler = handlers.get(action)
+    if handler is None:
+        return json_response({
+            "success": False,
+            "error": f"对象存储不支持该操作: {action}"
+        })
+
+    try:
+        return await handler(action, data)
+    except Exception as e:
+        logger.error(f"HTTP: 存储操作 {action} 失败: {str(e)}")
+        return json_response({
+            "success": False,
+            "error": str(e)
+        })
+
+
+async def _handle_list_directory(action, data):
+    backend, path = resolve_storage_path(data.get('path', ''))
+    await _require(backend, path, True, "目录")
+    result = await backend.list_directory(path)
+    logger.info(f"目录内容: {len(result['directories'])}个目录, {len(result['files'])}个JSON文件")
+    return json_response(result)
+
+
+async def _handle_load_workflow(action, data):
+    backend, path = resolve_storage_path(data.get('path', ''))
+    await _require(backend, path, False, "文件")
+
+    workflow_data = await backend.read_workflow(path)
+    if str(data.get('pretty', '')).lower() in ('1', 'true', 'yes', 'on'):
+        workflow_data = pretty_workflow_text(workflow_data)
+
+    logger.info(f"工作流文件读取成功: {path}")
+    return json_response({
+        "path": path,
+        "data": workflow_data,
+        "type": "workflow_loaded"
+    })
+
+
+async def _handle_save_workflow(action, data):
+    file_path = data.get('file_path', '')
+    workflow_data = data.get('workflow_data', '')
+    if not file_path:
+        raise ValueError("文件路径不能为空")
+    if not workflow_data:
+        raise ValueError("工作流数据不能为空")
+
+    backend, file_path = resolve_storage_path(file_path)
+    if isinstance(workflow_data, str):
+        content = workflow_data
+    else:
+        content = dumps(workflow_data, indent=True)
+
+    storage_path, size = await backend.write_workflow(file_path, content)
+    logger.info(f"HTTP: 工作流保存成功: {storage_path} ({size} 字节)")
+    return json_response({
+        "success": True,
+        "file_path": storage_path,
+        "size": size
+    })
+
+
+async def _handle_create_directory(action, data):
+    directory_name = data.get('directory_name', '')
+    if not validate_filename(directory_name):
+        raise ValueError("目录名包含非法字符或为空")
+
+    backend, parent_path = resolve_storage_path(data.get('parent_path', ''))
+    await _require(backend, parent_path, True, "父目录")
+
+    new_directory_path = backend.join(parent_path, directory_name)
+    if await backend.exists(new_directory_path):
+        raise ValueError("目录已存在")
+
+    await backend.make_directory(new_directory_path)
+    logger.info(f"HTTP: 成功创建目录: {new_directory_path}")
+    return json_response({
+        "success": True,
+        "path": new_directory_path
+    })
+
+
+async def _handle_delete(action, data):
+    is_dir = action == 'delete_directory'
+    backend, path = resolve_storage_path(data.get('directory_path' if is_dir else 'file_path', ''))
+    await _require(backend, path, is_dir, "目录" if is_dir else "文件")
+
+    permanent = str(data.get('permanent', '')).lower() in ('1', 'true', 'yes', 'on')
+    trash_id = await backend.delete(path, permanent=permanent)
+    logger.info(f"HTTP: 成功删除{'目录' if is_dir else '文件'}: {path}")
+    return json_response({
+        "success": True,
+        "path": path,
+        "trash_id": trash_id
+    })
+
+
+async def _handle_path_exists(action, data):
+    backend, path = resolve_storage_path(data.get('path', ''))
+    info = await backend.stat(path)
+    return json_response({
+        "success": True,
+        "exists": info is not None,
+        "is_directory": bool(info and info['is_dir']),
+        "is_file": bool(info and not info['is_dir']),
+        "path": path
+    })
+
+
+async def _handle_check_exists(action, data):
+    try:
+        backend, path = resolve_storage_path(data.get('path', ''))
+        info = await backend.stat(path)
+        exists = info is not None and info['is_dir'] == (action == 'check_directory_exists')
+        return json_response({"exists": exists})
+    except Exception as e:
+        return json_response({"exists": False, "error": str(e)})
+
+
+async def _handle_copy_or_move(action, data):
+    is_dir = action.endswith('_directory')
+    move = action.startswith('move')
+    new_name = data.get('new_filename', '') if action == 'move_file' else data.get('new_name', '')
+
+    source_backend, source_path = resolve_storage_path(data.get('source_path', ''))
+    await _require(source_backend, source_path, is_dir, "源目录" if is_dir else "源文件")
+
+    # 目录重命名：target_path是父目录，new_name是新名称，目标已存在时报错
+    rename = action == 'move_directory' and data.get('operation_type') == 'rename' and new_name
+
+    target_backend, target_path = resolve_storage_path(data.get('target_path', ''))
+    await _require(target_backend, target_path, True, "目标目录")
+
+    if new_name and not validate_filename(new_name):
+        raise ValueError("新名称包含非法字符")
+    full_target_path = target_backend.join(target_path, new_name or source_backend.basename(source_path))
+
+    # 本地一侧的路径加锁，避免传输过程中被其他请求修改
+    local_backend = get_local_backend()
+    exclusive = [full_target_path] if target_backend is local_backend else []
+    shared = []
+    if source_backend is local_backend:
+        (exclusive if move else shared).append(source_path)
+
+    async with path_lock(exclusive=exclusive, shared=shared):
+        if rename and await target_backend.exists(full_target_path):
+            raise ValueError("目标名称已存在")
+        await _transfer(source_backend, source_path, target_backend, full_target_path, move=move)
+    logger.info(f"HTTP: 成功{'移动' if move else '复制'}: {source_path} -> {full_target_path}")
+
+    result = {
+        "success": True,
+        "source": source_path,
+        "target": full_target_path
+    }
+    if action == 'move_directory':
+        result["operation"] = "rename" if rename else "move"
+    return json_response(result)
+
+
+async def _handle_rename(action, data):
+    source = data.get('source_path', '') or data.get('old_path', '')
+    if not source:
+        raise ValueError("源路径参数缺失")
+
+    backend, source_path = resolve_storage_path(source)
+    if not await backend.exists(source_path):
+        raise ValueError("原路径不存在")
+
+    target_path = data.get('target_path', '')
+    new_name = data.get('new_name', '')
+    if target_path:
+        target_backend, final_target_path = resolve_storage_path(target_path)
+        if target_backend is not backend:
+            raise ValueError("重命名不能跨存储后端")
+        new_name = backend.basename(final_target_path)
+    elif new_name:
+        final_target_path = backend.join(backend.dirname(source_path), new_name)
+    else:
+        raise ValueError("目标路径或新名称参数缺失")
+
+    if not validate_filename(new_name):
+        raise ValueError("新名称包含非法字符或为空")
+    if await backend.exists(final_target_path):
+        raise ValueError("目标名称已存在")
+
+    await backend.rename(source_path, final_target_path)
+    logger.info(f"HTTP: 成功重命名: {source_path} -> {final_target_path}")
+    return json_response({
+        "success": True,
+        "source_path": source_path,
+        "target_path": final_target_path
+    })
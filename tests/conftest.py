@@ -0,0 +1,39 @@
+"""
+NZ工作流助手 - 测试配置
+插件目录的 __init__.py 会向ComfyUI注册端点和节点，测试时只把插件目录注册为包，按需导入子模块
+"""
+
+import os
+import sys
+import json
+import types
+import pytest
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "nz_workflow_manager"
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules[PACKAGE_NAME] = package
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """使用临时配置文件和数据目录，返回写入配置并重新加载的函数"""
+    from nz_workflow_manager.core.config import reload_settings
+    from nz_workflow_manager.core.constants import SETTINGS_FILE_ENV
+
+    settings_file = tmp_path / "nz_settings.json"
+    monkeypatch.setenv(SETTINGS_FILE_ENV, str(settings_file))
+
+    def apply(**values):
+        values.setdefault("data_dir", str(tmp_path / "data"))
+        settings_file.write_text(json.dumps(values), encoding="utf-8")
+        return reload_settings()
+
+    apply()
+    yield apply
+    monkeypatch.delenv(SETTINGS_FILE_ENV)
+    reload_settings()
@@ -0,0 +1,45 @@
+"""
+前端打包测试：产物只在比源码新时使用；产物语法由Node.js单独校验
+"""
+
+import os
+import shutil
+import pytest
+
+from nz_workflow_manager.utils import asset_pipeline
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """把源码复制到临时目录，产物写入临时的 dist/"""
+    source_dir = tmp_path / "web"
+    shutil.copytree(asset_pipeline.SOURCE_DIR, source_dir)
+    dist_dir = tmp_path / "dist"
+    monkeypatch.setattr(asset_pipeline, "SOURCE_DIR", str(source_dir))
+    monkeypatch.setattr(asset_pipeline, "DIST_DIR", str(dist_dir))
+    monkeypatch.setattr(asset_pipeline, "ASSETS_DIR", str(dist_dir / "assets"))
+    monkeypatch.setattr(asset_pipeline, "LOADER_DIR", str(dist_dir / "web"))
+    monkeypatch.setattr(asset_pipeline, "MANIFEST_FILE", str(dist_dir / "manifest.json"))
+    return source_dir
+
+
+def test_bundle_is_used_only_while_newer_than_sources(pipeline):
+    assert asset_pipeline.check_build() == (False, "尚未打包")
+
+    manifest = asset_pipeline.build()
+    assert asset_pipeline.check_build() == (True, manifest['entry'])
+
+    source = pipeline / "extension.js"
+    os.utime(source, (manifest['built_at'] + 5, manifest['built_at'] + 5))
+    ok, reason = asset_pipeline.check_build()
+    assert not ok and reason == "源码比打包产物新"
+
+
+def test_outputs_are_checked_by_node(pipeline):
+    if shutil.which('node') is None:
+        pytest.skip("未安装Node.js")
+
+    assert asset_pipeline.build()['verified_with'] == 'node'
+    assert asset_pipeline.check_syntax({"ok.js": ("export const a=1;\n", [])}) == 'node'
+    with pytest.raises(asset_pipeline.BuildError, match="broken.js"):
+        asset_pipeline.check_syntax({"broken.js": ("const a=(;\n", [])})
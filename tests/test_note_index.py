@@ -0,0 +1,40 @@
+"""
+备注索引测试：路径变化的通知只记录下来，按通知顺序在后台或下一次读取前处理
+"""
+
+import os
+import time
+
+from nz_workflow_manager.utils import note_index
+from nz_workflow_manager.utils.json_codec import loads
+
+
+def test_path_changes_are_applied_in_background(settings, tmp_path, monkeypatch):
+    settings()
+    monkeypatch.setattr(note_index, 'FLUSH_DELAY', 0.05)
+    index = note_index.NoteIndex()
+
+    first = tmp_path / "a.json"
+    second = tmp_path / "b.json"
+    first.write_text("{}", encoding="utf-8")
+    second.write_text("{}", encoding="utf-8")
+    assert index.update({str(first): {"tags": ["x"]}, str(second): {"tags": ["y"]}}) == 2
+
+    # 通知本身不检查文件是否存在，也不写盘
+    os.rename(first, tmp_path / "c.json")
+    second.unlink()
+    index.move(str(first), str(tmp_path / "c.json"))
+    index.invalidate([str(second)])
+    assert str(second) in index._notes
+
+    deadline = time.monotonic() + 5
+    while index._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # 后台线程清空待处理列表时持有索引锁，拿到锁说明已处理完
+    with index._lock:
+        pass
+
+    with open(index._notes_file(), 'rb') as f:
+        saved = loads(f.read())['notes']
+    assert list(saved) == [str(tmp_path / "c.json")]
+    assert [item['path'] for item in index.query(tags_all=["x"])['items']] == [str(tmp_path / "c.json")]
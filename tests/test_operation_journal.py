@@ -0,0 +1,121 @@
+"""
+操作日志测试：执行中途压缩日志时未完成操作的记录不重复；中断的复制在恢复时从暂存目录续传
+"""
+
+import os
+import shutil
+import pytest
+from collections import Counter
+
+from nz_workflow_manager.utils import operation_journal
+from nz_workflow_manager.utils.json_codec import loads
+
+
+def _records(journal):
+    with open(journal._journal_file(), 'rb') as f:
+        return [loads(line) for line in f.read().splitlines()]
+
+
+def test_compact_with_pending_operation(settings, tmp_path, monkeypatch):
+    source = tmp_path / "a.json"
+    target = tmp_path / "b.json"
+    source.write_text('{"a": 1}', encoding="utf-8")
+    target.write_text('{"b": 2}', encoding="utf-8")
+
+    journal = operation_journal.OperationJournal()
+    sync = journal._sync
+
+    def compact_then_sync():
+        # 每一步执行前（begin和上一步的记录还在缓冲区中）压缩日志
+        journal.compact()
+        sync()
+
+    monkeypatch.setattr(journal, "_sync", compact_then_sync)
+    steps = journal.execute("copy_file", operation_journal.plan_copy(str(source), str(target)))
+    assert [step['do'] for step in steps] == ['trash', 'copy']
+
+    counts = Counter((record['type'], record['op'], record.get('index')) for record in _records(journal))
+    assert counts and max(counts.values()) == 1
+    assert [(record['type'], record.get('index')) for record in _records(journal)] == [
+        ('begin', None), ('step', 0), ('step', 1), ('commit', None)
+    ]
+
+    # 重新加载的日志与内存中的状态一致，仍然可以撤销
+    reloaded = operation_journal.OperationJournal()
+    entry = reloaded.peek('undo')
+    assert entry['action'] == 'copy_file' and entry['paths'] == [str(target), str(source)]
+    reloaded.undo()
+    assert target.read_text(encoding="utf-8") == '{"b": 2}'
+    assert os.path.exists(source)
+
+
+class Crash(BaseException):
+    """模拟进程在复制中途退出（不触发execute中的回滚）"""
+
+
+def test_recover_resumes_interrupted_copy(settings, tmp_path, monkeypatch):
+    from nz_workflow_manager.utils import copy_engine
+
+    settings(copy_workers=1)
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "big.json").write_text('{"big": 1}', encoding="utf-8")
+    (source / "small.json").write_text('{}', encoding="utf-8")
+    target = tmp_path / "dst"
+
+    copied = []
+    copy_file = copy_engine.copy_file_fast
+
+    def crash_after_first(src, dst):
+        if copied:
+            raise Crash()
+        copied.append(src)
+        return copy_file(src, dst)
+
+    monkeypatch.setattr(copy_engine, "copy_file_fast", crash_after_first)
+    journal = operation_journal.OperationJournal()
+    try:
+        journal.execute("copy_directory", operation_journal.plan_copy(str(source), str(target)))
+    except Crash:
+        pass
+    staging = copy_engine.get_staging_path(str(source), str(target))
+    assert os.path.exists(os.path.join(staging, "big.json")) and not target.exists()
+
+    # 新进程中恢复：从暂存目录续传，已复制的文件跳过
+    monkeypatch.setattr(copy_engine, "copy_file_fast", copy_file)
+    recovered = operation_journal.OperationJournal()
+    assert recovered.recover() == 1
+    assert sorted(os.listdir(target)) == ["big.json", "small.json"]
+    assert not os.path.exists(staging)
+    steps = recovered.peek('undo')
+    assert steps['action'] == 'copy_directory'
+    assert [record['type'] for record in _records(recovered)][-1] == 'commit'
+
+
+def test_recover_rolls_back_copy_without_source(settings, tmp_path, monkeypatch):
+    from nz_workflow_manager.utils import copy_engine
+
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.json").write_text('{}', encoding="utf-8")
+    target = tmp_path / "dst"
+
+    def crash(src, dst):
+        raise Crash()
+
+    monkeypatch.setattr(copy_engine, "copy_file_fast", crash)
+    try:
+        operation_journal.OperationJournal().execute(
+            "copy_directory", operation_journal.plan_copy(str(source), str(target))
+        )
+    except Crash:
+        pass
+    staging = copy_engine.get_staging_path(str(source), str(target))
+    assert os.path.isdir(staging)
+
+    shutil.rmtree(source)
+    recovered = operation_journal.OperationJournal()
+    assert recovered.recover() == 1
+    assert not target.exists() and not os.path.exists(staging)
+    with pytest.raises(ValueError):
+        recovered.peek('undo')
@@ -0,0 +1,60 @@
+"""
+路径解析测试：根目录限制不能通过前缀相同的兄弟目录、上级引用、路径ID或指向外部的符号链接绕过
+"""
+
+import os
+import pytest
+
+from nz_workflow_manager.utils.path_resolver import PathResolver, PathAccessError
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    library = tmp_path / "lib"
+    (library / "sub").mkdir(parents=True)
+    (library / "sub" / "a.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "library").mkdir()
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / "secret.json").write_text("{}", encoding="utf-8")
+    return PathResolver(roots=[{"name": "lib", "path": str(library)}])
+
+
+def test_paths_inside_root_resolve(resolver, tmp_path):
+    path = str(tmp_path / "lib" / "sub" / "a.json")
+    assert resolver.resolve(path) == path
+    assert resolver.resolve("@lib/sub/a.json") == path
+    assert resolver.resolve(str(tmp_path / "lib" / "sub" / ".." / "sub" / "a.json")) == path
+
+
+@pytest.mark.parametrize("relative", [
+    # 前缀相同的兄弟目录
+    "library",
+    os.path.join("library", "a.json"),
+    # 上级引用
+    os.path.join("lib", "..", "outside", "secret.json"),
+    os.path.join("lib", "sub", "..", "..", "outside"),
+])
+def test_paths_outside_root_are_rejected(resolver, tmp_path, relative):
+    with pytest.raises(PathAccessError):
+        resolver.resolve(str(tmp_path / relative))
+
+
+@pytest.mark.parametrize("path_id", ["@lib/../outside/secret.json", "@lib/sub/../../library", "@other/a.json"])
+def test_path_ids_cannot_escape_root(resolver, path_id):
+    with pytest.raises(PathAccessError):
+        resolver.resolve(path_id)
+
+
+def test_symlinks_pointing_outside_are_rejected(resolver, tmp_path):
+    link = tmp_path / "lib" / "link"
+    try:
+        link.symlink_to(tmp_path / "outside", target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip("当前系统不支持创建符号链接")
+
+    with pytest.raises(PathAccessError):
+        resolver.resolve(str(link))
+    with pytest.raises(PathAccessError):
+        resolver.resolve(str(link / "secret.json"))
+    with pytest.raises(PathAccessError):
+        resolver.resolve("@lib/link/secret.json")
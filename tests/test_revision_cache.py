@@ -0,0 +1,61 @@
+"""
+版本哈希测试：服务器应用补丁后生成的文本必须与客户端 JSON.stringify(data, null, 2) 逐字节一致
+"""
+
+import json
+import shutil
+import subprocess
+import pytest
+
+from nz_workflow_manager.utils.json_codec import loads
+from nz_workflow_manager.utils.revision_cache import compute_revision, serialize_for_revision
+
+
+WORKFLOW = {
+    "last_node_id": 12,
+    "version": 0.4,
+    "nodes": [
+        {
+            "id": 3,
+            "type": "KSampler",
+            "pos": [863.5, -186.25],
+            "size": {"0": 315, "1": 262},
+            "widgets_values": [156680208700286, "randomize", 20, 8, "euler", "normal", 1],
+            "properties": {}
+        },
+        {
+            "id": 6,
+            "type": "CLIPTextEncode",
+            "title": "提示词 / prompt ✨",
+            "widgets_values": ["a \"quoted\" line\nwith\ttabs, \\ and \u0001 control"],
+            "inputs": [],
+            "flags": {"collapsed": False},
+            "color": None
+        }
+    ],
+    "extra": {"ds": {"scale": 0.6209213230591552, "offset": [-1.5e-3, 1e+21, -0.1]}}
+}
+
+
+def _client_stringify(document):
+    """用Node执行客户端的 JSON.parse + JSON.stringify(data, null, 2)"""
+    script = "let s='';process.stdin.on('data',d=>s+=d).on('end',()=>process.stdout.write(JSON.stringify(JSON.parse(s),null,2)))"
+    result = subprocess.run(
+        ["node", "-e", script], input=json.dumps(document).encode("utf-8"),
+        capture_output=True, check=True
+    )
+    return result.stdout.decode("utf-8")
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="需要Node.js")
+def test_revision_matches_client_stringify():
+    client_text = _client_stringify(WORKFLOW)
+    server_text = serialize_for_revision(loads(client_text))
+
+    assert server_text == client_text
+    assert compute_revision(server_text) == compute_revision(client_text)
+
+
+def test_revision_of_bytes_and_text_match():
+    text = serialize_for_revision(WORKFLOW)
+    assert compute_revision(text) == compute_revision(text.encode("utf-8"))
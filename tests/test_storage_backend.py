@@ -0,0 +1,178 @@
+"""
+存储后端测试：接口为抽象类；S3驱动在moto模拟的对象存储上测试分段上传、分页列举和元数据缓存
+"""
+
+import asyncio
+import pytest
+
+from nz_workflow_manager.utils.storage_backend import StorageBackend, LocalStorageBackend, S3StorageBackend
+
+
+BUCKET = "nz-test"
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Incomplete(StorageBackend):
+        def join(self, path, *names):
+            return path
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert isinstance(LocalStorageBackend(), StorageBackend)
+
+
+@pytest.fixture(scope="module")
+def moto_endpoint():
+    pytest.importorskip("aiobotocore")
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(moto_endpoint, settings, monkeypatch):
+    """返回 run(coroutine_function)：在新的事件循环中用连接到moto的后端执行测试"""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    settings(
+        s3_multipart_threshold=6 * 1024 * 1024,
+        s3_multipart_chunk_size=5 * 1024 * 1024,
+        s3_metadata_cache_ttl=60
+    )
+    root = {"name": "team", "path": f"s3://{BUCKET}/lib", "endpoint_url": moto_endpoint, "region": "us-east-1"}
+
+    def run(test):
+        async def main():
+            backend = S3StorageBackend(root)
+            client = await backend._get_client()
+            try:
+                await client.create_bucket(Bucket=BUCKET)
+            except client.exceptions.BucketAlreadyOwnedByYou:
+                pass
+            try:
+                return await test(backend, client)
+            finally:
+                await backend._delete_keys((await backend._list_keys(backend.url))[1])
+                await backend.close()
+        return asyncio.run(main())
+
+    return run
+
+
+def test_multipart_upload(s3):
+    data = bytes(range(256)) * (11 * 1024 * 1024 // 256)
+
+    async def test(backend, client):
+        path = backend.join(backend.url, "big", "model.bin")
+        await backend.write_bytes(path, data)
+        head = await client.head_object(Bucket=BUCKET, Key="lib/big/model.bin")
+        # 分段上传的ETag以 -段数 结尾（11MiB按5MiB分为3段）
+        assert head["ETag"].strip('"').endswith("-3")
+        assert await backend.read_bytes(path) == data
+
+        await backend.write_bytes(path, b"small")
+        head = await client.head_object(Bucket=BUCKET, Key="lib/big/model.bin")
+        assert "-" not in head["ETag"]
+
+    s3(test)
+
+
+def test_listing_paginates_past_one_page(s3):
+    count = 1005
+
+    async def test(backend, client):
+        semaphore = asyncio.Semaphore(32)
+
+        async def put(index):
+            async with semaphore:
+                await client.put_object(Bucket=BUCKET, Key=f"lib/many/w{index:04d}.json", Body=b"{}")
+
+        await asyncio.gather(*[put(index) for index in range(count)])
+        await client.put_object(Bucket=BUCKET, Key="lib/many/sub/x.json", Body=b"{}")
+
+        folder = backend.join(backend.url, "many")
+        listing = await backend.list_directory(folder)
+        assert len(listing["files"]) == count
+        assert [d["name"] for d in listing["directories"]] == ["sub"]
+        assert listing["files"][0]["name"] == "w0000.json"
+
+        files = await backend.list_files(folder)
+        assert len(files) == count + 1
+        assert "sub/x.json" in files
+
+    s3(test)
+
+
+def test_metadata_cache_and_invalidation(s3, settings):
+    async def test(backend, client):
+        folder = backend.join(backend.url, "cache")
+        path = backend.join(folder, "a.json")
+        await backend.write_bytes(path, b'{"a": 1}')
+
+        assert (await backend.stat(path))["size"] == 8
+        assert [f["name"] for f in (await backend.list_directory(folder))["files"]] == ["a.json"]
+
+        # 绕过后端直接删除：缓存期间仍返回缓存的元数据和列表
+        await client.delete_object(Bucket=BUCKET, Key="lib/cache/a.json")
+        assert (await backend.stat(path))["size"] == 8
+        assert len((await backend.list_directory(folder))["files"]) == 1
+
+        # 通过后端写入会清除该路径和上级目录的缓存，同目录其他文件的元数据不受影响
+        other = backend.join(folder, "b.json")
+        await backend.write_bytes(other, b"{}")
+        assert [f["name"] for f in (await backend.list_directory(folder))["files"]] == ["b.json"]
+        assert (await backend.stat(path))["size"] == 8
+
+        await backend.write_bytes(path, b"{}")
+        assert (await backend.stat(path))["size"] == 2
+
+        await backend.delete(folder)
+        assert await backend.stat(other) is None
+
+    s3(test)
+
+
+def test_metadata_cache_expires(s3, settings):
+    settings(s3_metadata_cache_ttl=0.2)
+
+    async def test(backend, client):
+        path = backend.join(backend.url, "ttl.json")
+        await backend.write_bytes(path, b"{}")
+        assert await backend.stat(path) is not None
+        await client.delete_object(Bucket=BUCKET, Key="lib/ttl.json")
+        assert await backend.stat(path) is not None
+        await asyncio.sleep(0.3)
+        assert await backend.stat(path) is None
+
+    s3(test)
+
+
+def test_download_replaces_local_target_through_journal(s3, tmp_path):
+    from nz_workflow_manager.handlers.storage_operations import _transfer
+    from nz_workflow_manager.utils.storage_backend import get_local_backend
+    from nz_workflow_manager.utils.operation_journal import get_operation_journal
+
+    target = tmp_path / "pack"
+    target.mkdir()
+    (target / "old.json").write_text("{}", encoding="utf-8")
+
+    async def test(backend, client):
+        folder = backend.join(backend.url, "pack")
+        await backend.write_bytes(backend.join(folder, "a.json"), b'{"a": 1}')
+        await backend.write_bytes(backend.join(folder, "sub", "b.json"), b'{"b": 2}')
+        await _transfer(backend, folder, get_local_backend(), str(target))
+
+    s3(test)
+    # 已存在的目录被整体替换（旧目录移入回收站），暂存目录不残留
+    assert sorted(p.name for p in target.iterdir()) == ["a.json", "sub"]
+    assert (target / "sub" / "b.json").read_bytes() == b'{"b": 2}'
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".pack")] == []
+
+    get_operation_journal().undo()
+    assert [p.name for p in target.iterdir()] == ["old.json"]
@@ -0,0 +1,50 @@
+"""
+工作流存储格式测试：压缩存储模式把 a.json 保存为 a.json.gz 后，按原路径仍能找到文件，
+并通知移动监听器把旧路径的数据迁移到新路径
+"""
+
+import json
+import asyncio
+
+from nz_workflow_manager.utils import path_resolver
+from nz_workflow_manager.utils.workflow_format import locate_workflow_file, read_workflow_text
+
+
+def test_compressed_save_keeps_original_path_usable(settings, tmp_path, monkeypatch):
+    from nz_workflow_manager.handlers.file_operations import (
+        _handle_load_workflow_http, _handle_save_workflow_http
+    )
+
+    settings(storage_mode='gzip')
+    path = tmp_path / "a.json"
+    path.write_text('{"nodes": []}', encoding="utf-8")
+
+    moves = []
+    monkeypatch.setattr(path_resolver, '_move_listeners', [lambda source, target: moves.append((source, target))])
+
+    response = asyncio.run(_handle_save_workflow_http({
+        'file_path': str(path),
+        'workflow_data': '{"nodes": [1]}'
+    }))
+    result = json.loads(response.body)
+    storage_path = str(tmp_path / "a.json.gz")
+
+    assert result['success'] and result['file_path'] == storage_path
+    assert not path.exists()
+    assert moves == [(str(path), storage_path)]
+    assert locate_workflow_file(str(path)) == storage_path
+    assert read_workflow_text(storage_path) == '{"nodes":[1]}'
+
+    # 客户端仍用旧路径加载时回退到实际保存的文件
+    loaded = json.loads(asyncio.run(_handle_load_workflow_http(str(path))).body)
+    assert loaded['path'] == storage_path
+
+    # 再次保存不再产生移动通知
+    asyncio.run(_handle_save_workflow_http({'file_path': storage_path, 'workflow_data': '{"nodes": [2]}'}))
+    assert len(moves) == 1
+
+
+def test_locate_workflow_file_missing(settings, tmp_path):
+    settings()
+    assert locate_workflow_file(str(tmp_path / "missing.json")) is None
+    assert locate_workflow_file(str(tmp_path / "notes.txt")) is None
@@ -0,0 +1,36 @@
+"""
+压缩包导入测试：整体替换通过操作日志执行（旧目录移入回收站，可撤销），暂存目录按目标命名
+"""
+
+import zipfile
+
+from nz_workflow_manager.utils.operation_journal import get_operation_journal
+from nz_workflow_manager.utils.zip_transfer import import_zip, get_import_staging_path
+
+
+def test_replace_import_is_journaled(settings, tmp_path):
+    settings()
+    zip_path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr("pack/a.json", '{"a": 1}')
+        archive.writestr("pack/sub/b.json", '{"b": 2}')
+
+    target = tmp_path / "root" / "pack"
+    target.mkdir(parents=True)
+    (target / "old.json").write_text("{}", encoding="utf-8")
+
+    # 上次中断留下的暂存目录被清理，不会混入本次导入
+    staging = get_import_staging_path(str(target))
+    (tmp_path / "root" / ".pack.nzimport").mkdir()
+    (tmp_path / "root" / ".pack.nzimport" / "stale.json").write_text("{}", encoding="utf-8")
+    assert staging == str(tmp_path / "root" / ".pack.nzimport")
+
+    stats = import_zip(str(zip_path), str(target))
+    assert stats["files"] == 2
+    assert sorted(p.name for p in target.iterdir()) == ["a.json", "sub"]
+    assert not (tmp_path / "root" / ".pack.nzimport").exists()
+
+    journal = get_operation_journal()
+    assert journal.peek('undo')['action'] == 'import_zip'
+    journal.undo()
+    assert [p.name for p in target.iterdir()] == ["old.json"]
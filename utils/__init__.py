@@ -3,10 +3,12 @@ NZ工作流助手 - 工具模块
 包含文件验证、路径处理等工具函数
 """
 
-from .validation import validate_path, validate_filename, sanitize_filename
+from .validation import validate_path, validate_filename, sanitize_filename, parse_entity_tags
 from .file_utils import get_file_info, get_directory_listing, ensure_directory_exists
+from .path_resolver import PathResolver, PathAccessError, get_path_resolver, resolve_path, invalidate_path
 
 __all__ = [
-    'validate_path', 'validate_filename', 'sanitize_filename',
-    'get_file_info', 'get_directory_listing', 'ensure_directory_exists'
+    'validate_path', 'validate_filename', 'sanitize_filename', 'parse_entity_tags',
+    'get_file_info', 'get_directory_listing', 'ensure_directory_exists',
+    'PathResolver', 'PathAccessError', 'get_path_resolver', 'resolve_path', 'invalidate_path'
 ]
@@ -0,0 +1,728 @@
+"""
+NZ工作流助手 - 前端打包模块
+把 web/ 下的ES模块打包为压缩、带内容哈希的文件：入口及其静态依赖合并为一个主包，
+动态 import() 的模块拆分为按需加载的chunk。产物写入 dist/，ComfyUI 只加载 dist/web 中的引导文件，
+哈希文件由 /nz_assets 以不可变缓存提供。
+
+打包是单独的构建步骤，服务器启动时只检查产物，不会打包。本模块不依赖插件的其他模块，可以直接运行：
+    python utils/asset_pipeline.py            # 打包（也可以运行 python <插件目录> build-assets）
+    python utils/asset_pipeline.py --check    # 只检查产物是否比源码新
+"""
+
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import shutil
+import hashlib
+import posixpath
+import subprocess
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(PLUGIN_DIR, 'web')
+DIST_DIR = os.path.join(PLUGIN_DIR, 'dist')
+ASSETS_DIR = os.path.join(DIST_DIR, 'assets')
+LOADER_DIR = os.path.join(DIST_DIR, 'web')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+
+# 与 core/constants.py 中 HTTP_ENDPOINTS['hashed_assets'] 保持一致
+ASSETS_URL = '/nz_assets'
+
+# ComfyUI 加载扩展脚本的URL（用于解析 ../../scripts/app.js 这类指向ComfyUI自身的导入）
+EXTENSION_URL = '/extensions/plugin'
+
+ENTRY = 'extension.js'
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+
+# 浏览器中共享的模块表（主包和chunk通过它互相引用导出）
+REGISTRY = 'globalThis.__nzModules'
+
+
+# 校验产物语法时每个文件的超时时间（秒）
+NODE_CHECK_TIMEOUT = 30
+
+
+class BuildError(Exception):
+    """源码中有打包器不支持的写法"""
+
+
+# ====== 词法分析 ======
+
+_LINE_TERMINATORS = '\n\r\u2028\u2029'
+_GAP_RE = re.compile(r'(?:[ \t\f\v\r\n\u00a0\ufeff\u2028\u2029]+|//[^\n\r\u2028\u2029]*|/\*.*?\*/)+', re.S)
+_NAME_RE = re.compile(r'(?:[A-Za-z_$\\]|[^\x00-\x7f\u00a0\u2028\u2029\ufeff])(?:[0-9A-Za-z_$\\]|[^\x00-\x7f\u00a0\u2028\u2029\ufeff])*')
+_NUMBER_RE = re.compile(r'(?:0[xXoObB][0-9a-fA-F_]+|(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?)n?')
+_STRING_RE = re.compile(r'"(?:[^"\\\n\r]|\\[\s\S])*"|\'(?:[^\'\\\n\r]|\\[\s\S])*\'')
+_TEMPLATE_RE = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*(`|\$\{)')
+_REGEX_RE = re.compile(r'/(?:[^/\\\[\n\r]|\\.|\[(?:[^\]\\\n\r]|\\.)*\])+/[A-Za-z]*')
+_PUNCTUATORS = sorted([
+    '>>>=', '...', '===', '!==', '**=', '<<=', '>>=', '>>>', '&&=', '||=', '??=',
+    '=>', '==', '!=', '<=', '>=', '&&', '||', '??', '++', '--', '+=', '-=', '*=', '/=', '%=',
+    '&=', '|=', '^=', '**', '<<', '>>',
+    '{', '}', '(', ')', '[', ']', ';', ',', '<', '>', '+', '-', '*', '/', '%', '&', '|', '^',
+    '!', '~', '?', '=', ':', '.', '#', '@'
+], key=len, reverse=True)
+_PUNCT_RE = re.compile(r'\?\.(?!\d)|' + '|'.join(re.escape(p) for p in _PUNCTUATORS))
+
+# 这些关键字之后的 / 是正则表达式而不是除号
+_KEYWORDS_BEFORE_EXPRESSION = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw',
+    'case', 'do', 'else', 'yield', 'await'
+}
+
+# 受限产生式：这些关键字后的换行会插入分号，不能删除
+_RESTRICTED = {'return', 'break', 'continue', 'throw', 'yield', 'async', 'let'}
+
+
+class Token:
+    __slots__ = ('kind', 'value', 'newline')
+
+    def __init__(self, kind, value, newline):
+        self.kind = kind
+        self.value = value
+        self.newline = newline
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def _regex_allowed(previous):
+    if previous is None:
+        return True
+    if previous.kind == 'punct':
+        # 块结束后的 / 按正则处理（对象字面量后直接做除法的写法极少见）
+        return previous.value not in (')', ']', '++', '--')
+    if previous.kind == 'name':
+        return previous.value in _KEYWORDS_BEFORE_EXPRESSION
+    return previous.kind in ('template_head', 'template_middle')
+
+
+def tokenize(source, name='<source>'):
+    """把JavaScript源码切分为Token列表（注释和空白不保留，只记录其中是否有换行）"""
+    tokens = []
+    braces = []  # 模板字符串 ${ 与普通 { 的嵌套栈
+    pos = 0
+    length = len(source)
+    previous = None
+
+    while True:
+        newline = False
+        gap = _GAP_RE.match(source, pos)
+        if gap:
+            text = gap.group()
+            newline = any(c in text for c in _LINE_TERMINATORS)
+            pos = gap.end()
+        if pos >= length:
+            break
+
+        char = source[pos]
+        if char == '`' or (char == '}' and braces and braces[-1] == 'template'):
+            start = pos
+            match = _TEMPLATE_RE.match(source, pos + 1)
+            if not match:
+                raise BuildError(f"{name}: 未闭合的模板字符串 (偏移 {start})")
+            pos = match.end()
+            opening = char == '`'
+            if char == '}':
+                braces.pop()
+            if match.group(1) == '${':
+                braces.append('template')
+                kind = 'template_head' if opening else 'template_middle'
+            else:
+                kind = 'template' if opening else 'template_tail'
+            token = Token(kind, source[start:pos], newline)
+        elif char in '"\'':
+            match = _STRING_RE.match(source, pos)
+            if not match:
+                raise BuildError(f"{name}: 未闭合的字符串 (偏移 {pos})")
+            token = Token('string', match.group(), newline)
+            pos = match.end()
+        elif char == '/' and _regex_allowed(previous):
+            match = _REGEX_RE.match(source, pos)
+            if not match:
+                raise BuildError(f"{name}: 无法识别的正则表达式 (偏移 {pos})")
+            token = Token('regex', match.group(), newline)
+            pos = match.end()
+        else:
+            match = _NUMBER_RE.match(source, pos) if char.isdigit() or char == '.' else None
+            if match and match.end() > pos and (char != '.' or match.end() > pos + 1):
+                kind = 'number'
+            else:
+                match = _NAME_RE.match(source, pos)
+                kind = 'name'
+                if not match:
+                    match = _PUNCT_RE.match(source, pos)
+                    kind = 'punct'
+                if not match:
+                    raise BuildError(f"{name}: 无法识别的字符 {char!r} (偏移 {pos})")
+            token = Token(kind, match.group(), newline)
+            pos = match.end()
+            if kind == 'punct':
+                if token.value == '{':
+                    braces.append('{')
+                elif token.value == '}' and braces:
+                    braces.pop()
+
+        tokens.append(token)
+        previous = token
+
+    return tokens
+
+
+# ====== 压缩 ======
+
+_WORD_CHAR_RE = re.compile(r'[0-9A-Za-z_$\\]|[^\x00-\x7f]')
+
+# 前一个token属于这些类型、后一个token属于下面的类型时，换行可能触发自动插入分号，必须保留
+_ENDS_STATEMENT = {'name', 'number', 'string', 'template', 'template_tail', 'regex'}
+_ENDS_STATEMENT_PUNCT = {')', ']', '}', '++', '--'}
+_STARTS_STATEMENT = {'name', 'number', 'string', 'template', 'template_head', 'regex'}
+_STARTS_STATEMENT_PUNCT = {'{', '++', '--', '!', '~', '#', '@'}
+
+
+def _keep_newline(previous, token):
+    if previous.kind == 'name' and previous.value in _RESTRICTED:
+        return True
+    ends = previous.kind in _ENDS_STATEMENT or (previous.kind == 'punct' and previous.value in _ENDS_STATEMENT_PUNCT)
+    starts = token.kind in _STARTS_STATEMENT or (token.kind == 'punct' and token.value in _STARTS_STATEMENT_PUNCT)
+    return ends and starts
+
+
+def _separator(previous, token):
+    if token.newline and _keep_newline(previous, token):
+        return '\n'
+    left, right = previous.value[-1], token.value[0]
+    if _WORD_CHAR_RE.match(left) and _WORD_CHAR_RE.match(right):
+        return ' '
+    if previous.kind == 'number' and right == '.':
+        return ' '
+    if left == right and left in '+-/':
+        return ' '
+    return ''
+
+
+def minify_tokens(tokens):
+    """删除注释、缩进和不影响语义的换行（不重命名变量，保证与源码行为一致）"""
+    parts = []
+    previous = None
+    for token in tokens:
+        if previous is not None:
+            parts.append(_separator(previous, token))
+        parts.append(token.value)
+        previous = token
+    return ''.join(parts)
+
+
+def _verify_minified(tokens, minified, name):
+    """重新切分压缩结果，token序列必须与输入完全一致"""
+    again = tokenize(minified, name)
+    if len(again) != len(tokens) or any(a.value != b.value for a, b in zip(again, tokens)):
+        for index, (a, b) in enumerate(zip(again, tokens)):
+            if a.value != b.value:
+                raise BuildError(f"{name}: 压缩结果校验失败（第{index}个token: {b.value!r} -> {a.value!r}）")
+        raise BuildError(f"{name}: 压缩结果校验失败（token数量不一致）")
+
+
+# ====== 模块解析 ======
+
+class Module:
+    """一个源码模块：静态导入、导出和动态导入的位置"""
+
+    def __init__(self, module_id, tokens):
+        self.id = module_id
+        self.tokens = tokens
+        self.imports = []          # [(specifier, [(imported, local)], namespace_local)]
+        self.exports = {}          # exported -> local
+        self.dynamic_imports = []  # [(token_index, specifier)]
+
+
+def _module_url(module_id):
+    return posixpath.join(EXTENSION_URL, module_id)
+
+
+def _resolve(module_id, specifier):
+    """把导入路径解析为模块id（插件内）或以 / 开头的绝对URL（ComfyUI自身的模块）"""
+    if not specifier.startswith(('./', '../', '/')):
+        raise BuildError(f"{module_id}: 不支持的导入路径 {specifier}")
+    url = posixpath.normpath(posixpath.join(posixpath.dirname(_module_url(module_id)), specifier))
+    prefix = EXTENSION_URL + '/'
+    return url[len(prefix):] if url.startswith(prefix) else url
+
+
+def _string_value(token):
+    if token.kind != 'string':
+        raise BuildError(f"导入路径必须是字符串字面量: {token.value}")
+    return token.value[1:-1]
+
+
+def _parse_specifiers(tokens, index, module_id):
+    """解析 { a, b as c }，返回 ([(a, a), (b, c)], 结束位置)"""
+    pairs = []
+    index += 1
+    while tokens[index].value != '}':
+        imported = tokens[index].value
+        local = imported
+        index += 1
+        if tokens[index].value == 'as':
+            local = tokens[index + 1].value
+            index += 2
+        pairs.append((imported, local))
+        if tokens[index].value == ',':
+            index += 1
+        elif tokens[index].value != '}':
+            raise BuildError(f"{module_id}: 无法解析的导入/导出列表")
+    return pairs, index + 1
+
+
+def _statement_end(tokens, index):
+    """语句结束位置（可选的分号之后）"""
+    if index < len(tokens) and tokens[index].value == ';':
+        return index + 1
+    return index
+
+
+def parse_module(module_id, source):
+    """提取顶层的 import/export 语句（从token中删除），记录动态import()的位置"""
+    tokens = tokenize(source, module_id)
+    module = Module(module_id, None)
+    output = []
+    depth = 0
+    index = 0
+
+    while index < len(tokens):
+        token = tokens[index]
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+        if token.kind == 'punct' and token.value in '{([':
+            depth += 1
+        elif token.kind == 'punct' and token.value in '})]':
+            depth -= 1
+        elif token.kind == 'template_head':
+            depth += 1
+        elif token.kind == 'template_tail':
+            depth -= 1
+
+        if token.kind == 'name' and token.value == 'import' and following is not None:
+            if following.value == '(':
+                module.dynamic_imports.append((len(output) + 2, _string_value(tokens[index + 2])))
+                output.append(token)
+                index += 1
+                continue
+            if following.value != '.' and depth == 0:
+                index = _parse_import(module, tokens, index + 1)
+                continue
+
+        if token.kind == 'name' and token.value == 'export' and depth == 0:
+            index = _parse_export(module, tokens, index + 1, output)
+            continue
+
+        output.append(token)
+        index += 1
+
+    module.tokens = output
+    return module
+
+
+def _parse_import(module, tokens, index):
+    names = []
+    namespace = None
+    if tokens[index].kind == 'string':
+        module.imports.append((_string_value(tokens[index]), names, namespace))
+        return _statement_end(tokens, index + 1)
+
+    while tokens[index].value != 'from':
+        token = tokens[index]
+        if token.value == '{':
+            pairs, index = _parse_specifiers(tokens, index, module.id)
+            names.extend(pairs)
+            continue
+        if token.value == '*':
+            namespace = tokens[index + 2].value
+            index += 3
+        elif token.kind == 'name':
+            names.append(('default', token.value))
+            index += 1
+        elif token.value == ',':
+            index += 1
+        else:
+            raise BuildError(f"{module.id}: 无法解析的import语句")
+
+    module.imports.append((_string_value(tokens[index + 1]), names, namespace))
+    return _statement_end(tokens, index + 2)
+
+
+def _parse_export(module, tokens, index, output):
+    token = tokens[index]
+    following = tokens[index + 1]
+
+    if token.value == '{':
+        pairs, index = _parse_specifiers(tokens, index, module.id)
+        if index < len(tokens) and tokens[index].value == 'from':
+            raise BuildError(f"{module.id}: 不支持 export ... from")
+        for local, exported in pairs:
+            module.exports[exported] = local
+        return _statement_end(tokens, index)
+
+    if token.value == 'default':
+        if following.value in ('class', 'function') and tokens[index + 2].kind == 'name':
+            module.exports['default'] = tokens[index + 2].value
+            return index + 1
+        if following.value == 'async' and tokens[index + 2].value == 'function' and tokens[index + 3].kind == 'name':
+            module.exports['default'] = tokens[index + 3].value
+            return index + 1
+        # export default 表达式 -> const __nz_default = 表达式
+        module.exports['default'] = '__nz_default'
+        output.append(Token('name', 'const', token.newline))
+        output.append(Token('name', '__nz_default', False))
+        output.append(Token('punct', '=', False))
+        return index + 1
+
+    if token.value in ('class', 'function'):
+        name = following.value if following.value != '*' else tokens[index + 2].value
+        module.exports[name] = name
+        return index
+    if token.value == 'async' and following.value == 'function':
+        module.exports[tokens[index + 2].value] = tokens[index + 2].value
+        return index
+    if token.value in ('const', 'let', 'var'):
+        if following.kind != 'name':
+            raise BuildError(f"{module.id}: 不支持解构形式的导出")
+        if tokens[index + 2].value not in ('=', ';'):
+            raise BuildError(f"{module.id}: 一条export语句只能声明一个变量")
+        module.exports[following.value] = following.value
+        return index
+
+    raise BuildError(f"{module.id}: 不支持的export语句 export {token.value}")
+
+
+# ====== 打包 ======
+
+def _read_source(module_id):
+    with open(os.path.join(SOURCE_DIR, *module_id.split('/')), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _load_graph(entry):
+    """从入口解析所有插件内模块（静态和动态导入）"""
+    modules = {}
+    pending = [entry]
+    while pending:
+        module_id = pending.pop()
+        if module_id in modules:
+            continue
+        module = parse_module(module_id, _read_source(module_id))
+        modules[module_id] = module
+        for specifier, _, _ in module.imports:
+            target = _resolve(module_id, specifier)
+            if not target.startswith('/'):
+                pending.append(target)
+        for _, specifier in module.dynamic_imports:
+            target = _resolve(module_id, specifier)
+            if target.startswith('/'):
+                raise BuildError(f"{module_id}: 不支持动态导入插件外的模块 {specifier}")
+            pending.append(target)
+    return modules
+
+
+def _static_order(modules, root, exclude=()):
+    """root的静态依赖闭包，按依赖在前的顺序排列（不包含exclude中已加载的模块）"""
+    order = []
+    state = {}
+
+    def visit(module_id, chain):
+        if module_id in exclude or state.get(module_id) == 'done':
+            return
+        if state.get(module_id) == 'visiting':
+            raise BuildError("不支持循环导入: " + ' -> '.join(chain + [module_id]))
+        state[module_id] = 'visiting'
+        for specifier, _, _ in modules[module_id].imports:
+            target = _resolve(module_id, specifier)
+            if not target.startswith('/'):
+                visit(target, chain + [module_id])
+        state[module_id] = 'done'
+        order.append(module_id)
+
+    visit(root, [])
+    return order
+
+
+def _js_string(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _check_imported_names(modules, module, target, names):
+    if target.startswith('/'):
+        return
+    exports = modules[target].exports
+    for imported, _ in names:
+        if imported not in exports:
+            raise BuildError(f"{module.id}: {target} 没有导出 {imported}")
+
+
+def _render_module(modules, module, externals, chunk_files, bundled):
+    """把一个模块包装为在模块表中注册导出的函数"""
+    lines = []
+    for specifier, names, namespace in module.imports:
+        target = _resolve(module.id, specifier)
+        _check_imported_names(modules, module, target, names)
+        if target.startswith('/'):
+            source = externals.setdefault(target, f"__nz_ext{len(externals)}")
+        else:
+            source = f"__nz[{_js_string(target)}]"
+        if namespace:
+            lines.append(f"const {namespace}={source};")
+        if names:
+            lines.append("const{" + ','.join(f"{imported}:{local}" for imported, local in names) + "}=" + source + ";")
+
+    tokens = list(module.tokens)
+    # 从后往前替换，位置不受影响
+    for position, specifier in reversed(module.dynamic_imports):
+        target = _resolve(module.id, specifier)
+        if target in bundled:
+            # 已在当前文件中：import('./x.js') -> Promise.resolve(__nz["x.js"])
+            tokens[position - 2:position + 2] = [
+                Token('name', 'Promise', tokens[position - 2].newline), Token('punct', '.', False),
+                Token('name', 'resolve', False), Token('punct', '(', False),
+                Token('name', '__nz', False), Token('punct', '[', False),
+                Token('string', _js_string(target), False), Token('punct', ']', False),
+                Token('punct', ')', False)
+            ]
+        else:
+            tokens[position] = Token('string', _js_string('./' + chunk_files[target]), tokens[position].newline)
+
+    body = minify_tokens(tokens)
+    _verify_minified(tokens, body, module.id)
+    exports = ','.join(f"{_js_string(exported)}:{local}" for exported, local in module.exports.items())
+    key = _js_string(module.id)
+    lines.append(body)
+    return f"__nz[{key}]=__nz[{key}]||(()=>{{" + '\n'.join(lines) + f"\nreturn{{{exports}}};}})();"
+
+
+def _render_file(modules, order, chunk_files, root_exports=None):
+    """生成一个输出文件：外部导入、模块表、按依赖顺序注册的模块"""
+    externals = {}
+    bundled = set(order)
+    rendered = [_render_module(modules, modules[module_id], externals, chunk_files, bundled) for module_id in order]
+
+    header = []
+    for url, alias in externals.items():
+        relative = posixpath.relpath(url, ASSETS_URL)
+        header.append(f"import*as {alias} from{_js_string(relative)};")
+    header.append(f"const __nz={REGISTRY}||({REGISTRY}={{}});")
+
+    footer = []
+    if root_exports is not None:
+        # chunk：把根模块的导出作为ES模块导出，供 import() 使用
+        root_id, exports = root_exports
+        footer.append(f"const __nzRoot=__nz[{_js_string(root_id)}];")
+        for exported in exports:
+            if exported == 'default':
+                footer.append("export default __nzRoot.default;")
+            else:
+                footer.append(f"export const {exported}=__nzRoot.{exported};")
+
+    return '\n'.join(header + rendered + footer) + '\n'
+
+
+def _hashed_name(module_id, content):
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+    base = posixpath.splitext(posixpath.basename(module_id))[0]
+    return f"{base}.{digest}.js"
+
+
+def newest_source_mtime():
+    """web目录中所有文件及打包器自身最新的修改时间，用于判断产物是否过期（只读取文件状态）"""
+    newest = os.stat(os.path.abspath(__file__)).st_mtime
+    for root, dirs, files in os.walk(SOURCE_DIR):
+        newest = max([newest, os.stat(root).st_mtime] + [os.stat(os.path.join(root, name)).st_mtime for name in files])
+    return newest
+
+
+def check_syntax(outputs):
+    """
+    用Node.js单独解析每个产物（与打包器的词法分析无关的第二次校验），
+    返回使用的校验方式；未安装Node.js时返回None
+    """
+    node = shutil.which('node')
+    if node is None:
+        return None
+    for filename, (content, _) in outputs.items():
+        try:
+            result = subprocess.run(
+                [node, '--input-type=module', '--check'], input=content.encode('utf-8'),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=NODE_CHECK_TIMEOUT
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise BuildError(f"{filename}: 无法用Node.js校验语法: {e}")
+        if result.returncode != 0:
+            message = result.stderr.decode('utf-8', 'replace').strip()
+            raise BuildError(f"{filename}: 产物语法校验失败\n{message}")
+    return 'node'
+
+
+def _write_file(path, content):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _source_size(module_ids):
+    return sum(os.path.getsize(os.path.join(SOURCE_DIR, *module_id.split('/'))) for module_id in module_ids)
+
+
+def build():
+    """打包web目录并校验产物语法，返回manifest"""
+    # 记录开始时间：打包过程中修改的源码比产物新，下次检查时视为过期
+    started_at = time.time()
+    modules = _load_graph(ENTRY)
+    main_order = _static_order(modules, ENTRY)
+
+    # chunk：动态导入的模块及其尚未在主包中的静态依赖（chunk之间的依赖先生成，文件名才能确定）
+    chunk_roots = []
+    for module_id in main_order + sorted(set(modules) - set(main_order)):
+        for _, specifier in modules[module_id].dynamic_imports:
+            target = _resolve(module_id, specifier)
+            if target not in main_order and target not in chunk_roots:
+                chunk_roots.append(target)
+
+    outputs = {}
+    chunk_files = {}
+    remaining = list(chunk_roots)
+    while remaining:
+        progressed = False
+        for root in list(remaining):
+            order = _static_order(modules, root, exclude=set(main_order))
+            needed = {
+                _resolve(module_id, specifier)
+                for module_id in order for _, specifier in modules[module_id].dynamic_imports
+            } - set(main_order) - set(order)
+            if not needed.issubset(chunk_files):
+                continue
+            content = _render_file(modules, order, chunk_files, (root, list(modules[root].exports)))
+            chunk_files[root] = _hashed_name(root, content)
+            outputs[chunk_files[root]] = (content, order)
+            remaining.remove(root)
+            progressed = True
+        if not progressed:
+            raise BuildError("chunk之间存在循环的动态导入: " + ', '.join(remaining))
+
+    content = _render_file(modules, main_order, chunk_files)
+    entry_file = _hashed_name(ENTRY, content)
+    outputs[entry_file] = (content, main_order)
+    verified_with = check_syntax(outputs)
+
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    os.makedirs(LOADER_DIR, exist_ok=True)
+    assets = {}
+    for filename, (content, order) in outputs.items():
+        raw = content.encode('utf-8')
+        compressed = gzip.compress(raw, compresslevel=9, mtime=0)
+        _write_file(os.path.join(ASSETS_DIR, filename), raw)
+        _write_file(os.path.join(ASSETS_DIR, filename + '.gz'), compressed)
+        assets[filename] = {
+            "size": len(raw),
+            "gzip_size": len(compressed),
+            "source_size": _source_size(order),
+            "modules": order
+        }
+
+    # 非JS资源（图片、样式）原样复制，保持 /extensions/ 下的URL可用
+    for root, dirs, files in os.walk(SOURCE_DIR):
+        for name in files:
+            if name.endswith('.js'):
+                continue
+            source = os.path.join(root, name)
+            target = os.path.join(LOADER_DIR, os.path.relpath(source, SOURCE_DIR))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+
+    loader = (
+        "// 由 utils/asset_pipeline.py 生成，请勿修改：加载打包后的前端\n"
+        f"import {_js_string('../..' + ASSETS_URL + '/' + entry_file)};\n"
+    )
+    _write_file(os.path.join(LOADER_DIR, ENTRY), loader.encode('utf-8'))
+
+    previous = read_manifest()
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "entry": entry_file,
+        "chunks": {module_id: filename for module_id, filename in chunk_files.items()},
+        "assets": assets,
+        "verified_with": verified_with,
+        "built_at": started_at
+    }
+    _write_file(MANIFEST_FILE, json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    _remove_old_assets(manifest, previous)
+    return manifest
+
+
+def _remove_old_assets(manifest, previous):
+    """删除不再使用的哈希文件（保留上一次打包的文件，已打开的页面仍可按需加载旧chunk）"""
+    keep = set(manifest['assets'])
+    if previous:
+        keep.update(previous.get('assets', {}))
+    for name in os.listdir(ASSETS_DIR):
+        if name.endswith('.gz'):
+            name = name[:-3]
+        if name not in keep:
+            for path in (os.path.join(ASSETS_DIR, name), os.path.join(ASSETS_DIR, name + '.gz')):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def check_build():
+    """检查打包产物（文件齐全且比所有源码新），返回 (是否可用, 原因)"""
+    manifest = read_manifest()
+    if manifest is None:
+        return False, "尚未打包"
+    if not os.path.isfile(os.path.join(LOADER_DIR, ENTRY)):
+        return False, "引导文件不存在"
+    missing = [name for name in manifest['assets'] if not os.path.isfile(os.path.join(ASSETS_DIR, name))]
+    if missing:
+        return False, "打包文件缺失: " + ', '.join(missing)
+    if newest_source_mtime() > manifest.get('built_at', 0):
+        return False, "源码比打包产物新"
+    return True, manifest['entry']
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="打包NZ工作流助手的前端")
+    parser.add_argument('--check', action='store_true', help="只检查产物是否比源码新")
+    args = parser.parse_args()
+
+    if args.check:
+        ok, reason = check_build()
+        print(("打包产物有效: " if ok else "需要重新打包: ") + reason)
+        return 0 if ok else 1
+
+    start = time.perf_counter()
+    try:
+        manifest = build()
+    except BuildError as e:
+        print(f"打包失败: {e}", file=sys.stderr)
+        return 1
+    for name, info in manifest['assets'].items():
+        print(f"{name:<40} {info['source_size'] / 1024:>8.1f} KiB -> {info['size'] / 1024:>7.1f} KiB"
+              f" (gzip {info['gzip_size'] / 1024:.1f} KiB, {len(info['modules'])}个模块)")
+    if manifest['verified_with'] is None:
+        print("未安装Node.js，跳过产物语法校验", file=sys.stderr)
+    print(f"完成，用时 {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+NZ工作流助手 - 复制引擎模块
+提供多线程并行的目录复制，优先使用内核态复制（reflink / copy_file_range / sendfile），
+目标先写入暂存目录再整体替换，中断后可以断点续传
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from ..core.constants import TRASH_DIR_NAME
+from .lock_manager import LEGACY_LOCK_FILE_NAME
+
+
+# 获取logger实例
+logger = get_logger()
+
+# Linux FICLONE ioctl（btrfs / xfs / bcachefs 等支持写时复制的文件系统）
+FICLONE = 0x40049409
+
+# 每次copy_file_range调用的最大字节数
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 暂存目录与临时文件的后缀（以点开头，目录列表中默认隐藏）
+STAGING_SUFFIX = '.nzcopy'
+PARTIAL_SUFFIX = '.nzpart'
+BACKUP_SUFFIX = '.nzold'
+
+# 插件自己在目录中创建的条目（回收站和旧版本留下的跨进程锁文件），复制时跳过
+PLUGIN_ENTRY_NAMES = {TRASH_DIR_NAME, LEGACY_LOCK_FILE_NAME}
+
+# 记录不支持某种加速方式的设备，避免每个文件都重复尝试
+_unsupported = {'reflink': set(), 'copy_file_range': set()}
+_unsupported_lock = threading.Lock()
+
+
+def _mark_unsupported(method, device):
+    with _unsupported_lock:
+        _unsupported[method].add(device)
+
+
+def _is_unsupported(method, device):
+    return device in _unsupported[method]
+
+
+def _try_reflink(src_fd, dst_fd, device):
+    """尝试写时复制克隆，成功返回True"""
+    if not sys.platform.startswith('linux') or _is_unsupported('reflink', device):
+        return False
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        _mark_unsupported('reflink', device)
+        return False
+
+
+def _try_copy_file_range(src_fd, dst_fd, size, device):
+    """尝试使用copy_file_range在内核中复制，成功返回True"""
+    if not hasattr(os, 'copy_file_range') or _is_unsupported('copy_file_range', device):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            count = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, size - copied))
+            if count == 0:
+                break
+            copied += count
+        return copied == size
+    except OSError:
+        _mark_unsupported('copy_file_range', device)
+        # 回退前清空已写入的部分
+        os.ftruncate(dst_fd, 0)
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        return False
+
+
+def _copy_file_data(src, dst):
+    """复制文件内容：reflink -> copy_file_range -> shutil.copyfile（内部使用sendfile/fcopyfile等）"""
+    st = os.stat(src)
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        device = (st.st_dev, os.fstat(dst_fd).st_dev)
+        if device[0] == device[1] and _try_reflink(src_fd, dst_fd, device):
+            return 'reflink'
+        if _try_copy_file_range(src_fd, dst_fd, st.st_size, device):
+            return 'copy_file_range'
+    shutil.copyfile(src, dst)
+    return 'copyfile'
+
+
+def copy_file_fast(src, dst):
+    """复制单个文件：先写入同目录下的临时文件，完成后原子替换目标"""
+    partial_path = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}{PARTIAL_SUFFIX}")
+    try:
+        method = _copy_file_data(src, partial_path)
+        shutil.copystat(src, partial_path)
+        os.replace(partial_path, dst)
+        return method
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+
+def _is_copied(src_stat, dst):
+    """判断暂存目录中的文件是否已经完整复制（用于断点续传）"""
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def _is_plugin_entry(name):
+    """判断是否为插件自己的条目（回收站、锁文件、复制暂存目录和临时文件）"""
+    if name in PLUGIN_ENTRY_NAMES:
+        return True
+    return name.startswith('.') and any(suffix in name for suffix in (STAGING_SUFFIX, PARTIAL_SUFFIX, BACKUP_SUFFIX))
+
+
+def _remove_entry(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _entry_kind(path):
+    if os.path.islink(path):
+        return 'link'
+    return 'dir' if os.path.isdir(path) else 'file'
+
+
+def _prune_staging(staging_dir, expected):
+    """续传时删除暂存目录中源目录已经没有（或类型已改变）的条目，expected为 {名称: 类型}"""
+    for name in os.listdir(staging_dir):
+        path = os.path.join(staging_dir, name)
+        if expected.get(name) != _entry_kind(path):
+            _remove_entry(path)
+
+
+def copy_symlink(src, dst):
+    """按链接本身复制符号链接（不跟随），目标已是相同的链接时跳过"""
+    link_target = os.readlink(src)
+    if os.path.lexists(dst):
+        if os.path.islink(dst) and os.readlink(dst) == link_target:
+            return
+        _remove_entry(dst)
+    os.symlink(link_target, dst, target_is_directory=os.path.isdir(src))
+
+
+def get_staging_path(source_path, target_path):
+    """获取复制目标对应的暂存目录（同一源和目标固定不变，便于续传）"""
+    digest = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:8]
+    name = os.path.basename(target_path)
+    return os.path.join(os.path.dirname(target_path), f".{name}{STAGING_SUFFIX}-{digest}")
+
+
+def swap_into_place(staging_path, target_path, discard=None):
+    """把暂存目录替换到目标位置；已存在的目标先改名备份，替换完成后再交给discard处理"""
+    if not os.path.lexists(target_path):
+        os.rename(staging_path, target_path)
+        return
+
+    backup_path = os.path.join(
+        os.path.dirname(target_path),
+        f".{os.path.basename(target_path)}{BACKUP_SUFFIX}-{os.getpid()}-{threading.get_ident()}"
+    )
+    os.rename(target_path, backup_path)
+    try:
+        os.rename(staging_path, target_path)
+    except Exception:
+        # 替换失败时还原原目标
+        os.rename(backup_path, target_path)
+        raise
+
+    if discard is not None:
+        discard(backup_path)
+    else:
+        shutil.rmtree(backup_path, ignore_errors=True)
+
+
+def copy_tree(source_path, target_path, max_workers=None, discard=None):
+    """
+    并行复制目录树
+
+    目标先写入暂存目录，全部完成后整体替换到target_path，所以任何时候都不会留下
+    半删除或半复制的目标。中断后再次复制同一源和目标时，已完成的文件会被跳过，
+    源目录中已删除的条目会从暂存目录中清除。符号链接按链接复制，插件自己的条目不复制。
+    discard用于处理被替换掉的旧目标（默认直接删除）。
+    返回复制统计信息。
+    """
+    source_path = os.path.abspath(source_path)
+    target_path = os.path.abspath(target_path)
+
+    if os.path.commonpath([source_path, target_path]) == source_path:
+        raise ValueError("不能把目录复制到它自身或子目录中")
+
+    staging_path = get_staging_path(source_path, target_path)
+    resumed = os.path.isdir(staging_path)
+    if resumed:
+        logger.info(f"发现未完成的复制，继续复制: {staging_path}")
+
+    # 遍历源目录：先创建目录结构，收集需要复制的文件；
+    # 不跟随符号链接（避免链接循环和复制根目录外的数据），链接按链接本身复制
+    jobs = []
+    directories = []
+    skipped = 0
+    links = 0
+    for dir_path, dir_names, file_names in os.walk(source_path):
+        relative_dir = os.path.relpath(dir_path, source_path)
+        staging_dir = os.path.normpath(os.path.join(staging_path, relative_dir))
+        os.makedirs(staging_dir, exist_ok=True)
+        directories.append((dir_path, staging_dir))
+
+        expected = {}
+        for name in dir_names + file_names:
+            if not _is_plugin_entry(name):
+                expected[name] = _entry_kind(os.path.join(dir_path, name))
+        dir_names[:] = [name for name in dir_names if expected.get(name) == 'dir']
+        file_names = [name for name in file_names if expected.get(name) == 'file']
+        if resumed:
+            _prune_staging(staging_dir, expected)
+
+        for name, kind in expected.items():
+            if kind == 'link':
+                copy_symlink(os.path.join(dir_path, name), os.path.join(staging_dir, name))
+                links += 1
+
+        for file_name in file_names:
+            src_file = os.path.join(dir_path, file_name)
+            dst_file = os.path.join(staging_dir, file_name)
+            src_stat = os.stat(src_file)
+            if resumed and _is_copied(src_stat, dst_file):
+                skipped += 1
+                continue
+            jobs.append((src_file, dst_file, src_stat.st_size))
+
+    if max_workers is None:
+        max_workers = get_setting('copy_workers', 8)
+
+    stats = {"files": len(jobs) + skipped, "skipped": skipped, "links": links, "bytes": 0, "methods": {}}
+    if jobs:
+        # 大文件优先提交，避免最后只剩一个大文件在单线程复制
+        jobs.sort(key=lambda job: job[2], reverse=True)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+            futures = [executor.submit(copy_file_fast, src, dst) for src, dst, _ in jobs]
+            for (src, dst, size), future in zip(jobs, futures):
+                method = future.result()
+                stats["bytes"] += size
+                stats["methods"][method] = stats["methods"].get(method, 0) + 1
+
+    # 目录时间戳最后设置（写入文件会改变目录的mtime），从深到浅处理
+    for src_dir, staging_dir in reversed(directories):
+        shutil.copystat(src_dir, staging_dir)
+
+    swap_into_place(staging_path, target_path, discard=discard)
+    logger.info(
+        f"目录复制完成: {source_path} -> {target_path} "
+        f"({stats['files']}个文件, 跳过{skipped}个, {stats['bytes']}字节, 方式: {stats['methods']})"
+    )
+    return stats
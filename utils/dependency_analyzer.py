@@ -0,0 +1,267 @@
+"""
+NZ工作流助手 - 依赖分析模块
+从工作流中提取所需的模型文件和节点类型，与ComfyUI模型目录索引和已加载的节点比对，
+不需要在浏览器中打开工作流就能知道缺少哪些模型/节点
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from ..core.constants import MODEL_FILE_EXTENSIONS
+from .workflow_format import read_workflow_text, is_workflow_file
+from .json_codec import loads
+
+
+# 获取logger实例
+logger = get_logger()
+
+
+def _normalize_model_name(name):
+    return name.replace('\\', '/').strip().lower()
+
+
+def _collect_model_names(value, models):
+    """递归收集值中看起来像模型文件名的字符串"""
+    if isinstance(value, str):
+        if value.lower().endswith(MODEL_FILE_EXTENSIONS):
+            models.add(value.replace('\\', '/').strip())
+    elif isinstance(value, list):
+        for item in value:
+            _collect_model_names(item, models)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_model_names(item, models)
+
+
+def extract_dependencies(document):
+    """
+    从工作流文档中提取依赖，返回 {"node_types": set, "models": set}
+    同时支持界面格式（nodes列表）和API格式（{id: {"class_type", "inputs"}}）
+    """
+    node_types = set()
+    models = set()
+
+    if isinstance(document, dict) and isinstance(document.get('nodes'), list):
+        node_lists = [document['nodes']]
+        subgraph_ids = set()
+        # 新版前端的子图定义
+        definitions = document.get('definitions') or {}
+        for subgraph in definitions.get('subgraphs') or []:
+            if isinstance(subgraph, dict):
+                subgraph_ids.add(subgraph.get('id'))
+                if isinstance(subgraph.get('nodes'), list):
+                    node_lists.append(subgraph['nodes'])
+
+        for nodes in node_lists:
+            for node in nodes:
+                if not isinstance(node, dict):
+                    continue
+                node_type = node.get('type')
+                if node_type and node_type not in subgraph_ids:
+                    node_types.add(node_type)
+                _collect_model_names(node.get('widgets_values'), models)
+
+    elif isinstance(document, dict):
+        for node in document.values():
+            if isinstance(node, dict) and node.get('class_type'):
+                node_types.add(node['class_type'])
+                _collect_model_names(node.get('inputs'), models)
+
+    return {"node_types": node_types, "models": models}
+
+
+class ModelIndex:
+    """ComfyUI模型目录索引 - 按目录mtime增量刷新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 目录路径 -> (mtime_ns, 文件名列表, 子目录列表)
+        self._dir_cache = {}
+        self._names = set()
+        self._basenames = set()
+        self._last_refresh = 0.0
+        self.available = False
+
+    def _get_model_folders(self):
+        """从ComfyUI的folder_paths获取模型目录（不在ComfyUI中运行时返回空列表）"""
+        try:
+            import folder_paths
+        except ImportError:
+            return []
+
+        folders = []
+        for name, entry in folder_paths.folder_names_and_paths.items():
+            if name in ('custom_nodes', 'configs'):
+                continue
+            for path in entry[0]:
+                if os.path.isdir(path):
+                    folders.append(path)
+        return folders
+
+    def _scan_dir(self, dir_path):
+        """扫描单个目录，目录mtime未变化时复用缓存的文件列表"""
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return [], []
+
+        cached = self._dir_cache.get(dir_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        files, subdirs = [], []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=True):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(MODEL_FILE_EXTENSIONS):
+                        files.append(entry.name)
+        except OSError:
+            pass
+
+        self._dir_cache[dir_path] = (mtime, files, subdirs)
+        return files, subdirs
+
+    def refresh(self, force=False):
+        """刷新索引（默认按配置的间隔节流）"""
+        interval = get_setting('model_index_refresh_interval', 30)
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < interval:
+                return
+
+            names, basenames = set(), set()
+            seen_dirs = set()
+            folders = self._get_model_folders()
+            for folder in folders:
+                stack = [folder]
+                while stack:
+                    dir_path = stack.pop()
+                    real_dir = os.path.realpath(dir_path)
+                    if real_dir in seen_dirs:
+                        continue
+                    seen_dirs.add(real_dir)
+
+                    files, subdirs = self._scan_dir(dir_path)
+                    relative_dir = os.path.relpath(dir_path, folder)
+                    for file_name in files:
+                        relative = file_name if relative_dir == os.curdir else os.path.join(relative_dir, file_name)
+                        names.add(_normalize_model_name(relative))
+                        basenames.add(file_name.lower())
+                    stack.extend(subdirs)
+
+            # 清理已不存在的目录缓存
+            for dir_path in list(self._dir_cache):
+                if os.path.realpath(dir_path) not in seen_dirs:
+                    del self._dir_cache[dir_path]
+
+            self._names, self._basenames = names, basenames
+            self._last_refresh = time.monotonic()
+            # 是否在ComfyUI环境中（能获取模型目录）
+            self.available = bool(folders)
+
+    def has_model(self, name):
+        normalized = _normalize_model_name(name)
+        return normalized in self._names or normalized.rsplit('/', 1)[-1] in self._basenames
+
+    def get_stats(self):
+        return {"models": len(self._names), "directories": len(self._dir_cache)}
+
+
+def _get_loaded_node_types():
+    """获取ComfyUI已加载的节点类型（不在ComfyUI中运行时返回None）"""
+    try:
+        import nodes
+        return set(nodes.NODE_CLASS_MAPPINGS)
+    except (ImportError, AttributeError):
+        return None
+
+
+class DependencyAnalyzer:
+    """工作流依赖分析器 - 按文件mtime/大小缓存每个工作流提取出的依赖"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.model_index = ModelIndex()
+
+    def get_dependencies(self, path):
+        """读取（或从缓存获取）单个工作流的依赖"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        dependencies = extract_dependencies(loads(read_workflow_text(path)))
+        with self._lock:
+            self._cache[path] = (signature, dependencies)
+        return dependencies
+
+    def _check(self, dependencies, node_types):
+        missing_models = []
+        if self.model_index.available:
+            missing_models = sorted(m for m in dependencies['models'] if not self.model_index.has_model(m))
+        missing_nodes = sorted(dependencies['node_types'] - node_types) if node_types is not None else []
+        return {
+            "models": sorted(dependencies['models']),
+            "node_types": len(dependencies['node_types']),
+            "missing_models": missing_models,
+            "missing_nodes": missing_nodes,
+            "ok": not missing_models and not missing_nodes
+        }
+
+    def analyze_file(self, path):
+        """分析单个工作流，返回与analyze_directory相同格式的报告"""
+        self.model_index.refresh()
+        node_types = _get_loaded_node_types()
+        return {
+            "files": {os.path.basename(path): self._check(self.get_dependencies(path), node_types)},
+            "models_checked": self.model_index.available,
+            "nodes_checked": node_types is not None
+        }
+
+    def analyze_directory(self, directory_path):
+        """分析目录中的所有工作流（不递归），返回 {文件名: 分析结果}"""
+        self.model_index.refresh()
+        node_types = _get_loaded_node_types()
+
+        file_names = [
+            name for name in os.listdir(directory_path)
+            if not name.startswith('.') and is_workflow_file(name)
+            and os.path.isfile(os.path.join(directory_path, name))
+        ]
+
+        def analyze(name):
+            try:
+                return name, self._check(self.get_dependencies(os.path.join(directory_path, name)), node_types)
+            except Exception as e:
+                return name, {"error": str(e)}
+
+        max_workers = max(1, min(get_setting('analysis_workers', 4), len(file_names) or 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(executor.map(analyze, file_names))
+
+        return {
+            "files": results,
+            "models_checked": self.model_index.available,
+            "nodes_checked": node_types is not None
+        }
+
+    def forget(self, path):
+        with self._lock:
+            self._cache.pop(path, None)
+
+
+# 全局分析器实例
+_analyzer = DependencyAnalyzer()
+
+
+def get_dependency_analyzer():
+    """获取全局依赖分析器"""
+    return _analyzer
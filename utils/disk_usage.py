@@ -0,0 +1,256 @@
+"""
+NZ工作流助手 - 磁盘占用统计模块
+并行遍历目录树，记录每个目录自身文件的大小/数量并汇总为递归总量；
+结果持久化到数据目录，之后只重新扫描mtime变化或被标记为脏的目录。
+插件自身的修改通过invalidate_path回调标记，安装了watchdog时同时监听文件系统事件
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from .path_resolver import add_invalidation_listener
+from .json_codec import loads, dumps_bytes
+
+
+# 获取logger实例
+logger = get_logger()
+
+INDEX_FILE_NAME = "disk_usage.json"
+INDEX_VERSION = 1
+
+
+def _normalize(path):
+    return os.path.normpath(os.path.abspath(path))
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+class DiskUsageIndex:
+    """目录占用索引 - 目录路径 -> {mtime, size, files, dirs, total_size, total_files, total_dirs}"""
+
+    def __init__(self):
+        # 刷新和读取索引时持有（刷新期间的并发请求排队等待结果）
+        self._lock = threading.RLock()
+        self._dirty_lock = threading.Lock()
+        self._nodes = None
+        self._dirty = set()
+        self._watched = []
+        self._observer = None
+
+    # ====== 持久化 ======
+
+    def _index_file(self):
+        return os.path.join(get_data_dir(), INDEX_FILE_NAME)
+
+    def _load(self):
+        if self._nodes is not None:
+            return
+        try:
+            with open(self._index_file(), 'rb') as f:
+                data = loads(f.read())
+            self._nodes = data['nodes'] if data.get('version') == INDEX_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            self._nodes = {}
+
+    def _save(self):
+        temp_path = self._index_file() + '.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(dumps_bytes({"version": INDEX_VERSION, "nodes": self._nodes}))
+            os.replace(temp_path, self._index_file())
+        except OSError as e:
+            logger.warning(f"保存磁盘占用索引失败: {str(e)}")
+
+    # ====== 增量标记 ======
+
+    def mark_dirty(self, paths):
+        """标记路径（及其所在目录）需要重新扫描"""
+        with self._dirty_lock:
+            for path in paths:
+                if path:
+                    path = _normalize(path)
+                    self._dirty.add(path)
+                    self._dirty.add(os.path.dirname(path))
+
+    def _take_dirty(self, path):
+        with self._dirty_lock:
+            if path in self._dirty:
+                self._dirty.discard(path)
+                return True
+            return False
+
+    def _has_dirty_within(self, root):
+        with self._dirty_lock:
+            return any(_is_within(path, root) for path in self._dirty)
+
+    def start_watcher(self, paths):
+        """使用watchdog监听目录变化（未安装watchdog时返回False，退回到按目录mtime检查）"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("未安装watchdog，磁盘占用统计将按目录mtime增量检查")
+            return False
+
+        index = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                index.mark_dirty([event.src_path, getattr(event, 'dest_path', None)])
+
+        with self._lock:
+            if self._observer is None:
+                self._observer = Observer()
+                self._observer.daemon = True
+                self._observer.start()
+            for path in paths:
+                path = _normalize(path)
+                if os.path.isdir(path) and not any(_is_within(path, w) for w in self._watched):
+                    self._observer.schedule(_Handler(), path, recursive=True)
+                    self._watched.append(path)
+                    logger.info(f"磁盘占用统计开始监听目录: {path}")
+        return True
+
+    # ====== 扫描 ======
+
+    def _visit(self, path):
+        """扫描单个目录自身的文件，mtime未变化且未被标记时复用索引中的结果"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return path, None, False
+
+        dirty = self._take_dirty(path)
+        cached = self._nodes.get(path)
+        if cached is not None and cached['mtime'] == mtime and not dirty:
+            return path, cached, False
+
+        size, files, dirs = 0, 0, []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"扫描目录失败: {path} - {str(e)}")
+
+        return path, {"mtime": mtime, "size": size, "files": files, "dirs": sorted(dirs)}, True
+
+    def _refresh(self, root):
+        """并行遍历root，更新索引并重新汇总root及其上级目录的总量，返回是否有变化"""
+        max_workers = max(1, get_setting('disk_usage_workers', 8))
+        visited = {}
+        changed = False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(self._visit, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, node, rescanned = future.result()
+                    if node is None:
+                        continue
+                    visited[path] = node
+                    changed = changed or rescanned
+                    for name in node['dirs']:
+                        pending.add(executor.submit(self._visit, os.path.join(path, name)))
+
+        # 删除已不存在的目录
+        stale = [path for path in self._nodes if _is_within(path, root) and path not in visited]
+        for path in stale:
+            del self._nodes[path]
+        changed = changed or bool(stale)
+        self._nodes.update(visited)
+
+        # 自底向上汇总（深的目录先算）
+        for path in sorted(visited, key=lambda p: p.count(os.sep), reverse=True):
+            self._aggregate(path)
+
+        # 更新已索引的上级目录
+        parent = os.path.dirname(root)
+        while parent in self._nodes:
+            self._aggregate(parent)
+            if os.path.dirname(parent) == parent:
+                break
+            parent = os.path.dirname(parent)
+
+        return changed
+
+    def _aggregate(self, path):
+        node = self._nodes[path]
+        total_size, total_files, total_dirs = node['size'], node['files'], 0
+        for name in node['dirs']:
+            child = self._nodes.get(os.path.join(path, name))
+            if child is not None:
+                total_size += child.get('total_size', child['size'])
+                total_files += child.get('total_files', child['files'])
+                total_dirs += child.get('total_dirs', 0) + 1
+        node['total_size'] = total_size
+        node['total_files'] = total_files
+        node['total_dirs'] = total_dirs
+
+    # ====== 查询 ======
+
+    def _build_tree(self, path, depth):
+        node = self._nodes[path]
+        item = {
+            "name": os.path.basename(path) or path,
+            "path": path,
+            "size": node['total_size'],
+            "files": node['total_files'],
+            "dirs": node['total_dirs'],
+            "own_size": node['size'],
+            "own_files": node['files']
+        }
+        if depth > 0:
+            children = [
+                self._build_tree(os.path.join(path, name), depth - 1)
+                for name in node['dirs'] if os.path.join(path, name) in self._nodes
+            ]
+            children.sort(key=lambda child: child['size'], reverse=True)
+            item['children'] = children
+        return item
+
+    def get_usage(self, path, depth=None, refresh=True):
+        """
+        获取path的递归占用，返回可直接用于treemap的层级结构（展开到depth层）
+        已在监听中且没有脏标记的目录直接使用索引，不再遍历
+        """
+        path = _normalize(path)
+        if depth is None:
+            depth = get_setting('disk_usage_depth', 3)
+
+        with self._lock:
+            self._load()
+            watched = any(_is_within(path, w) for w in self._watched)
+            needs_walk = (
+                path not in self._nodes or 'total_size' not in self._nodes[path]
+                or not watched or self._has_dirty_within(path)
+            )
+            if refresh and needs_walk:
+                if self._refresh(path):
+                    self._save()
+            elif path not in self._nodes:
+                raise ValueError("目录尚未统计")
+
+            return self._build_tree(path, max(0, int(depth)))
+
+
+# 全局索引实例
+_disk_usage_index = DiskUsageIndex()
+add_invalidation_listener(_disk_usage_index.mark_dirty)
+
+
+def get_disk_usage_index():
+    """获取全局磁盘占用索引"""
+    return _disk_usage_index
@@ -0,0 +1,343 @@
+"""
+NZ工作流助手 - 重复工作流查找模块
+按 大小 -> 部分哈希 -> 完整哈希 逐级筛选逐字节相同的工作流；
+语义模式忽略节点位置和ID，比较规范化后的图结构。
+哈希计算分布到线程池（可选进程池），结果按路径/mtime缓存，重复扫描时只处理变化的文件
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from .workflow_format import read_workflow_text, is_workflow_file
+from .json_codec import loads, dumps_bytes
+
+
+# 获取logger实例
+logger = get_logger()
+
+CACHE_FILE_NAME = "duplicate_cache.json"
+REPORT_FILE_NAME = "duplicate_report.json"
+
+# 部分哈希读取文件开头和结尾各多少字节
+PARTIAL_HASH_BYTES = 64 * 1024
+
+# 计算哈希期间每隔多少秒保存一次缓存（中断后重新查找时不必从头计算）
+CACHE_SAVE_INTERVAL = 30
+
+# 语义比较时忽略的字段（位置、尺寸、执行顺序、界面状态等）
+IGNORED_NODE_KEYS = {'id', 'pos', 'size', 'order', 'flags', 'selected'}
+IGNORED_GRAPH_KEYS = {'id', 'last_node_id', 'last_link_id', 'extra', 'version', 'revision'}
+
+
+def _partial_hash(path):
+    """文件开头和结尾各PARTIAL_HASH_BYTES字节的哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        size = os.fstat(f.fileno()).st_size
+        if size > PARTIAL_HASH_BYTES * 2:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def _full_hash(path):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dumps_canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _canonicalize_ui_graph(document):
+    """界面格式：去掉位置/ID，节点按内容排序后用序号重新编号连线"""
+    nodes = [n for n in document.get('nodes') or [] if isinstance(n, dict)]
+
+    def node_body(node):
+        body = {k: v for k, v in node.items() if k not in IGNORED_NODE_KEYS}
+        # 连线信息单独处理，槽位里引用的连线ID不参与比较
+        body['inputs'] = [
+            {k: v for k, v in slot.items() if k != 'link'}
+            for slot in node.get('inputs') or [] if isinstance(slot, dict)
+        ]
+        body['outputs'] = [
+            {k: v for k, v in slot.items() if k not in ('links', 'slot_index')}
+            for slot in node.get('outputs') or [] if isinstance(slot, dict)
+        ]
+        return _dumps_canonical(body)
+
+    bodies = {id(node): node_body(node) for node in nodes}
+    ordered = sorted(nodes, key=lambda node: bodies[id(node)])
+    index_of = {node.get('id'): index for index, node in enumerate(ordered)}
+
+    links = []
+    for link in document.get('links') or []:
+        # 旧格式: [link_id, origin_id, origin_slot, target_id, target_slot, type]
+        if isinstance(link, list) and len(link) >= 6:
+            links.append([index_of.get(link[1]), link[2], index_of.get(link[3]), link[4], link[5]])
+        elif isinstance(link, dict):
+            links.append([
+                index_of.get(link.get('origin_id')), link.get('origin_slot'),
+                index_of.get(link.get('target_id')), link.get('target_slot'), link.get('type')
+            ])
+    links.sort(key=_dumps_canonical)
+
+    graph = {k: v for k, v in document.items() if k not in IGNORED_GRAPH_KEYS and k not in ('nodes', 'links', 'groups')}
+    graph['nodes'] = [bodies[id(node)] for node in ordered]
+    graph['links'] = links
+    graph['groups'] = sorted(
+        _dumps_canonical({k: v for k, v in g.items() if k not in ('bounding', 'id')})
+        for g in document.get('groups') or [] if isinstance(g, dict)
+    )
+    return graph
+
+
+def _canonicalize_api_graph(document):
+    """API格式：节点按内容排序，输入中的 [节点ID, 槽位] 引用替换为序号"""
+    def shallow_body(node):
+        inputs = {
+            k: (['link', v[1]] if isinstance(v, list) and len(v) == 2 and str(v[0]) in document else v)
+            for k, v in (node.get('inputs') or {}).items()
+        }
+        return _dumps_canonical({'class_type': node.get('class_type'), 'inputs': inputs})
+
+    node_ids = sorted(document, key=lambda node_id: shallow_body(document[node_id]))
+    index_of = {node_id: index for index, node_id in enumerate(node_ids)}
+
+    nodes = []
+    for node_id in node_ids:
+        node = document[node_id]
+        inputs = {}
+        for k, v in (node.get('inputs') or {}).items():
+            if isinstance(v, list) and len(v) == 2 and str(v[0]) in index_of:
+                v = ['link', index_of[str(v[0])], v[1]]
+            inputs[k] = v
+        nodes.append({'class_type': node.get('class_type'), 'inputs': inputs})
+    return {'nodes': nodes}
+
+
+def canonicalize_workflow(document):
+    """把工作流规范化为与节点位置、ID无关的结构"""
+    if isinstance(document, dict) and isinstance(document.get('nodes'), list):
+        return _canonicalize_ui_graph(document)
+    if isinstance(document, dict) and all(isinstance(v, dict) and 'class_type' in v for v in document.values()):
+        return _canonicalize_api_graph(document)
+    return document
+
+
+def _semantic_hash(path):
+    document = loads(read_workflow_text(path))
+    return hashlib.blake2b(_dumps_canonical(canonicalize_workflow(document)).encode('utf-8'), digest_size=32).hexdigest()
+
+
+# 在工作进程中执行的哈希任务（必须是模块级函数才能被pickle）
+_HASH_FUNCTIONS = {'partial': _partial_hash, 'full': _full_hash, 'semantic': _semantic_hash}
+
+
+def _hash_job(job):
+    kind, path = job
+    try:
+        return path, _HASH_FUNCTIONS[kind](path)
+    except Exception:
+        return path, None
+
+
+class DuplicateFinder:
+    """重复工作流查找器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def _cache_file(self):
+        return os.path.join(get_data_dir(), CACHE_FILE_NAME)
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self._cache_file(), 'rb') as f:
+                    self._cache = loads(f.read())
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self):
+        temp_path = self._cache_file() + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(dumps_bytes(self._cache))
+        os.replace(temp_path, self._cache_file())
+
+    def _scan(self, root_path):
+        """递归收集工作流文件 {路径: (mtime_ns, size)}，跳过隐藏目录（含回收站）"""
+        files = {}
+        for dir_path, dir_names, file_names in os.walk(root_path):
+            dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+            for file_name in file_names:
+                if file_name.startswith('.') or not is_workflow_file(file_name):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _compute(self, kind, paths, files, executor, progress=None):
+        """计算一批文件的哈希，优先使用缓存；progress(kind, 已完成数, 总数)报告进度"""
+        results, jobs = {}, []
+        for path in paths:
+            entry = self._cache.get(path)
+            if entry and entry.get('signature') == list(files[path]) and entry.get(kind):
+                results[path] = entry[kind]
+            else:
+                jobs.append((kind, path))
+
+        saved_at = time.time()
+        for done, (path, value) in enumerate(executor.map(_hash_job, jobs, chunksize=16), 1):
+            if progress is not None:
+                progress(kind, done, len(jobs))
+            if time.time() - saved_at > CACHE_SAVE_INTERVAL:
+                self._save_cache()
+                saved_at = time.time()
+            if value is None:
+                continue
+            entry = self._cache.get(path)
+            if not entry or entry.get('signature') != list(files[path]):
+                entry = {'signature': list(files[path])}
+                self._cache[path] = entry
+            entry[kind] = value
+            results[path] = value
+
+        return results, len(jobs)
+
+    @staticmethod
+    def _group(values):
+        groups = {}
+        for path, value in values.items():
+            groups.setdefault(value, []).append(path)
+        return {value: sorted(paths) for value, paths in groups.items() if len(paths) > 1}
+
+    def _create_executor(self, processes):
+        workers = get_setting('dedupe_workers', 0) or os.cpu_count() or 4
+        if processes:
+            try:
+                return ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError, ValueError):
+                pass
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def find_duplicates(self, root_path, semantic=False, progress=None, processes=None):
+        """
+        查找root_path下的重复工作流，返回报告并保存到数据目录（progress见_compute）；
+        processes为True时在进程池中计算哈希（默认按dedupe_processes设置，只适合独立运行的进程如命令行工具）
+        """
+        if processes is None:
+            processes = get_setting('dedupe_processes', False)
+        started = time.time()
+        with self._lock:
+            self._load_cache()
+            files = self._scan(root_path)
+
+            # 清理已删除文件的缓存
+            prefix = os.path.join(root_path, '')
+            for path in [p for p in self._cache if p.startswith(prefix) and p not in files]:
+                del self._cache[path]
+
+            executor = self._create_executor(processes)
+            try:
+                try:
+                    groups, hashed = self._find(files, semantic, executor, progress)
+                except Exception as e:
+                    # 进程池在某些环境中不可用（如模块无法在子进程中导入），改用线程池
+                    if isinstance(executor, ThreadPoolExecutor):
+                        raise
+                    logger.warning(f"进程池不可用，改用线程池查找重复: {str(e)}")
+                    executor.shutdown(cancel_futures=True)
+                    executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+                    groups, hashed = self._find(files, semantic, executor, progress)
+            finally:
+                executor.shutdown()
+
+            self._save_cache()
+
+        duplicate_groups = []
+        for value, paths in groups.items():
+            sizes = [files[p][1] for p in paths]
+            duplicate_groups.append({
+                "hash": value,
+                "files": paths,
+                "size": max(sizes),
+                "wasted_bytes": sum(sizes) - max(sizes)
+            })
+        duplicate_groups.sort(key=lambda g: g['wasted_bytes'], reverse=True)
+
+        report = {
+            "path": root_path,
+            "mode": "semantic" if semantic else "exact",
+            "generated_at": time.time(),
+            "elapsed": round(time.time() - started, 3),
+            "scanned_files": len(files),
+            "hashed_files": hashed,
+            "groups": duplicate_groups,
+            "wasted_bytes": sum(g['wasted_bytes'] for g in duplicate_groups)
+        }
+        self._save_report(report)
+
+        logger.info(
+            f"重复查找完成: {root_path} ({len(files)}个文件, 计算{hashed}个哈希, "
+            f"{len(duplicate_groups)}组重复, 耗时{report['elapsed']}秒)"
+        )
+        return report
+
+    def _find(self, files, semantic, executor, progress=None):
+        if semantic:
+            values, hashed = self._compute('semantic', list(files), files, executor, progress)
+            return self._group(values), hashed
+
+        # 第一级：按大小分组
+        by_size = {}
+        for path, (_, size) in files.items():
+            by_size.setdefault(size, []).append(path)
+        candidates = [p for paths in by_size.values() if len(paths) > 1 for p in paths]
+
+        # 第二级：部分哈希（同一大小内比较）
+        partial, hashed_partial = self._compute('partial', candidates, files, executor, progress)
+        partial_groups = self._group({p: f"{files[p][1]}:{h}" for p, h in partial.items()})
+        candidates = [p for paths in partial_groups.values() for p in paths]
+
+        # 第三级：完整哈希
+        full, hashed_full = self._compute('full', candidates, files, executor, progress)
+        return self._group(full), hashed_partial + hashed_full
+
+    def _save_report(self, report):
+        path = os.path.join(get_data_dir(), REPORT_FILE_NAME)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(dumps_bytes(report, indent=True))
+        os.replace(path + '.tmp', path)
+
+    def load_report(self):
+        """读取最近一次的查找报告（没有时返回None）"""
+        try:
+            with open(os.path.join(get_data_dir(), REPORT_FILE_NAME), 'rb') as f:
+                return loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+
+# 全局查找器实例
+_duplicate_finder = DuplicateFinder()
+
+
+def get_duplicate_finder():
+    """获取全局重复查找器"""
+    return _duplicate_finder
@@ -67,6 +67,7 @@ def get_directory_listing(directory_path, include_hidden=False):
                     directories.append({
                         "name": item,
                         "date": info['modified'].strftime("%m/%d/%y"),
+                        "mtime": info['modified'].timestamp(),
                         "type": "directory"
                     })
                     print(f"📁 添加目录: {item}")
@@ -75,6 +76,7 @@ def get_directory_listing(directory_path, include_hidden=False):
                     file_entry = {
                         "name": item,
                         "date": info['modified'].strftime("%m/%d/%y"),
+                        "mtime": info['modified'].timestamp(),
                         "size": info['size'],
                         "type": "file",
                         "is_workflow": True
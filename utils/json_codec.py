@@ -0,0 +1,152 @@
+"""
+NZ工作流助手 - JSON编解码模块
+启动时按 orjson -> ujson -> 标准库json 的顺序选择可用的最快实现，
+所有处理器的请求解析、响应序列化和工作流解析都通过这里进行；
+dumps_bytes直接输出UTF-8字节，写HTTP响应和文件时省去一次str编码
+"""
+
+import os
+import json
+
+# 可选依赖：orjson / ujson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# 强制使用指定实现（orjson / ujson / json），用于排查兼容性问题和性能对比
+JSON_BACKEND_ENV = "NZ_JSON_BACKEND"
+
+
+class _StdlibCodec:
+    name = "json"
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj, indent=False, sort_keys=False):
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys)
+
+    @classmethod
+    def dumps_bytes(cls, obj, indent=False, sort_keys=False):
+        return cls.dumps(obj, indent, sort_keys).encode('utf-8')
+
+
+class _UjsonCodec:
+    name = "ujson"
+
+    @staticmethod
+    def loads(data):
+        return ujson.loads(data)
+
+    @staticmethod
+    def dumps(obj, indent=False, sort_keys=False):
+        try:
+            return ujson.dumps(
+                obj, ensure_ascii=False, escape_forward_slashes=False,
+                indent=2 if indent else 0, sort_keys=sort_keys
+            )
+        except (TypeError, OverflowError):
+            # ujson不支持的类型交给标准库处理
+            return _StdlibCodec.dumps(obj, indent, sort_keys)
+
+    @classmethod
+    def dumps_bytes(cls, obj, indent=False, sort_keys=False):
+        return cls.dumps(obj, indent, sort_keys).encode('utf-8')
+
+
+class _OrjsonCodec:
+    name = "orjson"
+
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+    @staticmethod
+    def dumps_bytes(obj, indent=False, sort_keys=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            # 超过64位的整数等orjson不支持的值交给标准库处理
+            return _StdlibCodec.dumps_bytes(obj, indent, sort_keys)
+
+    @classmethod
+    def dumps(cls, obj, indent=False, sort_keys=False):
+        return cls.dumps_bytes(obj, indent, sort_keys).decode('utf-8')
+
+
+_CODECS = {
+    "orjson": _OrjsonCodec if orjson is not None else None,
+    "ujson": _UjsonCodec if ujson is not None else None,
+    "json": _StdlibCodec,
+}
+
+
+def get_codec(name=None):
+    """获取指定的编解码实现（不指定时返回最快的可用实现），未安装时返回None"""
+    if name:
+        return _CODECS.get(name)
+    for candidate in ("orjson", "ujson", "json"):
+        if _CODECS[candidate] is not None:
+            return _CODECS[candidate]
+
+
+def _select_codec():
+    forced = os.environ.get(JSON_BACKEND_ENV)
+    if forced:
+        codec = get_codec(forced)
+        if codec is not None:
+            return codec
+    return get_codec()
+
+
+_codec = _select_codec()
+
+# 当前使用的实现名称
+JSON_BACKEND = _codec.name
+
+
+def loads(data):
+    """解析JSON（接受str或bytes），格式错误时抛出ValueError"""
+    return _codec.loads(data)
+
+
+def dumps(obj, indent=False, sort_keys=False):
+    """序列化为str（保留非ASCII字符；indent=True时使用2空格缩进）"""
+    return _codec.dumps(obj, indent, sort_keys)
+
+
+def dumps_bytes(obj, indent=False, sort_keys=False):
+    """序列化为UTF-8字节"""
+    return _codec.dumps_bytes(obj, indent, sort_keys)
+
+
+def json_response(data, status=200, headers=None):
+    """构造JSON响应（替代web.json_response，直接使用编码后的字节作为响应体）"""
+    return json_response_bytes(dumps_bytes(data), status, headers)
+
+
+def json_response_bytes(body, status=200, headers=None):
+    """用已编码的JSON字节构造响应（同一结果发给多个请求时只编码一次）"""
+    from aiohttp import web
+    return web.Response(body=body, status=status, headers=headers, content_type='application/json')
+
+
+async def read_request_json(request):
+    """读取并解析请求体JSON"""
+    return loads(await request.read())
@@ -0,0 +1,148 @@
+"""
+NZ工作流助手 - JSON Patch模块
+实现 RFC 6902 JSON Patch 的应用（add / remove / replace / move / copy / test）
+"""
+
+import copy
+
+
+class JsonPatchError(ValueError):
+    """补丁格式错误或无法应用"""
+
+
+def _parse_pointer(pointer):
+    """解析 RFC 6901 JSON Pointer，返回路径组件列表"""
+    if pointer == '':
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JsonPatchError(f"无效的JSON Pointer: {pointer}")
+    return [part.replace('~1', '/').replace('~0', '~') for part in pointer[1:].split('/')]
+
+
+def _array_index(container, token, allow_end=False):
+    """把路径组件转换为数组下标"""
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise JsonPatchError(f"无效的数组下标: {token}")
+    index = int(token)
+    limit = len(container) + (1 if allow_end else 0)
+    if index >= limit:
+        raise JsonPatchError(f"数组下标越界: {token}")
+    return index
+
+
+def _resolve_parent(document, parts):
+    """找到路径的父容器"""
+    container = document
+    for token in parts[:-1]:
+        if isinstance(container, list):
+            container = container[_array_index(container, token)]
+        elif isinstance(container, dict):
+            if token not in container:
+                raise JsonPatchError(f"路径不存在: {token}")
+            container = container[token]
+        else:
+            raise JsonPatchError(f"路径经过非容器值: {token}")
+    return container
+
+
+def _get(document, parts):
+    value = document
+    for token in parts:
+        if isinstance(value, list):
+            value = value[_array_index(value, token)]
+        elif isinstance(value, dict):
+            if token not in value:
+                raise JsonPatchError(f"路径不存在: {token}")
+            value = value[token]
+        else:
+            raise JsonPatchError(f"路径经过非容器值: {token}")
+    return value
+
+
+def _add(document, parts, value):
+    if not parts:
+        return value
+    container = _resolve_parent(document, parts)
+    token = parts[-1]
+    if isinstance(container, list):
+        container.insert(_array_index(container, token, allow_end=True), value)
+    elif isinstance(container, dict):
+        container[token] = value
+    else:
+        raise JsonPatchError(f"无法在非容器值中添加: {token}")
+    return document
+
+
+def _remove(document, parts):
+    if not parts:
+        raise JsonPatchError("不能删除整个文档")
+    container = _resolve_parent(document, parts)
+    token = parts[-1]
+    if isinstance(container, list):
+        return container.pop(_array_index(container, token))
+    if isinstance(container, dict):
+        if token not in container:
+            raise JsonPatchError(f"路径不存在: {token}")
+        return container.pop(token)
+    raise JsonPatchError(f"无法从非容器值中删除: {token}")
+
+
+def _replace(document, parts, value):
+    """原位替换（保持对象键的顺序不变）"""
+    if not parts:
+        return value
+    container = _resolve_parent(document, parts)
+    token = parts[-1]
+    if isinstance(container, list):
+        container[_array_index(container, token)] = value
+    elif isinstance(container, dict):
+        if token not in container:
+            raise JsonPatchError(f"路径不存在: {token}")
+        container[token] = value
+    else:
+        raise JsonPatchError(f"无法在非容器值中替换: {token}")
+    return document
+
+
+def apply_json_patch(document, patch, in_place=False):
+    """
+    把补丁操作列表应用到文档，返回新文档
+    任一操作失败时抛出JsonPatchError；in_place=False时原文档保持不变
+    """
+    if not isinstance(patch, list):
+        raise JsonPatchError("补丁必须是操作列表")
+
+    if not in_place:
+        document = copy.deepcopy(document)
+
+    for operation in patch:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise JsonPatchError(f"无效的补丁操作: {operation}")
+
+        op = operation['op']
+        parts = _parse_pointer(operation['path'])
+
+        if op == 'add':
+            document = _add(document, parts, copy.deepcopy(operation.get('value')))
+        elif op == 'remove':
+            _remove(document, parts)
+        elif op == 'replace':
+            document = _replace(document, parts, copy.deepcopy(operation.get('value')))
+        elif op == 'move':
+            from_parts = _parse_pointer(operation.get('from'))
+            if parts[:len(from_parts)] == from_parts and len(parts) > len(from_parts):
+                raise JsonPatchError("不能把值移动到它自己的子路径")
+            value = _remove(document, from_parts)
+            document = _add(document, parts, value)
+        elif op == 'copy':
+            value = copy.deepcopy(_get(document, _parse_pointer(operation.get('from'))))
+            document = _add(document, parts, value)
+        elif op == 'test':
+            if _get(document, parts) != operation.get('value'):
+                raise JsonPatchError(f"test操作失败: {operation['path']}")
+        else:
+            raise JsonPatchError(f"不支持的补丁操作: {op}")
+
+    return document
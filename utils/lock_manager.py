@@ -0,0 +1,341 @@
+"""
+NZ工作流助手 - 路径锁模块
+进程内的层级路径锁：两个操作的路径互为祖先/相同且至少一方是写锁时互斥，
+不相交的子树可以并行；等待按先来先得授予，避免写操作被持续的读操作饿死。
+写锁同时在数据目录的锁文件上加跨进程建议锁（POSIX记录锁，使用同一数据目录的多个ComfyUI实例之间生效），
+文件系统不支持时只使用进程内锁。跨进程锁只锁单个条目，不是层级锁：
+另一个实例修改目录中的文件时，本实例仍然可以同时移动或删除整个目录
+"""
+
+import os
+import time
+import errno
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from .path_resolver import get_path_resolver
+
+# 可选依赖：fcntl（仅POSIX系统）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 跨进程建议锁使用的锁文件（位于数据目录，不在工作流目录中创建文件）
+LOCK_FILE_NAME = "advisory.lock"
+
+# 旧版本在每个工作流目录中创建的锁文件名（复制目录时跳过）
+LEGACY_LOCK_FILE_NAME = ".nzlock"
+
+# 等待跨进程锁时的轮询间隔（秒）
+ADVISORY_POLL_INTERVAL = 0.05
+
+
+class LockTimeoutError(Exception):
+    """在超时时间内没有获得路径锁"""
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _conflicts(first, second):
+    for path_a, exclusive_a in first:
+        for path_b, exclusive_b in second:
+            if (exclusive_a or exclusive_b) and (_is_within(path_a, path_b) or _is_within(path_b, path_a)):
+                return True
+    return False
+
+
+class _LockRequest:
+    __slots__ = ('paths', 'granted', 'event', 'loop', 'future')
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.granted = False
+        self.event = None
+        self.loop = None
+        self.future = None
+
+    def signal(self):
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+        elif self.event is not None:
+            self.event.set()
+
+
+class PathLockManager:
+    """层级路径锁管理器 - 同时支持协程（处理器）和线程（节点、WebSocket）中使用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = []
+        self._waiting = []
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+
+    def _make_request(self, exclusive, shared):
+        paths = [(_normalize(p), True) for p in exclusive if p]
+        paths += [(_normalize(p), False) for p in shared if p]
+        return _LockRequest(paths)
+
+    def _grant_waiting(self):
+        """按顺序授予等待中的请求（与更早的等待请求冲突的也要继续等待）"""
+        still_waiting = []
+        for request in self._waiting:
+            blocked = any(_conflicts(request.paths, held.paths) for held in self._held)
+            blocked = blocked or any(_conflicts(request.paths, earlier.paths) for earlier in still_waiting)
+            if blocked:
+                still_waiting.append(request)
+            else:
+                request.granted = True
+                self._held.append(request)
+                self.acquired += 1
+                request.signal()
+        self._waiting = still_waiting
+
+    def _enqueue(self, request):
+        with self._lock:
+            self._waiting.append(request)
+            self._grant_waiting()
+            if not request.granted:
+                self.contended += 1
+            return request.granted
+
+    def _cancel(self, request):
+        """等待超时后撤销请求；撤销前恰好被授予时返回True"""
+        with self._lock:
+            if request.granted:
+                return True
+            self._waiting.remove(request)
+            self.timeouts += 1
+            self._grant_waiting()
+            return False
+
+    def _timeout_error(self, request):
+        paths = ', '.join(path for path, _ in request.paths)
+        return LockTimeoutError(f"等待路径锁超时，文件正被其他操作占用: {paths}")
+
+    def acquire(self, exclusive=(), shared=(), timeout=None):
+        """在线程中获取锁（在事件循环线程中调用时不等待），返回用于release的句柄"""
+        request = self._make_request(exclusive, shared)
+        request.event = threading.Event()
+        if self._enqueue(request):
+            return request
+
+        if _in_event_loop():
+            # 事件循环线程中阻塞等待会卡住持锁的协程，只能立即失败
+            timeout = 0
+        elif timeout is None:
+            timeout = get_setting('lock_timeout', 30)
+        if request.event.wait(timeout) or self._cancel(request):
+            return request
+        raise self._timeout_error(request)
+
+    async def acquire_async(self, exclusive=(), shared=(), timeout=None):
+        """在协程中获取锁，返回用于release的句柄"""
+        request = self._make_request(exclusive, shared)
+        request.loop = asyncio.get_running_loop()
+        request.future = request.loop.create_future()
+        if self._enqueue(request):
+            return request
+
+        if timeout is None:
+            timeout = get_setting('lock_timeout', 30)
+        try:
+            await asyncio.wait_for(asyncio.shield(request.future), timeout)
+            return request
+        except asyncio.TimeoutError:
+            if self._cancel(request):
+                return request
+            raise self._timeout_error(request)
+        except asyncio.CancelledError:
+            if self._cancel(request):
+                self.release(request)
+            raise
+
+    def release(self, request):
+        with self._lock:
+            if request in self._held:
+                self._held.remove(request)
+                self._grant_waiting()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "held": len(self._held),
+                "waiting": len(self._waiting),
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "timeouts": self.timeouts
+            }
+
+
+class AdvisoryLocks:
+    """
+    跨进程建议锁 - 数据目录中的一个锁文件，每个路径对应锁文件中的一个字节（按路径哈希定位）
+    根目录内的路径按 "@根目录名/相对路径" 计算哈希，各实例的挂载位置不同时也能互斥；
+    只锁单个条目，不检查祖先和子路径（层级互斥只在进程内生效）。
+    POSIX记录锁在进程关闭该文件的任意描述符时全部释放，所以锁文件在进程内只打开一次并计数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}
+        self._unsupported = set()
+
+    @staticmethod
+    def _slot(path):
+        try:
+            key = get_path_resolver().to_path_id(path)
+        except ValueError:
+            key = path
+        return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:8], 16) & 0x3fffffff
+
+    def _open(self, lock_path):
+        with self._lock:
+            if lock_path in self._unsupported:
+                return None
+            entry = self._files.get(lock_path)
+            if entry is None:
+                try:
+                    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+                except OSError:
+                    # 数据目录只读时只使用进程内锁
+                    return None
+                entry = self._files[lock_path] = [fd, 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _close(self, lock_path):
+        with self._lock:
+            entry = self._files.get(lock_path)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    os.close(entry[0])
+                    del self._files[lock_path]
+
+    def acquire(self, path, timeout):
+        """获取路径的跨进程写锁（阻塞轮询），不支持时返回None"""
+        if fcntl is None:
+            return None
+        lock_path = os.path.join(get_data_dir(), LOCK_FILE_NAME)
+        fd = self._open(lock_path)
+        if fd is None:
+            return None
+
+        offset = self._slot(_normalize(path))
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+                return (lock_path, offset)
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    logger.info(f"数据目录不支持跨进程文件锁，只使用进程内锁: {lock_path} ({str(e)})")
+                    with self._lock:
+                        self._unsupported.add(lock_path)
+                    self._close(lock_path)
+                    return None
+                if time.monotonic() >= deadline:
+                    self._close(lock_path)
+                    raise LockTimeoutError(f"等待跨进程文件锁超时，文件正被其他实例修改: {path}")
+                time.sleep(ADVISORY_POLL_INTERVAL)
+
+    def release(self, handle):
+        if handle is None:
+            return
+        lock_path, offset = handle
+        with self._lock:
+            entry = self._files.get(lock_path)
+        if entry is not None:
+            try:
+                fcntl.lockf(entry[0], fcntl.LOCK_UN, 1, offset)
+            except OSError as e:
+                logger.warning(f"释放跨进程文件锁失败: {lock_path} - {str(e)}")
+        self._close(lock_path)
+
+
+# 全局实例
+_lock_manager = PathLockManager()
+_advisory_locks = AdvisoryLocks()
+
+
+def get_lock_manager():
+    """获取全局路径锁管理器"""
+    return _lock_manager
+
+
+def _acquire_advisory(paths, timeout):
+    handles = []
+    try:
+        for path in sorted({_normalize(p) for p in paths if p}):
+            handles.append(_advisory_locks.acquire(path, timeout))
+    except Exception:
+        _release_advisory(handles)
+        raise
+    return handles
+
+
+def _release_advisory(handles):
+    for handle in reversed(handles):
+        _advisory_locks.release(handle)
+
+
+@asynccontextmanager
+async def path_lock(exclusive=(), shared=(), timeout=None):
+    """
+    协程中使用的路径锁：exclusive中的路径加写锁（同时加跨进程建议锁），shared中的路径加读锁
+    async with path_lock(exclusive=[target], shared=[source]): ...
+    """
+    if timeout is None:
+        timeout = get_setting('lock_timeout', 30)
+    request = await _lock_manager.acquire_async(exclusive, shared, timeout)
+    handles = []
+    try:
+        if get_setting('advisory_locks', True):
+            loop = asyncio.get_running_loop()
+            handles = await loop.run_in_executor(None, _acquire_advisory, exclusive, timeout)
+        yield
+    finally:
+        _release_advisory(handles)
+        _lock_manager.release(request)
+
+
+@contextmanager
+def path_lock_sync(exclusive=(), shared=(), timeout=None):
+    """线程中使用的路径锁（节点执行、WebSocket消息等同步代码；在事件循环线程中不等待）"""
+    if _in_event_loop():
+        timeout = 0
+    elif timeout is None:
+        timeout = get_setting('lock_timeout', 30)
+    request = _lock_manager.acquire(exclusive, shared, timeout)
+    handles = []
+    try:
+        if get_setting('advisory_locks', True):
+            handles = _acquire_advisory(exclusive, timeout)
+        yield
+    finally:
+        _release_advisory(handles)
+        _lock_manager.release(request)
@@ -0,0 +1,326 @@
+"""
+NZ工作流助手 - 备注标签索引模块
+客户端同步过来的工作流备注（标签、分类、优先级）保存在数据目录，并维护倒排索引：
+按标签做集合运算（AND/OR/NOT）、按优先级范围筛选，再结合路径前缀和名称分页查询；
+备注修改、文件移动和删除时增量更新索引（移动和删除的通知只记录下来，
+在后台线程中合并处理，或在下一次读写索引前处理，不在事件循环中读写文件）
+"""
+
+import os
+import threading
+from ..core.logger import get_logger
+from ..core.config import get_data_dir
+from .path_resolver import add_invalidation_listener, add_move_listener
+from .json_codec import loads, dumps_bytes
+
+
+# 获取logger实例
+logger = get_logger()
+
+NOTES_FILE_NAME = "note_index.json"
+
+# 收到路径变化通知后等待多久再在后台处理（秒），期间的通知合并为一次写盘
+FLUSH_DELAY = 1.0
+
+# 优先级（与备注编辑器的选项一致），数值越大越重要
+PRIORITY_LEVELS = {"low": 0, "normal": 1, "high": 2}
+DEFAULT_PRIORITY = "normal"
+
+# 保存的备注字段
+NOTE_FIELDS = ("description", "tags", "category", "priority", "createTime", "updateTime")
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+def _tag_key(tag):
+    """标签不区分大小写和首尾空白"""
+    return str(tag).strip().lower()
+
+
+def parse_priority(value):
+    """优先级名称（low/normal/high）或数值（0-2）转换为数值，无法识别时抛出ValueError"""
+    if isinstance(value, str) and value.strip().lower() in PRIORITY_LEVELS:
+        return PRIORITY_LEVELS[value.strip().lower()]
+    try:
+        level = int(value)
+    except (TypeError, ValueError):
+        level = None
+    if level not in PRIORITY_LEVELS.values():
+        raise ValueError(f"不支持的优先级: {value}")
+    return level
+
+
+def _normalize_note(note):
+    """只保留已知字段，标签去重去空，未知优先级视为normal"""
+    normalized = {key: note[key] for key in NOTE_FIELDS if note.get(key) not in (None, '')}
+    tags = []
+    for tag in note.get('tags') or []:
+        tag = str(tag).strip()
+        if tag and _tag_key(tag) not in (_tag_key(t) for t in tags):
+            tags.append(tag)
+    normalized['tags'] = tags
+    priority = str(normalized.get('priority', '')).strip().lower()
+    normalized['priority'] = priority if priority in PRIORITY_LEVELS else DEFAULT_PRIORITY
+    return normalized
+
+
+class NoteIndex:
+    """备注索引 - 标签/分类/优先级到路径集合的倒排索引，查询时先用索引做集合运算再逐条筛选"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 待处理的路径变化 [("move", source, target) / ("invalidate", paths)]，按通知顺序处理
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._flush_timer = None
+        self._notes = None
+        self._tags = {}
+        self._tag_names = {}
+        self._categories = {}
+        self._priorities = {}
+
+    def _notes_file(self):
+        return os.path.join(get_data_dir(), NOTES_FILE_NAME)
+
+    def _load(self):
+        """读取备注文件并处理待处理的路径变化（调用方持有锁）"""
+        if self._notes is None:
+            self._notes = {}
+            try:
+                with open(self._notes_file(), 'rb') as f:
+                    notes = loads(f.read()).get('notes', {})
+            except (OSError, ValueError):
+                notes = {}
+            for path, note in notes.items():
+                self._add(path, note)
+        self._apply_pending()
+        return self._notes
+
+    def _add(self, path, note):
+        self._notes[path] = note
+        for tag in note['tags']:
+            key = _tag_key(tag)
+            self._tags.setdefault(key, set()).add(path)
+            self._tag_names.setdefault(key, tag)
+        if note.get('category'):
+            self._categories.setdefault(note['category'], set()).add(path)
+        self._priorities.setdefault(PRIORITY_LEVELS[note['priority']], set()).add(path)
+
+    @staticmethod
+    def _discard(table, key, path, names=None):
+        paths = table.get(key)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del table[key]
+                if names is not None:
+                    names.pop(key, None)
+
+    def _remove(self, path):
+        note = self._notes.pop(path, None)
+        if note is None:
+            return None
+        for tag in note['tags']:
+            self._discard(self._tags, _tag_key(tag), path, self._tag_names)
+        if note.get('category'):
+            self._discard(self._categories, note['category'], path)
+        self._discard(self._priorities, PRIORITY_LEVELS[note['priority']], path)
+        return note
+
+    def _save(self):
+        """写盘（调用方持有锁；先写临时文件再替换）"""
+        content = dumps_bytes({"notes": self._notes})
+        temp_path = self._notes_file() + '.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, self._notes_file())
+        except OSError as e:
+            logger.warning(f"保存备注索引失败: {str(e)}")
+
+    def update(self, changes):
+        """
+        按路径更新备注 {路径: 备注}，备注为None表示删除；
+        不存在的文件的备注不加入索引。返回实际变化的条目数
+        """
+        prepared = {}
+        for path, note in changes.items():
+            path = os.path.normpath(path)
+            if note is None:
+                prepared[path] = None
+            elif isinstance(note, dict) and os.path.isfile(path):
+                prepared[path] = _normalize_note(note)
+
+        changed = 0
+        with self._lock:
+            self._load()
+            for path, note in prepared.items():
+                if self._notes.get(path) == note:
+                    continue
+                self._remove(path)
+                if note is not None:
+                    self._add(path, note)
+                changed += 1
+            if changed:
+                self._save()
+        return changed
+
+    def _notify(self, change):
+        """记录路径变化并安排后台处理（由路径回调调用，可能在事件循环中，不读写文件）"""
+        with self._pending_lock:
+            self._pending.append(change)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def move(self, source, target):
+        """文件或目录被移动/重命名后，把其下的备注改到新路径"""
+        self._notify(("move", os.path.normpath(source), os.path.normpath(target)))
+
+    def invalidate(self, paths):
+        """路径被修改后，移除已不存在的文件的备注（文件被删除）"""
+        self._notify(("invalidate", [os.path.normpath(path) for path in paths if path]))
+
+    def flush(self):
+        """立即处理待处理的路径变化"""
+        with self._lock:
+            self._load()
+
+    def _apply_pending(self):
+        """按通知顺序处理路径变化，有变化时写盘（调用方持有锁）"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            self._flush_timer = None
+        if not pending:
+            return
+
+        changed = False
+        for change in pending:
+            if change[0] == "move":
+                changed = self._apply_move(change[1], change[2]) or changed
+            else:
+                changed = self._apply_invalidate(change[1]) or changed
+        if changed:
+            self._save()
+
+    def _apply_move(self, source, target):
+        # 目标位置原有的内容已被覆盖
+        replaced = [path for path in self._notes if _is_within(path, target)]
+        for path in replaced:
+            self._remove(path)
+        moved = [path for path in self._notes if _is_within(path, source)]
+        for path in moved:
+            note = self._remove(path)
+            self._add(target + path[len(source):], note)
+        if moved:
+            logger.debug(f"备注索引: {len(moved)}条备注随路径移动 {source} -> {target}")
+        return bool(moved or replaced)
+
+    def _apply_invalidate(self, paths):
+        missing = [
+            path for path in self._notes
+            if any(_is_within(path, changed) for changed in paths) and not os.path.exists(path)
+        ]
+        for path in missing:
+            self._remove(path)
+        return bool(missing)
+
+    def _union(self, table, keys):
+        result = set()
+        for key in keys:
+            result |= table.get(key, set())
+        return result
+
+    def query(self, tags_all=(), tags_any=(), tags_none=(), category=None,
+              priority_min=None, priority_max=None, path_prefix=None, name=None,
+              sort='priority', offset=0, limit=50):
+        """
+        查询备注：tags_all全部包含（AND）、tags_any包含任一（OR）、tags_none都不包含（NOT），
+        category分类，priority_min/priority_max优先级范围（包含两端），
+        path_prefix目录下（包括子目录），name文件名包含（不区分大小写）；
+        sort为priority（重要的在前）/ name / path，返回 {total, items: [{path, name, note}]}
+        """
+        if sort not in ('priority', 'name', 'path'):
+            raise ValueError(f"不支持的排序方式: {sort}")
+
+        with self._lock:
+            notes = self._load()
+            candidates = None
+
+            # AND：从最小的集合开始求交集，结果为空时提前结束
+            for key in sorted({_tag_key(t) for t in tags_all}, key=lambda k: len(self._tags.get(k, ()))):
+                paths = self._tags.get(key, set())
+                candidates = set(paths) if candidates is None else candidates & paths
+                if not candidates:
+                    break
+
+            if tags_any:
+                matched = self._union(self._tags, {_tag_key(t) for t in tags_any})
+                candidates = matched if candidates is None else candidates & matched
+
+            if category:
+                matched = self._categories.get(category, set())
+                candidates = set(matched) if candidates is None else candidates & matched
+
+            if priority_min is not None or priority_max is not None:
+                low = parse_priority(priority_min) if priority_min is not None else min(PRIORITY_LEVELS.values())
+                high = parse_priority(priority_max) if priority_max is not None else max(PRIORITY_LEVELS.values())
+                matched = self._union(self._priorities, range(low, high + 1))
+                candidates = matched if candidates is None else candidates & matched
+
+            if candidates is None:
+                candidates = set(notes)
+            if tags_none:
+                candidates = candidates - self._union(self._tags, {_tag_key(t) for t in tags_none})
+
+            # 路径和名称条件无法用索引，只对集合运算后剩下的条目逐条判断
+            prefix = os.path.normpath(path_prefix) if path_prefix else None
+            needle = name.lower() if name else None
+            items = [
+                (path, notes[path]) for path in candidates
+                if (prefix is None or _is_within(path, prefix))
+                and (needle is None or needle in os.path.basename(path).lower())
+            ]
+            tags = sorted(
+                ({"tag": self._tag_names[key], "count": len(paths)} for key, paths in self._tags.items()),
+                key=lambda item: (-item['count'], item['tag'].lower())
+            )
+
+        if sort == 'priority':
+            items.sort(key=lambda item: (-PRIORITY_LEVELS[item[1]['priority']], os.path.basename(item[0]).lower(), item[0]))
+        elif sort == 'name':
+            items.sort(key=lambda item: (os.path.basename(item[0]).lower(), item[0]))
+        else:
+            items.sort(key=lambda item: item[0])
+
+        page = items[offset:offset + limit] if limit else items[offset:]
+        return {
+            "total": len(items),
+            "offset": offset,
+            "limit": limit,
+            "items": [{"path": path, "name": os.path.basename(path), "note": note} for path, note in page],
+            "tags": tags
+        }
+
+    def get_stats(self):
+        with self._lock:
+            self._load()
+            return {
+                "notes": len(self._notes),
+                "tags": len(self._tags),
+                "categories": len(self._categories)
+            }
+
+
+# 全局实例（备注文件在第一次使用时才读取）
+_note_index = NoteIndex()
+add_invalidation_listener(_note_index.invalidate)
+add_move_listener(_note_index.move)
+
+
+def get_note_index():
+    """获取全局备注索引"""
+    return _note_index
@@ -0,0 +1,620 @@
+"""
+NZ工作流助手 - 操作日志模块
+新建、复制、移动、重命名和删除在修改文件系统之前先写入追加式日志（预写日志）。
+每个操作拆成可逆的基本步骤（移入回收站、还原、重命名、复制、创建目录……），每完成一步记录一次：
+- 并发操作的日志一起写入，合并为一次fsync（组提交）
+- 启动时检查中断的操作：按已完成的步骤回滚（包含永久删除的操作继续完成，中断的复制从暂存目录续传）
+- 撤销/重做按日志中记录的步骤执行逆操作，本身也作为操作写入日志
+"""
+
+import os
+import errno
+import time
+import uuid
+import shutil
+import threading
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from .path_resolver import invalidate_path, notify_path_moved
+from .copy_engine import copy_file_fast, copy_tree, get_staging_path, PARTIAL_SUFFIX
+from .trash import get_trash_manager
+from .json_codec import loads, dumps
+
+
+# 获取logger实例
+logger = get_logger()
+
+JOURNAL_FILE_NAME = "operation_journal.log"
+
+# 跨文件系统移动时先复制到目标旁的临时路径（以点开头，目录列表中默认隐藏）
+MOVE_SUFFIX = '.nzmove'
+
+# 写入多少条记录后压缩日志（只保留撤销/重做历史和未完成的操作）
+COMPACT_RECORDS = 2000
+
+# 操作的显示名称
+OPERATION_LABELS = {
+    "create_directory": "新建文件夹",
+    "delete_file": "删除文件",
+    "delete_directory": "删除文件夹",
+    "copy_file": "复制文件",
+    "copy_directory": "复制文件夹",
+    "move_file": "移动文件",
+    "move_directory": "移动文件夹",
+    "rename": "重命名",
+    "restore_trash": "从回收站还原",
+    "import_zip": "导入压缩包",
+}
+
+
+# ====== 基本步骤 ======
+
+def plan_create_directory(path):
+    return [{"do": "mkdir", "path": path}]
+
+
+def plan_delete(path, permanent=False):
+    return [{"do": "remove" if permanent else "trash", "path": path}]
+
+
+def plan_rename(source, target):
+    return [{"do": "rename", "source": source, "target": target}]
+
+
+def plan_move(source, target):
+    """移动（覆盖已存在的目标，被覆盖的目标移入回收站）"""
+    if os.path.abspath(source) == os.path.abspath(target):
+        return []
+    plan = [{"do": "trash", "path": target}] if os.path.lexists(target) else []
+    return plan + plan_rename(source, target)
+
+
+def plan_copy(source, target):
+    """复制（覆盖已存在的目标，被覆盖的目标移入回收站）"""
+    plan = [{"do": "trash", "path": target}] if os.path.lexists(target) else []
+    return plan + [{"do": "copy", "source": source, "target": target}]
+
+
+def plan_restore(trash_id, path):
+    """从回收站还原到path（撤销时重新移入回收站）"""
+    return [{"do": "restore", "trash_id": trash_id, "path": path}]
+
+
+def plan_paths(plan):
+    """步骤涉及的所有路径（用于加锁）"""
+    paths = []
+    for step in plan:
+        for key in ('path', 'source', 'target'):
+            if step.get(key) and step[key] not in paths:
+                paths.append(step[key])
+    return paths
+
+
+def _inverse(step):
+    """步骤的逆操作，不可逆（永久删除）时返回None"""
+    do = step['do']
+    if do == 'trash':
+        return {"do": "restore", "trash_id": step.get('trash_id'), "path": step['path']}
+    if do == 'restore':
+        return {"do": "trash", "path": step['path']}
+    if do == 'rename':
+        return {"do": "rename", "source": step['target'], "target": step['source']}
+    if do == 'copy':
+        return {"do": "trash", "path": step['target']}
+    if do == 'mkdir':
+        return {"do": "rmdir", "path": step['path']}
+    if do == 'rmdir':
+        return {"do": "mkdir", "path": step['path']}
+    return None
+
+
+def inverse_plan(steps):
+    """已执行步骤的逆操作（倒序），包含不可逆的步骤时返回None"""
+    plan = [_inverse(step) for step in reversed(steps)]
+    return None if any(step is None for step in plan) else plan
+
+
+def _remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _move_temp_path(target):
+    return os.path.join(os.path.dirname(target), f".{os.path.basename(target)}{MOVE_SUFFIX}")
+
+
+def _move(source, target):
+    """重命名；跨文件系统时先完整复制到目标旁的临时路径，改名为目标后再删除源"""
+    try:
+        os.rename(source, target)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    temp_path = _move_temp_path(target)
+    _remove_path(temp_path)
+    if os.path.isdir(source) and not os.path.islink(source):
+        shutil.copytree(source, temp_path, symlinks=True)
+    else:
+        shutil.copy2(source, temp_path, follow_symlinks=False)
+    os.rename(temp_path, target)
+    _remove_path(source)
+
+
+def _check(step):
+    """执行前检查步骤能否执行（撤销时文件可能已被其他操作修改）"""
+    do = step['do']
+    if do in ('trash', 'remove', 'rmdir'):
+        if not os.path.lexists(step['path']):
+            raise ValueError(f"路径不存在: {step['path']}")
+        if do == 'rmdir' and (not os.path.isdir(step['path']) or os.listdir(step['path'])):
+            raise ValueError(f"文件夹不为空: {step['path']}")
+    elif do in ('restore', 'mkdir'):
+        if os.path.lexists(step['path']):
+            raise ValueError(f"目标位置已存在同名项目: {step['path']}")
+        if do == 'restore' and (not step.get('trash_id') or get_trash_manager().get_item(step['trash_id']) is None):
+            raise ValueError(f"回收站中已没有该项目: {step['path']}")
+    else:
+        if not os.path.lexists(step['source']):
+            raise ValueError(f"路径不存在: {step['source']}")
+        if os.path.lexists(step['target']):
+            raise ValueError(f"目标位置已存在同名项目: {step['target']}")
+
+
+def _apply(step):
+    """执行步骤，把结果（回收站ID、复制统计）写回step"""
+    do = step['do']
+    if do == 'trash':
+        step['trash_id'] = get_trash_manager().move_to_trash(step['path'])
+        invalidate_path(step['path'])
+    elif do == 'restore':
+        get_trash_manager().restore(step['trash_id'], step['path'])
+        invalidate_path(step['path'])
+    elif do == 'rename':
+        _move(step['source'], step['target'])
+        notify_path_moved(step['source'], step['target'])
+        invalidate_path(step['source'], step['target'])
+    elif do == 'copy':
+        if os.path.isdir(step['source']):
+            stats = copy_tree(step['source'], step['target'])
+            step['files'], step['bytes'] = stats['files'], stats['bytes']
+        else:
+            copy_file_fast(step['source'], step['target'])
+            step['files'], step['bytes'] = 1, os.path.getsize(step['target'])
+        invalidate_path(step['target'])
+    elif do == 'mkdir':
+        os.makedirs(step['path'])
+        invalidate_path(step['path'])
+    elif do == 'rmdir':
+        os.rmdir(step['path'])
+        invalidate_path(step['path'])
+    elif do == 'remove':
+        _remove_path(step['path'])
+        invalidate_path(step['path'])
+    else:
+        raise ValueError(f"未知的操作步骤: {do}")
+    return step
+
+
+def _is_done(step, since):
+    """
+    判断中断时正在执行的步骤是否已经完成（崩溃时步骤记录可能还没写入），
+    未完成时清理留下的临时文件
+    """
+    do = step['do']
+    if do == 'trash':
+        if os.path.lexists(step['path']):
+            return False
+        item = get_trash_manager().find_item(step['path'], since)
+        step['trash_id'] = item['id'] if item else None
+        return True
+    if do == 'restore':
+        return os.path.lexists(step['path']) and get_trash_manager().get_item(step['trash_id']) is None
+    if do == 'rename':
+        if os.path.lexists(step['target']):
+            # 跨文件系统移动已改名为目标，只剩删除源未完成；无法确定源是否完整，保留由用户处理
+            if os.path.lexists(step['source']):
+                logger.warning(f"移动已完成但源路径仍存在，请手动检查: {step['source']}")
+            return True
+        _remove_path(_move_temp_path(step['target']))
+        return False
+    if do == 'copy':
+        if os.path.lexists(step['target']):
+            return True
+        # 只删除单个文件复制的临时文件；目录复制的暂存目录保留，继续执行时从中断处续传
+        target = step['target']
+        _remove_path(os.path.join(os.path.dirname(target), f".{os.path.basename(target)}{PARTIAL_SUFFIX}"))
+        return False
+    if do == 'mkdir':
+        return os.path.isdir(step['path'])
+    return not os.path.lexists(step['path'])
+
+
+def _new_id():
+    return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+
+class OperationJournal:
+    """
+    操作日志 - 每行一条JSON记录：begin（操作和计划的步骤）、step（完成的步骤）、commit / abort。
+    记录先进入缓冲区，需要持久化时由一个线程把缓冲区中所有记录一起写入并fsync，其他线程等待结果。
+    记录在_lock内追加，同时更新内存中的操作表，所以缓冲区中的记录总是已经反映在操作表中
+    """
+
+    def __init__(self):
+        # 操作表和撤销/重做栈
+        self._lock = threading.RLock()
+        # 撤销/重做依次执行
+        self._history_lock = threading.Lock()
+        # 日志缓冲和写入状态
+        self._write_cond = threading.Condition()
+        self._buffer = []
+        self._appended = 0
+        self._durable = 0
+        self._flushing = False
+        self._file = None
+        self._records = 0
+        self._batches = 0
+        self._since_compact = 0
+
+        self._operations = None
+        self._undo = []
+        self._redo = []
+
+    def _journal_file(self):
+        return os.path.join(get_data_dir(), JOURNAL_FILE_NAME)
+
+    # ====== 日志写入（组提交） ======
+
+    def _append(self, record):
+        """追加一条记录到缓冲区（调用方持有_lock并同时更新操作表），由_sync写入磁盘"""
+        line = dumps(record) + '\n'
+        with self._write_cond:
+            self._buffer.append(line)
+            self._appended += 1
+            self._since_compact += 1
+
+    def _sync(self):
+        """等待已追加的记录全部写入磁盘"""
+        with self._write_cond:
+            self._wait_durable(self._appended)
+
+    def _wait_durable(self, seq):
+        """调用方持有_write_cond；正在写入时等待，否则由当前线程写入缓冲区中的全部记录"""
+        while self._durable < seq:
+            if self._flushing:
+                self._write_cond.wait()
+                continue
+
+            self._flushing = True
+            lines, self._buffer = self._buffer, []
+            upto = self._appended
+            self._write_cond.release()
+            try:
+                self._write(lines)
+            except Exception:
+                self._write_cond.acquire()
+                self._buffer[:0] = lines
+                self._flushing = False
+                self._write_cond.notify_all()
+                raise
+            self._write_cond.acquire()
+            self._durable = upto
+            self._records += len(lines)
+            self._batches += 1
+            self._flushing = False
+            self._write_cond.notify_all()
+
+    def _write(self, lines):
+        if self._file is None:
+            self._file = open(self._journal_file(), 'ab')
+        self._file.write(''.join(lines).encode('utf-8'))
+        self._file.flush()
+        if get_setting('journal_fsync', True):
+            os.fsync(self._file.fileno())
+
+    # ====== 读取与状态 ======
+
+    def _load(self):
+        """读取日志并重建操作表和撤销/重做栈（调用方持有_lock），返回未完成的操作"""
+        if self._operations is not None:
+            return []
+        self._operations = {}
+        try:
+            with open(self._journal_file(), 'rb') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+
+        for line in lines:
+            try:
+                record = loads(line)
+            except ValueError:
+                # 崩溃时写了一半的最后一行
+                continue
+            op_id = record.get('op')
+            if record.get('type') == 'begin':
+                self._operations[op_id] = {
+                    "id": op_id, "kind": record['kind'], "args": record.get('args') or {},
+                    "plan": record['plan'], "time": record['time'], "steps": [], "status": "pending"
+                }
+            elif op_id in self._operations:
+                operation = self._operations[op_id]
+                if record['type'] == 'step' and record.get('index') == len(operation['steps']):
+                    operation['steps'].append(record['step'])
+                elif record['type'] in ('commit', 'abort'):
+                    self._settle(operation, record['type'])
+
+        return [op for op in self._operations.values() if op['status'] == 'pending']
+
+    def _settle(self, operation, status):
+        """操作结束后更新撤销/重做栈（调用方持有_lock）"""
+        operation['status'] = status
+        if status == 'commit':
+            kind = operation['kind']
+            target = operation['args'].get('target')
+            if kind == 'undo':
+                if target in self._undo:
+                    self._undo.remove(target)
+                self._redo.append(operation['id'])
+            elif kind == 'redo':
+                if target in self._redo:
+                    self._redo.remove(target)
+                self._undo.append(operation['id'])
+            else:
+                # 新操作使重做历史失效；永久删除等不可逆的操作不进入撤销历史
+                self._redo.clear()
+                if operation['steps'] and inverse_plan(operation['steps']) is not None:
+                    self._undo.append(operation['id'])
+
+            limit = max(0, get_setting('undo_history', 50))
+            while len(self._undo) > limit:
+                self._undo.pop(0)
+
+        # 不在历史中且已结束的操作不再需要
+        referenced = set(self._undo) | set(self._redo)
+        for op_id in [i for i, op in self._operations.items() if op['status'] != 'pending' and i not in referenced]:
+            del self._operations[op_id]
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._operations is None:
+                pending = self._load()
+                if pending:
+                    # 没有先调用recover时（如命令行工具中），未完成的操作保持原样，由服务启动时处理
+                    logger.warning(f"操作日志中有{len(pending)}个未完成的操作，将在服务启动时恢复")
+
+    # ====== 执行 ======
+
+    def execute(self, kind, plan, args=None):
+        """
+        执行并记录一个操作，返回执行后的步骤（包含回收站ID、复制统计等结果）；
+        某一步失败时按相反顺序撤销已完成的步骤，再抛出原来的异常
+        """
+        self._ensure_loaded()
+        operation = {
+            "id": _new_id(), "kind": kind, "args": dict(args or {}, action=(args or {}).get('action', kind)),
+            "plan": plan, "time": time.time(), "steps": [], "status": "pending"
+        }
+        with self._lock:
+            self._operations[operation['id']] = operation
+            self._append({
+                "type": "begin", "op": operation['id'], "kind": kind, "args": operation['args'],
+                "plan": plan, "time": operation['time']
+            })
+
+        try:
+            self._run(operation)
+        except Exception as e:
+            logger.warning(f"操作失败，回滚已完成的步骤: {kind} - {str(e)}")
+            self._rollback(operation)
+            self._finish(operation, 'abort', error=str(e))
+            raise
+        self._finish(operation, 'commit')
+        return operation['steps']
+
+    def _run(self, operation):
+        """依次执行剩余的步骤：修改文件系统之前，之前的记录必须已经写入磁盘"""
+        for index in range(len(operation['steps']), len(operation['plan'])):
+            step = dict(operation['plan'][index])
+            self._sync()
+            _check(step)
+            _apply(step)
+            self._record_step(operation, step)
+
+    def _record_step(self, operation, step):
+        with self._lock:
+            operation['steps'].append(step)
+            self._append({"type": "step", "op": operation['id'], "index": len(operation['steps']) - 1, "step": step})
+
+    def _rollback(self, operation):
+        """按相反顺序撤销已完成的步骤（已撤销的步骤会被跳过，可以重复执行）"""
+        for step in reversed(operation['steps']):
+            inverse = _inverse(step)
+            try:
+                if inverse is None or _is_done(inverse, operation['time']):
+                    continue
+                _apply(inverse)
+            except Exception as e:
+                logger.error(f"回滚步骤失败: {step} - {str(e)}")
+
+    def _finish(self, operation, status, error=None):
+        record = {"type": status, "op": operation['id']}
+        if error:
+            record['error'] = error
+        with self._lock:
+            self._append(record)
+            self._settle(operation, status)
+        self._sync()
+        if self._since_compact >= COMPACT_RECORDS:
+            self.compact()
+
+    # ====== 崩溃恢复 ======
+
+    def recover(self):
+        """处理上次运行中断的操作（服务启动时调用），返回处理的操作数"""
+        with self._lock:
+            pending = self._load()
+
+        for operation in sorted(pending, key=lambda op: op['time']):
+            plan, steps = operation['plan'], operation['steps']
+            try:
+                # 中断时正在执行的步骤可能已完成但还没有记录
+                if len(steps) < len(plan):
+                    step = dict(plan[len(steps)])
+                    if _is_done(step, operation['time']):
+                        self._record_step(operation, step)
+
+                if len(steps) == len(plan):
+                    self._finish(operation, 'commit')
+                    logger.info(f"操作日志恢复: 中断的操作已完成 {operation['kind']} {plan_paths(plan)}")
+                elif any(step['do'] == 'remove' for step in plan):
+                    # 永久删除无法回滚，继续完成
+                    self._run(operation)
+                    self._finish(operation, 'commit')
+                    logger.info(f"操作日志恢复: 继续完成中断的操作 {operation['kind']} {plan_paths(plan)}")
+                elif plan[len(steps)]['do'] == 'copy':
+                    self._resume_copy(operation)
+                else:
+                    self._rollback(operation)
+                    self._finish(operation, 'abort', error="服务中断，已回滚")
+                    logger.info(f"操作日志恢复: 已回滚中断的操作 {operation['kind']} {plan_paths(plan)}")
+            except Exception as e:
+                logger.error(f"操作日志恢复失败: {operation['kind']} {plan_paths(plan)} - {str(e)}")
+
+        self.compact()
+        return len(pending)
+
+    def _resume_copy(self, operation):
+        """继续中断的复制（目录复制从暂存目录续传，已复制的文件不再复制）；无法完成时回滚并清理暂存目录"""
+        plan = operation['plan']
+        try:
+            self._run(operation)
+        except Exception as e:
+            step = plan[len(operation['steps'])]
+            self._rollback(operation)
+            _remove_path(get_staging_path(step['source'], step['target']))
+            self._finish(operation, 'abort', error=f"服务中断，继续复制失败: {str(e)}")
+            logger.warning(f"操作日志恢复: 继续复制失败，已回滚 {operation['kind']} {plan_paths(plan)} - {str(e)}")
+            return
+        self._finish(operation, 'commit')
+        logger.info(f"操作日志恢复: 已续传中断的复制 {operation['kind']} {plan_paths(plan)}")
+
+    def compact(self):
+        """
+        重写日志文件，只保留撤销/重做历史中的操作和未完成的操作；
+        内容完全由操作表生成，缓冲区中尚未写入的记录已包含在操作表中，直接丢弃
+        """
+        with self._lock, self._write_cond:
+            if self._operations is None:
+                return
+            while self._flushing:
+                self._write_cond.wait()
+
+            keep = [self._operations[i] for i in self._undo + self._redo if i in self._operations]
+            keep += [op for op in self._operations.values() if op['status'] == 'pending']
+            lines = []
+            for operation in keep:
+                lines.append(dumps({
+                    "type": "begin", "op": operation['id'], "kind": operation['kind'],
+                    "args": operation['args'], "plan": operation['plan'], "time": operation['time']
+                }))
+                for index, step in enumerate(operation['steps']):
+                    lines.append(dumps({"type": "step", "op": operation['id'], "index": index, "step": step}))
+                if operation['status'] != 'pending':
+                    lines.append(dumps({"type": operation['status'], "op": operation['id']}))
+
+            path = self._journal_file()
+            temp_path = path + '.tmp'
+            try:
+                with open(temp_path, 'wb') as f:
+                    f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                os.replace(temp_path, path)
+            except OSError as e:
+                logger.warning(f"压缩操作日志失败: {str(e)}")
+                return
+
+            self._buffer = []
+            self._durable = self._appended
+            self._since_compact = 0
+            self._write_cond.notify_all()
+
+    # ====== 撤销/重做 ======
+
+    def _entry(self, op_id):
+        """历史条目：id、原操作类型和名称、逆操作的计划"""
+        operation = self._operations[op_id]
+        action = operation['args'].get('action', operation['kind'])
+        return {
+            "id": op_id,
+            "action": action,
+            "label": OPERATION_LABELS.get(action, action),
+            "time": operation['time'],
+            "paths": plan_paths(operation['steps']),
+            "plan": inverse_plan(operation['steps'])
+        }
+
+    def peek(self, direction):
+        """撤销（undo）或重做（redo）时将要处理的条目，没有时抛出ValueError"""
+        self._ensure_loaded()
+        with self._lock:
+            stack = self._undo if direction == 'undo' else self._redo
+            if not stack:
+                raise ValueError("没有可撤销的操作" if direction == 'undo' else "没有可重做的操作")
+            return self._entry(stack[-1])
+
+    def _step_back(self, direction, expected_id=None):
+        with self._history_lock:
+            entry = self.peek(direction)
+            if expected_id and entry['id'] != expected_id:
+                raise ValueError("操作历史已变化，请刷新后重试")
+            steps = self.execute(direction, entry['plan'], {"target": entry['id'], "action": entry['action']})
+            entry['paths'] = plan_paths(steps)
+            del entry['plan']
+            return entry
+
+    def undo(self, expected_id=None):
+        """撤销最近的操作，返回被撤销的条目（expected_id不是最近的操作时抛出ValueError）"""
+        return self._step_back('undo', expected_id)
+
+    def redo(self, expected_id=None):
+        """重做最近撤销的操作"""
+        return self._step_back('redo', expected_id)
+
+    def history(self, limit=20):
+        """撤销和重做历史（最近的在前）"""
+        self._ensure_loaded()
+        with self._lock:
+            entries = {}
+            for direction, stack in (('undo', self._undo), ('redo', self._redo)):
+                entries[direction] = []
+                for op_id in reversed(stack[-limit:] if limit else stack):
+                    entry = self._entry(op_id)
+                    del entry['plan']
+                    entries[direction].append(entry)
+            return entries
+
+    def get_stats(self):
+        with self._write_cond:
+            return {
+                "records": self._records,
+                "fsync_batches": self._batches,
+                "pending_records": len(self._buffer)
+            }
+
+
+# 全局实例
+_operation_journal = OperationJournal()
+
+
+def get_operation_journal():
+    """获取全局操作日志"""
+    return _operation_journal
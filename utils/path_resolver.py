@@ -0,0 +1,273 @@
+"""
+NZ工作流助手 - 路径解析模块
+把客户端传入的路径统一解析为规范化的绝对路径，并限制在配置的工作流根目录内
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from ..core.logger import get_logger
+from ..core.config import get_settings
+from ..core.constants import PATH_ID_PREFIX, REMOTE_PATH_SCHEMES
+from .tracer import span
+
+
+# 获取logger实例
+logger = get_logger()
+
+
+class PathAccessError(ValueError):
+    """路径无效或超出允许访问的根目录"""
+
+
+def is_remote_path(path):
+    """判断路径是否为对象存储地址（如 s3://bucket/prefix）"""
+    return isinstance(path, str) and path.lower().startswith(REMOTE_PATH_SCHEMES)
+
+
+def _normcase(path):
+    """大小写规范化（仅在不区分大小写的系统上生效）"""
+    return os.path.normcase(path)
+
+
+def _is_within(path, base):
+    """判断path是否位于base之内（两者均为规范化后的真实路径）"""
+    try:
+        return os.path.commonpath([_normcase(path), _normcase(base)]) == _normcase(base)
+    except ValueError:
+        # 不同盘符等情况无法比较
+        return False
+
+
+class PathResolver:
+    """路径解析器 - 缓存规范化和符号链接解析结果，按根目录校验访问范围"""
+
+    def __init__(self, roots=None, cache_size=4096, cache_ttl=5.0):
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = max(int(cache_size), 1)
+        self._cache_ttl = float(cache_ttl)
+        self._roots = []
+        self._remote_roots = []
+        self.hits = 0
+        self.misses = 0
+        self.set_roots(roots or [])
+
+    def set_roots(self, roots):
+        """设置允许访问的根目录 [{"name": ..., "path": ...}]（对象存储根目录由存储后端处理）"""
+        resolved_roots = []
+        remote_roots = []
+        for root in roots:
+            if is_remote_path(root['path']):
+                remote_roots.append(root)
+                continue
+            path = os.path.abspath(root['path'])
+            resolved_roots.append({
+                **root,
+                'path': path,
+                'real_path': os.path.realpath(path)
+            })
+
+        # 较长的根目录优先匹配（支持嵌套根目录）
+        resolved_roots.sort(key=lambda r: len(r['real_path']), reverse=True)
+
+        with self._lock:
+            self._roots = resolved_roots
+            self._remote_roots = remote_roots
+            self._cache.clear()
+
+        if resolved_roots:
+            logger.info(f"工作流根目录: {[r['path'] for r in resolved_roots]}")
+
+    @property
+    def roots(self):
+        return list(self._roots)
+
+    @property
+    def remote_roots(self):
+        return list(self._remote_roots)
+
+    @property
+    def restricted(self):
+        """是否启用了根目录限制（只配置了对象存储根目录时，本地路径全部禁止访问）"""
+        return bool(self._roots or self._remote_roots)
+
+    def _find_root_by_name(self, name):
+        for root in self._roots:
+            if root['name'] == name:
+                return root
+        return None
+
+    def _expand_path_id(self, path):
+        """把 "@根目录名/相对路径" 形式的路径ID展开为绝对路径"""
+        name, _, relative = path[len(PATH_ID_PREFIX):].replace('\\', '/').partition('/')
+        root = self._find_root_by_name(name)
+        if root is None:
+            raise PathAccessError(f"未知的根目录: {name}")
+        return os.path.join(root['path'], *[p for p in relative.split('/') if p])
+
+    def _resolve_uncached(self, path):
+        """执行实际的解析（规范化 + 符号链接解析 + 根目录校验）"""
+        if is_remote_path(path):
+            raise PathAccessError(f"对象存储路径不能按本地路径访问: {path}")
+
+        if path.startswith(PATH_ID_PREFIX) and self._roots:
+            path = self._expand_path_id(path)
+
+        normalized = os.path.normpath(os.path.abspath(os.path.expanduser(path)))
+        real_path = os.path.realpath(normalized)
+
+        root_name = None
+        if self.restricted:
+            for root in self._roots:
+                if _is_within(real_path, root['real_path']):
+                    root_name = root['name']
+                    break
+            else:
+                raise PathAccessError(f"路径超出允许访问的根目录: {path}")
+
+        return normalized, real_path, root_name
+
+    def _lookup(self, path):
+        """查询缓存，未命中时解析并写入缓存"""
+        if not path or not isinstance(path, str) or not path.strip():
+            raise PathAccessError("路径不能为空")
+
+        if '\x00' in path:
+            raise PathAccessError("路径包含非法字符")
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and now - entry[3] < self._cache_ttl:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return entry
+
+        normalized, real_path, root_name = self._resolve_uncached(path)
+        entry = (normalized, real_path, root_name, now)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[path] = entry
+            self._cache.move_to_end(path)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+        return entry
+
+    def resolve(self, path):
+        """解析客户端路径，返回规范化的绝对路径；超出根目录时抛出PathAccessError"""
+        return self._lookup(path)[0]
+
+    def find_root(self, path):
+        """返回路径所属的根目录配置（未启用根目录限制时返回None）"""
+        root_name = self._lookup(path)[2]
+        return self._find_root_by_name(root_name) if root_name else None
+
+    def to_path_id(self, path):
+        """把路径转换为 "@根目录名/相对路径" 形式的ID（未启用根目录限制时返回规范化路径）"""
+        normalized, real_path, root_name = self._lookup(path)[:3]
+        if not root_name:
+            return normalized
+
+        root = self._find_root_by_name(root_name)
+        relative = os.path.relpath(real_path, root['real_path'])
+        if relative == os.curdir:
+            return f"{PATH_ID_PREFIX}{root_name}"
+        return f"{PATH_ID_PREFIX}{root_name}/{relative.replace(os.sep, '/')}"
+
+    def invalidate(self, path=None):
+        """使缓存失效：不传参数时清空全部缓存，否则清除该路径及其子路径的缓存"""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+                return
+
+            prefix = _normcase(os.path.normpath(os.path.abspath(path)))
+            stale_keys = [
+                key for key, entry in self._cache.items()
+                if _is_within(_normcase(entry[0]), prefix) or _is_within(_normcase(entry[1]), prefix)
+            ]
+            for key in stale_keys:
+                del self._cache[key]
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "restricted": self.restricted,
+                "roots": [r['path'] for r in self._roots],
+                "cache_entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# 全局解析器实例
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_path_resolver():
+    """获取全局路径解析器（根据配置创建）"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                settings = get_settings()
+                _resolver = PathResolver(
+                    roots=settings.get('roots', []),
+                    cache_size=settings.get('path_cache_size', 4096),
+                    cache_ttl=settings.get('path_cache_ttl', 5.0)
+                )
+    return _resolver
+
+
+def resolve_path(path):
+    """解析客户端路径（便捷函数）"""
+    with span('validate'):
+        return get_path_resolver().resolve(path)
+
+
+# 路径失效监听器（其他按路径缓存的模块在此注册，随插件自身的修改操作同步失效）
+_invalidation_listeners = []
+
+
+def add_invalidation_listener(callback):
+    """注册路径失效回调 callback(paths)，重复注册同一回调无副作用"""
+    if callback not in _invalidation_listeners:
+        _invalidation_listeners.append(callback)
+
+
+def invalidate_path(*paths):
+    """在文件被修改后使相关路径缓存失效（便捷函数）"""
+    resolver = get_path_resolver()
+    paths = [path for path in paths if path]
+    for path in paths:
+        resolver.invalidate(path)
+    for callback in list(_invalidation_listeners):
+        try:
+            callback(paths)
+        except Exception as e:
+            logger.warning(f"路径失效回调执行失败: {str(e)}")
+
+
+# 路径移动监听器（按路径保存数据的模块在此注册，文件或目录被移动/重命名后把数据改到新路径）
+_move_listeners = []
+
+
+def add_move_listener(callback):
+    """注册路径移动回调 callback(source, target)，重复注册同一回调无副作用"""
+    if callback not in _move_listeners:
+        _move_listeners.append(callback)
+
+
+def notify_path_moved(source, target):
+    """文件或目录被移动/重命名后通知监听器（需在invalidate_path之前调用，否则源路径的数据会被当作已删除）"""
+    for callback in list(_move_listeners):
+        try:
+            callback(source, target)
+        except Exception as e:
+            logger.warning(f"路径移动回调执行失败: {str(e)}")
@@ -0,0 +1,192 @@
+"""
+NZ工作流助手 - 运行时分析模块
+在运行中的服务里做限时分析，不需要重启：
+- sample：采样线程按固定间隔抓取所有线程的调用栈，统计最耗时的函数和调用栈
+  （按实际时间采样，阻塞在磁盘IO上的线程也会被统计，只跳过空闲等待的线程）
+- memory：用tracemalloc比较开始和结束时的内存分配，找出分配最多和增长最多的代码行
+同一时间只允许一个分析运行
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from ..core.logger import get_logger
+
+
+# 获取logger实例
+logger = get_logger()
+
+PROFILE_MODES = ('sample', 'memory')
+
+# 单次分析的最长时间（秒）
+MAX_PROFILE_SECONDS = 60
+
+# 默认采样间隔（秒）和报告中列出的条目数
+DEFAULT_INTERVAL = 0.005
+DEFAULT_TOP = 30
+
+# 栈顶是这些函数时线程处于空闲等待（等锁、等任务、等IO事件），不计入热点
+_IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+_profile_lock = threading.Lock()
+
+
+def _short_path(filename):
+    """报告中的文件路径：site-packages和标准库只保留包内路径"""
+    parts = filename.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'dist-packages', 'custom_nodes'):
+        if marker in parts:
+            return '/'.join(parts[parts.index(marker) + 1:])
+    return '/'.join(parts[-2:])
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL, top=DEFAULT_TOP):
+    """按interval采样所有线程的调用栈seconds秒，返回热点函数（self为栈顶次数，total为出现次数）和调用栈"""
+    own_ident = threading.get_ident()
+    self_counts = Counter()
+    total_counts = Counter()
+    stacks = Counter()
+    thread_counts = Counter()
+    labels = {}
+    sweeps = busy = idle = 0
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if _is_idle(frame):
+                idle += 1
+                continue
+
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            busy += 1
+            thread_counts[names.get(ident, str(ident))] += 1
+            self_counts[codes[0]] += 1
+            for code in set(codes):
+                total_counts[code] += 1
+            stacks[tuple(reversed(codes))] += 1
+        sweeps += 1
+        time.sleep(interval)
+
+    def label(code):
+        if code not in labels:
+            labels[code] = _frame_label(code)
+        return labels[code]
+
+    def percent(count):
+        return round(count * 100.0 / busy, 1) if busy else 0.0
+
+    functions = [
+        {
+            "function": label(code),
+            "self": self_counts[code],
+            "total": count,
+            "self_percent": percent(self_counts[code]),
+            "total_percent": percent(count)
+        }
+        for code, count in sorted(total_counts.items(), key=lambda item: (-self_counts[item[0]], -item[1]))[:top]
+    ]
+    return {
+        "mode": "sample",
+        "seconds": seconds,
+        "interval": interval,
+        "sweeps": sweeps,
+        "busy_samples": busy,
+        "idle_samples": idle,
+        "threads": dict(thread_counts.most_common()),
+        "functions": functions,
+        # 折叠格式（根在前、分号分隔），可直接用于火焰图工具
+        "stacks": [
+            {"stack": ";".join(label(code) for code in stack), "count": count}
+            for stack, count in stacks.most_common(top)
+        ]
+    }
+
+
+def _statistic_entry(stat):
+    frame = stat.traceback[0]
+    entry = {
+        "location": f"{_short_path(frame.filename)}:{frame.lineno}",
+        "size": stat.size,
+        "count": stat.count
+    }
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff'] = stat.size_diff
+        entry['count_diff'] = stat.count_diff
+    return entry
+
+
+def snapshot_memory(seconds, top=DEFAULT_TOP):
+    """
+    用tracemalloc记录seconds秒内的内存分配：返回结束时分配最多的代码行和期间增长最多的代码行；
+    tracemalloc原本没有开启时分析结束后关闭（开启期间内存分配会变慢）
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    return {
+        "mode": "memory",
+        "seconds": seconds,
+        # 分析期间才开启tracemalloc时，只能看到这段时间内分配且仍未释放的内存
+        "tracing_started": started,
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "top": [_statistic_entry(stat) for stat in after.statistics('lineno')[:top]],
+        "growth": [_statistic_entry(stat) for stat in after.compare_to(before, 'lineno')[:top] if stat.size_diff > 0]
+    }
+
+
+def run_profile(mode='sample', seconds=5, interval=DEFAULT_INTERVAL, top=DEFAULT_TOP):
+    """执行一次限时分析（阻塞seconds秒，应在线程池中调用），已有分析在运行时抛出RuntimeError"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"不支持的分析模式: {mode}")
+    seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+    interval = min(max(float(interval), 0.001), 1.0)
+    top = max(1, int(top))
+
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("已有分析正在运行，请稍后再试")
+    try:
+        logger.info(f"开始运行时分析: {mode}，{seconds}秒")
+        if mode == 'sample':
+            return sample_stacks(seconds, interval, top)
+        return snapshot_memory(seconds, top)
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,114 @@
+"""
+NZ工作流助手 - 工作流版本缓存模块
+缓存每个工作流最近一次保存的内容和版本哈希，用于增量保存（客户端只上传JSON Patch）
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from ..core.config import get_setting
+from .json_codec import loads
+
+
+def compute_revision(content):
+    """计算工作流文本的版本哈希（SHA-256，与客户端计算方式一致）"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def serialize_for_revision(document):
+    """
+    按客户端 JSON.stringify(data, null, 2) 的格式序列化文档，应用补丁后用它生成文本并校验版本哈希；
+    浮点数按Python的格式输出，与JS不同的少数写法（如 1e-7）会使哈希不一致，由客户端改为完整上传
+    """
+    return json.dumps(document, indent=2, ensure_ascii=False)
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+class RevisionCache:
+    """最近保存版本的LRU缓存，按文本总大小限制内存占用"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self.max_bytes = max_bytes
+
+    def remember(self, path, content, document=None):
+        """记录某个文件刚保存的内容，返回版本哈希"""
+        revision = compute_revision(content)
+        size = len(content)
+        entry = {
+            "revision": revision,
+            "content": content,
+            "document": document,
+            "signature": _file_signature(path),
+            "size": size
+        }
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._total_bytes -= old['size']
+            if size <= self.max_bytes:
+                self._entries[path] = entry
+                self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted['size']
+
+        return revision
+
+    def get_document(self, path, revision):
+        """
+        获取指定版本的已解析文档；版本不一致、未缓存或文件已被其他途径修改时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['revision'] != revision:
+                return None
+            self._entries.move_to_end(path)
+
+        if entry['signature'] != _file_signature(path):
+            self.forget(path)
+            return None
+
+        if entry['document'] is None:
+            entry['document'] = loads(entry['content'])
+        return entry['document']
+
+    def get_revision(self, path):
+        """获取文件最近一次保存的版本哈希，文件已被其他途径修改或未缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or entry['signature'] != _file_signature(path):
+            return None
+        return entry['revision']
+
+    def forget(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._total_bytes -= entry['size']
+
+
+# 全局缓存实例
+_revision_cache = None
+
+
+def get_revision_cache():
+    """获取全局版本缓存"""
+    global _revision_cache
+    if _revision_cache is None:
+        _revision_cache = RevisionCache(get_setting('revision_cache_bytes', 64 * 1024 * 1024))
+    return _revision_cache
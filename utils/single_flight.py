@@ -0,0 +1,102 @@
+"""
+NZ工作流助手 - 请求合并模块
+相同的读取请求（同一操作、同一路径、同样的参数）同时到达时只执行一次磁盘操作，
+其余请求等待同一个结果；路径被修改后，新请求不再加入修改前开始的操作
+"""
+
+import os
+import asyncio
+import threading
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from .path_resolver import add_invalidation_listener
+from .tracer import bind
+
+
+# 获取logger实例
+logger = get_logger()
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+class SingleFlight:
+    """请求合并器 - key为 (操作, 路径, 参数)，操作在线程池中执行，结果分发给所有等待的请求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stats = {}
+
+    def _kind_stats(self, kind):
+        stats = self._stats.get(kind)
+        if stats is None:
+            stats = self._stats[kind] = {"requests": 0, "executions": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+        return stats
+
+    def _finished(self, key, entry, future):
+        with self._lock:
+            if self._in_flight.get(key) is entry:
+                del self._in_flight[key]
+            if future.cancelled() or future.exception() is not None:
+                # 读取exception()同时避免所有等待者都已断开时的"未获取异常"警告
+                self._kind_stats(key[0])['errors'] += 1
+
+    async def run(self, kind, path, options, func, *args):
+        """执行func(*args)，同一 (kind, path, options) 正在执行时直接等待其结果"""
+        if not get_setting('coalesce_reads', True):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, bind(func), *args)
+
+        key = (kind, os.path.normpath(path), options)
+        with self._lock:
+            stats = self._kind_stats(kind)
+            stats['requests'] += 1
+            entry = self._in_flight.get(key)
+            if entry is not None:
+                entry['waiters'] += 1
+                stats['coalesced'] += 1
+                stats['max_waiters'] = max(stats['max_waiters'], entry['waiters'])
+            else:
+                loop = asyncio.get_running_loop()
+                entry = {"future": loop.run_in_executor(None, bind(func), *args), "waiters": 1}
+                self._in_flight[key] = entry
+                stats['executions'] += 1
+                entry['future'].add_done_callback(lambda future: self._finished(key, entry, future))
+
+        # shield：某个请求断开时不取消其他请求仍在等待的操作
+        return await asyncio.shield(entry['future'])
+
+    def invalidate(self, paths):
+        """路径被修改后，之后的请求重新执行读取（已在等待的请求仍使用原结果）"""
+        paths = [os.path.normpath(path) for path in paths]
+        with self._lock:
+            for key in list(self._in_flight):
+                if any(_is_within(key[1], path) or _is_within(path, key[1]) for path in paths):
+                    del self._in_flight[key]
+
+    def get_stats(self):
+        with self._lock:
+            kinds = {kind: dict(stats) for kind, stats in self._stats.items()}
+            in_flight = len(self._in_flight)
+        requests = sum(stats['requests'] for stats in kinds.values())
+        coalesced = sum(stats['coalesced'] for stats in kinds.values())
+        return {
+            "requests": requests,
+            "executions": sum(stats['executions'] for stats in kinds.values()),
+            "coalesced": coalesced,
+            "coalesced_ratio": coalesced / requests if requests else 0.0,
+            "in_flight": in_flight,
+            "kinds": kinds
+        }
+
+
+# 全局实例
+_single_flight = SingleFlight()
+add_invalidation_listener(_single_flight.invalidate)
+
+
+def get_single_flight():
+    """获取全局请求合并器"""
+    return _single_flight
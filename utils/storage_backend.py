@@ -0,0 +1,642 @@
+"""
+NZ工作流助手 - 存储后端模块
+把文件操作抽象为统一的异步存储接口：
+LocalStorageBackend 操作本地磁盘（修改通过操作日志执行，沿用回收站、快速复制、存储格式等已有实现），
+S3StorageBackend 访问S3兼容的对象存储（AWS S3 / MinIO / moto等），
+使用连接池复用的异步客户端、分页列举前缀、元数据缓存和大文件分段上传
+"""
+
+import os
+import abc
+import time
+import asyncio
+from datetime import datetime
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from ..core.constants import PATH_ID_PREFIX
+from .path_resolver import PathAccessError, get_path_resolver, resolve_path, invalidate_path, is_remote_path
+from .file_utils import get_directory_listing
+from .operation_journal import (
+    get_operation_journal, plan_create_directory, plan_delete, plan_rename, plan_move, plan_copy, plan_restore
+)
+from .tracer import span
+from .workflow_format import (
+    decode_workflow_bytes, encode_workflow, read_workflow_text, write_workflow,
+    get_storage_mode, is_workflow_file, strip_workflow_extension, locate_workflow_file, publish_workflow_save,
+    PLAIN_EXTENSION, GZIP_EXTENSION, ZSTD_EXTENSION
+)
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 可选依赖：aiobotocore（使用S3根目录时需要）
+try:
+    from aiobotocore.session import get_session as _get_aiobotocore_session
+    from aiobotocore.config import AioConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    _get_aiobotocore_session = None
+    AioConfig = None
+    ClientError = None
+
+# S3单次批量删除的最大对象数
+S3_DELETE_BATCH = 1000
+
+
+class StorageBackend(abc.ABC):
+    """存储后端接口 - 所有路径都是该后端内的完整路径"""
+
+    remote = False
+
+    @abc.abstractmethod
+    def join(self, path, *names):
+        pass
+
+    @abc.abstractmethod
+    def dirname(self, path):
+        pass
+
+    @abc.abstractmethod
+    def basename(self, path):
+        pass
+
+    @abc.abstractmethod
+    async def stat(self, path):
+        """返回 {"is_dir", "size", "modified"}，路径不存在时返回None"""
+
+    @abc.abstractmethod
+    async def list_directory(self, path):
+        """返回与get_directory_listing相同格式的目录列表"""
+
+    @abc.abstractmethod
+    async def list_files(self, path):
+        """递归列出目录下的所有文件，返回相对路径列表（使用 / 分隔）"""
+
+    @abc.abstractmethod
+    async def read_bytes(self, path):
+        pass
+
+    @abc.abstractmethod
+    async def write_bytes(self, path, data):
+        pass
+
+    async def read_workflow(self, path):
+        """读取工作流JSON文本（自动解压）"""
+        return decode_workflow_bytes(await self.read_bytes(path), path)
+
+    @abc.abstractmethod
+    async def write_workflow(self, path, content):
+        """按存储模式写入工作流，返回实际写入的路径和字节数"""
+
+    @abc.abstractmethod
+    async def make_directory(self, path):
+        pass
+
+    @abc.abstractmethod
+    async def delete(self, path, permanent=False):
+        """删除文件或目录，移入回收站时返回回收站ID"""
+
+    @abc.abstractmethod
+    async def copy(self, source_path, target_path):
+        """在同一后端内复制文件或目录（覆盖目标），返回复制统计 {"files", "bytes"}（无法统计时为None）"""
+
+    @abc.abstractmethod
+    async def move(self, source_path, target_path):
+        """在同一后端内移动文件或目录"""
+
+    async def rename(self, source_path, target_path):
+        """重命名（默认与移动相同）"""
+        await self.move(source_path, target_path)
+
+    async def exists(self, path):
+        return await self.stat(path) is not None
+
+    async def close(self):
+        pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    本地磁盘后端 - 阻塞操作放到线程池执行；
+    新建、删除、复制、移动和重命名通过操作日志执行（可撤销，中断后可恢复），调用方负责路径锁
+    """
+
+    def join(self, path, *names):
+        return os.path.join(path, *names)
+
+    def dirname(self, path):
+        return os.path.dirname(path)
+
+    def basename(self, path):
+        return os.path.basename(path)
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def stat(self, path):
+        try:
+            stat = await self._run(os.stat, path)
+        except OSError:
+            return None
+        return {
+            "is_dir": os.path.isdir(path),
+            "size": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime)
+        }
+
+    async def list_directory(self, path):
+        return await self._run(get_directory_listing, path)
+
+    async def list_files(self, path):
+        def walk():
+            files = []
+            for dir_path, _, file_names in os.walk(path):
+                relative_dir = os.path.relpath(dir_path, path)
+                for file_name in file_names:
+                    relative = file_name if relative_dir == os.curdir else os.path.join(relative_dir, file_name)
+                    files.append(relative.replace(os.sep, '/'))
+            return files
+        return await self._run(walk)
+
+    async def read_bytes(self, path):
+        def read():
+            with open(path, 'rb') as f:
+                return f.read()
+        return await self._run(read)
+
+    async def write_bytes(self, path, data):
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        await self._run(write)
+        invalidate_path(path)
+
+    async def read_workflow(self, path):
+        return await self._run(read_workflow_text, path)
+
+    async def write_workflow(self, path, content):
+        def write():
+            previous_path = locate_workflow_file(path)
+            return (previous_path,) + write_workflow(path, content)
+        previous_path, storage_path, size = await self._run(write)
+        publish_workflow_save(previous_path, path, storage_path)
+        return storage_path, size
+
+    async def run_operation(self, action, plan):
+        """通过操作日志执行一组步骤，返回执行后的步骤"""
+        with span('filesystem'):
+            return await self._run(get_operation_journal().execute, action, plan)
+
+    async def make_directory(self, path):
+        await self.run_operation('create_directory', plan_create_directory(path))
+
+    async def delete(self, path, permanent=False):
+        action = 'delete_directory' if os.path.isdir(path) else 'delete_file'
+        steps = await self.run_operation(action, plan_delete(path, permanent))
+        return steps[0].get('trash_id')
+
+    async def copy(self, source_path, target_path):
+        action = 'copy_directory' if os.path.isdir(source_path) else 'copy_file'
+        steps = await self.run_operation(action, plan_copy(source_path, target_path))
+        return {"files": steps[-1].get('files', 0), "bytes": steps[-1].get('bytes', 0)}
+
+    async def move(self, source_path, target_path):
+        action = 'move_directory' if os.path.isdir(source_path) else 'move_file'
+        await self.run_operation(action, plan_move(source_path, target_path))
+
+    async def rename(self, source_path, target_path):
+        await self.run_operation('rename', plan_rename(source_path, target_path))
+
+    async def restore(self, trash_id, target_path):
+        """从回收站还原（只有本地磁盘有回收站）"""
+        await self.run_operation('restore_trash', plan_restore(trash_id, target_path))
+
+
+class _MetadataCache:
+    """对象元数据和目录列表的短期缓存（对象存储的HEAD/LIST请求延迟较高）"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+
+    def invalidate(self, path):
+        """清除路径自身、其下所有路径以及各级上级目录的缓存"""
+        parents = set()
+        parent = path
+        while '/' in parent.rstrip('/'):
+            parent = parent.rsplit('/', 1)[0]
+            parents.add(parent)
+        prefix = path.rstrip('/') + '/'
+        for key in list(self._entries):
+            target = key[1]
+            if target == path or target.startswith(prefix) or target in parents:
+                del self._entries[key]
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3兼容对象存储后端，根目录配置示例：
+    {"name": "team", "path": "s3://bucket/prefix", "endpoint_url": "http://127.0.0.1:9000",
+     "region": "us-east-1", "access_key": "...", "secret_key": "..."}
+    目录对应以 / 结尾的键前缀，新建目录时写入一个空的目录标记对象
+    """
+
+    remote = True
+
+    def __init__(self, root):
+        if _get_aiobotocore_session is None:
+            raise ValueError("访问S3存储需要安装 aiobotocore")
+
+        self.root = root
+        self.url = root['path'].rstrip('/')
+        self.bucket, _, prefix = self.url[len('s3://'):].partition('/')
+        self.prefix = prefix.strip('/')
+        if not self.bucket:
+            raise ValueError(f"无效的S3地址: {root['path']}")
+
+        self._client = None
+        self._client_context = None
+        self._client_lock = None
+        self._meta = _MetadataCache(get_setting('s3_metadata_cache_ttl', 10))
+
+    # ====== 路径 ======
+
+    def join(self, path, *names):
+        return '/'.join([path.rstrip('/')] + [name.strip('/') for name in names if name])
+
+    def dirname(self, path):
+        path = path.rstrip('/')
+        return self.url if path == self.url else path.rsplit('/', 1)[0]
+
+    def basename(self, path):
+        return path.rstrip('/').rsplit('/', 1)[-1]
+
+    def normalize(self, path):
+        """规范化对象存储路径，拒绝超出根目录的路径"""
+        if not path.startswith(self.url) or path[len(self.url):len(self.url) + 1] not in ('', '/'):
+            raise PathAccessError(f"路径超出允许访问的根目录: {path}")
+        parts = []
+        for part in path[len(self.url):].split('/'):
+            if part in ('', '.'):
+                continue
+            if part == '..':
+                raise PathAccessError(f"路径包含非法的上级引用: {path}")
+            parts.append(part)
+        return self.join(self.url, *parts)
+
+    def _key(self, path):
+        relative = path[len(self.url):].strip('/')
+        if self.prefix and relative:
+            return f"{self.prefix}/{relative}"
+        return self.prefix or relative
+
+    def _dir_prefix(self, path):
+        key = self._key(path)
+        return f"{key}/" if key else ''
+
+    # ====== 客户端 ======
+
+    async def _get_client(self):
+        """获取共享的异步客户端（内部维护HTTP连接池，所有请求复用）"""
+        if self._client is not None:
+            return self._client
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+
+        async with self._client_lock:
+            if self._client is None:
+                session = _get_aiobotocore_session()
+                self._client_context = session.create_client(
+                    's3',
+                    endpoint_url=self.root.get('endpoint_url'),
+                    region_name=self.root.get('region'),
+                    aws_access_key_id=self.root.get('access_key'),
+                    aws_secret_access_key=self.root.get('secret_key'),
+                    config=AioConfig(max_pool_connections=get_setting('s3_max_pool_connections', 32))
+                )
+                self._client = await self._client_context.__aenter__()
+                logger.info(f"已连接对象存储: {self.url}")
+        return self._client
+
+    async def close(self):
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client = None
+            self._client_context = None
+
+    @staticmethod
+    def _is_not_found(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    # ====== 查询 ======
+
+    async def stat(self, path):
+        cached = self._meta.get(('stat', path))
+        if cached is not None:
+            return cached or None
+
+        if path == self.url:
+            result = {"is_dir": True, "size": 0, "modified": None}
+            self._meta.put(('stat', path), result)
+            return result
+
+        client = await self._get_client()
+        result = None
+        try:
+            response = await client.head_object(Bucket=self.bucket, Key=self._key(path))
+            result = {"is_dir": False, "size": response['ContentLength'], "modified": response['LastModified']}
+        except ClientError as e:
+            if not self._is_not_found(e):
+                raise
+            response = await client.list_objects_v2(Bucket=self.bucket, Prefix=self._dir_prefix(path), MaxKeys=1)
+            if response.get('KeyCount', 0) > 0:
+                result = {"is_dir": True, "size": 0, "modified": None}
+
+        # 不存在的路径也缓存（用False表示），避免重复请求
+        self._meta.put(('stat', path), result or False)
+        return result
+
+    async def list_directory(self, path):
+        cached = self._meta.get(('list', path))
+        if cached is not None:
+            return cached
+
+        client = await self._get_client()
+        prefix = self._dir_prefix(path)
+        directories, files = [], []
+
+        paginator = client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                name = common['Prefix'][len(prefix):].rstrip('/')
+                if name and not name.startswith('.'):
+                    directories.append({"name": name, "date": "", "type": "directory"})
+                    self._meta.put(('stat', self.join(path, name)), {"is_dir": True, "size": 0, "modified": None})
+            for item in page.get('Contents', []):
+                name = item['Key'][len(prefix):]
+                # 跳过目录标记对象和隐藏文件
+                if not name or name.startswith('.'):
+                    continue
+                modified = item['LastModified']
+                self._meta.put(('stat', self.join(path, name)), {"is_dir": False, "size": item['Size'], "modified": modified})
+                if is_workflow_file(name):
+                    files.append({
+                        "name": name,
+                        "date": modified.strftime("%m/%d/%y"),
+                        "mtime": modified.timestamp(),
+                        "size": item['Size'],
+                        "type": "file",
+                        "is_workflow": True
+                    })
+
+        directories.sort(key=lambda x: x['name'].lower())
+        files.sort(key=lambda x: x['name'].lower())
+        result = {
+            "path": path,
+            "directories": directories,
+            "files": files,
+            "type": "directory_listing"
+        }
+        self._meta.put(('list', path), result)
+        return result
+
+    async def _list_keys(self, path):
+        """分页列出目录前缀下的所有对象键（含目录标记）"""
+        client = await self._get_client()
+        prefix = self._dir_prefix(path)
+        keys = []
+        paginator = client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return prefix, keys
+
+    async def list_files(self, path):
+        prefix, keys = await self._list_keys(path)
+        return [key[len(prefix):] for key in keys if key[len(prefix):] and not key.endswith('/')]
+
+    # ====== 读写 ======
+
+    async def read_bytes(self, path):
+        client = await self._get_client()
+        try:
+            response = await client.get_object(Bucket=self.bucket, Key=self._key(path))
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(f"文件不存在: {path}")
+            raise
+        async with response['Body'] as stream:
+            return await stream.read()
+
+    async def write_bytes(self, path, data):
+        """写入对象，超过分段阈值时使用分段上传"""
+        client = await self._get_client()
+        key = self._key(path)
+        threshold = get_setting('s3_multipart_threshold', 8 * 1024 * 1024)
+
+        if len(data) <= threshold:
+            await client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        else:
+            await self._multipart_upload(client, key, data)
+        self._meta.invalidate(path)
+
+    async def _multipart_upload(self, client, key, data):
+        # S3要求除最后一段外每段至少5MiB
+        chunk_size = max(get_setting('s3_multipart_chunk_size', 8 * 1024 * 1024), 5 * 1024 * 1024)
+        upload = await client.create_multipart_upload(Bucket=self.bucket, Key=key)
+        upload_id = upload['UploadId']
+        semaphore = asyncio.Semaphore(get_setting('s3_upload_concurrency', 4))
+
+        async def upload_part(number, offset):
+            async with semaphore:
+                response = await client.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id,
+                    PartNumber=number, Body=data[offset:offset + chunk_size]
+                )
+                return {"PartNumber": number, "ETag": response['ETag']}
+
+        try:
+            parts = await asyncio.gather(*[
+                upload_part(index + 1, offset)
+                for index, offset in enumerate(range(0, len(data), chunk_size))
+            ])
+            await client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": list(parts)}
+            )
+            logger.info(f"分段上传完成: s3://{self.bucket}/{key} ({len(parts)}段)")
+        except Exception:
+            await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def write_workflow(self, path, content):
+        storage_path, data = encode_workflow(path, content, get_storage_mode(path, self.root))
+        await self.write_bytes(storage_path, data)
+
+        # 删除同一工作流其他格式的副本
+        if is_workflow_file(storage_path):
+            base_path = strip_workflow_extension(storage_path)
+            others = [
+                base_path + extension
+                for extension in (PLAIN_EXTENSION, GZIP_EXTENSION, ZSTD_EXTENSION)
+                if base_path + extension != storage_path
+            ]
+            await self._delete_keys([self._key(other) for other in others])
+            for other in others:
+                self._meta.invalidate(other)
+
+        return storage_path, len(data)
+
+    async def make_directory(self, path):
+        client = await self._get_client()
+        await client.put_object(Bucket=self.bucket, Key=self._dir_prefix(path), Body=b'')
+        self._meta.invalidate(path)
+
+    async def _delete_keys(self, keys):
+        client = await self._get_client()
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            batch = keys[start:start + S3_DELETE_BATCH]
+            await client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+
+    async def delete(self, path, permanent=False):
+        """对象存储没有回收站，总是永久删除"""
+        info = await self.stat(path)
+        if info is None:
+            raise FileNotFoundError(f"路径不存在: {path}")
+
+        if info['is_dir']:
+            _, keys = await self._list_keys(path)
+            await self._delete_keys(keys)
+        else:
+            client = await self._get_client()
+            await client.delete_object(Bucket=self.bucket, Key=self._key(path))
+        self._meta.invalidate(path)
+        return None
+
+    async def copy(self, source_path, target_path):
+        """服务端复制（不经过本机传输数据），目录按对象并发复制"""
+        client = await self._get_client()
+        info = await self.stat(source_path)
+        if info is None:
+            raise FileNotFoundError(f"路径不存在: {source_path}")
+
+        if not info['is_dir']:
+            await client.copy_object(
+                Bucket=self.bucket, Key=self._key(target_path),
+                CopySource={"Bucket": self.bucket, "Key": self._key(source_path)}
+            )
+            self._meta.invalidate(target_path)
+            return
+
+        # 目标目录已存在时先清空，与本地复制的覆盖语义一致
+        if await self.exists(target_path):
+            await self.delete(target_path)
+
+        source_prefix, keys = await self._list_keys(source_path)
+        target_prefix = self._dir_prefix(target_path)
+        semaphore = asyncio.Semaphore(get_setting('s3_copy_concurrency', 16))
+
+        async def copy_key(key):
+            async with semaphore:
+                await client.copy_object(
+                    Bucket=self.bucket, Key=target_prefix + key[len(source_prefix):],
+                    CopySource={"Bucket": self.bucket, "Key": key}
+                )
+
+        await asyncio.gather(*[copy_key(key) for key in keys])
+        if not keys:
+            await self.make_directory(target_path)
+        self._meta.invalidate(target_path)
+
+    async def move(self, source_path, target_path):
+        """对象存储不支持重命名，使用复制后删除实现"""
+        await self.copy(source_path, target_path)
+        await self.delete(source_path)
+
+
+# 后端实例（本地后端全局共享，每个对象存储根目录一个后端）
+_local_backend = LocalStorageBackend()
+_remote_backends = {}
+
+
+def _get_remote_backend(root):
+    backend = _remote_backends.get(root['name'])
+    if backend is None or backend.root is not root:
+        backend = S3StorageBackend(root)
+        _remote_backends[root['name']] = backend
+    return backend
+
+
+def get_local_backend():
+    """获取本地磁盘后端"""
+    return _local_backend
+
+
+def is_object_storage_available():
+    """是否安装了访问对象存储根目录所需的aiobotocore"""
+    return _get_aiobotocore_session is not None
+
+
+def resolve_storage_path(path):
+    """
+    解析客户端路径，返回 (存储后端, 该后端内的规范化路径)
+    支持本地路径、s3://地址以及指向对象存储根目录的 "@根目录名/相对路径"
+    """
+    remote_roots = get_path_resolver().remote_roots
+
+    if isinstance(path, str) and path.startswith(PATH_ID_PREFIX) and remote_roots:
+        name, _, relative = path[len(PATH_ID_PREFIX):].replace('\\', '/').partition('/')
+        for root in remote_roots:
+            if root['name'] == name:
+                path = f"{root['path']}/{relative}" if relative else root['path']
+                break
+
+    if is_remote_path(path):
+        # 较长的根目录优先匹配（支持嵌套根目录）
+        for root in sorted(remote_roots, key=lambda r: len(r['path']), reverse=True):
+            if path == root['path'] or path.startswith(root['path'] + '/'):
+                backend = _get_remote_backend(root)
+                return backend, backend.normalize(path)
+        raise PathAccessError(f"对象存储路径不在配置的根目录中: {path}")
+
+    return _local_backend, resolve_path(path)
+
+
+def is_remote_request(data, keys):
+    """判断请求中的任一路径参数是否指向对象存储"""
+    remote_names = {f"{PATH_ID_PREFIX}{root['name']}" for root in get_path_resolver().remote_roots}
+    for key in keys:
+        value = data.get(key)
+        if not value or not isinstance(value, str):
+            continue
+        if is_remote_path(value) or value.replace('\\', '/').split('/', 1)[0] in remote_names:
+            return True
+    return False
+
+
+async def close_storage_backends():
+    """关闭所有对象存储客户端（释放连接池）"""
+    for backend in list(_remote_backends.values()):
+        try:
+            await backend.close()
+        except Exception as e:
+            logger.warning(f"关闭存储后端失败: {str(e)}")
+    _remote_backends.clear()
@@ -0,0 +1,302 @@
+"""
+NZ工作流助手 - 请求追踪模块
+按阶段统计每个请求的耗时：validate（解析请求、校验和解析路径）、filesystem（磁盘操作）、
+serialize（JSON编码）、send（把响应写给客户端），另外记录线程池排队时间和事件循环延迟
+（只在管理端点使用后的一段时间内测量，平时不运行定时任务）。
+耗时超过 slow_operation_ms 的请求写入慢操作日志，用于判断慢请求是卡在磁盘、JSON编码还是事件循环
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+import functools
+from collections import deque
+from ..core.logger import get_logger
+from ..core.config import get_setting
+
+
+# 获取logger实例
+logger = get_logger()
+
+PHASES = ('validate', 'filesystem', 'serialize', 'send', 'executor_wait')
+
+# 慢操作日志保留的条数
+SLOW_LOG_SIZE = 100
+
+# 事件循环延迟的测量间隔（秒）和保留的样本数（约1分钟）
+LOOP_MONITOR_INTERVAL = 0.1
+LOOP_LAG_SAMPLES = 600
+
+# 最后一次管理请求之后继续测量事件循环延迟的时间（秒）
+LOOP_MONITOR_WINDOW = 300
+
+_current_trace = contextvars.ContextVar('nz_trace', default=None)
+_current_span = contextvars.ContextVar('nz_span', default=None)
+
+
+class Trace:
+    """一次请求的追踪记录，同一阶段可以多次进入（如多次stat），耗时累加"""
+
+    def __init__(self, name, detail=''):
+        self.name = name
+        self.detail = detail
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.spans[phase] = self.spans.get(phase, 0.0) + seconds
+
+
+class _Span:
+    """阶段计时；嵌套的阶段从外层扣除，各阶段耗时之和不超过总耗时"""
+
+    __slots__ = ('trace', 'phase', 'start', 'children', 'parent', 'token')
+
+    def __init__(self, trace, phase):
+        self.trace = trace
+        self.phase = phase
+        self.children = 0.0
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        self.trace.add(self.phase, elapsed - self.children)
+        if self.parent is not None:
+            self.parent.children += elapsed
+        return False
+
+
+class _NoSpan:
+    """没有正在追踪的请求时使用的空上下文"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(phase):
+    """统计当前请求在某一阶段的耗时：with span('filesystem'): ...（不在请求中时没有开销）"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, phase)
+
+
+def bind(func):
+    """
+    让在线程池中执行的函数继续记录到当前请求（run_in_executor不会传递上下文），
+    并把从提交到开始执行的时间记为executor_wait
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return func
+    submitted = time.perf_counter()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        trace.add('executor_wait', time.perf_counter() - submitted)
+        token = _current_trace.set(trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+
+    return run
+
+
+def annotate_trace(name, detail=''):
+    """请求解析后补充操作名称和路径（用于慢操作日志）"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.name = name or trace.name
+        trace.detail = detail or trace.detail
+
+
+class Tracer:
+    """请求追踪器 - 保存慢操作日志和事件循环延迟样本"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lag_samples = deque(maxlen=LOOP_LAG_SAMPLES)
+        self._monitor = None
+        self._monitor_until = 0.0
+        self._expected_wake = None
+        self._traced = 0
+        self._slow_count = 0
+
+    def is_enabled(self):
+        return get_setting('slow_operation_ms', 1000) > 0
+
+    # ====== 事件循环延迟 ======
+
+    def ensure_monitor(self, duration=LOOP_MONITOR_WINDOW):
+        """在当前事件循环中测量延迟，持续到duration秒之后（管理端点每次请求时延长）"""
+        self._monitor_until = time.monotonic() + duration
+        if not self.is_monitoring():
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_loop())
+
+    def is_monitoring(self):
+        return self._monitor is not None and not self._monitor.done()
+
+    async def _monitor_loop(self):
+        try:
+            while time.monotonic() < self._monitor_until:
+                start = time.perf_counter()
+                self._expected_wake = start + LOOP_MONITOR_INTERVAL
+                await asyncio.sleep(LOOP_MONITOR_INTERVAL)
+                lag = time.perf_counter() - self._expected_wake
+                self._lag_samples.append((time.time(), max(0.0, lag)))
+        finally:
+            self._expected_wake = None
+
+    def _current_lag(self):
+        """事件循环此刻已被阻塞的时间（测量任务本该醒来但还没有运行）"""
+        expected = self._expected_wake
+        return max(0.0, time.perf_counter() - expected) if expected is not None else 0.0
+
+    def _max_lag_since(self, since):
+        """since之后测得的最大延迟，这段时间没有测量时返回None"""
+        lags = [lag for at, lag in list(self._lag_samples) if at >= since]
+        if self._expected_wake is not None:
+            lags.append(self._current_lag())
+        return max(lags) if lags else None
+
+    # ====== 请求追踪 ======
+
+    def finish(self, trace):
+        """请求结束：超过阈值时写入慢操作日志"""
+        total = time.perf_counter() - trace.start
+        threshold = get_setting('slow_operation_ms', 1000) / 1000.0
+        with self._lock:
+            self._traced += 1
+        if threshold <= 0 or total < threshold:
+            return None
+
+        spans = {phase: round(seconds * 1000, 1) for phase, seconds in trace.spans.items()}
+        accounted = sum(seconds for phase, seconds in trace.spans.items() if phase != 'executor_wait')
+        entry = {
+            "name": trace.name,
+            "detail": trace.detail,
+            "time": trace.started,
+            "total_ms": round(total * 1000, 1),
+            "spans_ms": spans,
+            "other_ms": round(max(0.0, total - accounted) * 1000, 1),
+            "loop_lag_ms": self._round_ms(self._max_lag_since(trace.started))
+        }
+        if entry['loop_lag_ms'] is None:
+            del entry['loop_lag_ms']
+        if trace.error:
+            entry['error'] = trace.error
+        with self._lock:
+            self._slow.append(entry)
+            self._slow_count += 1
+
+        phases = ", ".join(f"{phase}={ms}ms" for phase, ms in spans.items())
+        lag = f"{entry['loop_lag_ms']}ms" if 'loop_lag_ms' in entry else "未测量"
+        logger.warning(
+            f"慢操作: {trace.name} {trace.detail} 用时{entry['total_ms']}ms ({phases}, "
+            f"其他={entry['other_ms']}ms, 事件循环延迟={lag})"
+        )
+        return entry
+
+    @staticmethod
+    def _round_ms(seconds):
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    def slow_operations(self, limit=None):
+        """最近的慢操作（最近的在前）"""
+        with self._lock:
+            entries = list(self._slow)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def get_stats(self):
+        lags = [lag for at, lag in list(self._lag_samples)]
+        with self._lock:
+            return {
+                "enabled": self.is_enabled(),
+                "threshold_ms": get_setting('slow_operation_ms', 1000),
+                "traced": self._traced,
+                "slow": self._slow_count,
+                "loop_monitor": self.is_monitoring(),
+                "loop_lag_max_ms": round(max(lags) * 1000, 1) if lags else 0.0,
+                "loop_lag_avg_ms": round(sum(lags) / len(lags) * 1000, 1) if lags else 0.0
+            }
+
+
+# 全局实例
+_tracer = Tracer()
+
+
+def get_tracer():
+    """获取全局请求追踪器"""
+    return _tracer
+
+
+def _trace_sending(response, trace):
+    """响应发送完成（write_eof）后再结束追踪，把发送时间记为send"""
+    prepare, write_eof = response.prepare, response.write_eof
+    started = []
+
+    async def traced_prepare(request):
+        if not started:
+            started.append(time.perf_counter())
+        return await prepare(request)
+
+    async def traced_write_eof(*args, **kwargs):
+        try:
+            return await write_eof(*args, **kwargs)
+        finally:
+            if started:
+                trace.add('send', time.perf_counter() - started[0])
+                started.clear()
+                _tracer.finish(trace)
+
+    response.prepare = traced_prepare
+    response.write_eof = traced_write_eof
+
+
+def trace_request(handler):
+    """aiohttp处理函数的装饰器：为每个请求建立追踪记录"""
+
+    @functools.wraps(handler)
+    async def wrapper(request):
+        if not _tracer.is_enabled():
+            return await handler(request)
+
+        trace = Trace(request.query.get('action', '') or request.path)
+        token = _current_trace.set(trace)
+        try:
+            response = await handler(request)
+        except BaseException as e:
+            trace.error = str(e) or type(e).__name__
+            _tracer.finish(trace)
+            raise
+        finally:
+            _current_trace.reset(token)
+
+        # 已发送完的流式响应（如导出压缩包）直接结束追踪
+        if getattr(response, 'prepared', False):
+            _tracer.finish(trace)
+        else:
+            _trace_sending(response, trace)
+        return response
+
+    return wrapper
@@ -0,0 +1,382 @@
+"""
+NZ工作流助手 - 回收站模块
+删除操作改为重命名到同一文件系统上的回收站目录（O(1)），可列出、还原和清空，
+后台线程按保留时间和容量上限清理。
+清单由快照（manifest.json）和追加写入的变更记录（manifest.log）组成，
+删除和还原只追加一行记录，由后台清理线程合并为新的快照
+"""
+
+import os
+import errno
+import time
+import uuid
+import shutil
+import threading
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from ..core.constants import TRASH_DIR_NAME
+from .path_resolver import get_path_resolver
+from .json_codec import loads, dumps_bytes
+
+
+# 获取logger实例
+logger = get_logger()
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_LOG_NAME = "manifest.log"
+LOCATIONS_FILE_NAME = "trash_locations.json"
+
+
+def _get_path_size(path):
+    """计算文件或目录的总大小"""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _write_json_atomic(path, data):
+    """先写临时文件再替换，避免清单文件写到一半"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(dumps_bytes(data, indent=True))
+    os.replace(temp_path, path)
+
+
+class TrashManager:
+    """回收站管理器 - 每个根目录（或文件系统）一个回收站目录，各自维护清单"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._manifests = {}
+        # 每个回收站目录尚未合并进快照的变更记录数
+        self._log_counts = {}
+        self._locations = None
+        self._purger = None
+        self._stop_event = threading.Event()
+
+    # ====== 回收站位置 ======
+
+    def _locations_file(self):
+        return os.path.join(get_data_dir(), LOCATIONS_FILE_NAME)
+
+    def _load_locations(self):
+        if self._locations is None:
+            self._locations = []
+            try:
+                with open(self._locations_file(), 'rb') as f:
+                    self._locations = [p for p in loads(f.read()) if isinstance(p, str)]
+            except (OSError, ValueError):
+                pass
+        return self._locations
+
+    def _register_location(self, trash_dir):
+        locations = self._load_locations()
+        if trash_dir not in locations:
+            locations.append(trash_dir)
+            _write_json_atomic(self._locations_file(), locations)
+
+    def get_trash_dir(self, path):
+        """
+        确定某个路径对应的回收站目录，必须与该路径位于同一文件系统才能直接重命名：
+        配置的根目录 -> 插件数据目录 -> 所在父目录
+        """
+        root = get_path_resolver().find_root(path)
+        if root is not None:
+            return os.path.join(root['path'], TRASH_DIR_NAME)
+
+        device = os.lstat(path).st_dev
+        data_trash_dir = os.path.join(get_data_dir(), 'trash')
+        if os.stat(get_data_dir()).st_dev == device:
+            return data_trash_dir
+
+        return os.path.join(os.path.dirname(path), TRASH_DIR_NAME)
+
+    # ====== 清单 ======
+
+    def _manifest(self, trash_dir):
+        manifest = self._manifests.get(trash_dir)
+        if manifest is None:
+            manifest = {}
+            try:
+                with open(os.path.join(trash_dir, MANIFEST_FILE_NAME), 'rb') as f:
+                    manifest = loads(f.read())
+            except (OSError, ValueError):
+                pass
+            self._log_counts[trash_dir] = self._replay_log(trash_dir, manifest)
+            self._manifests[trash_dir] = manifest
+        return manifest
+
+    def _replay_log(self, trash_dir, manifest):
+        """在快照上重放变更记录，返回记录数（最后一行写到一半时忽略）"""
+        count = 0
+        try:
+            with open(os.path.join(trash_dir, MANIFEST_LOG_NAME), 'rb') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return 0
+        for line in lines:
+            try:
+                record = loads(line)
+            except ValueError:
+                continue
+            count += 1
+            op = record.get('op')
+            if op == 'add':
+                manifest[record['item']['id']] = record['item']
+            elif op == 'remove':
+                manifest.pop(record['id'], None)
+            elif op == 'size' and record['id'] in manifest:
+                manifest[record['id']]['size'] = record['size']
+        return count
+
+    def _append_records(self, trash_dir, records):
+        """追加清单变更记录（调用方持有锁），与回收站大小无关"""
+        if not records:
+            return
+        with open(os.path.join(trash_dir, MANIFEST_LOG_NAME), 'ab') as f:
+            f.write(b''.join(dumps_bytes(record) + b'\n' for record in records))
+        self._log_counts[trash_dir] = self._log_counts.get(trash_dir, 0) + len(records)
+
+    def compact(self):
+        """把变更记录合并为新的清单快照（在后台清理线程中调用）"""
+        with self._lock:
+            for trash_dir in self._load_locations():
+                manifest = self._manifest(trash_dir)
+                if not self._log_counts.get(trash_dir):
+                    continue
+                # 先写快照再删除记录：中间中断时重放记录结果不变
+                _write_json_atomic(os.path.join(trash_dir, MANIFEST_FILE_NAME), manifest)
+                try:
+                    os.remove(os.path.join(trash_dir, MANIFEST_LOG_NAME))
+                except FileNotFoundError:
+                    pass
+                self._log_counts[trash_dir] = 0
+
+    def _find_item(self, item_id):
+        for trash_dir in list(self._load_locations()):
+            entry = self._manifest(trash_dir).get(item_id)
+            if entry is not None:
+                return trash_dir, entry
+        raise ValueError(f"回收站中不存在该项目: {item_id}")
+
+    # ====== 操作 ======
+
+    def move_to_trash(self, path, original_path=None):
+        """
+        把文件或目录移入回收站，返回回收站项目ID
+        original_path用于记录还原位置（默认为path本身）
+        """
+        path = os.path.abspath(path)
+        original_path = os.path.abspath(original_path or path)
+        if not os.path.lexists(path):
+            raise ValueError(f"路径不存在: {path}")
+
+        with self._lock:
+            trash_dir = self.get_trash_dir(path)
+            if os.path.commonpath([path, trash_dir]) == path:
+                raise ValueError("不能删除包含回收站的目录，请先清空回收站或永久删除")
+
+            item_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+            is_dir = os.path.isdir(path)
+
+            try:
+                os.makedirs(trash_dir, exist_ok=True)
+                os.rename(path, os.path.join(trash_dir, item_id))
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # 根目录内挂载了其他文件系统，改用所在父目录的回收站
+                trash_dir = os.path.join(os.path.dirname(path), TRASH_DIR_NAME)
+                os.makedirs(trash_dir, exist_ok=True)
+                os.rename(path, os.path.join(trash_dir, item_id))
+
+            entry = {
+                "id": item_id,
+                "name": os.path.basename(original_path),
+                "original_path": original_path,
+                "is_directory": is_dir,
+                "trashed_at": time.time(),
+                "size": None
+            }
+            self._manifest(trash_dir)[item_id] = entry
+            self._append_records(trash_dir, [{"op": "add", "item": entry}])
+            self._register_location(trash_dir)
+
+        logger.info(f"已移入回收站: {path} -> {item_id}")
+        return item_id
+
+    def list_items(self):
+        """列出所有回收站项目（最近删除的在前）"""
+        with self._lock:
+            items = []
+            for trash_dir in self._load_locations():
+                items.extend(dict(entry) for entry in self._manifest(trash_dir).values())
+        items.sort(key=lambda entry: entry['trashed_at'], reverse=True)
+        return items
+
+    def get_item(self, item_id):
+        """获取回收站项目的信息（不存在时返回None）"""
+        with self._lock:
+            try:
+                return dict(self._find_item(item_id)[1])
+            except ValueError:
+                return None
+
+    def find_item(self, original_path, since=0):
+        """查找since之后从original_path移入回收站的最近一个项目（不存在时返回None）"""
+        original_path = os.path.abspath(original_path)
+        matches = [
+            item for item in self.list_items()
+            if item['original_path'] == original_path and item['trashed_at'] >= since
+        ]
+        return matches[0] if matches else None
+
+    def restore(self, item_id, target_path=None):
+        """还原回收站项目到原位置（或指定位置），返回还原后的路径"""
+        with self._lock:
+            trash_dir, entry = self._find_item(item_id)
+            restore_path = os.path.abspath(target_path or entry['original_path'])
+
+            if os.path.lexists(restore_path):
+                raise ValueError(f"还原位置已存在同名项目: {restore_path}")
+
+            os.makedirs(os.path.dirname(restore_path), exist_ok=True)
+            os.rename(os.path.join(trash_dir, item_id), restore_path)
+
+            del self._manifest(trash_dir)[item_id]
+            self._append_records(trash_dir, [{"op": "remove", "id": item_id}])
+
+        logger.info(f"已从回收站还原: {item_id} -> {restore_path}")
+        return restore_path
+
+    def _remove_entry(self, trash_dir, item_id):
+        """从磁盘和清单中永久删除一个项目（调用方持有锁）"""
+        item_path = os.path.join(trash_dir, item_id)
+        # 先改名为隐藏的待删除路径再删除，删除耗时期间不影响清单
+        doomed_path = os.path.join(trash_dir, f".purge-{item_id}")
+        if os.path.lexists(item_path):
+            os.rename(item_path, doomed_path)
+        self._manifest(trash_dir).pop(item_id, None)
+        return doomed_path
+
+    def _delete_doomed(self, doomed_paths):
+        for doomed_path in doomed_paths:
+            if os.path.isdir(doomed_path) and not os.path.islink(doomed_path):
+                shutil.rmtree(doomed_path, ignore_errors=True)
+            elif os.path.lexists(doomed_path):
+                os.remove(doomed_path)
+
+    def empty(self, item_ids=None):
+        """永久删除指定项目（不指定时清空整个回收站），返回删除的项目数"""
+        doomed = []
+        with self._lock:
+            for trash_dir in self._load_locations():
+                manifest = self._manifest(trash_dir)
+                ids = list(manifest) if item_ids is None else [i for i in item_ids if i in manifest]
+                if not ids:
+                    continue
+                for item_id in ids:
+                    doomed.append(self._remove_entry(trash_dir, item_id))
+                self._append_records(trash_dir, [{"op": "remove", "id": item_id} for item_id in ids])
+
+        self._delete_doomed(doomed)
+        logger.info(f"已永久删除 {len(doomed)} 个回收站项目")
+        return len(doomed)
+
+    def purge(self, max_age_days=None, max_bytes=None):
+        """按保留时间和容量上限清理回收站，返回清理的项目数"""
+        if max_age_days is None:
+            max_age_days = get_setting('trash_max_age_days', 30)
+        if max_bytes is None:
+            max_bytes = get_setting('trash_max_bytes', 10 * 1024 ** 3)
+
+        # 补算尚未统计大小的项目（移入回收站时为保证O(1)没有计算）
+        with self._lock:
+            pending = [
+                (trash_dir, entry['id'])
+                for trash_dir in self._load_locations()
+                for entry in self._manifest(trash_dir).values()
+                if entry.get('size') is None
+            ]
+        sizes = {}
+        for trash_dir, item_id in pending:
+            try:
+                sizes[(trash_dir, item_id)] = _get_path_size(os.path.join(trash_dir, item_id))
+            except OSError:
+                sizes[(trash_dir, item_id)] = 0
+
+        cutoff = time.time() - max_age_days * 86400
+        doomed = []
+        with self._lock:
+            entries = []
+            records = {}
+            for trash_dir in self._load_locations():
+                manifest = self._manifest(trash_dir)
+                for item_id, entry in manifest.items():
+                    if (trash_dir, item_id) in sizes:
+                        entry['size'] = sizes[(trash_dir, item_id)]
+                        records.setdefault(trash_dir, []).append({"op": "size", "id": item_id, "size": entry['size']})
+                    entries.append((trash_dir, entry))
+
+            # 超过保留时间的项目直接清理，其余按时间从旧到新清理直到低于容量上限
+            entries.sort(key=lambda item: item[1]['trashed_at'])
+            total = sum(entry.get('size') or 0 for _, entry in entries)
+            for trash_dir, entry in entries:
+                if entry['trashed_at'] >= cutoff and total <= max_bytes:
+                    break
+                total -= entry.get('size') or 0
+                doomed.append(self._remove_entry(trash_dir, entry['id']))
+                records.setdefault(trash_dir, []).append({"op": "remove", "id": entry['id']})
+
+            for trash_dir, dir_records in records.items():
+                self._append_records(trash_dir, dir_records)
+
+        self._delete_doomed(doomed)
+        if doomed:
+            logger.info(f"回收站自动清理: 删除 {len(doomed)} 个项目")
+        return len(doomed)
+
+    # ====== 后台清理 ======
+
+    def start_purger(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        if self._purger is not None and self._purger.is_alive():
+            return
+
+        def purge_loop():
+            while not self._stop_event.wait(get_setting('trash_purge_interval', 600)):
+                try:
+                    self.purge()
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"回收站自动清理失败: {str(e)}")
+
+        self._stop_event.clear()
+        self._purger = threading.Thread(target=purge_loop, name="nz-trash-purger", daemon=True)
+        self._purger.start()
+        logger.info("回收站后台清理线程已启动")
+
+    def stop_purger(self):
+        self._stop_event.set()
+
+
+# 全局回收站实例
+_trash_manager = TrashManager()
+
+
+def get_trash_manager():
+    """获取全局回收站管理器"""
+    return _trash_manager
+
+
+def move_to_trash(path, original_path=None):
+    """把路径移入回收站（便捷函数）"""
+    return _trash_manager.move_to_trash(path, original_path)
@@ -4,14 +4,26 @@ NZ工作流助手 - 数据验证工具模块
 """
 
 import os
+import platform
+from functools import lru_cache
 from ..core.constants import INVALID_FILENAME_CHARS
 
 
+# 系统类型在进程生命周期内不会变化，只需检测一次
+IS_WINDOWS = platform.system() == 'Windows'
+
+
 def validate_path(path):
     """验证路径是否有效且安全"""
     if not path or not isinstance(path, str):
         return False
     
+    return _validate_path_cached(path)
+
+
+@lru_cache(maxsize=4096)
+def _validate_path_cached(path):
+    """validate_path的缓存实现（结果只取决于路径字符串本身）"""
     # 检查路径是否为空或只包含空格
     if not path.strip():
         return False
@@ -29,8 +41,7 @@ def validate_path(path):
         illegal_chars = ['<', '>', '"', '|', '?', '*']
         
         # 对于Windows系统，允许盘符中的冒号（如 C:, D: 等）
-        import platform
-        if platform.system() == 'Windows':
+        if IS_WINDOWS:
             # 检查是否是合法的Windows路径格式
             if len(path) >= 2 and path[1] == ':' and path[0].isalpha():
                 # 这是合法的盘符格式，检查冒号后面的部分
@@ -115,12 +126,25 @@ def sanitize_filename(filename):
 def is_safe_path(path, base_path):
     """检查路径是否在指定的基础路径内（防止路径遍历攻击）"""
     try:
-        # 规范化路径
-        abs_path = os.path.abspath(path)
-        abs_base = os.path.abspath(base_path)
+        # 规范化路径（解析符号链接，避免通过链接逃逸）
+        abs_path = os.path.normcase(os.path.realpath(path))
+        abs_base = os.path.normcase(os.path.realpath(base_path))
         
-        # 检查是否在基础路径内
-        return abs_path.startswith(abs_base)
+        # 检查是否在基础路径内（按路径组件比较，避免 /web 与 /web2 这类前缀误判）
+        return os.path.commonpath([abs_path, abs_base]) == abs_base
         
     except Exception:
         return False
+
+
+def parse_entity_tags(value):
+    """解析If-Match/If-None-Match请求头的值为标签列表（去掉W/前缀和引号）"""
+    tags = []
+    for part in str(value or '').split(','):
+        part = part.strip()
+        if part.startswith('W/'):
+            part = part[2:]
+        part = part.strip('"')
+        if part:
+            tags.append(part)
+    return tags
@@ -0,0 +1,357 @@
+"""
+NZ工作流助手 - 热点工作流缓存模块
+所有用户共享的工作流文本LRU缓存（按总大小限制，按mtime/大小校验），
+同时在服务端记录访问统计，并在后台预读可能接下来打开的工作流
+"""
+
+import os
+import time
+import queue
+import itertools
+import threading
+from collections import OrderedDict
+from ..core.logger import get_logger
+from ..core.config import get_setting, get_data_dir
+from .workflow_format import read_workflow_text, is_workflow_file
+from .path_resolver import add_invalidation_listener
+from .json_codec import loads, dumps_bytes
+
+
+# 获取logger实例
+logger = get_logger()
+
+STATS_FILE_NAME = "access_stats.json"
+
+# 访问统计写盘的最小间隔（秒）
+STATS_SAVE_INTERVAL = 30
+
+# 匿名访问使用的用户名
+DEFAULT_USER = "default"
+
+# 等待预读的工作流数量上限
+PREFETCH_QUEUE_SIZE = 256
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+class WorkflowCache:
+    """工作流文本LRU缓存 - 预读的条目放在最冷的一端，不会挤掉正在使用的条目"""
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    def _lookup(self, path, signature):
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry['signature'] != signature:
+            self._remove(path)
+            return None
+        return entry
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= entry['size']
+
+    def _store(self, path, signature, text, cold=False):
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        self._remove(path)
+        self._entries[path] = {"signature": signature, "text": text, "size": size}
+        self._total_bytes += size
+        if cold:
+            self._entries.move_to_end(path, last=False)
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted['size']
+
+    def get_text(self, path):
+        """读取工作流文本（缓存命中且文件未变化时不访问磁盘内容）"""
+        signature = _file_signature(path)
+        with self._lock:
+            entry = self._lookup(path, signature)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry['text']
+            self.misses += 1
+
+        text = read_workflow_text(path)
+        with self._lock:
+            self._store(path, signature, text)
+        return text
+
+    def prefetch(self, path):
+        """预读到缓存的冷端，已缓存且有效时跳过，返回是否实际读取了文件"""
+        try:
+            signature = _file_signature(path)
+            with self._lock:
+                if self._lookup(path, signature) is not None:
+                    return False
+            text = read_workflow_text(path)
+        except (OSError, ValueError):
+            return False
+
+        with self._lock:
+            self._store(path, signature, text, cold=True)
+            self.prefetched += 1
+        return True
+
+    def contains(self, path):
+        with self._lock:
+            return path in self._entries
+
+    def invalidate(self, paths):
+        """使路径（或目录下所有路径）的缓存失效"""
+        with self._lock:
+            for path in paths:
+                path = os.path.normpath(path)
+                for key in [k for k in self._entries if _is_within(k, path)]:
+                    self._remove(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefetched": self.prefetched
+            }
+
+
+class AccessStats:
+    """工作流访问统计 - 全局及每个用户的访问次数和最近访问时间，定期写入数据目录"""
+
+    def __init__(self, max_entries=2000):
+        self._lock = threading.Lock()
+        self._data = None
+        self._dirty = False
+        self._last_save = 0.0
+        self.max_entries = max_entries
+
+    def _stats_file(self):
+        return os.path.join(get_data_dir(), STATS_FILE_NAME)
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self._stats_file(), 'rb') as f:
+                    self._data = loads(f.read())
+                self._data.setdefault('paths', {})
+                self._data.setdefault('users', {})
+            except (OSError, ValueError):
+                self._data = {"paths": {}, "users": {}}
+        return self._data
+
+    @staticmethod
+    def _bump(table, path, now):
+        entry = table.setdefault(path, {"count": 0, "last_access": 0})
+        entry['count'] += 1
+        entry['last_access'] = now
+
+    def _prune(self, table):
+        if len(table) > self.max_entries:
+            oldest = sorted(table, key=lambda p: table[p]['last_access'])
+            for path in oldest[:len(table) - self.max_entries]:
+                del table[path]
+
+    def record(self, path, user=None):
+        now = time.time()
+        with self._lock:
+            data = self._load()
+            self._bump(data['paths'], path, now)
+            user_table = data['users'].setdefault(user or DEFAULT_USER, {})
+            self._bump(user_table, path, now)
+            self._prune(data['paths'])
+            self._prune(user_table)
+            self._dirty = True
+        self.save()
+
+    def save(self, force=False):
+        """写盘（距上次写盘不足STATS_SAVE_INTERVAL秒时跳过，除非force）"""
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_save < STATS_SAVE_INTERVAL):
+                return
+            content = dumps_bytes(self._data)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        temp_path = self._stats_file() + '.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, self._stats_file())
+        except OSError as e:
+            logger.warning(f"保存访问统计失败: {str(e)}")
+
+    def get_ranked(self, sort='recent', user=None, limit=20):
+        """
+        按最近访问（recent）或访问次数（frequent）排序，返回 [{path, count, last_access}]
+        user为None时使用全局统计，已不存在的文件不返回
+        """
+        with self._lock:
+            data = self._load()
+            table = data['users'].get(user, {}) if user else data['paths']
+            if sort == 'frequent':
+                key = lambda item: (item[1]['count'], item[1]['last_access'])
+            else:
+                key = lambda item: item[1]['last_access']
+            ranked = sorted(table.items(), key=key, reverse=True)
+
+        result = []
+        for path, entry in ranked:
+            if len(result) >= limit:
+                break
+            if os.path.isfile(path):
+                result.append({"path": path, "count": entry['count'], "last_access": entry['last_access']})
+        return result
+
+    def get_count(self, path):
+        with self._lock:
+            entry = self._load()['paths'].get(path)
+            return entry['count'] if entry else 0
+
+
+class WorkflowPrefetcher:
+    """
+    后台预读线程 - 打开工作流后预读同目录的工作流和该用户最常用的工作流；
+    请求处理中只把访问事件放入队列，记录统计、扫描同目录和排序都在这个线程中进行
+    """
+
+    # 队列中访问事件优先于预读
+    _ACCESS, _PREFETCH = 0, 1
+
+    def __init__(self, cache, stats):
+        self.cache = cache
+        self.stats = stats
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="nz-workflow-prefetch", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            kind, _, path, user = self._queue.get()
+            if kind == self._ACCESS:
+                try:
+                    self.stats.record(path, user)
+                    self.schedule_after_access(path, user)
+                except Exception as e:
+                    logger.debug(f"安排预读失败: {str(e)}")
+                continue
+
+            with self._pending_lock:
+                self._pending.discard(path)
+            try:
+                self.cache.prefetch(path)
+            except Exception as e:
+                logger.debug(f"预读工作流失败: {path} - {str(e)}")
+
+    def record_access(self, path, user=None):
+        """记录一次访问（只放入队列，不在调用线程中做任何磁盘操作）"""
+        self._ensure_thread()
+        self._queue.put((self._ACCESS, next(self._sequence), path, user))
+
+    def enqueue(self, paths):
+        self._ensure_thread()
+        for path in paths:
+            with self._pending_lock:
+                if path in self._pending:
+                    continue
+                if len(self._pending) >= PREFETCH_QUEUE_SIZE:
+                    break
+                self._pending.add(path)
+            self._queue.put((self._PREFETCH, next(self._sequence), path, None))
+
+    def _siblings(self, path, limit):
+        """同目录的其他工作流（访问次数多的优先）"""
+        directory = os.path.dirname(path)
+        try:
+            names = [
+                name for name in os.listdir(directory)
+                if not name.startswith('.') and is_workflow_file(name)
+            ]
+        except OSError:
+            return []
+        siblings = [os.path.join(directory, name) for name in names]
+        siblings = [p for p in siblings if p != path and not self.cache.contains(p)]
+        siblings.sort(key=lambda p: (-self.stats.get_count(p), p))
+        return siblings[:limit]
+
+    def schedule_after_access(self, path, user=None):
+        """按刚访问的工作流安排预读（在预读线程中调用）"""
+        candidates = self._siblings(path, get_setting('prefetch_siblings', 8))
+        top_n = get_setting('prefetch_top_n', 5)
+        if top_n > 0:
+            for item in self.stats.get_ranked('frequent', user or DEFAULT_USER, top_n):
+                if item['path'] != path and item['path'] not in candidates:
+                    candidates.append(item['path'])
+        if candidates:
+            self.enqueue(candidates)
+
+
+# 全局实例
+_workflow_cache = None
+_access_stats = None
+_prefetcher = None
+_init_lock = threading.Lock()
+
+
+def _ensure_initialized():
+    global _workflow_cache, _access_stats, _prefetcher
+    if _prefetcher is None:
+        with _init_lock:
+            if _prefetcher is None:
+                _workflow_cache = WorkflowCache(get_setting('workflow_cache_bytes', 128 * 1024 * 1024))
+                _access_stats = AccessStats()
+                _prefetcher = WorkflowPrefetcher(_workflow_cache, _access_stats)
+                add_invalidation_listener(_workflow_cache.invalidate)
+
+
+def get_workflow_cache():
+    """获取全局工作流缓存"""
+    _ensure_initialized()
+    return _workflow_cache
+
+
+def get_access_stats():
+    """获取全局访问统计"""
+    _ensure_initialized()
+    return _access_stats
+
+
+def record_workflow_access(path, user=None):
+    """记录一次工作流访问，并在后台预读可能接下来打开的文件（统计和预读都在后台线程中进行）"""
+    _ensure_initialized()
+    _prefetcher.record_access(path, user)
+
+
+def load_workflow_text(path, user=None):
+    """通过缓存读取工作流文本，记录访问并在后台预读可能接下来打开的文件"""
+    _ensure_initialized()
+    text = _workflow_cache.get_text(path)
+    record_workflow_access(path, user)
+    return text
@@ -0,0 +1,233 @@
+"""
+NZ工作流助手 - 工作流存储格式模块
+透明读写 .json / .json.gz / .json.zst 工作流文件，并支持按根目录配置存储模式：
+original（原样写入）、minified（压缩空白）、gzip、zstd
+"""
+
+import os
+import gzip
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from .path_resolver import get_path_resolver, invalidate_path, notify_path_moved
+from .json_codec import loads, dumps
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 可选依赖：zstandard
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PLAIN_EXTENSION = '.json'
+GZIP_EXTENSION = '.json.gz'
+ZSTD_EXTENSION = '.json.zst'
+
+STORAGE_MODES = ('original', 'minified', 'gzip', 'zstd')
+
+# 存储模式对应的文件扩展名
+_MODE_EXTENSIONS = {
+    'original': PLAIN_EXTENSION,
+    'minified': PLAIN_EXTENSION,
+    'gzip': GZIP_EXTENSION,
+    'zstd': ZSTD_EXTENSION,
+}
+
+
+def get_workflow_extension(path):
+    """返回工作流文件的扩展名（.json / .json.gz / .json.zst），不是工作流文件时返回None"""
+    lower = path.lower()
+    for extension in (GZIP_EXTENSION, ZSTD_EXTENSION, PLAIN_EXTENSION):
+        if lower.endswith(extension):
+            return extension
+    return None
+
+
+def is_workflow_file(path):
+    """判断路径是否为支持的工作流文件"""
+    return get_workflow_extension(path) is not None
+
+
+def strip_workflow_extension(path):
+    """去掉工作流扩展名，得到不含格式信息的基础路径"""
+    extension = get_workflow_extension(path)
+    return path[:-len(extension)] if extension else path
+
+
+def _decode_bytes(raw, extension):
+    if extension == GZIP_EXTENSION:
+        raw = gzip.decompress(raw)
+    elif extension == ZSTD_EXTENSION:
+        if zstandard is None:
+            raise ValueError("读取 .json.zst 文件需要安装 zstandard")
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw.decode('utf-8')
+
+
+def decode_workflow_bytes(raw, path):
+    """把工作流文件的原始字节解码为JSON文本（按扩展名自动解压）"""
+    return _decode_bytes(raw, get_workflow_extension(path))
+
+
+def read_workflow_text(path):
+    """读取工作流文件并返回JSON文本（自动解压）"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return _decode_bytes(raw, get_workflow_extension(path))
+
+
+def pretty_workflow_text(content):
+    """把工作流JSON文本格式化为便于阅读的缩进格式"""
+    return dumps(loads(content), indent=True)
+
+
+def minify_workflow_text(content):
+    """去掉工作流JSON文本中的多余空白"""
+    return dumps(loads(content))
+
+
+def get_storage_mode(path, root=None):
+    """获取路径所在根目录配置的存储模式（未配置时使用全局设置）"""
+    mode = None
+    if root is None:
+        root = get_path_resolver().find_root(path)
+    if root is not None:
+        mode = root.get('storage_mode')
+    mode = mode or get_setting('storage_mode', 'original')
+
+    if mode not in STORAGE_MODES:
+        logger.warning(f"未知的存储模式 {mode}，使用 original")
+        return 'original'
+    if mode == 'zstd' and zstandard is None:
+        logger.warning("未安装 zstandard，zstd 存储模式回退为 gzip")
+        return 'gzip'
+    return mode
+
+
+def _encode_text(content, extension, mode):
+    if mode != 'original':
+        content = minify_workflow_text(content)
+
+    raw = content.encode('utf-8')
+    if extension == GZIP_EXTENSION:
+        return gzip.compress(raw, compresslevel=get_setting('storage_compression_level', 6))
+    if extension == ZSTD_EXTENSION:
+        if zstandard is None:
+            raise ValueError("写入 .json.zst 文件需要安装 zstandard")
+        return zstandard.ZstdCompressor(level=get_setting('storage_zstd_level', 3)).compress(raw)
+    return raw
+
+
+def get_storage_path(path, mode=None):
+    """根据存储模式确定工作流实际保存的文件路径（如 a.json 在gzip模式下保存为 a.json.gz）"""
+    extension = get_workflow_extension(path)
+    if mode is None:
+        mode = get_storage_mode(path)
+
+    # 非工作流扩展名或客户端明确指定了压缩格式时保持不变
+    if extension is None or extension in (GZIP_EXTENSION, ZSTD_EXTENSION):
+        return path
+
+    return path[:-len(extension)] + _MODE_EXTENSIONS[mode]
+
+
+def locate_workflow_file(path):
+    """
+    查找工作流实际所在的文件：按压缩存储模式保存后 a.json 会变为 a.json.gz，
+    请求的路径不存在时依次尝试存储路径和其他格式的副本，都不存在时返回None
+    """
+    if os.path.isfile(path):
+        return path
+
+    extension = get_workflow_extension(path)
+    if extension is None:
+        return None
+
+    base_path = strip_workflow_extension(path)
+    candidates = [get_storage_path(path)]
+    candidates += [base_path + other for other in (PLAIN_EXTENSION, GZIP_EXTENSION, ZSTD_EXTENSION)]
+    for candidate in candidates:
+        if candidate != path and os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def publish_workflow_save(previous_path, file_path, storage_path):
+    """
+    保存后通知路径变化：存储格式改变了文件名（如 a.json -> a.json.gz）时，
+    先把旧文件的数据（笔记等）迁移到新路径，再使相关路径的缓存失效
+    """
+    if previous_path and previous_path != storage_path:
+        notify_path_moved(previous_path, storage_path)
+    invalidate_path(file_path, storage_path)
+
+
+def encode_workflow(path, content, mode):
+    """按存储模式编码工作流JSON文本，返回实际应保存的路径和字节内容"""
+    storage_path = get_storage_path(path, mode)
+    extension = get_workflow_extension(storage_path)
+    if extension is None:
+        # 不是工作流文件，原样写入
+        mode = 'original'
+    return storage_path, _encode_text(content, extension, mode)
+
+
+def write_workflow(path, content, mode=None):
+    """
+    按存储模式写入工作流JSON文本，返回实际写入的路径和字节数
+    写入先落到临时文件再原子替换；同一工作流的其他格式副本会被删除，避免新旧版本并存
+    """
+    if mode is None:
+        mode = get_storage_mode(path)
+
+    storage_path, data = encode_workflow(path, content, mode)
+    extension = get_workflow_extension(storage_path)
+
+    temp_path = os.path.join(os.path.dirname(storage_path), f".{os.path.basename(storage_path)}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, storage_path)
+    except BaseException:
+        # 写入或替换失败时不留下临时文件
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if extension is not None:
+        base_path = strip_workflow_extension(storage_path)
+        for other_extension in (PLAIN_EXTENSION, GZIP_EXTENSION, ZSTD_EXTENSION):
+            other_path = base_path + other_extension
+            if other_extension != extension and os.path.isfile(other_path):
+                os.remove(other_path)
+                logger.info(f"已删除旧格式的工作流副本: {other_path}")
+
+    return storage_path, len(data)
+
+
+def is_stored_as(path, mode):
+    """
+    判断工作流文件是否已是该存储模式的格式（按扩展名判断）；
+    minified与original同为 .json，无法从扩展名区分，视为需要转换
+    """
+    extension = get_workflow_extension(path)
+    return extension is not None and mode != 'minified' and extension == _MODE_EXTENSIONS.get(mode)
+
+
+def get_converted_path(path, mode):
+    """工作流文件转换为指定存储模式后的路径（不保留原扩展名，完全按目标模式决定）"""
+    return strip_workflow_extension(path) + _MODE_EXTENSIONS[mode]
+
+
+def convert_workflow_file(path, mode):
+    """把已有工作流文件转换为指定存储模式，返回转换后的路径和节省的字节数"""
+    original_size = os.path.getsize(path)
+    content = read_workflow_text(path)
+
+    target_path = get_converted_path(path, mode)
+    storage_path, size = write_workflow(target_path, content, mode)
+    return storage_path, original_size - size
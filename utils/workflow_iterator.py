@@ -0,0 +1,213 @@
+"""
+NZ工作流助手 - 工作流遍历模块
+批量处理节点按游标逐个取出文件夹（或标签查询结果）中的工作流：
+排序时只缓存路径列表，目录没有增删改名时直接复用；不排序时用生成器边遍历边返回，
+游标连续前进时从上次的位置继续，不需要先列出整个文件夹
+"""
+
+import os
+import re
+import fnmatch
+import itertools
+import threading
+from collections import OrderedDict
+from ..core.logger import get_logger
+from .workflow_format import is_workflow_file
+from .note_index import get_note_index
+
+
+# 获取logger实例
+logger = get_logger()
+
+SORT_MODES = ("name", "modified", "size", "none")
+SORT_ORDERS = ("asc", "desc")
+
+
+def make_filter(pattern='', regex=''):
+    """
+    文件筛选函数 accept(相对路径)：pattern为文件名glob（不区分大小写，多个用;分隔），
+    regex为在相对路径（/分隔）中搜索的正则表达式
+    """
+    patterns = [p.strip().lower() for p in (pattern or '').split(';') if p.strip()]
+    try:
+        compiled = re.compile(regex) if regex else None
+    except re.error as e:
+        raise ValueError(f"正则表达式无效: {e}")
+
+    def accept(rel_path):
+        name = rel_path.rsplit('/', 1)[-1].lower()
+        if patterns and not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+            return False
+        return compiled is None or compiled.search(rel_path) is not None
+
+    return accept
+
+
+def walk_workflow_files(folder, recursive=True, directories=None):
+    """
+    逐个返回文件夹中的工作流文件 (路径, 相对路径)，跳过隐藏文件和目录（含回收站）；
+    directories不为None时记录遍历过的目录及其修改时间
+    """
+    for dir_path, dir_names, file_names in os.walk(folder):
+        if directories is not None:
+            try:
+                directories[dir_path] = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                pass
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.')) if recursive else []
+        rel_dir = os.path.relpath(dir_path, folder).replace(os.sep, '/')
+        for file_name in file_names:
+            if file_name.startswith('.') or not is_workflow_file(file_name):
+                continue
+            rel_path = file_name if rel_dir == '.' else f"{rel_dir}/{file_name}"
+            yield os.path.join(dir_path, file_name), rel_path
+
+
+def _sort_paths(paths, sort, order):
+    """按名称（相对路径，不区分大小写）、修改时间或大小排序，无法读取的文件排在最后"""
+    reverse = order == 'desc'
+    if sort == 'name':
+        return sorted(paths, key=lambda item: item[1].lower(), reverse=reverse)
+
+    def stat_key(item):
+        try:
+            stat = os.stat(item[0])
+        except OSError:
+            return (1, 0)
+        value = stat.st_mtime_ns if sort == 'modified' else stat.st_size
+        return (0, -value if reverse else value)
+
+    return sorted(paths, key=lambda item: (stat_key(item), item[1].lower()))
+
+
+class WorkflowIterator:
+    """
+    工作流遍历器 - 排序的列表按参数缓存（记录遍历过的目录的修改时间用于校验），
+    不排序的遍历保留生成器和当前位置
+    """
+
+    def __init__(self, max_listings=16, max_streams=8):
+        self._lock = threading.Lock()
+        self._listings = OrderedDict()
+        self._streams = OrderedDict()
+        self._generation = 0
+        self.max_listings = max_listings
+        self.max_streams = max_streams
+
+    @staticmethod
+    def _directories_unchanged(directories):
+        """目录都没有增删改名（修改时间未变化）时，缓存的列表仍然有效"""
+        for path, mtime_ns in directories.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _tag_paths(self, folder, tags, recursive):
+        """标签查询结果（同时包含所有标签）中位于文件夹内的工作流"""
+        result = get_note_index().query(tags_all=tags, path_prefix=folder, sort='path', limit=0)
+        paths = []
+        for item in result['items']:
+            rel_path = os.path.relpath(item['path'], folder).replace(os.sep, '/')
+            if recursive or '/' not in rel_path:
+                paths.append((item['path'], rel_path))
+        return paths
+
+    def _listing(self, key, folder, accept, recursive, sort, order, tags):
+        """排序后的路径列表 (generation, [(路径, 相对路径)])"""
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is not None:
+                self._listings.move_to_end(key)
+        if cached is not None and cached['directories'] is not None \
+                and self._directories_unchanged(cached['directories']):
+            return cached['generation'], cached['paths']
+
+        if tags:
+            # 标签查询直接使用内存中的索引，每次重新查询（索引随备注修改更新）
+            directories = None
+            paths = [item for item in self._tag_paths(folder, tags, recursive) if accept(item[1])]
+        else:
+            directories = {}
+            paths = [item for item in walk_workflow_files(folder, recursive, directories) if accept(item[1])]
+        paths = _sort_paths(paths, sort if sort != 'none' else 'name', order)
+
+        with self._lock:
+            self._generation += 1
+            entry = {"generation": self._generation, "directories": directories, "paths": paths}
+            self._listings[key] = entry
+            self._listings.move_to_end(key)
+            while len(self._listings) > self.max_listings:
+                self._listings.popitem(last=False)
+        logger.debug(f"工作流遍历: 列出 {folder} 共{len(paths)}个工作流")
+        return entry['generation'], paths
+
+    def _stream_next(self, key, folder, accept, recursive, cursor):
+        """不排序时按文件系统顺序遍历：游标等于上次位置时继续，否则从头跳过cursor个"""
+        with self._lock:
+            stream = self._streams.pop(key, None)
+        if stream is None or stream['position'] != cursor:
+            iterator = (item for item in walk_workflow_files(folder, recursive) if accept(item[1]))
+            stream = {"iterator": itertools.islice(iterator, cursor, None), "position": cursor}
+
+        item = next(stream['iterator'], None)
+        if item is not None:
+            stream['position'] = cursor + 1
+            with self._lock:
+                self._streams[key] = stream
+                while len(self._streams) > self.max_streams:
+                    self._streams.popitem(last=False)
+        return item
+
+    def get(self, folder, cursor, pattern='', regex='', recursive=False, sort='name', order='asc', tags=()):
+        """
+        取出第cursor个工作流，返回 {path, rel_path, cursor, total, done, generation}；
+        不排序（sort=none）且不按标签查询时不统计总数，total为-1
+        """
+        if sort not in SORT_MODES:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"不支持的排序顺序: {order}")
+        folder = os.path.abspath(folder)
+        if not os.path.isdir(folder):
+            raise ValueError(f"路径不是目录: {folder}")
+        cursor = max(0, int(cursor))
+        tags = tuple(tags or ())
+        accept = make_filter(pattern, regex)
+        key = (folder, pattern, regex, bool(recursive), sort, order, tags)
+
+        if sort == 'none' and not tags:
+            item = self._stream_next(key, folder, accept, recursive, cursor)
+            total, generation = -1, None
+        else:
+            generation, paths = self._listing(key, folder, accept, recursive, sort, order, tags)
+            item = paths[cursor] if cursor < len(paths) else None
+            total = len(paths)
+
+        return {
+            "path": item[0] if item else None,
+            "rel_path": item[1] if item else None,
+            "cursor": cursor,
+            "total": total,
+            "done": item is None,
+            "generation": generation
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "listings": len(self._listings),
+                "paths": sum(len(entry['paths']) for entry in self._listings.values()),
+                "streams": len(self._streams)
+            }
+
+
+# 全局实例
+_workflow_iterator = WorkflowIterator()
+
+
+def get_workflow_iterator():
+    """获取全局工作流遍历器"""
+    return _workflow_iterator
@@ -0,0 +1,258 @@
+"""
+NZ工作流助手 - 目录打包导入导出模块
+导出：在遍历目录的同时把zip数据流式写入HTTP响应（不生成临时文件，内存占用固定）；
+导入：上传的zip按块写入数据目录，逐项校验路径安全后并行解压到目标目录，
+冲突处理与复制目录一致（默认整体替换：解压到目标旁的暂存目录，再通过操作日志替换目标，
+被替换的旧目录移入回收站，可以撤销）
+"""
+
+import os
+import stat
+import shutil
+import zipfile
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..core.logger import get_logger
+from ..core.config import get_setting
+from .copy_engine import PARTIAL_SUFFIX
+from .operation_journal import get_operation_journal, plan_move
+from .validation import validate_filename
+
+
+# 获取logger实例
+logger = get_logger()
+
+# 写入HTTP响应和读写文件的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 本身已经压缩过的文件直接存储，不再deflate
+STORED_EXTENSIONS = ('.gz', '.zst', '.zip', '.png', '.jpg', '.jpeg', '.webp', '.gif', '.mp4', '.webm', '.safetensors')
+
+# 导入时忽略的系统文件
+IGNORED_MEMBER_NAMES = {'__MACOSX', '.DS_Store', 'Thumbs.db', 'desktop.ini'}
+
+# 整体替换时的暂存目录后缀（以点开头，目录列表中默认隐藏）
+IMPORT_STAGING_SUFFIX = '.nzimport'
+
+# 导入冲突策略：replace 整体替换（与复制目录相同）、merge 合并并覆盖同名文件、
+# skip 合并但保留已有文件、error 目标已存在时报错
+CONFLICT_POLICIES = ('replace', 'merge', 'skip', 'error')
+
+
+class ZipStreamWriter:
+    """
+    供zipfile在工作线程中写入的文件对象，数据攒够一块后同步写入aiohttp响应
+    （等待事件循环写完再继续，客户端读取慢时自然形成背压）
+    """
+
+    def __init__(self, response, loop, chunk_size=STREAM_CHUNK_SIZE):
+        self.response = response
+        self.loop = loop
+        self.chunk_size = chunk_size
+        self.bytes_written = 0
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._send()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._send()
+
+    def _send(self):
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        asyncio.run_coroutine_threadsafe(self.response.write(chunk), self.loop).result()
+        self.bytes_written += len(chunk)
+
+
+def _iter_directory(directory_path):
+    """遍历目录，返回 (绝对路径, zip内名称, 是否目录)，跳过隐藏文件和目录（回收站、复制暂存等）"""
+    base_name = os.path.basename(directory_path.rstrip(os.sep))
+    for dir_path, dir_names, file_names in os.walk(directory_path):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.'))
+        relative_dir = os.path.relpath(dir_path, directory_path)
+        prefix = base_name if relative_dir == os.curdir else f"{base_name}/{relative_dir.replace(os.sep, '/')}"
+
+        visible_files = sorted(f for f in file_names if not f.startswith('.'))
+        if not visible_files and not dir_names:
+            yield dir_path, f"{prefix}/", True
+        for file_name in visible_files:
+            yield os.path.join(dir_path, file_name), f"{prefix}/{file_name}", False
+
+
+def write_directory_zip(directory_path, fileobj):
+    """把目录打包写入fileobj（可以是不可seek的流），返回写入的文件数"""
+    level = get_setting('zip_compression_level', 6)
+    count = 0
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=level, allowZip64=True) as archive:
+        for path, arcname, is_dir in _iter_directory(directory_path):
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                if is_dir:
+                    archive.writestr(info, b'')
+                    continue
+                if arcname.lower().endswith(STORED_EXTENSIONS):
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    # Python 3.13起属性名为compress_level
+                    setattr(info, 'compress_level' if hasattr(info, 'compress_level') else '_compresslevel', level)
+
+                with open(path, 'rb') as source, archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as target:
+                    shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+                count += 1
+            except FileNotFoundError:
+                # 导出过程中被删除的文件直接跳过
+                logger.warning(f"导出时文件已不存在，跳过: {path}")
+    return count
+
+
+def _member_parts(info):
+    """
+    校验zip成员名称，返回路径组件列表；应忽略的成员返回None
+    绝对路径、盘符、上级引用和非法文件名会使整个导入失败
+    """
+    name = info.filename.replace('\\', '/')
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        raise ValueError(f"压缩包包含绝对路径: {info.filename}")
+
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts:
+        return None
+    if any(part in IGNORED_MEMBER_NAMES or part.startswith('._') for part in parts):
+        return None
+    for part in parts:
+        if part == '..':
+            raise ValueError(f"压缩包包含上级目录引用: {info.filename}")
+        if not validate_filename(part):
+            raise ValueError(f"压缩包包含非法文件名: {info.filename}")
+
+    # 符号链接不解压（可能指向目标目录之外）
+    if stat.S_ISLNK(info.external_attr >> 16):
+        logger.warning(f"跳过压缩包中的符号链接: {info.filename}")
+        return None
+    return parts
+
+
+def _plan_members(archive):
+    """校验所有成员并计算相对路径；所有成员位于同一顶层目录时去掉这一层"""
+    max_files = get_setting('zip_import_max_files', 20000)
+    max_bytes = get_setting('zip_import_max_bytes', 4 * 1024 * 1024 * 1024)
+
+    members = []
+    total_bytes = 0
+    for info in archive.infolist():
+        parts = _member_parts(info)
+        if parts is None:
+            continue
+        members.append((info, parts))
+        total_bytes += info.file_size
+        if len(members) > max_files:
+            raise ValueError(f"压缩包文件数超过限制 ({max_files})")
+        if total_bytes > max_bytes:
+            raise ValueError(f"压缩包解压后大小超过限制 ({max_bytes} 字节)")
+
+    top_level = {parts[0] for _, parts in members}
+    if len(top_level) == 1 and all(len(parts) > 1 or info.is_dir() for info, parts in members):
+        members = [(info, parts[1:]) for info, parts in members if len(parts) > 1]
+    return members
+
+
+def _extract_member(zip_path, info, destination, local, handles):
+    """解压单个成员：先写临时文件再原子替换，实际大小超过声明大小时中止（防止伪造头部的压缩炸弹）"""
+    # 每个线程使用自己的ZipFile句柄，避免共享文件位置
+    archive = getattr(local, 'archive', None)
+    if archive is None:
+        archive = local.archive = zipfile.ZipFile(zip_path)
+        handles.append(archive)
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = destination + PARTIAL_SUFFIX
+    written = 0
+    try:
+        with archive.open(info) as source, open(temp_path, 'wb') as target:
+            while True:
+                chunk = source.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > info.file_size:
+                    raise ValueError(f"压缩包成员大小与声明不符: {info.filename}")
+                target.write(chunk)
+        os.replace(temp_path, destination)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return written
+
+
+def get_import_staging_path(target_path):
+    """导入的暂存目录（按目标命名，中断留下的暂存目录在下次导入同一目标时清理）"""
+    return os.path.join(os.path.dirname(target_path), f".{os.path.basename(target_path)}{IMPORT_STAGING_SUFFIX}")
+
+
+def import_zip(zip_path, target_path, conflict='replace', max_workers=None):
+    """
+    把zip解压为target_path目录，返回统计信息 {"files", "skipped", "bytes"}
+    conflict见CONFLICT_POLICIES；replace时先解压到暂存目录，完成后作为一次操作写入操作日志并替换目标
+    （已存在的目标移入回收站），调用方持有目标路径的锁
+    """
+    if conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"不支持的冲突策略: {conflict}")
+
+    target_exists = os.path.lexists(target_path)
+    if target_exists and conflict == 'error':
+        raise ValueError("目标目录已存在")
+    if target_exists and not os.path.isdir(target_path):
+        raise ValueError("目标路径已存在且不是目录")
+
+    with zipfile.ZipFile(zip_path) as archive:
+        members = _plan_members(archive)
+
+    in_place = target_exists and conflict in ('merge', 'skip')
+    destination_root = target_path if in_place else get_import_staging_path(target_path)
+    if not in_place and os.path.exists(destination_root):
+        shutil.rmtree(destination_root)
+    os.makedirs(destination_root, exist_ok=True)
+
+    jobs = []
+    skipped = 0
+    real_root = os.path.realpath(destination_root)
+    for info, parts in members:
+        destination = os.path.join(destination_root, *parts)
+        # 合并到已有目录时，目录中的符号链接可能把文件引到目标之外
+        if in_place and os.path.commonpath([os.path.realpath(destination), real_root]) != real_root:
+            raise ValueError(f"压缩包成员会写到目标目录之外: {info.filename}")
+        if info.is_dir():
+            os.makedirs(destination, exist_ok=True)
+        elif conflict == 'skip' and os.path.exists(destination):
+            skipped += 1
+        else:
+            jobs.append((info, destination))
+
+    if max_workers is None:
+        max_workers = get_setting('copy_workers', 8)
+    local = threading.local()
+    handles = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs) or 1))) as executor:
+            sizes = list(executor.map(lambda job: _extract_member(zip_path, job[0], job[1], local, handles), jobs))
+    except Exception:
+        if not in_place:
+            shutil.rmtree(destination_root, ignore_errors=True)
+        raise
+    finally:
+        for archive in handles:
+            archive.close()
+
+    if not in_place:
+        get_operation_journal().execute('import_zip', plan_move(destination_root, target_path))
+
+    logger.info(f"压缩包导入完成: {target_path} ({len(jobs)}个文件, 跳过{skipped}个)")
+    return {"files": len(jobs), "skipped": skipped, "bytes": sum(sizes)}
@@ -16,6 +16,8 @@ import { WorkflowManager } from './modules/features/workflow-manager.js';
 import { WorkflowLoader } from './modules/features/workflow-loader.js';
 import { WorkflowUI } from './modules/features/workflow-ui.js';
 import { CommunicationAPI } from './modules/core/communication-api.js';
+import { DataProcessor } from './modules/core/data-processor.js';
+import { ClientStore } from './modules/core/client-store.js';
 
 // Stage6: 交互系统模块
 import interactionSystem from './modules/ui/interaction-system.js';
@@ -23,11 +25,8 @@ import interactionSystem from './modules/ui/interaction-system.js';
 // Stage7: 浮动管理器模块
 import { WorkflowState, FloatingWorkflowManager } from './modules/features/floating-manager.js';
 
-// Stage8: 备注编辑器模块
-import { WorkflowNoteEditor, setWorkflowNoteEditorInstance } from './modules/features/workflow-note-editor.js';
-
-// Stage8: 自定义图标管理器模块
-import { CustomIconManager, setCustomIconManagerInstance } from './modules/features/custom-icon-manager.js';
+// Stage8: 备注编辑器和自定义图标管理器模块按需加载（见 loadNoteEditor / loadCustomIconManager），
+// 打包后是独立的chunk，首次使用时才下载
 
 // Path模块已迁移到 modules/core/config.js
 // 如需使用Path工具函数，请通过 config.path 访问
@@ -55,6 +54,8 @@ let workflowManager = null;
 let workflowLoader = null;
 let workflowUI = null;
 let communicationAPI = null;
+let dataProcessor = null;
+let clientStore = null;
 
 // Stage6: 交互系统模块实例
 let interactionSystemInstance = null;
@@ -68,6 +69,84 @@ let workflowNoteEditor = null;
 // Stage8: 自定义图标管理器模块实例
 let customIconManager = null;
 
+// 按需加载的模块（加载中的Promise，避免重复导入）
+let noteEditorLoading = null;
+let customIconManagerLoading = null;
+
+// 加载备注编辑器模块并创建实例
+function loadNoteEditor() {
+  if (!noteEditorLoading) {
+    noteEditorLoading = import('./modules/features/workflow-note-editor.js').then(({ WorkflowNoteEditor, setWorkflowNoteEditorInstance }) => {
+      workflowNoteEditor = new WorkflowNoteEditor(config, workflowNotesManager, uiManager);
+      setWorkflowNoteEditorInstance(workflowNoteEditor);
+      console.log(`[${config.PLUGIN_NAME}] 备注编辑器模块已加载`);
+      return workflowNoteEditor;
+    }).catch(error => {
+      noteEditorLoading = null;
+      console.error(`[${config.PLUGIN_NAME}] 备注编辑器模块加载失败:`, error);
+      throw error;
+    });
+  }
+  return noteEditorLoading;
+}
+
+// 加载自定义图标管理器模块并创建实例，完成后为已显示的文件项补上自定义图标
+function loadCustomIconManager() {
+  if (!customIconManagerLoading) {
+    customIconManagerLoading = import('./modules/features/custom-icon-manager.js').then(({ CustomIconManager, setCustomIconManagerInstance }) => {
+      const manager = new CustomIconManager(config, uiManager, clientStore);
+      return manager.load().then(() => {
+        customIconManager = manager;
+        setCustomIconManagerInstance(customIconManager);
+        if (workflowUI) {
+          workflowUI.refreshItemElements();
+        }
+        console.log(`[${config.PLUGIN_NAME}] 自定义图标管理器模块已加载`);
+        return customIconManager;
+      });
+    }).catch(error => {
+      customIconManagerLoading = null;
+      console.error(`[${config.PLUGIN_NAME}] 自定义图标管理器模块加载失败:`, error);
+      throw error;
+    });
+  }
+  return customIconManagerLoading;
+}
+
+// 模块加载前使用的全局占位接口：调用时加载模块，加载后由模块的 set*Instance 替换为真正的实现
+function installLazyFeatureStubs() {
+  window.openNoteEditor = (filePath) => loadNoteEditor().then(() => window.openNoteEditor(filePath));
+  window.deleteWorkflowNote = (filePath) => loadNoteEditor().then(() => window.deleteWorkflowNote(filePath));
+  window.WorkflowNoteEditor = {
+    openEditor: (filePath, existingNote) => loadNoteEditor().then(() => window.WorkflowNoteEditor.openEditor(filePath, existingNote)),
+    refreshFileDisplay: () => loadNoteEditor().then(() => window.WorkflowNoteEditor.refreshFileDisplay())
+  };
+
+  // 没有保存过自定义图标时，文件列表不需要图标管理器，等用户第一次设置图标时再加载
+  const forward = (method) => (...args) => loadCustomIconManager().then(() => window.CustomIconManager[method](...args));
+  window.CustomIconManager = {
+    getAllCustomIcons: () => ({}),
+    getCustomIcon: () => null,
+    applyCustomIconToFileItem: () => false,
+    setCustomIcon: forward('setCustomIcon'),
+    removeCustomIcon: forward('removeCustomIcon'),
+    showIconSelectorDialog: forward('showIconSelectorDialog'),
+    handleFileUpload: forward('handleFileUpload'),
+    closeDialog: () => {}
+  };
+  window.nzTestCustomIcon = () => loadCustomIconManager().then(() => window.nzTestCustomIcon());
+
+  if (localStorage.getItem('nz_custom_icons')) {
+    loadCustomIconManager();
+  } else if (clientStore) {
+    clientStore.count('icons').then(count => {
+      if (count > 0) {
+        loadCustomIconManager();
+      }
+    });
+  }
+}
+
 // 全局工作流管理器协调接口已迁移到 modules/core/config.js
 // 状态管理变量已迁移到 modules/core/config.js
 // 主题管理变量已迁移到 modules/ui/theme-system.js
@@ -102,9 +181,13 @@ function initializeModules(app) {
       console.log(`[${config.PLUGIN_NAME}] 侧边栏注册模块已初始化`);
     }
     
-    // 5. 初始化工作流备注系统模块
+    // 5. 初始化客户端持久化存储和工作流备注系统模块
+    if (!clientStore) {
+      clientStore = new ClientStore(config.PLUGIN_NAME);
+    }
+    
     if (!workflowNotesManager) {
-      workflowNotesManager = new WorkflowNotesManager(config);
+      workflowNotesManager = new WorkflowNotesManager(config, clientStore);
       console.log(`[${config.PLUGIN_NAME}] 工作流备注系统模块已初始化`);
     }
     
@@ -114,18 +197,22 @@ function initializeModules(app) {
       console.log(`[${config.PLUGIN_NAME}] 通信API模块已初始化`);
     }
     
+    if (!dataProcessor) {
+      dataProcessor = new DataProcessor(config.PLUGIN_NAME);
+    }
+    
     if (!workflowLoader) {
-      workflowLoader = new WorkflowLoader(config.PLUGIN_NAME);
+      workflowLoader = new WorkflowLoader(config.PLUGIN_NAME, dataProcessor, clientStore);
       console.log(`[${config.PLUGIN_NAME}] 工作流加载器模块已初始化`);
     }
     
     if (!workflowUI) {
-      workflowUI = new WorkflowUI(config.PLUGIN_NAME);
+      workflowUI = new WorkflowUI(config.PLUGIN_NAME, dataProcessor);
       console.log(`[${config.PLUGIN_NAME}] 工作流UI模块已初始化`);
     }
     
     if (!workflowManager) {
-      workflowManager = new WorkflowManager(config.PLUGIN_NAME, config);
+      workflowManager = new WorkflowManager(config.PLUGIN_NAME, config, dataProcessor, clientStore);
       console.log(`[${config.PLUGIN_NAME}] 工作流管理器模块已初始化`);
     }
     
@@ -173,7 +260,7 @@ function initializeModules(app) {
       loadDirectory: (path) => workflowManager.loadDirectory(path),
       loadDirectoryWithoutHistory: (path) => workflowManager.loadDirectoryWithoutHistory(path),
       loadWorkflow: (filePath) => workflowLoader.loadWorkflow(filePath),
-      loadWorkflowFile: (filePath) => workflowLoader.loadWorkflowFile(filePath),
+      loadWorkflowFile: (filePath, options) => workflowLoader.loadWorkflowFile(filePath, options),
       // ✅ Stage4已完成：UI事件监听器已迁移到 modules/ui/ui-manager.js
       initializeUIEventListeners: () => uiManager.initializeUIEventListeners(),
       // ✅ Stage7已完成：浮动管理器已迁移到 modules/features/floating-manager.js
@@ -198,22 +285,17 @@ function initializeModules(app) {
     themeSystem.initializeDefaultSettings();
     themeSystem.initializeTheme();
     
-    // 8. 初始化备注编辑器模块
-    if (!workflowNoteEditor) {
-      workflowNoteEditor = new WorkflowNoteEditor(config, workflowNotesManager, uiManager);
-      setWorkflowNoteEditorInstance(workflowNoteEditor);
-      console.log(`[${config.PLUGIN_NAME}] 备注编辑器模块已初始化`);
+    // 8. 备注编辑器和自定义图标管理器按需加载，这里只安装占位接口
+    if (!workflowNoteEditor && !noteEditorLoading) {
+      installLazyFeatureStubs();
     }
     
-    // 8.1 初始化自定义图标管理器模块
-    if (!customIconManager) {
-      customIconManager = new CustomIconManager(config, uiManager);
-      setCustomIconManagerInstance(customIconManager);
-      console.log(`[${config.PLUGIN_NAME}] 自定义图标管理器模块已初始化`);
-    }
-    
-    // 9. 加载工作流备注
-    workflowNotesManager.loadNotes();
+    // 9. 加载工作流备注（IndexedDB中的备注异步加载，完成后更新已显示的文件项）
+    workflowNotesManager.loadNotes().then(changed => {
+      if (changed && workflowUI) {
+        workflowUI.refreshItemElements();
+      }
+    });
     
     // 9. 设置全局模块访问对象（Stage5: 工作流模块间通信）
     window.nzWorkflowManager = window.nzWorkflowManager || {};
@@ -223,6 +305,8 @@ function initializeModules(app) {
     window.nzWorkflowManager.dialogManager = window.dialogManager; // 确保模块化代码可以访问dialogManager
     window.nzWorkflowManager.workflowUI = workflowUI;
     window.nzWorkflowManager.communicationAPI = communicationAPI;
+    window.nzWorkflowManager.dataProcessor = dataProcessor;
+    window.nzWorkflowManager.clientStore = clientStore;
     window.nzWorkflowManager.uiManager = uiManager; // 暴露UI管理器
     
     // 直接暴露CommunicationAPI到全局，供交互系统使用
@@ -1488,6 +1572,53 @@ function addManagerStyles() {
       color: #ff8a8a;
     }
     
+    /* 搜索和排序栏 */
+    .nz-search-bar {
+      display: flex;
+      align-items: center;
+      gap: 6px;
+      margin-bottom: 8px;
+      padding: 4px 8px;
+      background: rgba(100, 120, 180, 0.12);
+      border-radius: 8px;
+      font-size: 0.85em;
+    }
+    
+    .nz-search-bar i {
+      color: #6bb6ff;
+      font-size: 13px;
+    }
+    
+    .nz-search-input {
+      flex: 1;
+      min-width: 0;
+      background: transparent;
+      border: none;
+      outline: none;
+      color: inherit;
+      font-size: inherit;
+      padding: 4px 0;
+    }
+    
+    .nz-search-count {
+      opacity: 0.7;
+      white-space: nowrap;
+    }
+    
+    .nz-sort-select {
+      background: rgba(100, 120, 180, 0.2);
+      border: 1px solid rgba(100, 120, 180, 0.3);
+      border-radius: 4px;
+      color: inherit;
+      font-size: inherit;
+      padding: 2px 4px;
+      flex-shrink: 0;
+    }
+    
+    .nz-sort-select option {
+      color: #222;
+    }
+    
     /* 路径栏拖拽样式 */
     .nz-path-display.drag-over {
       background: linear-gradient(135deg, rgba(100, 150, 255, 0.3), rgba(80, 130, 255, 0.2));
@@ -4263,43 +4394,46 @@ function handleMultiSelectAction(action) {
   }
 }
 
-function selectAllItems() {
-  const fileItems = document.querySelectorAll('.nz-file-item');
-  fileItems.forEach(item => {
-    const filePath = item.dataset.filePath;
-    if (filePath) {
-      const fileName = filePath.split('\\').pop() || filePath.split('/').pop();
+// 当前目录的所有项目：虚拟滚动时不在DOM中的项目也包括在内
+function getAllItemRecords() {
+  if (workflowUI && typeof workflowUI.getItemRecords === 'function' && workflowUI.gridState) {
+    return workflowUI.getItemRecords();
+  }
+  return Array.from(document.querySelectorAll('.nz-file-item'))
+    .filter(item => item.dataset.filePath)
+    .map(item => {
+      const filePath = item.dataset.filePath;
       const itemType = item.classList.contains('folder') ? 'directory' : 'file';
-      multiSelectManager.addToSelection(item, filePath, fileName, itemType);
-    }
+      return {
+        id: `${itemType}:${filePath}`,
+        itemType,
+        filePath,
+        fileName: filePath.split('\\').pop() || filePath.split('/').pop(),
+        element: item
+      };
+    });
+}
+
+function selectAllItems() {
+  const records = getAllItemRecords();
+  records.forEach(record => {
+    multiSelectManager.addToSelection(record.element, record.filePath, record.fileName, record.itemType);
   });
-  window.nzWorkflowManager.showNotification(`已选择 ${fileItems.length} 个项目`, 'info');
+  window.nzWorkflowManager.showNotification(`已选择 ${records.length} 个项目`, 'info');
 }
 
 function invertSelection() {
-  const fileItems = document.querySelectorAll('.nz-file-item');
-  const selectedItems = multiSelectManager.getSelectedItems();
-  const selectedPaths = new Set(selectedItems.map(item => item.filePath));
-  
-  let invertedCount = 0;
-  
-  fileItems.forEach(item => {
-    const filePath = item.dataset.filePath;
-    if (filePath) {
-      const fileName = filePath.split('\\').pop() || filePath.split('/').pop();
-      const itemType = item.classList.contains('folder') ? 'directory' : 'file';
-      const itemId = `${itemType}:${filePath}`;
-      
-      if (selectedPaths.has(filePath)) {
-        // 如果已选中，取消选择
-        multiSelectManager.deselectItem(item, itemId);
-      } else {
-        // 如果未选中，选择它
-        multiSelectManager.selectItem(item, itemId, filePath, fileName, itemType);
-        invertedCount++;
-      }
+  getAllItemRecords().forEach(record => {
+    if (multiSelectManager.selectedItems.has(record.id)) {
+      // 如果已选中，取消选择
+      multiSelectManager.removeFromSelection(record.id);
+    } else {
+      // 如果未选中，选择它
+      multiSelectManager.addToSelection(record.element, record.filePath, record.fileName, record.itemType);
     }
   });
+  multiSelectManager.updateSelectionDisplay();
+  multiSelectManager.updateMultiSelectButtonState();
   
   const newSelectedCount = multiSelectManager.getSelectedItems().length;
   window.nzWorkflowManager.showNotification(`反选完成，当前选择 ${newSelectedCount} 个项目`, 'info');
@@ -13075,8 +13209,8 @@ window.debugNZWorkflow = {
       console.log('请先打开工作流备注编辑器（点击"增加备注"按钮）');
     }
     
-    console.log('WorkflowNoteEditor:', WorkflowNoteEditor);
-    console.log('showCategoryManager 方法:', WorkflowNoteEditor.showCategoryManager);
+    console.log('WorkflowNoteEditor:', window.WorkflowNoteEditor);
+    console.log('备注编辑器模块是否已加载:', !!workflowNoteEditor);
   },
   showCategoryManager: () => {
     try {
@@ -0,0 +1,346 @@
+/**
+ * NZ工作流管理器 - 客户端持久化存储模块
+ *
+ * 功能：
+ * - 目录列表和最近打开的工作流按路径保存在IndexedDB（原始响应内容和ETag），
+ *   重新加载页面后可以立即显示，再用条件请求（If-None-Match）向服务器确认是否有变化
+ * - 备注和自定义图标按条目保存，修改时只写入变化的条目，写入合并到后台事务中执行，不阻塞界面
+ * - 浏览器不支持IndexedDB（或被禁用）时读取返回空结果、写入被忽略，调用方继续使用localStorage
+ */
+
+const DB_NAME = 'nz_workflow_manager';
+const DB_VERSION = 1;
+
+// 按路径缓存的响应内容（超出条目数时淘汰最久未使用的）
+const CACHE_STORE_LIMITS = {
+  listings: 200,
+  workflows: 30
+};
+
+// 按路径保存的用户数据
+const RECORD_STORES = ['notes', 'icons'];
+
+// 超过该大小的响应不缓存
+const MAX_CACHED_BYTES = 16 * 1024 * 1024;
+
+// 写入合并的等待时间（毫秒）
+const WRITE_DELAY_MS = 100;
+
+class ClientStore {
+  constructor(pluginName) {
+    this.pluginName = pluginName;
+    this.dbPromise = null;
+    // 等待写入的条目：{ store: Map(路径 -> 记录，null表示删除) }
+    this.pending = new Map();
+    this.flushTimer = null;
+
+    // 页面关闭前写入未完成的修改
+    if (typeof window !== 'undefined') {
+      window.addEventListener('pagehide', () => this.flush());
+    }
+  }
+
+  /**
+   * 打开数据库（只打开一次）
+   * @returns {Promise<IDBDatabase|null>} 不可用时为null
+   */
+  open() {
+    if (!this.dbPromise) {
+      this.dbPromise = new Promise(resolve => {
+        let request;
+        try {
+          request = indexedDB.open(DB_NAME, DB_VERSION);
+        } catch (error) {
+          console.warn(`[${this.pluginName}] IndexedDB不可用，使用localStorage:`, error);
+          resolve(null);
+          return;
+        }
+
+        request.onupgradeneeded = () => {
+          const db = request.result;
+          for (const name of Object.keys(CACHE_STORE_LIMITS)) {
+            if (!db.objectStoreNames.contains(name)) {
+              db.createObjectStore(name, { keyPath: 'path' }).createIndex('accessedAt', 'accessedAt');
+            }
+          }
+          for (const name of RECORD_STORES) {
+            if (!db.objectStoreNames.contains(name)) {
+              db.createObjectStore(name, { keyPath: 'path' });
+            }
+          }
+        };
+        request.onsuccess = () => {
+          const db = request.result;
+          // 其他标签页升级数据库时关闭连接，本页之后不再使用IndexedDB
+          db.onversionchange = () => {
+            db.close();
+            this.dbPromise = Promise.resolve(null);
+          };
+          resolve(db);
+        };
+        request.onerror = () => {
+          console.warn(`[${this.pluginName}] 打开IndexedDB失败，使用localStorage:`, request.error);
+          resolve(null);
+        };
+      });
+    }
+    return this.dbPromise;
+  }
+
+  /**
+   * 在只读事务中执行一个请求
+   * @param {string} storeName - 存储名称
+   * @param {Function} makeRequest - (store) => IDBRequest
+   * @returns {Promise} 请求结果，失败时为null
+   */
+  async read(storeName, makeRequest) {
+    const db = await this.open();
+    if (!db) return null;
+    return new Promise(resolve => {
+      try {
+        const request = makeRequest(db.transaction(storeName, 'readonly').objectStore(storeName));
+        request.onsuccess = () => resolve(request.result ?? null);
+        request.onerror = () => resolve(null);
+      } catch (error) {
+        console.warn(`[${this.pluginName}] 读取${storeName}失败:`, error);
+        resolve(null);
+      }
+    });
+  }
+
+  /**
+   * 读取一条记录（包括尚未写入的修改）
+   * @param {string} storeName - 存储名称
+   * @param {string} path - 路径
+   * @returns {Promise<Object|null>} 记录
+   */
+  async get(storeName, path) {
+    const pending = this.pending.get(storeName);
+    if (pending && pending.has(path)) {
+      return pending.get(path);
+    }
+    return this.read(storeName, store => store.get(path));
+  }
+
+  /**
+   * 读取存储中的所有记录（包括尚未写入的修改）
+   * @param {string} storeName - 存储名称
+   * @returns {Promise<Object[]>} 记录列表
+   */
+  async getAll(storeName) {
+    const records = new Map();
+    for (const record of (await this.read(storeName, store => store.getAll())) || []) {
+      records.set(record.path, record);
+    }
+    for (const [path, record] of this.pending.get(storeName) || []) {
+      if (record) {
+        records.set(path, record);
+      } else {
+        records.delete(path);
+      }
+    }
+    return Array.from(records.values());
+  }
+
+  /**
+   * 写入一条记录（合并到稍后的后台事务中）
+   * @param {string} storeName - 存储名称
+   * @param {Object} record - 记录（path为键）
+   */
+  put(storeName, record) {
+    this.enqueue(storeName, record.path, record);
+  }
+
+  /**
+   * 删除一条记录（合并到稍后的后台事务中）
+   * @param {string} storeName - 存储名称
+   * @param {string} path - 路径
+   */
+  delete(storeName, path) {
+    this.enqueue(storeName, path, null);
+  }
+
+  enqueue(storeName, path, record) {
+    if (!this.pending.has(storeName)) {
+      this.pending.set(storeName, new Map());
+    }
+    // 同一路径的多次修改只写入最后一次
+    this.pending.get(storeName).set(path, record);
+    if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(), WRITE_DELAY_MS);
+    }
+  }
+
+  /**
+   * 在一个事务中写入所有等待的修改
+   * @returns {Promise<boolean>} 是否写入成功（IndexedDB不可用时为false）
+   */
+  async flush() {
+    clearTimeout(this.flushTimer);
+    this.flushTimer = null;
+    if (this.pending.size === 0) return true;
+
+    const batch = this.pending;
+    this.pending = new Map();
+    const db = await this.open();
+    if (!db) return false;
+
+    const success = await new Promise(resolve => {
+      let transaction;
+      try {
+        transaction = db.transaction(Array.from(batch.keys()), 'readwrite');
+        for (const [storeName, records] of batch) {
+          const store = transaction.objectStore(storeName);
+          for (const [path, record] of records) {
+            if (record) {
+              store.put(record);
+            } else {
+              store.delete(path);
+            }
+          }
+        }
+      } catch (error) {
+        console.warn(`[${this.pluginName}] 写入IndexedDB失败:`, error);
+        if (transaction) transaction.abort();
+        resolve(false);
+        return;
+      }
+      transaction.oncomplete = () => resolve(true);
+      transaction.onabort = () => {
+        console.warn(`[${this.pluginName}] 写入IndexedDB失败:`, transaction.error);
+        resolve(false);
+      };
+    });
+
+    for (const storeName of batch.keys()) {
+      if (CACHE_STORE_LIMITS[storeName]) {
+        this.prune(storeName, CACHE_STORE_LIMITS[storeName]);
+      }
+    }
+    return success;
+  }
+
+  /**
+   * 条目超出上限时淘汰最久未使用的缓存
+   * @param {string} storeName - 存储名称
+   * @param {number} limit - 条目上限
+   */
+  async prune(storeName, limit) {
+    const count = await this.read(storeName, store => store.count());
+    if (!count || count <= limit) return;
+
+    const db = await this.open();
+    let excess = count - limit;
+    const transaction = db.transaction(storeName, 'readwrite');
+    const request = transaction.objectStore(storeName).index('accessedAt').openCursor();
+    request.onsuccess = () => {
+      const cursor = request.result;
+      if (cursor && excess > 0) {
+        cursor.delete();
+        excess--;
+        cursor.continue();
+      }
+    };
+  }
+
+  // ====== 响应缓存 ======
+
+  /**
+   * 条件请求：有缓存时带上If-None-Match，服务器返回304时使用缓存的响应内容，
+   * 返回新内容且带ETag时更新缓存
+   * @param {string} storeName - listings 或 workflows
+   * @param {string} path - 缓存键（文件或目录路径）
+   * @param {string} url - 请求地址
+   * @param {Object|null} cached - 已读取的缓存记录（undefined时在这里读取）
+   * @returns {Promise<Object>} { buffer: 响应内容, modified: 是否与缓存不同 }
+   */
+  async fetchCached(storeName, path, url, cached = undefined) {
+    if (cached === undefined) {
+      cached = await this.get(storeName, path);
+    }
+
+    // 由这里管理缓存和条件请求，不使用浏览器的HTTP缓存
+    const headers = cached && cached.etag ? { 'If-None-Match': cached.etag } : {};
+    const response = await fetch(url, { headers, cache: 'no-store' });
+
+    if (response.status === 304 && cached) {
+      this.put(storeName, { ...cached, accessedAt: Date.now() });
+      // 调用方可能把内容转移给Worker，传出副本保留缓存中的内容
+      return { buffer: cached.body.slice(0), modified: false };
+    }
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const buffer = await response.arrayBuffer();
+    const etag = response.headers.get('ETag');
+    if (etag && buffer.byteLength <= MAX_CACHED_BYTES) {
+      this.put(storeName, { path, etag, body: buffer.slice(0), accessedAt: Date.now() });
+    } else if (cached) {
+      this.delete(storeName, path);
+    }
+    return { buffer, modified: true };
+  }
+
+  // ====== 按路径保存的用户数据 ======
+
+  /**
+   * 读取所有按路径保存的数据，第一次使用时把localStorage中整体保存的旧数据迁移为单独的记录
+   * @param {string} storeName - notes 或 icons
+   * @param {string} legacyKey - 旧数据的localStorage键
+   * @returns {Promise<Object|null>} { 路径: 数据 }，IndexedDB不可用时为null
+   */
+  async loadRecords(storeName, legacyKey) {
+    const db = await this.open();
+    if (!db) return null;
+
+    const values = {};
+    for (const record of await this.getAll(storeName)) {
+      values[record.path] = record.value;
+    }
+
+    let legacy = null;
+    try {
+      legacy = JSON.parse(localStorage.getItem(legacyKey) || 'null');
+    } catch (error) {
+      console.warn(`[${this.pluginName}] 读取旧数据失败: ${legacyKey}`, error);
+    }
+    if (legacy && typeof legacy === 'object') {
+      // localStorage中的数据比IndexedDB新（迁移前的数据或迁移完成前的修改）
+      for (const [path, value] of Object.entries(legacy)) {
+        values[path] = value;
+        this.setRecord(storeName, path, value);
+      }
+      if (await this.flush()) {
+        localStorage.removeItem(legacyKey);
+        console.log(`[${this.pluginName}] 已迁移${Object.keys(legacy).length}条${storeName}数据到IndexedDB`);
+      }
+    }
+    return values;
+  }
+
+  /**
+   * 保存或删除一个路径的数据
+   * @param {string} storeName - notes 或 icons
+   * @param {string} path - 文件路径
+   * @param {*} value - 数据，null表示删除
+   */
+  setRecord(storeName, path, value) {
+    if (value == null) {
+      this.delete(storeName, path);
+    } else {
+      this.put(storeName, { path, value });
+    }
+  }
+
+  /**
+   * 存储中的记录数
+   * @param {string} storeName - 存储名称
+   * @returns {Promise<number>} 记录数
+   */
+  async count(storeName) {
+    return (await this.read(storeName, store => store.count())) || 0;
+  }
+}
+
+export { ClientStore };
@@ -10,20 +10,140 @@
  * 第五阶段模块化完成
  */
 
+// 能力握手：协议版本与服务器一致时才使用缓存的能力描述
+const HANDSHAKE_ENDPOINT = '/nz_handshake';
+const HANDSHAKE_PROTOCOL = 1;
+const CAPABILITIES_STORAGE_KEY = 'nz_capabilities';
+
 class CommunicationAPI {
   constructor(pluginName) {
     this.pluginName = pluginName;
     
-    // WebSocket连接状态缓存
-    this._wsConnectionCache = {
-      lastCheckTime: 0,
-      isAvailable: false,
-      checkInterval: 2000 // 2秒内不重复检查
-    };
+    // 服务器能力（上次会话缓存的结果立即可用，后台再向服务器确认）
+    this._capabilities = this._loadCachedCapabilities();
+    this._capabilitiesPromise = null;
+    this._serverTimeOffset = 0;
+    // 本次会话中WebSocket请求失败后不再使用WebSocket
+    this._webSocketFailed = false;
+    
+    this.getCapabilities().catch(error => {
+      console.warn(`[${this.pluginName}] 能力握手失败，使用HTTP:`, error);
+    });
     
     console.log(`[${this.pluginName}] 通信API模块已初始化`);
   }
 
+  // ====== 能力握手 ======
+
+  /**
+   * 读取上次会话缓存的服务器能力
+   * @returns {Object|null} 能力描述
+   */
+  _loadCachedCapabilities() {
+    try {
+      const cached = JSON.parse(localStorage.getItem(CAPABILITIES_STORAGE_KEY) || 'null');
+      return cached && cached.protocol === HANDSHAKE_PROTOCOL ? cached : null;
+    } catch (error) {
+      return null;
+    }
+  }
+
+  /**
+   * 获取服务器能力（每个会话只请求一次，缓存未变化时服务器返回304）
+   * @param {boolean} refresh - 重新向服务器确认
+   * @returns {Promise<Object>} 能力描述：transports、actions、batch、stream、features、limits
+   */
+  async getCapabilities(refresh = false) {
+    if (!this._capabilitiesPromise || refresh) {
+      this._capabilitiesPromise = this._fetchCapabilities().catch(error => {
+        this._capabilitiesPromise = null;
+        throw error;
+      });
+    }
+    return await this._capabilitiesPromise;
+  }
+
+  async _fetchCapabilities() {
+    const headers = {};
+    if (this._capabilities && this._capabilities.etag) {
+      headers['If-None-Match'] = `"${this._capabilities.etag}"`;
+    }
+    
+    const response = await fetch(`${window.location.origin}${HANDSHAKE_ENDPOINT}`, { headers, cache: 'no-store' });
+    if (response.status === 304 && this._capabilities) {
+      this._updateServerTime(Date.parse(response.headers.get('Date')) / 1000);
+      return this._capabilities;
+    }
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    
+    const capabilities = await response.json();
+    if (capabilities.protocol !== HANDSHAKE_PROTOCOL) {
+      throw new Error(`不支持的握手协议版本: ${capabilities.protocol}`);
+    }
+    this._updateServerTime(capabilities.server_time);
+    delete capabilities.server_time;
+    capabilities.etag = (response.headers.get('ETag') || '').replace(/"/g, '');
+    
+    this._capabilities = capabilities;
+    this._webSocketFailed = false;
+    try {
+      localStorage.setItem(CAPABILITIES_STORAGE_KEY, JSON.stringify(capabilities));
+    } catch (error) {
+      console.warn(`[${this.pluginName}] 保存能力缓存失败:`, error);
+    }
+    console.log(`[${this.pluginName}] 能力握手完成: WebSocket=${capabilities.transports.websocket}`);
+    return capabilities;
+  }
+
+  _updateServerTime(serverTime) {
+    if (Number.isFinite(serverTime)) {
+      this._serverTimeOffset = serverTime * 1000 - Date.now();
+    }
+  }
+
+  /**
+   * 按服务器时钟估算的当前时间（毫秒）
+   * @returns {number} 时间戳
+   */
+  getServerTime() {
+    return Date.now() + this._serverTimeOffset;
+  }
+
+  /**
+   * 服务器是否支持某个操作
+   * @param {string} action - 操作名称
+   * @param {string} endpoint - file_operations / local_files / websocket
+   * @returns {boolean} 能力未知时按支持处理
+   */
+  supportsAction(action, endpoint = 'file_operations') {
+    const capabilities = this._capabilities;
+    if (!capabilities) {
+      return endpoint !== 'websocket';
+    }
+    return (capabilities.actions[endpoint] || []).includes(action);
+  }
+
+  /**
+   * 某个操作能否通过WebSocket发送：服务器公布支持且连接已打开；能力未知时使用HTTP
+   * @param {string} action - 操作名称
+   * @returns {boolean}
+   */
+  canUseWebSocket(action) {
+    const capabilities = this._capabilities;
+    if (!capabilities || !capabilities.transports.websocket || this._webSocketFailed) {
+      return false;
+    }
+    return this.supportsAction(action, 'websocket') && this.getAvailableWebSocket() !== null;
+  }
+
+  _logWebSocketFallback(operation, error) {
+    if (!error.transportUnavailable) {
+      console.error(`[${this.pluginName}] WebSocket${operation}失败，改用HTTP:`, error);
+    }
+  }
+
   // ====== 错误处理 ======
   
   /**
@@ -62,55 +182,15 @@ class CommunicationAPI {
    */
   async sendWebSocketMessage(message, timeout = 5000) {
     return new Promise((resolve, reject) => {
-      // 快速缓存检查：如果最近检查过且不可用，直接跳到HTTP
-      const now = Date.now();
-      if (now - this._wsConnectionCache.lastCheckTime < this._wsConnectionCache.checkInterval && 
-          !this._wsConnectionCache.isAvailable) {
-        reject(new Error('WebSocket最近检查不可用，使用缓存结果'));
-        return;
-      }
-      
-      // 改进的WebSocket可用性检查 - 检查多种可能的socket位置
-      let socket = null;
-      
-      // 尝试多种方式获取WebSocket连接
-      if (app && app.socket) {
-        socket = app.socket;
-      } else if (app && app.api && app.api.socket) {
-        socket = app.api.socket;
-      } else if (window.api && window.api.socket) {
-        socket = window.api.socket;
-      } else if (typeof api !== 'undefined' && api.socket) {
-        socket = api.socket;
-      }
-      
-      if (!socket || socket.readyState !== WebSocket.OPEN) {
-        const status = socket ? `readyState=${socket.readyState}` : 'socket不存在';
-        console.log(`[${this.pluginName}] WebSocket连接检查失败: ${status}, 立即使用HTTP备用方案`);
-        
-        // 更新缓存状态
-        this._wsConnectionCache.lastCheckTime = now;
-        this._wsConnectionCache.isAvailable = false;
-        
-        reject(new Error(`WebSocket不可用 (${status})`));
-        return;
-      }
-      
-      // 额外检查：如果socket在发送过程中断开连接，立即失败
-      if (socket.readyState === WebSocket.CLOSING || socket.readyState === WebSocket.CLOSED) {
-        console.log(`[${this.pluginName}] WebSocket连接正在关闭或已关闭，立即使用HTTP备用方案`);
-        
-        // 更新缓存状态
-        this._wsConnectionCache.lastCheckTime = now;
-        this._wsConnectionCache.isAvailable = false;
-        
-        reject(new Error('WebSocket连接已断开'));
+      // 服务器没有公布该操作的WebSocket支持时直接使用HTTP，不做试探请求
+      if (!this.canUseWebSocket(message.action)) {
+        const error = new Error('WebSocket不支持该操作，使用HTTP');
+        error.transportUnavailable = true;
+        reject(error);
         return;
       }
       
-      // WebSocket连接可用，更新缓存
-      this._wsConnectionCache.lastCheckTime = now;
-      this._wsConnectionCache.isAvailable = true;
+      const socket = this.getAvailableWebSocket();
       
       let resultReceived = false;
       const originalHandler = socket.onmessage;
@@ -120,9 +200,8 @@ class CommunicationAPI {
           resultReceived = true;
           socket.onmessage = originalHandler;
           
-          // 超时时更新缓存状态，标记为不可用
-          this._wsConnectionCache.lastCheckTime = Date.now();
-          this._wsConnectionCache.isAvailable = false;
+          // 超时后本次会话改用HTTP
+          this._webSocketFailed = true;
           
           reject(new Error('WebSocket请求超时'));
         }
@@ -192,7 +271,7 @@ class CommunicationAPI {
     try {
       return await this.sendWebSocketMessage(message);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket创建目录失败，尝试HTTP方式:`, error);
+      this._logWebSocketFallback('创建目录', error);
       return await this.createDirectoryHTTP(parentPath, directoryName);
     }
   }
@@ -232,7 +311,7 @@ class CommunicationAPI {
     try {
       return await this.sendWebSocketMessage(message);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket删除目录失败，尝试HTTP方式:`, error);
+      this._logWebSocketFallback('删除目录', error);
       return await this.deleteDirectoryHTTP(directoryPath);
     }
   }
@@ -273,7 +352,7 @@ class CommunicationAPI {
     try {
       return await this.sendWebSocketMessage(message);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket删除文件失败，尝试HTTP方式:`, error);
+      this._logWebSocketFallback('删除文件', error);
       return await this.deleteFileHTTP(filePath);
     }
   }
@@ -314,7 +393,7 @@ class CommunicationAPI {
     try {
       return await this.sendWebSocketMessage(message);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket重命名失败，尝试HTTP方式:`, error);
+      this._logWebSocketFallback('重命名', error);
       return await this.renameHTTP(oldPath, newName);
     }
   }
@@ -418,7 +497,7 @@ class CommunicationAPI {
       // 文件移动操作使用较短的超时时间，快速转到HTTP备用方案
       return await this.sendWebSocketMessage(message, 1500);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket移动文件失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('移动文件', error);
       // 传递用户选择给HTTP备用方案
       try {
         return await this.moveFileHTTP(sourcePath, targetPath, resolvedChoice);
@@ -599,7 +678,7 @@ class CommunicationAPI {
       
       return await this.sendWebSocketMessage(message, 8000);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket复制文件失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('复制文件', error);
       try {
         return await this.copyFileHTTP(sourcePath, targetPath, finalNewName, resolvedChoice);
       } catch (httpError) {
@@ -631,7 +710,7 @@ class CommunicationAPI {
       console.log(`[${this.pluginName}] 直接复制文件（跳过冲突检测）: ${sourcePath} -> ${targetPath}\\${finalNewName}`);
       return await this.sendWebSocketMessage(message, 8000);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket直接复制文件失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('直接复制文件', error);
       try {
         // 直接使用HTTP复制，跳过冲突检查
         let url = `${window.location.origin}/file_operations?action=copy_file&source_path=${encodeURIComponent(sourcePath)}&target_path=${encodeURIComponent(targetPath)}`;
@@ -737,7 +816,7 @@ class CommunicationAPI {
       
       return await this.sendWebSocketMessage(message, 5000);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket复制目录失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('复制目录', error);
       try {
         return await this.copyDirectoryHTTP(sourcePath, targetPath, finalNewName, resolvedChoice);
       } catch (httpError) {
@@ -1129,7 +1208,7 @@ class CommunicationAPI {
       
       return await this.sendWebSocketMessage(message, 5000);
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket移动目录失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('移动目录', error);
       try {
         return await this.moveDirectoryHTTP(validatedSourcePath, targetPath, finalNewName, resolvedChoice); // 使用验证后的路径
       } catch (httpError) {
@@ -1430,8 +1509,205 @@ class CommunicationAPI {
     }
   }
 
+  // ====== 依赖分析 ======
+
+  /**
+   * 分析目录（或单个文件）中工作流缺少的模型和节点
+   * @param {string} path - 目录或文件路径
+   * @returns {Promise} 分析报告，files[文件名] 包含 missing_models / missing_nodes
+   */
+  async analyzeDependencies(path) {
+    return await this.httpGet('/file_operations', { action: 'analyze_dependencies', path });
+  }
+
+  /**
+   * 查找目录下的重复工作流（递归）
+   * @param {string} path - 目录路径
+   * @param {string} mode - 'exact' 逐字节相同，'semantic' 忽略节点位置和ID
+   * @returns {Promise} 重复分组报告
+   */
+  async findDuplicates(path, mode = 'exact') {
+    return await this.httpGet('/file_operations', { action: 'find_duplicates', path, mode });
+  }
+
+  /**
+   * 获取最近一次的重复查找报告
+   * @returns {Promise} 重复分组报告
+   */
+  async getDuplicateReport() {
+    return await this.httpGet('/file_operations', { action: 'duplicate_report' });
+  }
+
+  /**
+   * 获取目录的递归磁盘占用（treemap层级结构）
+   * @param {string} path - 目录路径
+   * @param {number} depth - 展开的层数（可选，默认使用服务端配置）
+   * @returns {Promise} 占用层级 { tree: { name, path, size, files, children } }
+   */
+  async getDiskUsage(path, depth = null) {
+    const params = { action: 'disk_usage', path };
+    if (depth !== null) {
+      params.depth = depth;
+    }
+    return await this.httpGet('/file_operations', params);
+  }
+  /**
+   * 获取服务端记录的工作流访问排行
+   * @param {string} sort - 'recent' 最近打开，'frequent' 最常打开
+   * @param {string} scope - 'all' 所有用户，'user' 当前用户
+   * @param {number} limit - 返回数量
+   * @returns {Promise} { items: [{ path, count, last_access, cached }], cache }
+   */
+  async getWorkflowAccessStats(sort = 'recent', scope = 'all', limit = 20) {
+    return await this.httpGet('/file_operations', { action: 'workflow_access_stats', sort, scope, limit });
+  }
+
+  /**
+   * 获取读取请求合并统计（同时到达的相同目录列表/工作流加载请求共用一次磁盘读取）
+   * @returns {Promise} { stats: { requests, executions, coalesced, coalesced_ratio, kinds } }
+   */
+  async getReadCoalescingStats() {
+    return await this.httpGet('/file_operations', { action: 'read_coalescing_stats' });
+  }
+
+  // ====== 备注索引 ======
+
+  /**
+   * 把备注同步到服务端的标签索引（只更新有变化的条目）
+   * @param {Object} notes - { 路径: 备注 }，备注为null表示删除
+   * @returns {Promise} { changed }
+   */
+  async syncNotes(notes) {
+    return await this.httpPost('/file_operations', { action: 'sync_notes', notes });
+  }
+
+  /**
+   * 在服务端的标签索引中查询备注
+   * @param {Object} filters - { tags_all, tags_any, tags_none, category, priority_min, priority_max, path, name, sort, offset, limit }
+   * @returns {Promise} { total, offset, limit, items: [{ path, name, note }], tags: [{ tag, count }] }
+   */
+  async queryNotes(filters = {}) {
+    return await this.httpPost('/file_operations', { action: 'query_notes', ...filters });
+  }
+  // ====== 压缩包导入导出 ======
+
+  /**
+   * 获取目录导出为zip的下载地址（服务端流式打包）
+   * @param {string} path - 目录路径
+   * @returns {string} 下载地址
+   */
+  getZipExportUrl(path) {
+    const url = new URL(`${window.location.origin}/file_operations`);
+    url.searchParams.append('action', 'export_zip');
+    url.searchParams.append('path', path);
+    return url.toString();
+  }
+
+  /**
+   * 把zip导入为目标目录下的子目录
+   * @param {File|Blob} file - zip文件
+   * @param {string} targetPath - 目标父目录
+   * @param {Object} options - { newName: 目录名（默认使用zip文件名）, conflict: 'replace' | 'merge' | 'skip' | 'error' }
+   * @returns {Promise} 导入结果 { target, files, skipped, bytes }
+   */
+  async importZip(file, targetPath, { newName = '', conflict = 'replace' } = {}) {
+    // 普通字段放在文件之前，服务端读取到文件时已知道目标位置
+    const form = new FormData();
+    form.append('target_path', targetPath);
+    form.append('conflict', conflict);
+    if (newName) {
+      form.append('new_name', newName);
+    }
+    form.append('file', file, file.name || 'import.zip');
+
+    const response = await fetch(`${window.location.origin}/file_operations?action=import_zip`, {
+      method: 'POST',
+      body: form
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    return await response.json();
+  }
+
+
+
+  // ====== 回收站 ======
+
+  /**
+   * 列出回收站内容
+   * @returns {Promise} 回收站项目列表
+   */
+  async listTrash() {
+    return await this.httpGet('/file_operations', { action: 'list_trash' });
+  }
+
+  /**
+   * 从回收站还原项目
+   * @param {string} trashId - 回收站项目ID（删除操作返回的trash_id）
+   * @param {string} targetPath - 还原位置（可选，默认原位置）
+   * @returns {Promise} 操作结果
+   */
+  async restoreTrash(trashId, targetPath = null) {
+    const params = { action: 'restore_trash', trash_id: trashId };
+    if (targetPath) {
+      params.target_path = targetPath;
+    }
+    return await this.httpGet('/file_operations', params);
+  }
+
+  /**
+   * 永久删除回收站项目
+   * @param {Array<string>|null} trashIds - 要删除的项目ID，不传则清空整个回收站
+   * @returns {Promise} 操作结果
+   */
+  async emptyTrash(trashIds = null) {
+    const params = { action: 'empty_trash' };
+    if (trashIds && trashIds.length > 0) {
+      params.trash_ids = trashIds.join(',');
+    }
+    return await this.httpGet('/file_operations', params);
+  }
+
+  // ====== 操作历史 ======
+
+  /**
+   * 获取可撤销/重做的文件操作（最近的在前）
+   * @param {number} limit - 每个列表最多返回的条目数
+   * @returns {Promise} { undo: [...], redo: [...] }
+   */
+  async getOperationHistory(limit = 20) {
+    return await this.httpGet('/file_operations', { action: 'operation_history', limit });
+  }
+
+  /**
+   * 撤销最近一次文件操作
+   * @param {string} operationId - 期望撤销的操作ID（可选，历史已变化时服务器拒绝执行）
+   * @returns {Promise} 操作结果
+   */
+  async undoOperation(operationId = null) {
+    const params = { action: 'undo_operation' };
+    if (operationId) {
+      params.operation_id = operationId;
+    }
+    return await this.httpGet('/file_operations', params);
+  }
+
+  /**
+   * 重做最近一次撤销的文件操作
+   * @param {string} operationId - 期望重做的操作ID（可选）
+   * @returns {Promise} 操作结果
+   */
+  async redoOperation(operationId = null) {
+    const params = { action: 'redo_operation' };
+    if (operationId) {
+      params.operation_id = operationId;
+    }
+    return await this.httpGet('/file_operations', params);
+  }
+
   // ====== 连接状态管理 ======
-  
+
   /**
    * 检查ComfyUI连接状态
    * @returns {Promise<Object>} 连接状态信息
@@ -1444,21 +1720,17 @@ class CommunicationAPI {
     };
     
     try {
-      // 检查WebSocket连接
-      const socket = this.getAvailableWebSocket();
-      status.websocket = socket !== null;
-      
-      // 检查HTTP连接
+      // 检查HTTP连接（重新进行能力握手，能力未变化时服务器只返回304）
       try {
-        const response = await fetch(`${window.location.origin}/system_stats`, { 
-          method: 'GET',
-          timeout: 3000 
-        });
-        status.http = response.ok;
+        await this.getCapabilities(true);
+        status.http = true;
       } catch (httpError) {
         status.http = false;
       }
       
+      // 检查WebSocket连接（服务器支持且连接已打开）
+      status.websocket = this.canUseWebSocket('list_directory');
+      
       // 检查ComfyUI应用状态
       status.comfyui = typeof app !== 'undefined' && app !== null;
       
@@ -1507,7 +1779,7 @@ class CommunicationAPI {
       // 返回文件列表（只返回文件，不包括目录）
       return result.files || [];
     } catch (error) {
-      console.error(`[${this.pluginName}] WebSocket获取文件列表失败，尝试HTTP:`, error);
+      this._logWebSocketFallback('获取文件列表', error);
       return await this.listFilesHTTP(directoryPath);
     }
   }
@@ -0,0 +1,359 @@
+/**
+ * NZ工作流管理器 - 后台数据处理模块
+ *
+ * 功能：
+ * - JSON响应解析：响应内容以ArrayBuffer转移给Worker（不复制），解码和解析都不占用界面线程
+ * - 目录列表的排序、筛选、搜索和备注装饰，主线程只接收可以直接渲染的项目列表
+ * - Worker不可用（浏览器不支持、CSP禁止blob:）时在主线程执行同一套处理逻辑
+ */
+
+// 小于该字节数的内容直接在主线程解析（Worker往返的开销比解析本身大）
+const WORKER_MIN_BYTES = 64 * 1024;
+
+/**
+ * 创建处理器（Worker和主线程共用的处理逻辑）
+ * 注意：该函数会被转换为源码在Worker中执行，函数体内不能引用函数外的任何变量
+ * @returns {Object} { handle(message) }
+ */
+function createDataProcessor() {
+  // 最多缓存的目录列表数
+  const MAX_LISTINGS = 8;
+  const PRIORITY_RANK = { high: 0, normal: 1, low: 2 };
+  const decoder = new TextDecoder('utf-8');
+  const collator = new Intl.Collator(undefined, { numeric: true, sensitivity: 'base' });
+  // token -> 列表，Map的顺序即最近使用顺序
+  const listings = new Map();
+  let nextToken = 1;
+
+  function fail(message, code) {
+    const error = new Error(message);
+    error.code = code;
+    return error;
+  }
+
+  // 没有mtime字段时（旧版本服务端）从 mm/dd/yy 格式的日期推算
+  function parseDate(date) {
+    const match = /^(\d{2})\/(\d{2})\/(\d{2})$/.exec(date || '');
+    return match ? Date.UTC(2000 + Number(match[3]), Number(match[1]) - 1, Number(match[2])) / 1000 : 0;
+  }
+
+  function storeListing(data) {
+    const base = data.path || '';
+    const entries = [];
+    const addEntry = (info, type) => {
+      const name = typeof info === 'string' ? info : info.name;
+      const path = base ? `${base}\\${name}` : name;
+      entries.push({
+        type,
+        name,
+        path,
+        info,
+        key: `${type}:${path}`,
+        lowerName: name.toLowerCase(),
+        mtime: typeof info === 'object' ? (info.mtime || parseDate(info.date)) : 0,
+        size: typeof info === 'object' ? (info.size || 0) : 0
+      });
+    };
+    (data.directories || []).forEach(info => addEntry(info, 'directory'));
+    (data.files || []).forEach(info => addEntry(info, 'file'));
+
+    const token = nextToken++;
+    listings.set(token, { entries, notesKey: null, decorated: null });
+    while (listings.size > MAX_LISTINGS) {
+      listings.delete(listings.keys().next().value);
+    }
+    return token;
+  }
+
+  // 按备注装饰项目：生成渲染用的记录、比较用的签名和搜索文本（备注不变时复用上次结果）
+  function decorate(listing, notes) {
+    const notesKey = JSON.stringify(notes || {});
+    if (listing.notesKey === notesKey) {
+      return listing.decorated;
+    }
+    listing.decorated = listing.entries.map(entry => {
+      const note = entry.type === 'file' && notes ? notes[entry.path] || null : null;
+      const decoration = note ? {
+        description: note.description || '',
+        priority: note.priority || '',
+        tags: Array.isArray(note.tags) ? note.tags : []
+      } : null;
+      const signature = entry.type === 'file'
+        ? JSON.stringify([entry.info, decoration ? [note.description, note.priority, note.tags] : null])
+        : JSON.stringify(entry.info);
+      const searchText = decoration
+        ? [entry.lowerName, decoration.description.toLowerCase(), decoration.tags.join(' ').toLowerCase()].join('\n')
+        : entry.lowerName;
+      return {
+        entry,
+        searchText,
+        rank: decoration && decoration.priority in PRIORITY_RANK ? PRIORITY_RANK[decoration.priority] : PRIORITY_RANK.normal,
+        record: { key: entry.key, type: entry.type, info: entry.info, signature, note: decoration }
+      };
+    });
+    listing.notesKey = notesKey;
+    return listing.decorated;
+  }
+
+  // 筛选和排序；name排序保持服务端的顺序（已按名称排序），文件夹始终在前
+  function view(listing, notes, options) {
+    const decorated = decorate(listing, notes);
+    const terms = (options.query || '').toLowerCase().split(/\s+/).filter(Boolean);
+    let matched = terms.length
+      ? decorated.filter(item => terms.every(term => item.searchText.includes(term)))
+      : decorated.slice();
+
+    const direction = options.order === 'desc' ? -1 : 1;
+    const byName = (a, b) => collator.compare(a.entry.name, b.entry.name);
+    const comparators = {
+      modified: (a, b) => (a.entry.mtime - b.entry.mtime) || byName(a, b),
+      size: (a, b) => (a.entry.size - b.entry.size) || byName(a, b),
+      priority: (a, b) => (a.rank - b.rank) || byName(a, b)
+    };
+    const compare = comparators[options.sort];
+    if (compare || direction < 0) {
+      const directories = matched.filter(item => item.entry.type === 'directory');
+      const files = matched.filter(item => item.entry.type === 'file');
+      const order = list => compare ? list.sort((a, b) => direction * compare(a, b)) : list.reverse();
+      matched = order(directories).concat(order(files));
+    }
+
+    return {
+      total: decorated.length,
+      matched: matched.length,
+      items: matched.map(item => item.record)
+    };
+  }
+
+  function handle(message) {
+    switch (message.op) {
+      case 'parse': {
+        const text = message.buffer ? decoder.decode(message.buffer) : message.text;
+        const result = JSON.parse(text);
+        // 工作流响应的data字段是工作流文本，解析为对象后只返回对象（文本不再复制回主线程）
+        if (message.nested && result && typeof result.data === 'string') {
+          result.workflow = JSON.parse(result.data);
+          delete result.data;
+        }
+        const token = message.listing && result && result.type === 'directory_listing' ? storeListing(result) : 0;
+        return { result, token };
+      }
+      case 'view': {
+        let token = message.token;
+        if (message.data) {
+          token = storeListing(message.data);
+        }
+        const listing = listings.get(token);
+        if (!listing) {
+          throw fail('目录列表已不在缓存中', 'LISTING_MISSING');
+        }
+        listings.delete(token);
+        listings.set(token, listing);
+        return { token, ...view(listing, message.notes, message.options || {}) };
+      }
+      default:
+        throw fail(`未知的处理操作: ${message.op}`, 'UNKNOWN_OP');
+    }
+  }
+
+  return { handle };
+}
+
+/**
+ * Worker入口：转发消息给处理器并返回结果
+ * 注意：该函数会被转换为源码在Worker中执行
+ * @param {Object} processor - createDataProcessor() 创建的处理器
+ */
+function workerMain(processor) {
+  self.onmessage = (event) => {
+    const { id, message } = event.data;
+    try {
+      self.postMessage({ id, result: processor.handle(message) });
+    } catch (error) {
+      self.postMessage({ id, error: error.message, code: error.code });
+    }
+  };
+}
+
+class DataProcessor {
+  constructor(pluginName) {
+    this.pluginName = pluginName;
+    this.local = createDataProcessor();
+    this.worker = null;
+    this.workerUrl = null;
+    this.workerDisabled = typeof Worker === 'undefined' || typeof Blob === 'undefined' || !URL.createObjectURL;
+    this.pending = new Map();
+    this.nextRequestId = 1;
+    // 目录数据对象 -> { token, backend }，同一份列表再次查询时不需要重新发送
+    this.listingTokens = new WeakMap();
+
+    console.log(`[${this.pluginName}] 后台数据处理模块已初始化`);
+  }
+
+  /**
+   * 获取Worker（首次使用时创建，创建失败后一直使用主线程处理）
+   * @returns {Worker|null} Worker或null
+   */
+  getWorker() {
+    if (this.worker || this.workerDisabled) {
+      return this.worker;
+    }
+
+    try {
+      // 处理逻辑以源码形式创建Worker，开发模式和打包后都不需要单独的Worker文件
+      const source = `(${workerMain.toString()})((${createDataProcessor.toString()})());`;
+      this.workerUrl = URL.createObjectURL(new Blob([source], { type: 'text/javascript' }));
+      this.worker = new Worker(this.workerUrl);
+      this.worker.onmessage = (event) => this.handleWorkerMessage(event.data);
+      this.worker.onerror = (event) => {
+        event.preventDefault();
+        this.disableWorker(event.message || 'Worker执行出错');
+      };
+      console.log(`[${this.pluginName}] 后台处理Worker已创建`);
+    } catch (error) {
+      this.disableWorker(error.message);
+    }
+    return this.worker;
+  }
+
+  /**
+   * 停用Worker，之后的处理都在主线程执行；等待中的请求以错误结束（其数据已转移给Worker）
+   * @param {string} reason - 原因
+   */
+  disableWorker(reason) {
+    console.warn(`[${this.pluginName}] 后台处理Worker不可用，改为在主线程处理: ${reason}`);
+    this.workerDisabled = true;
+    if (this.worker) {
+      this.worker.terminate();
+      this.worker = null;
+    }
+    if (this.workerUrl) {
+      URL.revokeObjectURL(this.workerUrl);
+      this.workerUrl = null;
+    }
+    this.pending.forEach(request => request.reject(new Error(`后台处理失败: ${reason}`)));
+    this.pending.clear();
+  }
+
+  handleWorkerMessage(response) {
+    const request = this.pending.get(response.id);
+    if (!request) return;
+    this.pending.delete(response.id);
+    if (response.error !== undefined) {
+      const error = new Error(response.error);
+      error.code = response.code;
+      request.reject(error);
+    } else {
+      request.resolve(response.result);
+    }
+  }
+
+  /**
+   * 执行处理操作
+   * @param {Object} message - 操作消息
+   * @param {Array} transfer - 转移给Worker的对象
+   * @param {boolean} preferLocal - 是否直接在主线程处理
+   * @returns {Promise} { backend, result }
+   */
+  run(message, transfer = [], preferLocal = false) {
+    const worker = preferLocal ? null : this.getWorker();
+    if (!worker) {
+      return new Promise(resolve => resolve({ backend: this.local, result: this.local.handle(message) }));
+    }
+    return new Promise((resolve, reject) => {
+      const id = this.nextRequestId++;
+      this.pending.set(id, {
+        resolve: result => resolve({ backend: worker, result }),
+        reject
+      });
+      worker.postMessage({ id, message }, transfer);
+    });
+  }
+
+  /**
+   * 解析JSON内容（ArrayBuffer会转移给Worker，调用后不能再使用）
+   * @param {ArrayBuffer} buffer - UTF-8编码的JSON
+   * @param {Object} options - { nested: 把data字段中的工作流文本解析为workflow对象（不返回文本）, listing: 缓存目录列表供后续查询 }
+   * @returns {Promise<Object>} 解析结果
+   */
+  async parseBuffer(buffer, options = {}) {
+    const message = { op: 'parse', buffer, nested: !!options.nested, listing: !!options.listing };
+    const { backend, result } = await this.run(message, [buffer], buffer.byteLength < WORKER_MIN_BYTES);
+    if (result.token) {
+      this.listingTokens.set(result.result, { token: result.token, backend });
+    }
+    return result.result;
+  }
+
+  /**
+   * 解析JSON文本
+   * @param {string} text - JSON文本
+   * @param {Object} options - 同parseBuffer
+   * @returns {Promise<Object>} 解析结果
+   */
+  async parseText(text, options = {}) {
+    const message = { op: 'parse', text, nested: !!options.nested, listing: !!options.listing };
+    const { backend, result } = await this.run(message, [], text.length < WORKER_MIN_BYTES);
+    if (result.token) {
+      this.listingTokens.set(result.result, { token: result.token, backend });
+    }
+    return result.result;
+  }
+
+  /**
+   * 读取HTTP响应并解析
+   * @param {Response} response - fetch响应
+   * @param {Object} options - 同parseBuffer
+   * @returns {Promise<Object>} 解析结果
+   */
+  async parseResponse(response, options = {}) {
+    return this.parseBuffer(await response.arrayBuffer(), options);
+  }
+
+  /**
+   * 生成目录列表的显示视图（在Worker中筛选、排序和装饰）
+   * @param {Object} data - 目录数据
+   * @param {Object} notes - 该目录中文件的备注 { 路径: 备注 }
+   * @param {Object} options - { query, sort: name|modified|size|priority, order: asc|desc }
+   * @returns {Promise<Object>} { total, matched, items: [{ key, type, info, signature, note }] }
+   */
+  async viewListing(data, notes, options = {}) {
+    const cached = this.listingTokens.get(data);
+    const worker = this.getWorker();
+    if (cached && cached.backend === (worker || this.local)) {
+      try {
+        const { result } = await this.run({ op: 'view', token: cached.token, notes, options }, [], !worker);
+        return result;
+      } catch (error) {
+        if (error.code !== 'LISTING_MISSING') throw error;
+      }
+    }
+    const { backend, result } = await this.run({ op: 'view', data, notes, options }, [], !worker);
+    this.listingTokens.set(data, { token: result.token, backend });
+    return result;
+  }
+
+  /**
+   * 在主线程同步生成目录列表的显示视图（项目较少时使用，避免异步渲染）
+   * @param {Object} data - 目录数据
+   * @param {Object} notes - 该目录中文件的备注
+   * @param {Object} options - 同viewListing
+   * @returns {Object} 同viewListing
+   */
+  viewListingSync(data, notes, options = {}) {
+    const cached = this.listingTokens.get(data);
+    if (cached && cached.backend === this.local) {
+      try {
+        return this.local.handle({ op: 'view', token: cached.token, notes, options });
+      } catch (error) {
+        if (error.code !== 'LISTING_MISSING') throw error;
+      }
+    }
+    const result = this.local.handle({ op: 'view', data, notes, options });
+    this.listingTokens.set(data, { token: result.token, backend: this.local });
+    return result;
+  }
+}
+
+// 导出模块
+export { DataProcessor, createDataProcessor };
@@ -0,0 +1,192 @@
+/**
+ * NZ工作流管理器 - 增量保存模块
+ *
+ * 功能：
+ * - 记录每个文件最近一次保存的内容和版本哈希
+ * - 再次保存时只上传 RFC 6902 JSON Patch
+ * - 服务器版本不一致或校验失败时自动回退为完整上传
+ * - 完整上传带If-Match前置条件，文件被其他人修改过时不会直接覆盖
+ */
+
+/**
+ * 生成两个JSON值之间的 RFC 6902 补丁
+ * 数组长度变化时整体替换，保证补丁简单且正确
+ * @param {*} before - 旧值
+ * @param {*} after - 新值
+ * @param {string} path - 当前JSON Pointer
+ * @param {Array} ops - 输出的补丁操作
+ * @returns {Array} 补丁操作列表
+ */
+function createJsonPatch(before, after, path = '', ops = []) {
+  if (before === after) {
+    return ops;
+  }
+
+  const beforeIsObject = before !== null && typeof before === 'object';
+  const afterIsObject = after !== null && typeof after === 'object';
+
+  if (!beforeIsObject || !afterIsObject || Array.isArray(before) !== Array.isArray(after)) {
+    ops.push({ op: 'replace', path, value: after });
+    return ops;
+  }
+
+  if (Array.isArray(before)) {
+    if (before.length !== after.length) {
+      ops.push({ op: 'replace', path, value: after });
+      return ops;
+    }
+    for (let i = 0; i < before.length; i++) {
+      createJsonPatch(before[i], after[i], `${path}/${i}`, ops);
+    }
+    return ops;
+  }
+
+  for (const key of Object.keys(before)) {
+    const childPath = `${path}/${escapePointerToken(key)}`;
+    if (!(key in after) || after[key] === undefined) {
+      if (before[key] !== undefined) {
+        ops.push({ op: 'remove', path: childPath });
+      }
+    } else {
+      createJsonPatch(before[key], after[key], childPath, ops);
+    }
+  }
+  for (const key of Object.keys(after)) {
+    if (after[key] !== undefined && (!(key in before) || before[key] === undefined)) {
+      ops.push({ op: 'add', path: `${path}/${escapePointerToken(key)}`, value: after[key] });
+    }
+  }
+  return ops;
+}
+
+function escapePointerToken(token) {
+  return String(token).replace(/~/g, '~0').replace(/\//g, '~1');
+}
+
+/**
+ * 计算文本的SHA-256（十六进制），与服务器的版本哈希一致
+ * crypto.subtle只在安全上下文（https / localhost）中可用，不可用时返回null
+ */
+async function sha256Hex(text) {
+  if (!window.crypto || !window.crypto.subtle) {
+    return null;
+  }
+  const buffer = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+  return Array.from(new Uint8Array(buffer)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+class DeltaSaver {
+  constructor(pluginName) {
+    this.pluginName = pluginName;
+    // filePath -> { revision, document }
+    this._bases = new Map();
+  }
+
+  /**
+   * 保存工作流：有可用的基准版本时发送补丁，否则完整上传
+   * @param {string} filePath - 文件路径
+   * @param {Object} workflowData - 工作流对象
+   * @returns {Promise<Object>} 服务器返回结果
+   */
+  async save(filePath, workflowData) {
+    const jsonData = JSON.stringify(workflowData, null, 2);
+    const base = this._bases.get(filePath);
+
+    if (base) {
+      const result = await this._trySavePatch(filePath, base, workflowData, jsonData);
+      if (result) {
+        return result;
+      }
+    }
+
+    // 带上上次保存的版本作为前置条件，文件在此期间被其他人修改时服务器拒绝覆盖
+    const body = {
+      action: 'save_workflow',
+      file_path: filePath,
+      workflow_data: jsonData
+    };
+    if (base) {
+      body.if_match = base.revision;
+    }
+    const result = await this._post(body);
+    if (result.success) {
+      this._remember(filePath, result, jsonData);
+    } else if (result.precondition_failed) {
+      // 提示冲突后丢弃基准版本，用户再次保存时直接覆盖
+      console.warn(`[${this.pluginName}] 保存冲突: ${filePath} - ${result.error || ''}`);
+      this._bases.delete(filePath);
+    }
+    return result;
+  }
+
+  /**
+   * 尝试增量保存，需要回退为完整上传时返回null
+   */
+  async _trySavePatch(filePath, base, workflowData, jsonData) {
+    const revision = await sha256Hex(jsonData);
+    if (!revision) {
+      return null;
+    }
+
+    const patch = createJsonPatch(base.document, workflowData);
+    const patchBody = JSON.stringify(patch);
+    // 补丁接近完整内容大小时（例如大部分节点都变了）直接完整上传
+    if (patchBody.length > jsonData.length / 2) {
+      return null;
+    }
+
+    const result = await this._post({
+      action: 'save_workflow_patch',
+      file_path: filePath,
+      base_revision: base.revision,
+      revision,
+      patch
+    });
+
+    if (result.success) {
+      this._remember(filePath, result, jsonData);
+      console.log(`[${this.pluginName}] 增量保存成功: ${filePath} (${patch.length} 个补丁操作, ${patchBody.length} 字节)`);
+      return result;
+    }
+    if (result.need_full_upload) {
+      console.log(`[${this.pluginName}] 服务器要求完整上传: ${result.error || ''}`);
+      this._bases.delete(filePath);
+      return null;
+    }
+    return result;
+  }
+
+  /**
+   * 丢弃某个文件的基准版本（文件被移动、删除或在其他地方修改时调用）
+   * @param {string} filePath - 文件路径
+   */
+  forget(filePath) {
+    this._bases.delete(filePath);
+  }
+
+  _remember(filePath, result, jsonData) {
+    // 按压缩存储模式保存后服务器返回的路径可能不同（如 a.json -> a.json.gz），之后以返回的路径为准
+    this._bases.delete(filePath);
+    if (!result.revision) {
+      return;
+    }
+    // 基准文档必须与服务器解析的内容一致，所以从上传的文本重新解析
+    this._bases.set(result.file_path || filePath, { revision: result.revision, document: JSON.parse(jsonData) });
+  }
+
+  async _post(body) {
+    const response = await fetch('/file_operations', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body)
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP错误: ${response.status}`);
+    }
+    return await response.json();
+  }
+}
+
+export { DeltaSaver, createJsonPatch, sha256Hex };
@@ -296,6 +296,21 @@ class SidebarRegistration {
             </div>
           </div>
           
+          <div class="nz-search-bar" id="nz-search-bar">
+            <i class="pi pi-search"></i>
+            <input type="search" id="nz-search-input" class="nz-search-input" placeholder="搜索名称、备注或标签" autocomplete="off">
+            <span id="nz-search-count" class="nz-search-count" style="display: none;"></span>
+            <select id="nz-sort-select" class="nz-sort-select" title="排序方式">
+              <option value="name:asc">名称 ↑</option>
+              <option value="name:desc">名称 ↓</option>
+              <option value="modified:desc">修改时间 ↓</option>
+              <option value="modified:asc">修改时间 ↑</option>
+              <option value="size:desc">大小 ↓</option>
+              <option value="size:asc">大小 ↑</option>
+              <option value="priority:asc">优先级</option>
+            </select>
+          </div>
+          
           <div class="nz-content" id="nz-content">
             <div class="loading-overlay">加载中...</div>
             <div class="file-grid" id="nz-file-grid"></div>
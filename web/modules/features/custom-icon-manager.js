@@ -23,18 +23,38 @@ export class CustomIconManager {
   static STORAGE_KEY = 'nz_custom_icons';
   static MAX_STORAGE_SIZE = 4 * 1024 * 1024; // 4MB localStorage 限制
 
-  constructor(config, uiManager) {
+  constructor(config, uiManager, clientStore = null) {
     this.config = config;
     this.uiManager = uiManager;
     this.pluginName = config.PLUGIN_NAME;
+    // 客户端持久化存储：可用时每个图标单独保存，不再整体序列化写入localStorage
+    this.clientStore = clientStore;
+    this.recordStorage = false;
+    // 内存中的图标数据（显示文件列表时不需要反复解析存储内容）
+    this.icons = null;
     
     console.log(`[${this.pluginName}] 自定义图标管理器模块已初始化`);
   }
   
   /**
-   * 获取所有自定义图标数据
+   * 加载图标数据（首次使用IndexedDB时迁移localStorage中的图标）
    */
-  getAllCustomIcons() {
+  async load() {
+    const records = this.clientStore
+      ? await this.clientStore.loadRecords('icons', CustomIconManager.STORAGE_KEY)
+      : null;
+    if (records) {
+      this.icons = records;
+      this.recordStorage = true;
+    } else {
+      this.icons = this.readStoredIcons();
+    }
+  }
+  
+  /**
+   * 从localStorage读取图标数据
+   */
+  readStoredIcons() {
     try {
       const data = localStorage.getItem(CustomIconManager.STORAGE_KEY);
       return data ? JSON.parse(data) : {};
@@ -44,16 +64,47 @@ export class CustomIconManager {
     }
   }
   
+  getIcons() {
+    if (!this.icons) {
+      this.icons = this.readStoredIcons();
+    }
+    return this.icons;
+  }
+  
   /**
-   * 保存所有自定义图标数据
+   * 获取所有自定义图标数据
+   */
+  getAllCustomIcons() {
+    return { ...this.getIcons() };
+  }
+  
+  /**
+   * 保存所有自定义图标数据（IndexedDB可用时只写入有变化的图标）
    */
   saveAllCustomIcons(data) {
     try {
+      if (this.recordStorage) {
+        const icons = this.getIcons();
+        for (const filePath of Object.keys(icons)) {
+          if (!(filePath in data)) {
+            this.clientStore.setRecord('icons', filePath, null);
+          }
+        }
+        for (const [filePath, icon] of Object.entries(data)) {
+          if (icons[filePath] !== icon) {
+            this.clientStore.setRecord('icons', filePath, icon);
+          }
+        }
+        this.icons = { ...data };
+        return true;
+      }
+      
       const jsonData = JSON.stringify(data);
       if (jsonData.length > CustomIconManager.MAX_STORAGE_SIZE) {
         throw new Error('存储空间不足，请删除一些自定义图标');
       }
       localStorage.setItem(CustomIconManager.STORAGE_KEY, jsonData);
+      this.icons = { ...data };
       return true;
     } catch (error) {
       console.error(`[${this.pluginName}] 保存自定义图标数据失败:`, error);
@@ -83,8 +134,7 @@ export class CustomIconManager {
    * 获取自定义图标
    */
   getCustomIcon(filePath) {
-    const icons = this.getAllCustomIcons();
-    return icons[filePath] || null;
+    return this.getIcons()[filePath] || null;
   }
   
   /**
@@ -4,6 +4,8 @@
 
 "use strict";
 
+import { DeltaSaver } from '../core/delta-save.js';
+
 // ====== 工作流状态类 ======
 class WorkflowState {
   constructor(filePath, data, timestamp = Date.now()) {
@@ -21,6 +23,12 @@ class WorkflowState {
     return filePath.split(/[\\/]/).pop() || 'Unknown';
   }
   
+  // 保存后服务器返回的实际路径可能不同（如压缩存储模式下 a.json 保存为 a.json.gz）
+  setFilePath(filePath) {
+    this.filePath = filePath;
+    this.fileName = this.extractFileName(filePath);
+  }
+  
   getDisplayName() {
     return this.fileName.replace(/\.[^/.]+$/, ""); // 移除扩展名
   }
@@ -49,6 +57,9 @@ class FloatingWorkflowManager {
     this.uiManager = dependencies.uiManager;
     this.WorkflowNoteEditor = dependencies.WorkflowNoteEditor;
     
+    // 增量保存：同一文件再次保存时只上传变化部分
+    this.deltaSaver = new DeltaSaver(this.pluginName);
+    
     // 立即初始化，而不是延迟
     this.initializeImmediately();
   }
@@ -541,39 +552,26 @@ class FloatingWorkflowManager {
       }
       
       const workflowData = app.graph.serialize();
-      const jsonData = JSON.stringify(workflowData, null, 2);
-      
-      // ✅ 修复：使用正确的API参数名称
-      const response = await fetch('/file_operations', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          action: 'save_workflow',
-          file_path: this.currentWorkflow.filePath,  // ✅ 正确参数名
-          workflow_data: jsonData                    // ✅ 正确参数名
-        })
-      });
       
-      if (response.ok) {
-        const result = await response.json();
-        if (result.success) {
-          console.log(`[${this.pluginName}] 保存成功: ${this.currentWorkflow.filePath}`);
-          
-          // 显示成功通知
-          this.showNotification('工作流保存成功', 'success');
-          
-          // 清除修改标记
-          this.currentWorkflow.isModified = false;
-          this.currentWorkflow.lastSaved = Date.now();
-          this.updateModifiedIndicator();
-          
-        } else {
-          throw new Error(result.error || '保存失败');
+      // 增量保存（有上次保存的版本时只上传JSON Patch，否则完整上传）
+      const result = await this.deltaSaver.save(this.currentWorkflow.filePath, workflowData);
+      if (result.success) {
+        if (result.file_path && result.file_path !== this.currentWorkflow.filePath) {
+          console.log(`[${this.pluginName}] 文件已按存储模式保存为: ${result.file_path}`);
+          this.currentWorkflow.setFilePath(result.file_path);
         }
+        console.log(`[${this.pluginName}] 保存成功: ${this.currentWorkflow.filePath}`);
+        
+        // 显示成功通知
+        this.showNotification('工作流保存成功', 'success');
+        
+        // 清除修改标记
+        this.currentWorkflow.isModified = false;
+        this.currentWorkflow.lastSaved = Date.now();
+        this.updateModifiedIndicator();
+        
       } else {
-        throw new Error(`HTTP错误: ${response.status}`);
+        throw new Error(result.error || '保存失败');
       }
       
     } catch (error) {
@@ -640,10 +638,12 @@ class FloatingWorkflowManager {
       if (response.ok) {
         const result = await response.json();
         if (result.success) {
-          console.log(`[${this.pluginName}] 另存为成功: ${newPath}`);
+          // 压缩存储模式下实际保存的文件名可能是 .json.gz 等
+          const savedPath = result.file_path || newPath;
+          console.log(`[${this.pluginName}] 另存为成功: ${savedPath}`);
           
           // 显示成功通知
-          this.showNotification(`已另存为: ${newFileName}.json`, 'success');
+          this.showNotification(`已另存为: ${savedPath.split(/[\\/]/).pop()}`, 'success');
           
         } else {
           throw new Error(result.error || '另存为失败');
@@ -12,15 +12,19 @@
  * - 与浮动管理器的集成
  */
 export class WorkflowNotesManager {
-  constructor(config) {
+  constructor(config, clientStore = null) {
     this.config = config;
     this.pluginName = config.PLUGIN_NAME;
+    // 客户端持久化存储：可用时每条备注单独保存，修改时只写入变化的备注
+    this.clientStore = clientStore;
+    this.recordStorage = false;
     
     console.log(`[${this.pluginName}] 工作流备注系统模块已初始化`);
   }
   
   /**
-   * 从本地存储加载备注数据
+   * 从本地存储加载备注数据（localStorage中的数据立即可用，IndexedDB中的数据异步加载）
+   * @returns {Promise<boolean>} IndexedDB中的备注加载完成，备注有变化时为true
    */
   loadNotes() {
     try {
@@ -34,6 +38,82 @@ export class WorkflowNotesManager {
       console.error(`[${this.pluginName}] 加载工作流备注失败:`, error);
       this.config.setWorkflowNotes({});
     }
+    
+    if (!this.clientStore) {
+      // 等模块初始化完成（通信模块就绪）后再同步
+      return Promise.resolve().then(() => {
+        this._syncToServer(this.config.getWorkflowNotes());
+        return false;
+      });
+    }
+    // 首次使用时把localStorage中的备注迁移为单独的记录
+    return this.clientStore.loadRecords('notes', this.config.getNotesStorageKey())
+      .then(records => {
+        if (!records) {
+          this._syncToServer(this.config.getWorkflowNotes());
+          return false;
+        }
+        this.recordStorage = true;
+        const notes = this.config.getWorkflowNotes();
+        const paths = Object.keys(records);
+        const changed = paths.length !== Object.keys(notes).length || paths.some(filePath => !(filePath in notes));
+        this.config.setWorkflowNotes(records);
+        this._syncToServer(records);
+        if (changed) {
+          console.log(`[${this.pluginName}] 已加载${paths.length}条工作流备注`);
+        }
+        return changed;
+      })
+      .catch(error => {
+        console.error(`[${this.pluginName}] 加载工作流备注失败:`, error);
+        return false;
+      });
+  }
+
+  /**
+   * 保存一个文件的备注（IndexedDB可用时只写入这一条，否则整体保存到localStorage）
+   * @param {string} filePath - 文件路径
+   * @private
+   */
+  _persistNote(filePath) {
+    const note = this.config.getWorkflowNotes()[filePath] || null;
+    if (this.recordStorage) {
+      this.clientStore.setRecord('notes', filePath, note);
+    } else {
+      this.saveNotes();
+    }
+    this._syncToServer({ [filePath]: note });
+  }
+
+  /**
+   * 把备注同步到服务端的标签索引（用于按标签和优先级查询），失败时不影响本地保存
+   * 页面加载时同步全部备注（服务端只更新有变化的条目，不会删除其他浏览器同步的备注），之后只同步修改的条目
+   * @param {Object} notes - { 路径: 备注 }，备注为null表示删除
+   * @private
+   */
+  _syncToServer(notes) {
+    const api = window.nzWorkflowManager?.communicationAPI;
+    if (!api || Object.keys(notes).length === 0) return;
+    api.syncNotes(notes).catch(error => {
+      console.warn(`[${this.pluginName}] 同步备注到服务器失败:`, error);
+    });
+  }
+
+  /**
+   * 在服务端的标签索引中查询备注（标签AND/OR/NOT、优先级范围、目录、文件名，分页）
+   * @param {Object} filters - 见 CommunicationAPI.queryNotes
+   * @returns {Promise<Object>} { total, items: [{ path, name, note }], tags }
+   */
+  async queryNotes(filters = {}) {
+    const api = window.nzWorkflowManager?.communicationAPI;
+    if (!api) {
+      throw new Error('通信模块尚未初始化');
+    }
+    const result = await api.queryNotes(filters);
+    if (!result.success) {
+      throw new Error(result.error || '查询备注失败');
+    }
+    return result;
   }
 
   /**
@@ -83,7 +163,7 @@ export class WorkflowNotesManager {
       updateTime: now
     };
     this.config.setWorkflowNotes(notes);
-    this.saveNotes();
+    this._persistNote(filePath);
     
     // 更新浮动管理器显示
     this._updateFloatingManagerDisplay(filePath);
@@ -99,7 +179,7 @@ export class WorkflowNotesManager {
     if (notes[filePath]) {
       delete notes[filePath];
       this.config.setWorkflowNotes(notes);
-      this.saveNotes();
+      this._persistNote(filePath);
       
       // 更新浮动管理器显示
       this._updateFloatingManagerDisplay(filePath);
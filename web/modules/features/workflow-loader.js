@@ -10,8 +10,12 @@
  */
 
 class WorkflowLoader {
-  constructor(pluginName) {
+  constructor(pluginName, dataProcessor = null, clientStore = null) {
     this.pluginName = pluginName;
+    // 后台数据处理器（在Worker中解析响应和工作流文本）
+    this.dataProcessor = dataProcessor;
+    // 客户端持久化存储（缓存最近打开的工作流，未修改时服务器只返回304）
+    this.clientStore = clientStore;
     
     console.log(`[${this.pluginName}] 工作流加载器模块已初始化`);
   }
@@ -21,14 +25,15 @@ class WorkflowLoader {
   /**
    * 统一工作流文件加载器
    * @param {string} filePath - 文件路径
-   * @returns {Promise} 工作流数据
+   * @param {Object} options - { parsed: true时返回 { workflow }，工作流文本在后台解析，文本不返回主线程 }
+   * @returns {Promise} 工作流数据（默认为工作流文本）
    */
-  loadWorkflowFile(filePath) {
+  loadWorkflowFile(filePath, options = {}) {
     console.log(`[${this.pluginName}] 开始加载工作流文件: ${filePath}`);
     
-    return new Promise((resolve, reject) => {
+    const loading = new Promise((resolve, reject) => {
       // 方法1: 先尝试HTTP端点（最直接）
-      this.loadWorkflowUsingHTTP(filePath)
+      this.loadWorkflowUsingHTTP(filePath, options)
         .then(result => {
           console.log(`[${this.pluginName}] HTTP读取成功`);
           resolve(result);
@@ -58,14 +63,34 @@ class WorkflowLoader {
             });
         });
     });
+    
+    return options.parsed ? loading.then(result => this.parseWorkflowResult(result)) : loading;
+  }
+
+  /**
+   * 把读取结果整理为 { workflow }（HTTP读取时已在后台解析，其他方式读取的文本在这里解析）
+   * @param {string|Object} result - 工作流文本、{ workflow } 或工作流对象
+   * @returns {Promise<Object>} { workflow }
+   */
+  async parseWorkflowResult(result) {
+    if (typeof result === 'string') {
+      const workflow = this.dataProcessor ? await this.dataProcessor.parseText(result) : JSON.parse(result);
+      return { workflow };
+    }
+    if (result && result.parsed === true) {
+      return { workflow: result.workflow };
+    }
+    // 其他方式可能直接返回工作流对象
+    return { workflow: result };
   }
 
   /**
    * 使用HTTP端点读取工作流文件
    * @param {string} filePath - 文件路径
+   * @param {Object} options - 同loadWorkflowFile
    * @returns {Promise} 工作流数据
    */
-  loadWorkflowUsingHTTP(filePath) {
+  loadWorkflowUsingHTTP(filePath, options = {}) {
     return new Promise((resolve, reject) => {
       console.log(`[${this.pluginName}] 使用HTTP端点读取工作流文件: ${filePath}`);
       
@@ -79,23 +104,28 @@ class WorkflowLoader {
         const url = `${window.location.origin}/local_files?${params.toString()}`;
         console.log(`[${this.pluginName}] 请求URL:`, url);
         
-        fetch(url)
-          .then(response => {
-            if (response.ok) {
-              return response.json();
-            } else {
-              throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
+        this.fetchWorkflowBuffer(filePath, url)
+          .then(buffer => {
+            // 响应内容转移给Worker解码和解析，需要时同时解析其中的工作流文本
+            return this.dataProcessor
+              ? this.dataProcessor.parseBuffer(buffer, { nested: !!options.parsed })
+              : JSON.parse(new TextDecoder().decode(buffer));
           })
           .then(data => {
-            console.log(`[${this.pluginName}] HTTP响应数据:`, data);
+            console.log(`[${this.pluginName}] HTTP响应: ${data.type}`);
             
             if (data.error) {
+              if (this.clientStore) {
+                this.clientStore.delete('workflows', filePath);
+              }
               throw new Error(data.error);
             }
             
-            if (data.type === "workflow_loaded" && data.data) {
-              resolve(data.data);
+            if (data.type === "workflow_loaded" && data.workflow !== undefined) {
+              // 已在后台解析（只返回了解析后的对象）
+              resolve({ parsed: true, workflow: data.workflow });
+            } else if (data.type === "workflow_loaded" && data.data) {
+              resolve(options.parsed ? { parsed: true, workflow: JSON.parse(data.data) } : data.data);
             } else if (data.type === "directory_listing") {
               throw new Error('请求的是文件但返回了目录列表');
             } else {
@@ -112,6 +142,27 @@ class WorkflowLoader {
     });
   }
 
+  /**
+   * 读取工作流响应内容（有客户端存储时带If-None-Match，文件未修改时使用缓存的内容）
+   * @param {string} filePath - 文件路径
+   * @param {string} url - 请求地址
+   * @returns {Promise<ArrayBuffer>} 响应内容
+   */
+  async fetchWorkflowBuffer(filePath, url) {
+    if (this.clientStore) {
+      const { buffer, modified } = await this.clientStore.fetchCached('workflows', filePath, url);
+      if (!modified) {
+        console.log(`[${this.pluginName}] 工作流未修改，使用缓存: ${filePath}`);
+      }
+      return buffer;
+    }
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    return response.arrayBuffer();
+  }
+
   /**
    * 使用WebSocket加载工作流文件
    * @param {string} filePath - 文件路径
@@ -130,6 +181,13 @@ class WorkflowLoader {
           return;
         }
         
+        // 服务器没有在能力握手中公布该操作时不发送，避免等待超时
+        const api = window.nzWorkflowManager && window.nzWorkflowManager.communicationAPI;
+        if (api && !api.canUseWebSocket('load_workflow')) {
+          reject(new Error('服务器不支持通过WebSocket读取文件'));
+          return;
+        }
+        
         console.log(`[${this.pluginName}] 使用ComfyUI WebSocket发送文件读取消息`);
         
         // 创建WebSocket消息
@@ -234,20 +292,24 @@ class WorkflowLoader {
     try {
       // 使用ComfyUI的API加载工作流
       if (typeof app !== 'undefined') {
-        this.loadWorkflowFile(filePath)
-          .then(workflowData => {
-            console.log(`[${this.pluginName}] 工作流数据读取成功，开始验证格式`);
+        this.loadWorkflowFile(filePath, { parsed: true })
+          .then(({ workflow }) => {
+            console.log(`[${this.pluginName}] 工作流数据读取成功，开始加载到ComfyUI`);
+            
+            // 先直接加载原始工作流，失败时再验证和修复格式
+            if (this.tryDirectWorkflowLoad(workflow)) {
+              this.displaySuccess(`工作流已成功加载: ${filePath}`);
+              return;
+            }
             
-            // 验证和修复工作流格式
-            const fixedWorkflow = this.validateAndFixWorkflow(workflowData);
+            const fixedWorkflow = this.validateAndFixWorkflow(workflow);
             
             if (fixedWorkflow) {
-              console.log(`[${this.pluginName}] 工作流格式验证通过，开始加载到ComfyUI`);
+              console.log(`[${this.pluginName}] 工作流格式验证通过，尝试加载修复后的工作流`);
               
-              // 尝试直接加载工作流
               if (this.tryDirectWorkflowLoad(fixedWorkflow)) {
                 // 显示成功消息
-                this.displaySuccess(`工作流已成功加载: ${filePath}`);
+                this.displaySuccess(`工作流已成功加载（已修复格式）: ${filePath}`);
               } else {
                 this.displayError('工作流加载失败，格式可能不兼容');
               }
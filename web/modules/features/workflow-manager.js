@@ -12,9 +12,13 @@
  */
 
 class WorkflowManager {
-  constructor(pluginName, configManager) {
+  constructor(pluginName, configManager, dataProcessor = null, clientStore = null) {
     this.pluginName = pluginName;
     this.config = configManager;
+    // 后台数据处理器（在Worker中解析目录列表响应）
+    this.dataProcessor = dataProcessor;
+    // 客户端持久化存储（缓存目录列表，重新加载页面后先显示缓存再确认）
+    this.clientStore = clientStore;
     
     console.log(`[${this.pluginName}] 工作流管理器模块已初始化`);
   }
@@ -59,15 +63,7 @@ class WorkflowManager {
       this.showLoadingState();
       
       // 开始加载目录内容
-      this.loadDirectoryContent(path)
-        .then(data => {
-          console.log(`[${this.pluginName}] 目录加载成功: ${data.directories?.length || 0}个文件夹, ${data.files?.length || 0}个文件`);
-          this.displayDirectoryContent(data);
-        })
-        .catch(error => {
-          console.error(`[${this.pluginName}] 目录加载失败:`, error);
-          this.displayError('无法加载目录，请检查路径或ComfyUI服务状态');
-        });
+      this.showDirectoryContent(path);
         
     } catch (error) {
       console.error(`[${this.pluginName}] 目录加载失败:`, error);
@@ -110,15 +106,7 @@ class WorkflowManager {
       this.showLoadingState();
       
       // 开始加载目录内容
-      this.loadDirectoryContent(path)
-        .then(data => {
-          console.log(`[${this.pluginName}] 目录加载成功: ${data.directories?.length || 0}个文件夹, ${data.files?.length || 0}个文件`);
-          this.displayDirectoryContent(data);
-        })
-        .catch(error => {
-          console.error(`[${this.pluginName}] 目录加载失败:`, error);
-          this.displayError('无法加载目录，请检查路径或ComfyUI服务状态');
-        });
+      this.showDirectoryContent(path);
         
     } catch (error) {
       console.error(`[${this.pluginName}] 目录加载失败:`, error);
@@ -126,17 +114,67 @@ class WorkflowManager {
     }
   }
 
+  /**
+   * 显示目录内容：有本地缓存时先显示缓存的列表，再向服务器确认，内容有变化时更新显示
+   * @param {string} path - 目录路径
+   */
+  async showDirectoryContent(path) {
+    const cached = this.clientStore ? await this.clientStore.get('listings', path) : null;
+    let shownCached = false;
+    
+    if (cached && path === this.config.getCurrentPath()) {
+      try {
+        const data = await this.parseListing(cached.body.slice(0));
+        if (data.type === "directory_listing" && path === this.config.getCurrentPath()) {
+          this.displayDirectoryContent(data);
+          shownCached = true;
+        }
+      } catch (error) {
+        console.warn(`[${this.pluginName}] 缓存的目录列表无效:`, error);
+      }
+    }
+    
+    try {
+      // 缓存已显示时只需确认，未变化（304）时返回null
+      const data = await this.loadDirectoryContent(path, shownCached ? cached : null);
+      if (data && path === this.config.getCurrentPath()) {
+        console.log(`[${this.pluginName}] 目录加载成功: ${data.directories?.length || 0}个文件夹, ${data.files?.length || 0}个文件`);
+        this.displayDirectoryContent(data);
+      }
+    } catch (error) {
+      console.error(`[${this.pluginName}] 目录加载失败:`, error);
+      if (path !== this.config.getCurrentPath()) return;
+      if (shownCached) {
+        window.nzWorkflowManager?.showNotification?.('无法连接服务器，当前显示的是缓存的目录内容', 'warning');
+      } else {
+        this.displayError('无法加载目录，请检查路径或ComfyUI服务状态');
+      }
+    }
+  }
+
+  /**
+   * 解析目录列表响应内容（有后台数据处理器时在Worker中解析并缓存列表）
+   * @param {ArrayBuffer} buffer - 响应内容
+   * @returns {Promise<Object>} 目录数据
+   */
+  parseListing(buffer) {
+    return this.dataProcessor
+      ? this.dataProcessor.parseBuffer(buffer, { listing: true })
+      : Promise.resolve(JSON.parse(new TextDecoder().decode(buffer)));
+  }
+
   /**
    * 加载目录内容（通信层）
    * @param {string} path - 目录路径
-   * @returns {Promise} 目录数据
+   * @param {Object|null} cached - 已显示的缓存记录（用于条件请求）
+   * @returns {Promise} 目录数据，与缓存相同时为null
    */
-  async loadDirectoryContent(path) {
+  async loadDirectoryContent(path, cached = null) {
     console.log(`[${this.pluginName}] 开始加载目录内容: ${path}`);
     
     try {
       // 优先使用HTTP端点
-      const data = await this.loadDirectoryUsingHTTP(path);
+      const data = await this.loadDirectoryUsingHTTP(path, cached);
       return data;
     } catch (httpError) {
       console.log(`[${this.pluginName}] HTTP失败，尝试WebSocket备用方案...`);
@@ -176,43 +214,49 @@ class WorkflowManager {
   /**
    * 使用HTTP端点读取目录
    * @param {string} dirPath - 目录路径
-   * @returns {Promise} 目录数据
+   * @param {Object|null} cached - 缓存记录（带If-None-Match确认）
+   * @returns {Promise} 目录数据，服务器确认与缓存相同时为null
    */
-  loadDirectoryUsingHTTP(dirPath) {
-    return new Promise((resolve, reject) => {
-      console.log(`[${this.pluginName}] 使用HTTP端点读取目录: ${dirPath}`);
+  async loadDirectoryUsingHTTP(dirPath, cached = null) {
+    console.log(`[${this.pluginName}] 使用HTTP端点读取目录: ${dirPath}`);
+    
+    // 使用正确的/file_operations端点
+    const localFileUrl = `${window.location.origin}/file_operations?action=list_directory&path=${encodeURIComponent(dirPath)}`;
+    console.log(`[${this.pluginName}] HTTP请求URL: ${localFileUrl}`);
+    
+    try {
+      let buffer;
+      if (this.clientStore) {
+        const result = await this.clientStore.fetchCached('listings', dirPath, localFileUrl, cached);
+        if (!result.modified) {
+          console.log(`[${this.pluginName}] 目录未变化，继续使用缓存: ${dirPath}`);
+          return null;
+        }
+        buffer = result.buffer;
+      } else {
+        const response = await fetch(localFileUrl);
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        buffer = await response.arrayBuffer();
+      }
       
-      // 使用正确的/file_operations端点
-      const localFileUrl = `${window.location.origin}/file_operations?action=list_directory&path=${encodeURIComponent(dirPath)}`;
-      console.log(`[${this.pluginName}] HTTP请求URL: ${localFileUrl}`);
+      // 响应内容转移给Worker解析，同时在Worker中缓存列表供排序和搜索使用
+      const data = await this.parseListing(buffer);
+      console.log(`[${this.pluginName}] HTTP响应数据: ${data.directories?.length || 0}个文件夹, ${data.files?.length || 0}个文件`);
       
-      fetch(localFileUrl)
-        .then(response => {
-          if (response.ok) {
-            return response.json();
-          } else {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-          }
-        })
-        .then(data => {
-          console.log(`[${this.pluginName}] HTTP响应数据:`, data);
-          
-          if (data.error) {
-            reject(new Error(data.error));
-            return;
-          }
-          
-          if (data.type === "directory_listing") {
-            resolve(data);
-          } else {
-            reject(new Error('HTTP端点返回数据格式错误'));
-          }
-        })
-        .catch(error => {
-          console.error(`[${this.pluginName}] HTTP读取失败:`, error);
-          reject(error);
-        });
-    });
+      if (data.type !== "directory_listing" || data.error) {
+        // 错误结果不保留在缓存中
+        if (this.clientStore) {
+          this.clientStore.delete('listings', dirPath);
+        }
+        throw new Error(data.error || 'HTTP端点返回数据格式错误');
+      }
+      return data;
+    } catch (error) {
+      console.error(`[${this.pluginName}] HTTP读取失败:`, error);
+      throw error;
+    }
   }
 
   /**
@@ -232,6 +276,13 @@ class WorkflowManager {
           return;
         }
         
+        // 服务器没有在能力握手中公布该操作时不发送，避免等待超时
+        const api = window.nzWorkflowManager && window.nzWorkflowManager.communicationAPI;
+        if (api && !api.canUseWebSocket('list_directory')) {
+          reject(new Error('服务器不支持通过WebSocket读取目录'));
+          return;
+        }
+        
         console.log(`[${this.pluginName}] 使用ComfyUI WebSocket发送目录读取消息`);
         
         // 创建WebSocket消息
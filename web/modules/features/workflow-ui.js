@@ -10,9 +10,31 @@
  * 第五阶段模块化完成
  */
 
+// 项目数超过该值时使用虚拟滚动，只创建可见行及上下预留行的元素
+const VIRTUAL_GRID_THRESHOLD = 200;
+// 可见区域上下各多渲染的行数
+const VIRTUAL_GRID_OVERSCAN_ROWS = 4;
+// 最多保留的已创建元素数（滚出可见范围的元素缓存起来，滚回时复用）
+const VIRTUAL_GRID_POOL_SIZE = 600;
+// 测量到实际行高之前使用的估计值（项目高度74px + 内边距 + 行间距）
+const DEFAULT_GRID_ROW_HEIGHT = 113;
+
+// 目录列表的排序设置在localStorage中的键
+const LISTING_SORT_STORAGE_KEY = 'nz_listing_sort';
+
 class WorkflowUI {
-  constructor(pluginName) {
+  constructor(pluginName, dataProcessor = null) {
     this.pluginName = pluginName;
+    // 后台数据处理器（目录列表的筛选、排序和备注装饰）
+    this.dataProcessor = dataProcessor;
+    // 文件网格的渲染状态（当前目录的项目、已创建的元素、可见范围）
+    this.gridState = null;
+    // 目录列表的显示选项（搜索词和排序方式）
+    this.listingOptions = { query: '', ...this.loadListingSort() };
+    // 目录列表处理的序号和等待中的请求（只渲染最新一次请求的结果）
+    this.listingSeq = 0;
+    this.listingPending = false;
+    this.listingQueued = null;
     
     console.log(`[${this.pluginName}] 工作流UI模块已初始化`);
   }
@@ -48,37 +70,513 @@ class WorkflowUI {
       return;
     }
     
-    // 清空现有内容
-    fileGrid.innerHTML = '';
+    if (this.listingOptions.query && (!this.gridState || this.gridState.path !== data.path)) {
+      // 切换目录时清空搜索词
+      this.setListingQuery('', false);
+    }
     
-    let totalItems = 0;
+    const seq = ++this.listingSeq;
+    this.listingQueued = null;
+    const entryCount = (data.directories || []).length + (data.files || []).length;
+    if (this.dataProcessor && entryCount > VIRTUAL_GRID_THRESHOLD) {
+      // 大目录在后台筛选、排序和装饰，完成后再渲染
+      this.requestListingView(data, seq);
+      return;
+    }
     
-    // 显示文件夹 - 完整功能版本
-    if (data.directories && data.directories.length > 0) {
-      console.log(`[${this.pluginName}] 显示 ${data.directories.length} 个文件夹`);
-      data.directories.forEach(dirInfo => {
-        const dirElement = this.createDirectoryElementFull(dirInfo, data);
-        fileGrid.appendChild(dirElement);
-        totalItems++;
+    this.renderGridItems(data, this.buildListingView(data));
+  }
+
+  /**
+   * 在后台生成目录列表视图并渲染；上一次处理还没完成时只保留最新的请求，快速输入搜索词时不会堆积
+   * @param {Object} data - 目录数据
+   * @param {number} seq - 请求序号
+   */
+  requestListingView(data, seq) {
+    if (this.listingPending) {
+      this.listingQueued = data;
+      return;
+    }
+    
+    this.listingPending = true;
+    this.dataProcessor.viewListing(data, this.collectListingNotes(data), this.listingOptions)
+      .catch(error => {
+        console.error(`[${this.pluginName}] 后台处理目录列表失败，改为在主线程处理:`, error);
+        return this.buildListingView(data);
+      })
+      .then(view => {
+        this.listingPending = false;
+        const queued = this.listingQueued;
+        this.listingQueued = null;
+        if (queued) {
+          this.requestListingView(queued, this.listingSeq);
+        } else if (seq === this.listingSeq) {
+          this.renderGridItems(data, view);
+        }
       });
+  }
+
+  /**
+   * 在主线程生成目录列表视图（项目较少时使用，与后台处理的逻辑相同）
+   * @param {Object} data - 目录数据
+   * @returns {Object} { total, matched, items }
+   */
+  buildListingView(data) {
+    if (this.dataProcessor) {
+      return this.dataProcessor.viewListingSync(data, this.collectListingNotes(data), this.listingOptions);
+    }
+    const items = this.buildGridItems(data);
+    return { total: items.length, matched: items.length, items };
+  }
+
+  /**
+   * 收集目录中文件的备注，用于在后台装饰项目和搜索备注内容
+   * @param {Object} data - 目录数据
+   * @returns {Object} { 文件路径: 备注 }
+   */
+  collectListingNotes(data) {
+    const notes = {};
+    const manager = window.workflowNotesManager;
+    if (!manager) return notes;
+    (data.files || []).forEach(fileInfo => {
+      const fileName = typeof fileInfo === 'string' ? fileInfo : fileInfo.name;
+      const filePath = data.path ? `${data.path}\\${fileName}` : fileName;
+      const note = manager.getNote(filePath);
+      if (note) {
+        notes[filePath] = { description: note.description, priority: note.priority, tags: note.tags };
+      }
+    });
+    return notes;
+  }
+
+  /**
+   * 按目录列表视图渲染文件网格
+   * @param {Object} data - 目录数据
+   * @param {Object} view - 目录列表视图 { total, matched, items }
+   */
+  renderGridItems(data, view) {
+    const fileGrid = document.querySelector('#nz-content #nz-file-grid');
+    if (!fileGrid) {
+      console.error(`[${this.pluginName}] 找不到文件网格元素`);
+      return;
     }
     
-    // 显示文件 - 完整功能版本
-    if (data.files && data.files.length > 0) {
-      console.log(`[${this.pluginName}] 显示 ${data.files.length} 个JSON工作流文件`);
-      data.files.forEach(fileInfo => {
-        const fileElement = this.createFileElementFull(fileInfo, data);
-        fileGrid.appendChild(fileElement);
-        totalItems++;
+    const items = view.items;
+    const state = this.gridState;
+    
+    if (state && state.fileGrid === fileGrid && state.path === data.path) {
+      // 同一目录的刷新：按key比较，只重建内容有变化的项目
+      const nextKeys = new Set(items.map(item => item.key));
+      let changed = 0;
+      items.forEach(item => {
+        const cached = state.elements.get(item.key);
+        if (cached && cached.signature !== item.signature) {
+          this.releaseElement(state, item.key);
+          changed++;
+        }
+      });
+      Array.from(state.elements.keys()).forEach(key => {
+        if (!nextKeys.has(key)) {
+          this.releaseElement(state, key);
+          changed++;
+        }
+      });
+      console.log(`[${this.pluginName}] 增量更新目录内容，${changed} 个项目有变化`);
+    } else {
+      this.resetGridState(fileGrid, data.path);
+    }
+    
+    this.gridState.items = items;
+    this.gridState.data = data;
+    this.gridState.virtual = items.length > VIRTUAL_GRID_THRESHOLD;
+    this.renderGridWindow();
+    this.updateSearchCount(view);
+    
+    console.log(`[${this.pluginName}] 目录内容显示完成，共 ${items.length} 个项目${this.gridState.virtual ? '（虚拟滚动）' : ''}`);
+  }
+
+  /**
+   * 设置搜索词并重新显示当前目录
+   * @param {string} query - 搜索词（空格分隔的多个词需同时匹配名称、备注或标签）
+   * @param {boolean} refresh - 是否立即重新显示
+   */
+  setListingQuery(query, refresh = true) {
+    this.listingOptions = { ...this.listingOptions, query };
+    const input = document.getElementById('nz-search-input');
+    if (input && input.value !== query) {
+      input.value = query;
+    }
+    if (refresh && this.gridState && this.gridState.data) {
+      this.displayDirectoryContent(this.gridState.data);
+    }
+  }
+
+  /**
+   * 设置排序方式并重新显示当前目录
+   * @param {string} sort - name / modified / size / priority
+   * @param {string} order - asc / desc
+   */
+  setListingSort(sort, order) {
+    this.listingOptions = { ...this.listingOptions, sort, order };
+    try {
+      localStorage.setItem(LISTING_SORT_STORAGE_KEY, JSON.stringify({ sort, order }));
+    } catch (error) {
+      console.error(`[${this.pluginName}] 保存排序设置失败:`, error);
+    }
+    if (this.gridState && this.gridState.data) {
+      this.displayDirectoryContent(this.gridState.data);
+    }
+  }
+
+  /**
+   * 读取保存的排序设置
+   * @returns {Object} { sort, order }
+   */
+  loadListingSort() {
+    try {
+      const saved = JSON.parse(localStorage.getItem(LISTING_SORT_STORAGE_KEY) || 'null');
+      if (saved && typeof saved.sort === 'string') {
+        return { sort: saved.sort, order: saved.order === 'desc' ? 'desc' : 'asc' };
+      }
+    } catch (error) {
+      console.error(`[${this.pluginName}] 读取排序设置失败:`, error);
+    }
+    return { sort: 'name', order: 'asc' };
+  }
+
+  /**
+   * 更新搜索结果计数（没有搜索词时隐藏）
+   * @param {Object} view - 目录列表视图
+   */
+  updateSearchCount(view) {
+    const counter = document.getElementById('nz-search-count');
+    if (!counter) return;
+    if (this.listingOptions.query.trim()) {
+      counter.textContent = `${view.matched} / ${view.total}`;
+      counter.style.display = '';
+    } else {
+      counter.textContent = '';
+      counter.style.display = 'none';
+    }
+  }
+
+  /**
+   * 把目录数据转换为网格项目列表（文件夹在前）
+   * key与多选管理器的项目id一致：`${类型}:${路径}`
+   * @param {Object} data - 目录数据
+   * @returns {Array} 项目列表
+   */
+  buildGridItems(data) {
+    const items = [];
+    (data.directories || []).forEach(dirInfo => {
+      const dirName = typeof dirInfo === 'string' ? dirInfo : dirInfo.name;
+      const directoryPath = data.path ? `${data.path}\\${dirName}` : dirName;
+      items.push({
+        key: `directory:${directoryPath}`,
+        type: 'directory',
+        info: dirInfo,
+        signature: JSON.stringify(dirInfo)
       });
+    });
+    (data.files || []).forEach(fileInfo => {
+      const fileName = typeof fileInfo === 'string' ? fileInfo : fileInfo.name;
+      const filePath = data.path ? `${data.path}\\${fileName}` : fileName;
+      // 备注会显示在文件项中，备注变化时也需要重建
+      const note = window.workflowNotesManager ? window.workflowNotesManager.getNote(filePath) : null;
+      items.push({
+        key: `file:${filePath}`,
+        type: 'file',
+        info: fileInfo,
+        signature: JSON.stringify([fileInfo, note ? [note.description, note.priority, note.tags] : null])
+      });
+    });
+    return items;
+  }
+
+  /**
+   * 切换到新目录（或网格元素被替换）时重置渲染状态
+   * @param {HTMLElement} fileGrid - 文件网格元素
+   * @param {string} path - 目录路径
+   */
+  resetGridState(fileGrid, path) {
+    if (this.gridState) {
+      this.detachGridListeners(this.gridState);
+    }
+    
+    fileGrid.innerHTML = '';
+    fileGrid.style.paddingTop = '';
+    fileGrid.style.paddingBottom = '';
+    const computed = getComputedStyle(fileGrid);
+    
+    const state = {
+      fileGrid,
+      path,
+      items: [],
+      data: null,
+      virtual: false,
+      // key -> { element, signature }，Map的顺序即最近使用顺序，超出上限时淘汰最久未显示的
+      elements: new Map(),
+      basePaddingTop: parseFloat(computed.paddingTop) || 0,
+      basePaddingBottom: parseFloat(computed.paddingBottom) || 0,
+      rowHeight: 0,
+      columns: 1,
+      range: null,
+      frame: 0,
+      scrollParent: this.findScrollParent(fileGrid)
+    };
+    
+    state.onScroll = () => this.scheduleGridRender();
+    state.scrollParent.addEventListener('scroll', state.onScroll, { passive: true });
+    if (typeof ResizeObserver !== 'undefined') {
+      // 侧边栏宽度变化会改变列数
+      state.resizeObserver = new ResizeObserver(() => this.scheduleGridRender());
+      state.resizeObserver.observe(fileGrid);
+    }
+    
+    this.gridState = state;
+  }
+
+  /**
+   * 移除网格的滚动和尺寸监听
+   * @param {Object} state - 渲染状态
+   */
+  detachGridListeners(state) {
+    state.scrollParent.removeEventListener('scroll', state.onScroll);
+    if (state.resizeObserver) {
+      state.resizeObserver.disconnect();
+    }
+    if (state.frame) {
+      cancelAnimationFrame(state.frame);
+    }
+  }
+
+  /**
+   * 查找实际滚动的祖先元素（内容区或侧边栏）
+   * @param {HTMLElement} element - 起始元素
+   * @returns {HTMLElement} 滚动容器
+   */
+  findScrollParent(element) {
+    let node = element.parentElement;
+    while (node && node !== document.body) {
+      const overflowY = getComputedStyle(node).overflowY;
+      if (overflowY === 'auto' || overflowY === 'scroll' || overflowY === 'overlay') {
+        return node;
+      }
+      node = node.parentElement;
+    }
+    return document.scrollingElement || document.documentElement;
+  }
+
+  /**
+   * 在下一帧重新计算可见范围（滚动和尺寸变化事件合并为一次）
+   */
+  scheduleGridRender() {
+    const state = this.gridState;
+    if (!state || state.frame) return;
+    state.frame = requestAnimationFrame(() => {
+      state.frame = 0;
+      if (this.gridState === state && state.fileGrid.isConnected) {
+        this.renderGridWindow();
+      }
+    });
+  }
+
+  /**
+   * 计算需要显示的项目范围：项目较少时全部显示，否则只显示可见行及上下预留行
+   * @param {Object} state - 渲染状态
+   * @returns {Object} { start, end, rowsBefore, rowsAfter }
+   */
+  computeGridRange(state) {
+    const total = state.items.length;
+    if (!state.virtual) {
+      return { start: 0, end: total, rowsBefore: 0, rowsAfter: 0 };
     }
     
-    console.log(`[${this.pluginName}] 目录内容显示完成，共 ${totalItems} 个项目`);
+    const fileGrid = state.fileGrid;
+    const tracks = getComputedStyle(fileGrid).gridTemplateColumns;
+    state.columns = tracks && tracks !== 'none' ? Math.max(1, tracks.trim().split(/\s+/).length) : 1;
+    const rowHeight = state.rowHeight || DEFAULT_GRID_ROW_HEIGHT;
+    const totalRows = Math.ceil(total / state.columns);
+    
+    const scrollParent = state.scrollParent;
+    const isDocument = scrollParent === document.scrollingElement || scrollParent === document.documentElement;
+    const viewportTop = isDocument ? 0 : scrollParent.getBoundingClientRect().top;
+    const viewportHeight = isDocument ? window.innerHeight : scrollParent.clientHeight;
+    // 网格第一行顶部相对于可视区域顶部的距离（已滚出可视区域时为负）
+    const gridTop = fileGrid.getBoundingClientRect().top + state.basePaddingTop - viewportTop;
+    
+    const firstRow = Math.max(0, Math.floor(-gridTop / rowHeight) - VIRTUAL_GRID_OVERSCAN_ROWS);
+    const lastRow = Math.min(totalRows, Math.ceil((viewportHeight - gridTop) / rowHeight) + VIRTUAL_GRID_OVERSCAN_ROWS);
+    const startRow = Math.min(firstRow, Math.max(0, lastRow - 1));
+    
+    return {
+      start: startRow * state.columns,
+      end: Math.min(total, Math.max(lastRow, startRow + 1) * state.columns),
+      rowsBefore: startRow,
+      rowsAfter: Math.max(0, totalRows - Math.max(lastRow, startRow + 1))
+    };
+  }
+
+  /**
+   * 按可见范围更新网格中的元素：复用已创建的元素，只移动/插入/移除有变化的节点，
+   * 范围外的行用网格的上下内边距占位，保持滚动条高度不变
+   */
+  renderGridWindow() {
+    const state = this.gridState;
+    if (!state) return;
+    
+    const range = this.computeGridRange(state);
+    const fileGrid = state.fileGrid;
+    const wanted = [];
+    const created = [];
+    
+    for (let index = range.start; index < range.end; index++) {
+      const item = state.items[index];
+      let cached = state.elements.get(item.key);
+      if (cached) {
+        // 移到Map末尾，表示最近使用
+        state.elements.delete(item.key);
+      } else {
+        cached = { element: this.createGridElement(item, state.data), signature: item.signature };
+        created.push(cached.element);
+      }
+      state.elements.set(item.key, cached);
+      this.syncItemSelection(cached.element, item.key);
+      wanted.push(cached.element);
+    }
+    
+    // 按顺序放置需要的节点（已在正确位置的不动）
+    const wantedSet = new Set(wanted);
+    let cursor = fileGrid.firstChild;
+    wanted.forEach(element => {
+      while (cursor && !wantedSet.has(cursor)) {
+        const next = cursor.nextSibling;
+        cursor.remove();
+        cursor = next;
+      }
+      if (cursor === element) {
+        cursor = cursor.nextSibling;
+      } else {
+        fileGrid.insertBefore(element, cursor);
+      }
+    });
+    while (cursor) {
+      const next = cursor.nextSibling;
+      cursor.remove();
+      cursor = next;
+    }
+    
+    const rowHeight = state.rowHeight || DEFAULT_GRID_ROW_HEIGHT;
+    fileGrid.style.paddingTop = range.rowsBefore ? `${state.basePaddingTop + range.rowsBefore * rowHeight}px` : '';
+    fileGrid.style.paddingBottom = range.rowsAfter ? `${state.basePaddingBottom + range.rowsAfter * rowHeight}px` : '';
+    state.range = range;
+    
+    this.trimElementPool(state);
+    
+    if (created.length > 0) {
+      // 新创建的元素延迟修复布局，避免阻塞首屏
+      setTimeout(() => created.forEach(element => this.fixItemLayout(element)), 100);
+    }
     
-    // 强制修复所有布局（延迟执行避免阻塞）
-    setTimeout(() => {
-      this.fixAllItemLayouts(fileGrid);
-    }, 100);
+    // 首次显示后测量实际行高（项目高度 + 行间距），与估计值不同时重新计算范围
+    if (state.virtual && wanted.length > 0 && !state.rowHeight) {
+      const rowGap = parseFloat(getComputedStyle(fileGrid).rowGap) || 0;
+      const measured = wanted[0].offsetHeight + rowGap;
+      if (measured > 0) {
+        state.rowHeight = measured;
+        if (measured !== DEFAULT_GRID_ROW_HEIGHT) {
+          this.scheduleGridRender();
+        }
+      }
+    }
+  }
+
+  /**
+   * 创建网格项目元素
+   * @param {Object} item - 网格项目
+   * @param {Object} data - 目录数据
+   * @returns {HTMLElement} 项目元素
+   */
+  createGridElement(item, data) {
+    return item.type === 'directory'
+      ? this.createDirectoryElementFull(item.info, data)
+      : this.createFileElementFull(item.info, data, item.note);
+  }
+
+  /**
+   * 从缓存中移除项目元素
+   * @param {Object} state - 渲染状态
+   * @param {string} key - 项目key
+   */
+  releaseElement(state, key) {
+    const cached = state.elements.get(key);
+    if (cached) {
+      cached.element.remove();
+      state.elements.delete(key);
+    }
+  }
+
+  /**
+   * 限制已创建元素的数量：滚出可见范围的元素保留在缓存中，滚回时直接复用，
+   * 超出上限时丢弃最久未显示的
+   * @param {Object} state - 渲染状态
+   */
+  trimElementPool(state) {
+    const limit = Math.max(VIRTUAL_GRID_POOL_SIZE, state.range.end - state.range.start);
+    for (const key of state.elements.keys()) {
+      if (state.elements.size <= limit) break;
+      if (!state.elements.get(key).element.isConnected) {
+        state.elements.delete(key);
+      }
+    }
+  }
+
+  /**
+   * 重新显示的元素同步多选状态（选择在元素不在DOM中时也会保留）
+   * @param {HTMLElement} element - 项目元素
+   * @param {string} key - 项目key（即多选项目id）
+   */
+  syncItemSelection(element, key) {
+    const manager = window.multiSelectManager;
+    if (!manager || !manager.selectedItems) return;
+    if (manager.selectedItems.has(key)) {
+      element.classList.add('nz-selected');
+      if (manager.selectedItems[key]) {
+        manager.selectedItems[key].element = element;
+      }
+    } else {
+      element.classList.remove('nz-selected');
+    }
+  }
+
+  /**
+   * 当前目录中的所有项目（包括不在DOM中的），用于全选、反选等操作
+   * @returns {Array} [{ id, itemType, filePath, fileName, element }]
+   */
+  getItemRecords() {
+    const state = this.gridState;
+    if (!state) return [];
+    return state.items.map(item => {
+      const name = typeof item.info === 'string' ? item.info : item.info.name;
+      const cached = state.elements.get(item.key);
+      return {
+        id: item.key,
+        itemType: item.type,
+        filePath: item.key.slice(item.type.length + 1),
+        fileName: name,
+        element: cached && cached.element.isConnected ? cached.element : null
+      };
+    });
+  }
+
+  /**
+   * 丢弃已创建的元素并按当前数据重新显示（备注、自定义图标等显示内容在外部变化时使用）
+   */
+  refreshItemElements() {
+    const state = this.gridState;
+    if (!state || !state.fileGrid.isConnected) return;
+    Array.from(state.elements.keys()).forEach(key => this.releaseElement(state, key));
+    this.displayDirectoryContent(state.data);
   }
 
   /**
@@ -163,9 +661,10 @@ class WorkflowUI {
    * 创建文件元素 - 完整功能版本
    * @param {Object} fileInfo - 文件信息
    * @param {Object} data - 完整数据对象
+   * @param {Object|null} preparedNote - 已在后台查好的备注（未提供时从备注系统读取）
    * @returns {HTMLElement} 文件元素
    */
-  createFileElementFull(fileInfo, data) {
+  createFileElementFull(fileInfo, data, preparedNote) {
     const fileName = typeof fileInfo === 'string' ? fileInfo : fileInfo.name;
     const fileDate = typeof fileInfo === 'object' ? fileInfo.date : '--/--/--';
     
@@ -176,7 +675,8 @@ class WorkflowUI {
     const filePath = data.path ? `${data.path}\\${fileName}` : fileName;
     
     // 获取备注信息
-    const note = window.workflowNotesManager ? window.workflowNotesManager.getNote(filePath) : null;
+    const note = preparedNote !== undefined ? preparedNote :
+      (window.workflowNotesManager ? window.workflowNotesManager.getNote(filePath) : null);
     const hasNote = !!note;
     
     // JSON工作流文件固定图标
@@ -558,14 +1058,7 @@ class WorkflowUI {
     let skippedCount = 0;
     
     items.forEach(item => {
-      const hasCustomIcon = item.querySelector('.custom-icon-container');
-      if (!hasCustomIcon) {
-        if (window.ensureCorrectLayout) {
-          window.ensureCorrectLayout(item);
-        }
-        if (window.ensureFileItemBorder) {
-          window.ensureFileItemBorder(item, true);
-        }
+      if (this.fixItemLayout(item)) {
         fixedCount++;
       } else {
         skippedCount++;
@@ -576,6 +1069,24 @@ class WorkflowUI {
     console.log(`[${this.pluginName}] 已修复 ${fixedCount}/${items.length} 个文件项的布局（跳过 ${skippedCount} 个自定义图标项）`);
   }
 
+  /**
+   * 修复单个项目的布局和边框（自定义图标项跳过）
+   * @param {HTMLElement} item - 项目元素
+   * @returns {boolean} 是否进行了修复
+   */
+  fixItemLayout(item) {
+    if (item.querySelector('.custom-icon-container')) {
+      return false;
+    }
+    if (window.ensureCorrectLayout) {
+      window.ensureCorrectLayout(item);
+    }
+    if (window.ensureFileItemBorder) {
+      window.ensureFileItemBorder(item, true);
+    }
+    return true;
+  }
+
   // ====== 工具方法 ======
 
   /**
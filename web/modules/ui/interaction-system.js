@@ -3753,10 +3753,12 @@ class MultiSelectManager {
     
     this.selectedItems.add(itemId);
     this.selectedItems[itemId] = selectionData; // 存储详细信息
-    this.lastSelectedItem = itemElement;
     
-    // 添加视觉选择效果
-    itemElement.classList.add('nz-selected');
+    // 添加视觉选择效果（虚拟滚动时不在DOM中的项目没有元素，显示时再同步）
+    if (itemElement) {
+      this.lastSelectedItem = itemElement;
+      itemElement.classList.add('nz-selected');
+    }
   }
   
   // 从选择中移除
@@ -73,6 +73,9 @@ export class UIManager {
       // 多选按钮事件
       this.setupMultiSelectButton();
       
+      // 搜索和排序事件
+      this.setupSearchBar();
+      
       this.state.initialized = true;
       console.log(`[${this.pluginName}] UI事件监听器初始化完成`);
       
@@ -128,6 +131,42 @@ export class UIManager {
     }
   }
   
+  /**
+   * 设置搜索框和排序选择事件（输入时即时筛选当前目录）
+   */
+  setupSearchBar() {
+    const searchInput = document.getElementById('nz-search-input');
+    const sortSelect = document.getElementById('nz-sort-select');
+    const workflowUI = window.nzWorkflowManager && window.nzWorkflowManager.workflowUI;
+    if (!searchInput || !sortSelect || !workflowUI) return;
+    
+    searchInput.replaceWith(searchInput.cloneNode(true));
+    sortSelect.replaceWith(sortSelect.cloneNode(true));
+    const newSearchInput = document.getElementById('nz-search-input');
+    const newSortSelect = document.getElementById('nz-sort-select');
+    
+    newSearchInput.value = workflowUI.listingOptions.query;
+    newSearchInput.addEventListener('input', () => {
+      workflowUI.setListingQuery(newSearchInput.value);
+    });
+    newSearchInput.addEventListener('keydown', (e) => {
+      if (e.key === 'Escape' && newSearchInput.value) {
+        e.stopPropagation();
+        workflowUI.setListingQuery('');
+      }
+    });
+    
+    const { sort, order } = workflowUI.listingOptions;
+    newSortSelect.value = `${sort}:${order}`;
+    if (!newSortSelect.value) {
+      newSortSelect.value = 'name:asc';
+    }
+    newSortSelect.addEventListener('change', () => {
+      const [newSort, newOrder] = newSortSelect.value.split(':');
+      workflowUI.setListingSort(newSort, newOrder);
+    });
+  }
+  
   /**
    * 设置选择目录按钮事件
    */